@@ -0,0 +1,242 @@
+"""
+Teste de carga offline: técnicos simulados a percorrer os fluxos reais do bot.
+
+Monta a Application com os handlers de bot.py (registar_handlers) sobre a
+Bot API em memória (bot_offline) e um banco SQLite temporário com latência
+simulada em cada consulta. Cada chat simulado faz, por ordem:
+    /start -> criar OS -> fechar OS -> (com probabilidade --relatorios) relatório
+e cada passo é medido desde que a atualização entra na fila até à primeira
+resposta do bot para esse chat. No fim mostra p50/p95/p99 por passo e o débito.
+
+Uso:
+    python -m benchmarks.bench_carga --chats 500 --latencia-db 0.02 --latencia-api 0.01
+
+Os processos que geram os PDF leem o mesmo ficheiro SQLite, mas sem a latência simulada.
+"""
+import os
+import tempfile
+
+# O banco e o journal têm de ser definidos antes de o config.py ser importado.
+# (setdefault: os processos de renderização herdam os valores do processo principal.)
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DB_SQLITE_FICHEIRO", os.path.join(tempfile.gettempdir(), f"kraflo_carga_{os.getpid()}.sqlite3"))
+os.environ.setdefault("JOURNAL_FICHEIRO", os.path.join(tempfile.gettempdir(), f"kraflo_carga_{os.getpid()}.jsonl"))
+os.environ.setdefault("JOURNAL_INTERVALO", "1")
+os.environ.setdefault("PERSISTENCIA_FICHEIRO", "")
+os.environ.setdefault("METRICAS_PORTA", "0")
+os.environ.setdefault("METRICAS_LOG_INTERVALO", "0")
+
+import argparse
+import asyncio
+import glob
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.bot_offline import PedidoOffline, criar_aplicacao_offline, update_de_dados
+from benchmarks.comum import USUARIO_EXEMPLO, percentil
+from benchmarks.telegram_falso import criar_update_mensagem, criar_update_callback
+
+import database
+from bot import ao_iniciar, ao_encerrar, registar_handlers
+from config import DB_SQLITE_FICHEIRO, JOURNAL_FICHEIRO
+from database.repositorio import Repositorio
+from database.repositorio_sqlite import RepositorioSQLite
+
+# Um passo de um fluxo: (nome, 'msg' ou 'cb', texto da mensagem ou dados do botão).
+Passo = Tuple[str, str, str]
+Predicado = Callable[[str, Dict[str, Any]], bool]
+
+
+class RepositorioComLatencia(Repositorio):
+    """Envolve outro repositório e acrescenta uma espera fixa a cada chamada (simula a rede)."""
+
+    def __init__(self, base: Repositorio, latencia: float):
+        self.base = base
+        self.latencia = latencia
+        self.chamadas: Dict[str, int] = defaultdict(int)
+
+    def _chamar(self, nome: str, *args: Any) -> Any:
+        self.chamadas[nome] += 1
+        time.sleep(self.latencia)
+        return getattr(self.base, nome)(*args)
+
+    def buscar_usuario(self, *args): return self._chamar('buscar_usuario', *args)
+    def buscar_usuarios(self, *args): return self._chamar('buscar_usuarios', *args)
+    def existe_matricula(self, *args): return self._chamar('existe_matricula', *args)
+    def inserir_usuario(self, *args): return self._chamar('inserir_usuario', *args)
+    def inserir_ordens(self, *args): return self._chamar('inserir_ordens', *args)
+    def atualizar_ordem(self, *args): return self._chamar('atualizar_ordem', *args)
+    def listar_ordens_abertas(self, *args): return self._chamar('listar_ordens_abertas', *args)
+    def listar_ordens_abertas_lote(self, *args): return self._chamar('listar_ordens_abertas_lote', *args)
+    def existe_ordem_periodo(self, *args): return self._chamar('existe_ordem_periodo', *args)
+    def pagina_ordens_periodo(self, *args): return self._chamar('pagina_ordens_periodo', *args)
+    def pagina_ordens_setor(self, *args): return self._chamar('pagina_ordens_setor', *args)
+    def resumo_setor(self, *args): return self._chamar('resumo_setor', *args)
+    def pagina_ordens_maquina(self, *args): return self._chamar('pagina_ordens_maquina', *args)
+    def pagina_ordens_exportacao(self, *args): return self._chamar('pagina_ordens_exportacao', *args)
+    def listar_assinaturas(self, *args): return self._chamar('listar_assinaturas', *args)
+    def guardar_assinatura(self, *args): return self._chamar('guardar_assinatura', *args)
+    def remover_assinatura(self, *args): return self._chamar('remover_assinatura', *args)
+
+    def fechar(self) -> None:
+        self.base.fechar()
+
+
+def fluxo_criar_os() -> List[Passo]:
+    return [
+        ('criar_os:comando', 'msg', '/criar_os'), ('criar_os:confirmar', 'cb', 'sim'),
+        ('criar_os:maquina', 'msg', '1234'), ('criar_os:modelo', 'msg', 'Tear Picanol OMNIplus'),
+        ('criar_os:tipo', 'cb', 'Corretiva'), ('criar_os:problema', 'msg', 'Ruído anormal no rolamento'),
+    ]
+
+
+def fluxo_fechar_os(os_id: int) -> List[Passo]:
+    return [
+        ('fechar_os:comando', 'msg', '/fechar_os'), ('fechar_os:confirmar', 'cb', 'sim'),
+        ('fechar_os:selecionar', 'cb', f'os:{os_id}'), ('fechar_os:solucao', 'msg', 'Rolamento substituído'),
+        ('fechar_os:peca', 'cb', 'nao'), ('fechar_os:concluido', 'cb', 'sim'), ('fechar_os:observacao', 'cb', 'nao'),
+    ]
+
+
+def fluxo_relatorio(dia: date) -> List[Passo]:
+    return [
+        ('relatorio:comando', 'msg', '/relatorio'), ('relatorio:opcao', 'cb', 'dia_unico'),
+        ('relatorio:ano', 'cb', f'cbcal_0_s_y_{dia.year}_{dia.month}_{dia.day}'),
+        ('relatorio:mes', 'cb', f'cbcal_0_s_m_{dia.year}_{dia.month}_{dia.day}'),
+        ('relatorio:dia', 'cb', f'cbcal_0_s_d_{dia.year}_{dia.month}_{dia.day}'),
+        ('relatorio:confirmar', 'cb', 'confirmar'), ('relatorio:layout', 'cb', 'resumo'),
+    ]
+
+
+def _fim_do_relatorio(metodo: str, parametros: Dict[str, Any]) -> bool:
+    """O PDF chegou, ou o bot desistiu (fila cheia, tempo esgotado, erro)."""
+    return metodo == 'sendDocument' or str(parametros.get('text', '')).startswith(('⚠️', 'Nenhuma', 'Ocorreu'))
+
+
+class Carga:
+    """Envia as atualizações dos chats simulados e mede o tempo até à resposta do bot."""
+
+    def __init__(self, application, pedido: PedidoOffline):
+        self.application = application
+        self.tempos: Dict[str, List[float]] = defaultdict(list)
+        self.atualizacoes = 0
+        self._ids = iter(range(1, 10 ** 9))
+        self._espera: Dict[int, List[Tuple[Predicado, asyncio.Future]]] = defaultdict(list)
+        pedido.ao_enviar = self._ao_enviar
+
+    def _ao_enviar(self, chat_id: int, metodo: str, parametros: Dict[str, Any]) -> None:
+        pendentes = self._espera.get(chat_id, [])
+        for item in list(pendentes):
+            predicado, futuro = item
+            if predicado(metodo, parametros):
+                pendentes.remove(item)
+                if not futuro.done():
+                    futuro.set_result(time.perf_counter())
+
+    def _aguardar(self, chat_id: int, predicado: Predicado = lambda metodo, parametros: True) -> asyncio.Future:
+        futuro = asyncio.get_running_loop().create_future()
+        self._espera[chat_id].append((predicado, futuro))
+        return futuro
+
+    async def passo(self, chat_id: int, passo: Passo, pausa: float) -> None:
+        nome, tipo, conteudo = passo
+        criar = criar_update_mensagem if tipo == 'msg' else criar_update_callback
+        update = update_de_dados(self.application, criar(next(self._ids), chat_id, conteudo))
+        resposta = self._aguardar(chat_id)
+        inicio = time.perf_counter()
+        await self.application.update_queue.put(update)
+        self.atualizacoes += 1
+        self.tempos[nome].append(await asyncio.wait_for(resposta, 60) - inicio)
+        if pausa:
+            await asyncio.sleep(pausa)
+
+    async def tecnico(self, chat_id: int, os_id: int, dia: date, com_relatorio: bool, pausa: float) -> None:
+        await self.passo(chat_id, ('start', 'msg', '/start'), pausa)
+        for passo in fluxo_criar_os() + fluxo_fechar_os(os_id):
+            await self.passo(chat_id, passo, pausa)
+        if com_relatorio:
+            passos = fluxo_relatorio(dia)
+            for passo in passos[:-1]:
+                await self.passo(chat_id, passo, pausa)
+            pdf = self._aguardar(chat_id, _fim_do_relatorio)
+            inicio = time.perf_counter()
+            await self.passo(chat_id, passos[-1], 0)
+            self.tempos['relatorio:pdf'].append(await asyncio.wait_for(pdf, 300) - inicio)
+
+
+def preparar_banco(chats: List[int], ordens_por_chat: int) -> Dict[int, int]:
+    """Cria os técnicos e algumas OS abertas hoje. Retorna, por chat, uma OS para fechar."""
+    repositorio = RepositorioSQLite(DB_SQLITE_FICHEIRO)
+    agora = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    for chat_id in chats:
+        repositorio.inserir_usuario({**USUARIO_EXEMPLO, 'chat_id': chat_id, 'cadastro_empresa': f'M-{chat_id}'})
+    repositorio.inserir_ordens([
+        {
+            'chat_id': chat_id, 'numero_maquina': str(100 + i), 'modelo_maquina': 'Tear Toyota JAT810',
+            'tipo_manutencao': 'Preventiva', 'problema_apresentado': 'Inspeção programada.',
+            'data_abertura': agora.replace(minute=i % 60).isoformat(),
+        }
+        for chat_id in chats for i in range(ordens_por_chat)
+    ])
+    abertas = {chat_id: repositorio.listar_ordens_abertas(chat_id)[0]['id'] for chat_id in chats}
+    repositorio.fechar()
+    return abertas
+
+
+def imprimir(carga: Carga, total: float) -> None:
+    print(f"\n{'passo':<22} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for nome, tempos in carga.tempos.items():
+        tempos.sort()
+        print(f"{nome:<22} {len(tempos):>6} {percentil(tempos, 50) * 1000:>9.1f} {percentil(tempos, 95) * 1000:>9.1f} "
+              f"{percentil(tempos, 99) * 1000:>9.1f} {tempos[-1] * 1000:>9.1f}")
+    todos = sorted(t for nome, tempos in carga.tempos.items() if nome != 'relatorio:pdf' for t in tempos)
+    print(f"\n{carga.atualizacoes} atualizações em {total:.2f}s | {carga.atualizacoes / total:.0f} atualizações/s "
+          f"| todas as respostas: p50={percentil(todos, 50) * 1000:.1f}ms p95={percentil(todos, 95) * 1000:.1f}ms "
+          f"p99={percentil(todos, 99) * 1000:.1f}ms")
+
+
+async def main() -> None:
+    argumentos = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentos.add_argument('--chats', type=int, default=200, help='técnicos simulados em simultâneo')
+    argumentos.add_argument('--latencia-db', type=float, default=0.02, help='segundos por consulta ao banco')
+    argumentos.add_argument('--latencia-api', type=float, default=0.0, help='segundos por chamada à Bot API')
+    argumentos.add_argument('--relatorios', type=float, default=0.1, help='fração dos técnicos que pede um relatório')
+    argumentos.add_argument('--ordens', type=int, default=20, help='OS já existentes por técnico')
+    argumentos.add_argument('--pausa', type=float, default=0.0, help='segundos entre passos (tempo de escrita)')
+    argumentos.add_argument('--concorrencia', type=int, default=256, help='atualizações processadas em simultâneo')
+    args = argumentos.parse_args()
+
+    chats = [10_000 + i for i in range(args.chats)]
+    os_por_chat = preparar_banco(chats, args.ordens)
+    base = RepositorioSQLite(DB_SQLITE_FICHEIRO)
+    database.repositorio = repositorio = RepositorioComLatencia(base, args.latencia_db)
+
+    application, pedido = criar_aplicacao_offline(PedidoOffline(args.latencia_api), max_concorrencia=args.concorrencia)
+    registar_handlers(application)
+    carga = Carga(application, pedido)
+    aleatorio = random.Random(42)
+
+    try:
+        async with application:
+            await ao_iniciar(application)
+            await application.start()
+            inicio = time.perf_counter()
+            await asyncio.gather(*(
+                carga.tecnico(chat_id, os_por_chat[chat_id], date.today(), aleatorio.random() < args.relatorios, args.pausa)
+                for chat_id in chats
+            ))
+            total = time.perf_counter() - inicio
+            await application.stop()
+            await ao_encerrar(application)
+        imprimir(carga, total)
+        print(f"Consultas ao banco: {dict(repositorio.chamadas)}")
+    finally:
+        for ficheiro in glob.glob(DB_SQLITE_FICHEIRO + '*') + glob.glob(JOURNAL_FICHEIRO + '*'):
+            os.remove(ficheiro)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
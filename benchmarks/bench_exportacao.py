@@ -0,0 +1,105 @@
+"""
+Exportação das OS (/exportar): OS por segundo, pico de memória (RSS) e
+tamanho do ficheiro, em CSV comprimido e em XLSX, sobre o repositório SQLite.
+
+Cada medição corre num processo novo, para que o pico de RSS seja só o da
+exportação. A linha "lista" carrega primeiro todas as OS numa lista (como o
+relatório PDF fazia antes da paginação) e serve de comparação.
+
+Uso:
+    python -m benchmarks.bench_exportacao [quantidade] [--tecnicos 40]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+
+from benchmarks.comum import gerar_ordens
+
+MODOS = ('csv', 'xlsx', 'lista')
+
+
+def preparar_banco(caminho: str, quantidade: int, tecnicos: int) -> None:
+    from database.repositorio_sqlite import RepositorioSQLite
+    repositorio = RepositorioSQLite(caminho)
+    for i in range(tecnicos):
+        repositorio.inserir_usuario({
+            'chat_id': 1000 + i, 'nome': f'Técnico {i + 1:03d}', 'funcao': 'Mecânico',
+            'nivel': 'Pleno', 'setor': 'Tecelagem', 'cadastro_empresa': f'M-{1000 + i}',
+        })
+    ordens = gerar_ordens(quantidade)
+    lote = list(islice(ordens, 5000))
+    while lote:
+        for ordem in lote:
+            ordem['chat_id'] = 1000 + ordem.pop('id') % tecnicos
+        repositorio.inserir_ordens(lote)
+        lote = list(islice(ordens, 5000))
+    repositorio.fechar()
+
+
+def _rss_mb() -> float:
+    # ru_maxrss vem em KiB no Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def executar(caminho_banco: str, modo: str) -> None:
+    """Corre uma exportação (num processo filho) e escreve o resultado em JSON."""
+    os.environ['DB_BACKEND'] = 'sqlite'
+    os.environ['DB_SQLITE_FICHEIRO'] = caminho_banco
+    from database.models import iterar_os_exportacao
+    from utils.exportacao import FORMATOS, escrever_csv
+
+    rss_inicial = _rss_mb()
+    extensao = FORMATOS['csv' if modo == 'lista' else modo][0]
+    with tempfile.TemporaryDirectory() as pasta:
+        destino = os.path.join(pasta, f'exportacao{extensao}')
+        inicio = time.perf_counter()
+        linhas = iterar_os_exportacao('2000-01-01', '2100-12-31')
+        if modo == 'lista':
+            total = escrever_csv(list(linhas), destino)
+        else:
+            total = FORMATOS[modo][1](linhas, destino)
+        segundos = time.perf_counter() - inicio
+        tamanho = os.path.getsize(destino)
+    print(json.dumps({
+        'total': total, 'segundos': segundos, 'rss_inicial_mb': rss_inicial,
+        'rss_pico_mb': _rss_mb(), 'bytes': tamanho,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('quantidade', nargs='?', type=int, default=1000000)
+    parser.add_argument('--tecnicos', type=int, default=40)
+    parser.add_argument('--modos', nargs='*', default=list(MODOS), choices=MODOS)
+    parser.add_argument('--executar', nargs=2, metavar=('BANCO', 'MODO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.executar:
+        executar(*args.executar)
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'bench.sqlite3')
+        inicio = time.perf_counter()
+        preparar_banco(caminho, args.quantidade, args.tecnicos)
+        print(f"Banco com {args.quantidade} OS preparado em {time.perf_counter() - inicio:.1f}s "
+              f"({os.path.getsize(caminho) / 2**20:.0f} MiB)")
+        print(f"{'modo':>6} | {'OS':>8} | {'tempo (s)':>9} | {'OS/s':>8} | {'RSS inicial (MiB)':>17} | "
+              f"{'RSS pico (MiB)':>14} | {'ficheiro (MiB)':>14}")
+        for modo in args.modos:
+            saida = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_exportacao', '--executar', caminho, modo],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(saida.strip().splitlines()[-1])
+            print(f"{modo:>6} | {r['total']:>8} | {r['segundos']:>9.1f} | {r['total'] / r['segundos']:>8.0f} | "
+                  f"{r['rss_inicial_mb']:>17.1f} | {r['rss_pico_mb']:>14.1f} | {r['bytes'] / 2**20:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compara o tempo de renderização e o tamanho do relatório (layout detalhado)
+com três configurações de fonte:
+    - arial:       fonte base do PDF, sem fonte embutida (só latin-1);
+    - ttf simples: fonte TrueType registada com add_font() em cada relatório;
+    - ttf em cache: a fonte reduzida e lida uma vez por processo (utils/fontes_pdf.py).
+No fim, gera um relatório com caracteres fora do latin-1 (travessão, €, ≥, emoji)
+em cada configuração.
+
+Uso:
+    python -m benchmarks.bench_fontes_pdf [quantidade_de_os ...]
+"""
+import sys
+import time
+
+from benchmarks.comum import USUARIO_EXEMPLO, gerar_ordens, cronometrar
+from config import logging, PDF_FONTE_NORMAL, PDF_FONTE_NEGRITO
+from utils import fontes_pdf, pdf_generator
+from utils.pdf_generator import gerar_relatorio_pdf
+
+PERIODO = "01/01/2024 a 31/12/2024"
+TEXTO_UNICODE = "Rolamento — folga ≥ 0,2 mm, peça de 35 € ✓ 🔧"
+
+
+def _arial(pdf) -> str:
+    return fontes_pdf.FAMILIA_PADRAO
+
+
+def _ttf_simples(pdf) -> str:
+    pdf.add_font(fontes_pdf.FAMILIA, '', PDF_FONTE_NORMAL)
+    pdf.add_font(fontes_pdf.FAMILIA, 'B', PDF_FONTE_NEGRITO)
+    return fontes_pdf.FAMILIA
+
+
+CONFIGURACOES = (
+    ('arial', _arial),
+    ('ttf simples', _ttf_simples),
+    ('ttf em cache', fontes_pdf.registar_fontes),
+)
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    quantidades = [int(q) for q in sys.argv[1:]] or [1, 50, 300]
+
+    inicio = time.perf_counter()
+    fontes_pdf.preparar_fontes()
+    print(f"Fonte reduzida e carregada (uma vez por processo) em {time.perf_counter() - inicio:.3f}s\n")
+
+    print(f"{'OS':>6} | {'fonte':<12} | {'tempo (s)':>9} | {'tamanho (KiB)':>13}")
+    for quantidade in quantidades:
+        ordens = list(gerar_ordens(quantidade))
+        for nome, registar in CONFIGURACOES:
+            pdf_generator.registar_fontes = registar
+            tempo, conteudo = cronometrar(lambda: gerar_relatorio_pdf(USUARIO_EXEMPLO, ordens, PERIODO, True))
+            print(f"{quantidade:>6} | {nome:<12} | {tempo:>9.3f} | {len(conteudo) / 1024:>13.1f}")
+
+    print(f"\nRelatório com {TEXTO_UNICODE!r}:")
+    ordem = dict(next(gerar_ordens(1)), problema_apresentado=TEXTO_UNICODE)
+    for nome, registar in CONFIGURACOES:
+        pdf_generator.registar_fontes = registar
+        conteudo = gerar_relatorio_pdf(USUARIO_EXEMPLO, [ordem], PERIODO, True)
+        print(f"  {nome:<12}: {'gerado' if conteudo else 'falhou'}")
+    pdf_generator.registar_fontes = fontes_pdf.registar_fontes
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Compara o tempo de renderização e o tamanho do PDF entre os layouts de relatório.
+
+Uso:
+    python -m benchmarks.bench_layout_pdf [quantidade_de_os ...]
+"""
+import sys
+
+from benchmarks.comum import USUARIO_EXEMPLO, gerar_ordens, cronometrar
+from utils.pdf_generator import gerar_relatorio_pdf, LAYOUT_DETALHADO, LAYOUT_RESUMO
+
+PERIODO = "01/01/2024 a 31/12/2024"
+
+
+def main() -> None:
+    quantidades = [int(q) for q in sys.argv[1:]] or [50, 300, 1000]
+    print(f"{'OS':>6} | {'layout':<16} | {'tempo (s)':>9} | {'tamanho (KiB)':>13} | {'páginas':>7}")
+    for quantidade in quantidades:
+        ordens = list(gerar_ordens(quantidade))
+        casos = (
+            ('detalhado', LAYOUT_DETALHADO, None),
+            ('resumo', LAYOUT_RESUMO, None),
+            ('resumo+anexos', LAYOUT_RESUMO, ordens),
+        )
+        for nome, layout, anexos in casos:
+            tempo, conteudo = cronometrar(
+                lambda: gerar_relatorio_pdf(USUARIO_EXEMPLO, ordens, PERIODO, True, layout, anexos)
+            )
+            paginas = conteudo.count(b'/Type /Page\n') or conteudo.count(b'/Type /Page ')
+            print(f"{quantidade:>6} | {nome:<16} | {tempo:>9.3f} | {len(conteudo) / 1024:>13.1f} | {paginas:>7}")
+
+
+if __name__ == "__main__":
+    main()
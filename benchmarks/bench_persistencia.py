@@ -0,0 +1,99 @@
+"""
+Mede o débito de atualizações (updates/s) com e sem persistência das conversas.
+
+Cada chat simulado percorre uma conversa de 4 passos que grava dados em
+context.user_data, como os fluxos de criação e fecho de OS. Compara:
+    - sem persistência (estado só em memória);
+    - PersistenciaSQLite com escrita diferida em lote (a usada em produção);
+    - SQLite com uma gravação por atualização (referência do custo ingénuo).
+
+Uso:
+    python -m benchmarks.bench_persistencia [numero_de_chats]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, ConversationHandler, MessageHandler, filters
+
+from benchmarks.bot_offline import criar_aplicacao_offline, update_de_dados
+from benchmarks.telegram_falso import criar_update_mensagem
+from utils.persistencia import PersistenciaSQLite
+
+PASSO_1, PASSO_2, PASSO_3 = range(3)
+
+
+class PersistenciaPorAtualizacao(PersistenciaSQLite):
+    """Grava cada alteração de imediato, no event loop (sem lote nem thread)."""
+
+    def _agendar_descarga(self) -> None:
+        self._gravar(*self._retirar_pendentes())
+
+
+def criar_conversa(persistente: bool) -> ConversationHandler:
+    async def inicio(update: Update, context: CallbackContext):
+        context.user_data.clear()
+        await update.message.reply_text("Qual é o número da máquina?")
+        return PASSO_1
+
+    def guardar(campo: str, proximo: int, pergunta: str):
+        async def passo(update: Update, context: CallbackContext):
+            context.user_data[campo] = update.message.text
+            await update.message.reply_text(pergunta)
+            return proximo
+        return passo
+
+    async def fim(update: Update, context: CallbackContext):
+        context.user_data['problema'] = update.message.text
+        await update.message.reply_text("✅ OS criada com sucesso!")
+        return ConversationHandler.END
+
+    texto = filters.TEXT & ~filters.COMMAND
+    return ConversationHandler(
+        entry_points=[CommandHandler("criar_os", inicio)],
+        states={
+            PASSO_1: [MessageHandler(texto, guardar('numero_maquina', PASSO_2, "E o modelo?"))],
+            PASSO_2: [MessageHandler(texto, guardar('modelo_maquina', PASSO_3, "Descreva o problema."))],
+            PASSO_3: [MessageHandler(texto, fim)],
+        },
+        fallbacks=[], name="bench", persistent=persistente,
+    )
+
+
+async def medir(nome: str, chats: int, persistencia=None, gravar_sempre: bool = False) -> None:
+    application, _ = criar_aplicacao_offline(persistencia=persistencia)
+    application.add_handler(criar_conversa(persistencia is not None))
+    mensagens = ("/criar_os", "1234", "Tear Picanol", "Ruído no rolamento")
+    ids = iter(range(1, 10 ** 9))
+
+    async def conversa(chat_id: int) -> None:
+        for texto in mensagens:
+            await application.process_update(update_de_dados(application, criar_update_mensagem(next(ids), chat_id, texto)))
+            if gravar_sempre:
+                await application.update_persistence()
+
+    async with application:
+        await application.start()
+        inicio = time.perf_counter()
+        await asyncio.gather(*(conversa(1000 + i) for i in range(chats)))
+        tempo = time.perf_counter() - inicio
+        await application.stop()
+
+    total = chats * len(mensagens)
+    print(f"{nome:<34} | {total:>8} updates | {tempo:>7.2f}s | {total / tempo:>9.0f} updates/s")
+
+
+async def main() -> None:
+    chats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as pasta:
+        await medir("sem persistência", chats)
+        await medir("SQLite com escrita em lote", chats, PersistenciaSQLite(os.path.join(pasta, 'lote.sqlite3'), 1))
+        await medir("SQLite com gravação por update", chats,
+                    PersistenciaPorAtualizacao(os.path.join(pasta, 'sempre.sqlite3'), 60), gravar_sempre=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Relatório de setor: agregação no banco (resumo_setor) versus leitura paginada
+de todas as OS do setor com agregação local, e renderização do PDF de resumo.
+
+Usa o repositório SQLite num ficheiro temporário, com um setor de vários técnicos.
+
+Uso:
+    python -m benchmarks.bench_setor [os_por_ano ...] [--tecnicos 40]
+"""
+import argparse
+import os
+import tempfile
+from itertools import islice
+
+from benchmarks.comum import gerar_ordens, cronometrar
+from config import OS_TAMANHO_PAGINA
+from database.repositorio import agregar_resumo_setor
+from database.repositorio_sqlite import RepositorioSQLite
+from utils.pdf_generator import gerar_relatorio_setor_pdf
+
+SETOR = 'Tecelagem'
+
+
+def preparar_banco(caminho: str, quantidade: int, tecnicos: int) -> RepositorioSQLite:
+    repositorio = RepositorioSQLite(caminho)
+    for i in range(tecnicos):
+        repositorio.inserir_usuario({
+            'chat_id': 1000 + i, 'nome': f'Técnico {i + 1:03d}', 'funcao': 'Mecânico',
+            'nivel': 'Pleno', 'setor': SETOR if i % 4 else 'Fiação', 'cadastro_empresa': f'M-{1000 + i}',
+        })
+    ordens = gerar_ordens(quantidade)
+    lote = list(islice(ordens, 5000))
+    while lote:
+        for ordem in lote:
+            # As OS são distribuídas pelos técnicos de forma determinística.
+            ordem['chat_id'] = 1000 + ordem.pop('id') % tecnicos
+        repositorio.inserir_ordens(lote)
+        lote = list(islice(ordens, 5000))
+    return repositorio
+
+
+def agregar_paginado(repositorio: RepositorioSQLite, inicio: str, fim: str) -> list:
+    def iterar():
+        apos = None
+        while True:
+            pagina = repositorio.pagina_ordens_setor(SETOR, inicio, fim, apos, OS_TAMANHO_PAGINA)
+            yield from pagina
+            if len(pagina) < OS_TAMANHO_PAGINA:
+                return
+            apos = (pagina[-1]['data_abertura'], pagina[-1]['id'])
+    return agregar_resumo_setor(iterar())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('quantidades', nargs='*', type=int, default=[10000, 50000])
+    parser.add_argument('--tecnicos', type=int, default=40)
+    args = parser.parse_args()
+
+    inicio, fim = '2024-01-01T00:00:00', '2100-01-01T00:00:00'
+    print(f"{'OS':>7} | {'OS do setor':>11} | {'SQL (ms)':>9} | {'paginado+local (ms)':>19} | {'PDF (ms)':>8} | {'PDF (KiB)':>9}")
+    for quantidade in args.quantidades:
+        with tempfile.TemporaryDirectory() as pasta:
+            repositorio = preparar_banco(os.path.join(pasta, 'bench.sqlite3'), quantidade, args.tecnicos)
+            t_sql, resumo = cronometrar(lambda: repositorio.resumo_setor(SETOR, inicio, fim))
+            t_local, resumo_local = cronometrar(lambda: agregar_paginado(repositorio, inicio, fim), repeticoes=1)
+            assert [(l['chat_id'], l['tipo_manutencao'], l['total']) for l in resumo] == \
+                   [(l['chat_id'], l['tipo_manutencao'], l['total']) for l in resumo_local]
+            t_pdf, pdf = cronometrar(lambda: gerar_relatorio_setor_pdf(SETOR, resumo, "01/01/2024 a 31/12/2024", True))
+            total_setor = sum(l['total'] for l in resumo)
+            print(f"{quantidade:>7} | {total_setor:>11} | {t_sql * 1000:>9.1f} | {t_local * 1000:>19.1f} | "
+                  f"{t_pdf * 1000:>8.1f} | {len(pdf) / 1024:>9.1f}")
+            repositorio.fechar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Custo de tratar um toque num teclado: calendário dos relatórios e teclados
+fixos, construídos de novo a cada resposta (como antes) ou a partir do cache
+de handlers/ui.py. Inclui o callback processar_calendario_dia completo, com
+um Update falso (sem rede).
+
+Uso:
+    python -m benchmarks.bench_teclados [toques]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from benchmarks.comum import percentil
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram_bot_calendar import DetailedTelegramCalendar
+
+from config import UIBotao
+from handlers.report_handler import processar_calendario_dia
+from handlers.ui import get_main_keyboard, teclado_inline, processar_calendario, estatisticas_teclados
+
+
+def gerar_toques(quantidade: int, semente: int = 7) -> list[tuple[str, date | None]]:
+    """Toques de técnicos a navegar no calendário: (callback_data, data mínima)."""
+    aleatorio = random.Random(semente)
+    toques = []
+    while len(toques) < quantidade:
+        # A data mínima é a data inicial de um intervalo, normalmente nas últimas semanas.
+        data_minima = None if aleatorio.random() < 0.5 else date(2025, 6, 1) + timedelta(days=aleatorio.randint(0, 29))
+        teclado, _ = DetailedTelegramCalendar(min_date=data_minima).build()
+        for _ in range(4):
+            botoes = [b['callback_data'] for linha in json.loads(teclado)['inline_keyboard'] for b in linha]
+            dados = aleatorio.choice(botoes)
+            toques.append((dados, data_minima))
+            _, teclado, _ = DetailedTelegramCalendar(min_date=data_minima).process(dados)
+            if teclado is None:
+                break
+    return toques[:quantidade]
+
+
+def por_toque_calendario(funcao, toques: list) -> tuple[float, float]:
+    """Média e p95 (em µs) de um toque no calendário."""
+    duracoes = []
+    for dados, data_minima in toques:
+        inicio = time.perf_counter()
+        funcao(dados, data_minima)
+        duracoes.append(time.perf_counter() - inicio)
+    duracoes.sort()
+    return sum(duracoes) / len(duracoes) * 1e6, percentil(duracoes, 95) * 1e6
+
+
+def por_toque(funcao, repeticoes: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def teclado_principal_antigo() -> ReplyKeyboardMarkup:
+    return ReplyKeyboardMarkup([
+        [KeyboardButton(UIBotao.CRIAR_OS)],
+        [KeyboardButton(UIBotao.FECHAR_OS), KeyboardButton(UIBotao.GERAR_RELATORIO)],
+    ], resize_keyboard=True)
+
+
+def sim_nao_antigo() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("Sim, concluído", callback_data="sim")],
+                                 [InlineKeyboardButton("Não, pendente", callback_data="nao")]])
+
+
+async def medir_handler(toques: list) -> float:
+    async def nada(*args, **kwargs):
+        return None
+
+    contexto = SimpleNamespace(user_data={})
+    inicio = time.perf_counter()
+    for dados, _ in toques:
+        query = SimpleNamespace(data=dados, answer=nada, edit_message_text=nada)
+        await processar_calendario_dia(SimpleNamespace(callback_query=query), contexto)
+    return (time.perf_counter() - inicio) / len(toques) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('toques', nargs='?', type=int, default=20000)
+    args = parser.parse_args()
+
+    toques = gerar_toques(args.toques)
+    antes = por_toque_calendario(lambda dados, minima: DetailedTelegramCalendar(min_date=minima).process(dados), toques)
+    cache = por_toque_calendario(processar_calendario, toques)
+
+    print(f"{'operação':<34} | {'antes (µs)':>10} | {'cache (µs)':>10}")
+    print(f"{'toque no calendário (média)':<34} | {antes[0]:>10.1f} | {cache[0]:>10.1f}")
+    print(f"{'toque no calendário (p95)':<34} | {antes[1]:>10.1f} | {cache[1]:>10.1f}")
+    print(f"{'teclado principal':<34} | {por_toque(teclado_principal_antigo, 20000):>10.2f} | {por_toque(get_main_keyboard, 20000):>10.2f}")
+    sim_nao = lambda: teclado_inline(("Sim, concluído", "sim"), ("Não, pendente", "nao"))
+    print(f"{'teclado Sim/Não':<34} | {por_toque(sim_nao_antigo, 20000):>10.2f} | {por_toque(sim_nao, 20000):>10.2f}")
+    print(f"{'processar_calendario_dia (handler)':<34} | {'':>10} | {asyncio.run(medir_handler(toques)):>10.1f}")
+    print(f"Cache do calendário: {estatisticas_teclados()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Aplicação do bot que corre sem rede.
+
+Os pedidos à Bot API são respondidos em memória por PedidoOffline, por isso
+os handlers reais correm exatamente como em produção, mas cada chamada ao
+Telegram custa apenas uma chamada de função (mais a latência simulada).
+"""
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, BasePersistence
+from telegram.request import BaseRequest, RequestData
+
+from benchmarks import comum  # noqa: F401  (define as variáveis de ambiente)
+from benchmarks.telegram_falso import resultado_bot_api, METODOS_DE_ENVIO
+
+
+class PedidoOffline(BaseRequest):
+    """Implementação de BaseRequest que responde localmente aos métodos da Bot API."""
+
+    def __init__(self, latencia: float = 0.0):
+        self.latencia = latencia
+        self.chamadas: Dict[str, int] = defaultdict(int)
+        self.enviadas: List[Tuple[int, str, Dict[str, Any]]] = []
+        # Chamada a cada mensagem enviada pelo bot: ao_enviar(chat_id, metodo, parametros).
+        self.ao_enviar: Callable[[int, str, Dict[str, Any]], None] | None = None
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None,
+                         *args: Any, **kwargs: Any) -> Tuple[int, bytes]:
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        metodo = url.rsplit('/', 1)[-1]
+        parametros = dict(request_data.parameters) if request_data else {}
+        self.chamadas[metodo] += 1
+        if metodo in METODOS_DE_ENVIO:
+            chat_id = int(parametros.get('chat_id', 0) or 0)
+            self.enviadas.append((chat_id, metodo, parametros))
+            if self.ao_enviar:
+                self.ao_enviar(chat_id, metodo, parametros)
+        return 200, json.dumps({'ok': True, 'result': resultado_bot_api(metodo, parametros)}).encode()
+
+
+def criar_aplicacao_offline(
+    pedido: PedidoOffline | None = None,
+    persistencia: BasePersistence | None = None,
+    max_concorrencia: int = 256,
+) -> Tuple[Application, PedidoOffline]:
+    """Cria uma Application com o mesmo processamento por chat usado em produção, sem rede."""
+    from utils.processamento import ProcessadorPorChat
+
+    pedido = pedido or PedidoOffline()
+    builder = (
+        ApplicationBuilder()
+        .token(os.environ["TELEGRAM_BOT_TOKEN"])
+        .request(pedido)
+        .get_updates_request(PedidoOffline())
+        .concurrent_updates(ProcessadorPorChat(max_concorrencia))
+        .updater(None)
+    )
+    if persistencia is not None:
+        builder = builder.persistence(persistencia)
+    return builder.build(), pedido
+
+
+def update_de_dados(application: Application, dados: Dict[str, Any]) -> Update:
+    return Update.de_json(dados, application.bot)
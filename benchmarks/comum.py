@@ -0,0 +1,66 @@
+"""
+Utilitários partilhados pelos benchmarks.
+
+Os benchmarks correm offline: este módulo define valores fictícios para as
+variáveis de ambiente obrigatórias antes de o config.py ser importado.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+
+TIPOS_MANUTENCAO = ("Preventiva", "Corretiva", "Preditiva")
+
+USUARIO_EXEMPLO: Dict[str, Any] = {
+    'chat_id': 1000, 'nome': 'João da Silva', 'funcao': 'Mecânico',
+    'nivel': 'Pleno', 'setor': 'Tecelagem', 'cadastro_empresa': 'M-1000',
+}
+
+
+def gerar_ordens(quantidade: int, chat_id: int = 1000, semente: int = 42) -> Iterator[Dict[str, Any]]:
+    """Gera OS sintéticas, com textos de tamanho realista, por ordem de abertura."""
+    aleatorio = random.Random(semente)
+    inicio = datetime(2024, 1, 1, 7, 0)
+    for i in range(quantidade):
+        abertura = inicio + timedelta(minutes=37 * i)
+        fechada = aleatorio.random() < 0.85
+        troca = aleatorio.random() < 0.3
+        yield {
+            'id': i + 1,
+            'chat_id': chat_id,
+            'numero_maquina': str(aleatorio.randint(1, 400)),
+            'modelo_maquina': aleatorio.choice(("Tear Picanol OMNIplus", "Urdideira Benninger", "Tear Toyota JAT810")),
+            'tipo_manutencao': aleatorio.choice(TIPOS_MANUTENCAO),
+            'problema_apresentado': "Máquina a parar com frequência durante o turno, ruído anormal no rolamento. " * aleatorio.randint(1, 3),
+            'data_abertura': abertura.isoformat(),
+            'data_fechamento': (abertura + timedelta(minutes=aleatorio.randint(10, 600))).isoformat() if fechada else None,
+            'solucao_aplicada': "Substituição do rolamento e ajuste da tensão da correia." if fechada else None,
+            'substituir_peca': troca,
+            'descricao_peca': "Rolamento 6204-2RS" if troca else None,
+            'tag_peca': f"ROL-{aleatorio.randint(100, 999)}" if troca else None,
+            'servico_concluido': fechada,
+            'observacao': "Acompanhar nas próximas semanas." if aleatorio.random() < 0.2 else None,
+        }
+
+
+def cronometrar(funcao: Callable[[], Any], repeticoes: int = 3) -> tuple[float, Any]:
+    """Executa `funcao` várias vezes e retorna (melhor tempo em segundos, último resultado)."""
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def percentil(valores: Sequence[float], p: float) -> float:
+    """Percentil `p` (0-100) de uma lista já ordenada, pelo método do posto mais próximo."""
+    if not valores:
+        return 0.0
+    posicao = max(0, min(len(valores) - 1, round(p / 100 * len(valores)) - 1))
+    return valores[posicao]
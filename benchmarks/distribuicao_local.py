@@ -0,0 +1,121 @@
+"""
+Teste local do modo distribuído, sem Telegram nem Supabase.
+
+Lança a entrada e N processos trabalhadores reais (bot.py em modo
+trabalhador, com o banco SQLite numa pasta temporária), aponta-os para a Bot
+API falsa de benchmarks/telegram_falso.py e alimenta a entrada com uma fonte
+falsa de atualizações: cada técnico simulado envia /start e depois o nome,
+o início da conversa de registo. Se as mensagens de um chat chegassem fora
+de ordem ou a um processo sem o estado da conversa, a segunda resposta não
+seria "qual é a sua função?".
+
+Com --matar, um trabalhador é morto (SIGKILL) a meio: os seus chats passam
+para os outros, o processo é lançado de novo e volta ao anel.
+
+Uso:
+    python -m benchmarks.distribuicao_local [--trabalhadores 4] [--chats 200] [--matar]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+def _configurar_ambiente(args: argparse.Namespace, pasta: str) -> None:
+    # Tem de correr antes de o config.py ser importado (também pelos processos filhos).
+    os.environ.update({
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{args.porta_api}",
+        'DB_BACKEND': 'sqlite',
+        'DB_SQLITE_FICHEIRO': os.path.join(pasta, 'kraflo.sqlite3'),
+        'PERSISTENCIA_FICHEIRO': os.path.join(pasta, 'estado.sqlite3'),
+        'JOURNAL_FICHEIRO': os.path.join(pasta, 'journal.jsonl'),
+        'METRICAS_PORTA': '0',
+        'METRICAS_LOG_INTERVALO': '0',
+        'ENVIO_TAXA_GLOBAL': '0',
+        'DISTRIBUICAO_TRABALHADORES': str(args.trabalhadores),
+        'DISTRIBUICAO_PORTA_BASE': str(args.porta_base),
+        'DISTRIBUICAO_SAUDE_INTERVALO': '0.5',
+        'DISTRIBUICAO_SAUDE_FALHAS': '2',
+    })
+
+
+async def executar(args: argparse.Namespace) -> None:
+    from benchmarks.telegram_falso import TelegramFalso, criar_update_mensagem
+    from utils.distribuicao import Entrada, lancar_trabalhador, atualizacoes_distribuidas
+
+    telegram = TelegramFalso(args.porta_api)
+    await telegram.iniciar()
+    comando = [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot.py')]
+    urls = [f"http://127.0.0.1:{args.porta_base + i}" for i in range(args.trabalhadores)]
+    entrada = Entrada(urls, 'segredo-local', lambda indice: lancar_trabalhador(comando, 'segredo-local', indice),
+                      intervalo_saude=0.5, limite_falhas=2)
+    await entrada.iniciar()
+    inicio = time.perf_counter()
+    if not await entrada.aguardar_prontos(60):
+        raise RuntimeError(f"os trabalhadores não arrancaram: {entrada.estado()}")
+    print(f"{args.trabalhadores} trabalhadores prontos em {time.perf_counter() - inicio:.1f}s.")
+
+    chats = [5000 + i for i in range(args.chats)]
+    total = 2 * len(chats)
+
+    async def fonte_falsa():
+        """Cada chat envia /start e, mais tarde, o nome; os chats intercalam-se."""
+        update_id = 0
+        for passo in ('/start', 'Técnico {}'):
+            for i, chat_id in enumerate(chats):
+                update_id += 1
+                yield criar_update_mensagem(update_id, chat_id, passo.format(chat_id))
+                if args.matar and passo != '/start' and i == len(chats) // 2:
+                    vitima = entrada.trabalhadores[-1]
+                    print(f"A matar {vitima.nome} (pid {vitima.processo.pid})...")
+                    vitima.processo.kill()
+                if i % 20 == 0:
+                    await asyncio.sleep(0.01)
+
+    inicio = time.perf_counter()
+    await entrada.consumir(fonte_falsa())
+    # Espera pelas respostas até não chegar nenhuma durante 2s (com --matar, algumas nunca chegam).
+    recebidas, ultima = 0, time.perf_counter()
+    while len(telegram.enviadas) < total and time.perf_counter() - ultima < 2:
+        if len(telegram.enviadas) != recebidas:
+            recebidas, ultima = len(telegram.enviadas), time.perf_counter()
+        await asyncio.sleep(0.01)
+    segundos = ultima - inicio
+    if args.matar:
+        await entrada.aguardar_prontos(60)
+
+    respostas = defaultdict(list)
+    for envio in telegram.enviadas:
+        respostas[int(envio['chat_id'])].append(envio.get('text', ''))
+    completas = sum(1 for chat_id in chats if any('qual é a sua função' in r for r in respostas[chat_id]))
+    print(f"{total} atualizações, {len(telegram.enviadas)} respostas em {segundos:.2f}s")
+    print(f"Conversas com o estado mantido entre mensagens: {completas}/{len(chats)}")
+    if args.matar:
+        print("(as conversas em falta são as que estavam a meio no trabalhador morto: o estado dele perdeu-se)")
+    print(f"Atualizações por trabalhador: {atualizacoes_distribuidas.resumo()}")
+    print(f"Estado da entrada: {entrada.estado()}")
+    await entrada.parar()
+    await telegram.servidor.parar()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trabalhadores', type=int, default=4)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--matar', action='store_true', help='mata um trabalhador a meio do teste')
+    parser.add_argument('--porta-api', type=int, default=18081)
+    parser.add_argument('--porta-base', type=int, default=18100)
+    args = parser.parse_args()
+    pasta = tempfile.mkdtemp(prefix='kraflo_distribuicao_')
+    _configurar_ambiente(args, pasta)
+    try:
+        asyncio.run(executar(args))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
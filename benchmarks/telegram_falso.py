@@ -0,0 +1,177 @@
+"""
+Servidor falso da Bot API do Telegram, para testar o bot localmente em modo webhook.
+
+Responde aos métodos que o bot usa (getMe, setWebhook, sendMessage, ...), guarda
+as mensagens enviadas pelo bot e envia atualizações sintéticas para o webhook,
+medindo o tempo até à primeira resposta de cada chat.
+
+Uso (em dois terminais):
+    python -m benchmarks.telegram_falso --porta 8081 --webhook http://127.0.0.1:8080/telegram --chats 50
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_MODO=webhook \\
+    WEBHOOK_URL=http://127.0.0.1:8080 WEBHOOK_SEGREDO=segredo python bot.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import statistics
+import time
+import urllib.parse
+from typing import Any, Dict, List
+
+from benchmarks import comum  # noqa: F401  (define as variáveis de ambiente)
+from utils.servidor_http import ServidorHTTP, Pedido, Resposta
+
+BOT_ID = 123456
+_ids_mensagem = itertools.count(1)
+
+
+def _usuario(chat_id: int) -> Dict[str, Any]:
+    return {'id': chat_id, 'is_bot': False, 'first_name': f'Tecnico {chat_id}'}
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    return {'id': chat_id, 'type': 'private', 'first_name': f'Tecnico {chat_id}'}
+
+
+def criar_update_mensagem(update_id: int, chat_id: int, texto: str) -> Dict[str, Any]:
+    """Atualização do Telegram com uma mensagem de texto (ou comando) de um utilizador."""
+    mensagem: Dict[str, Any] = {
+        'message_id': next(_ids_mensagem), 'date': int(time.time()),
+        'chat': _chat(chat_id), 'from': _usuario(chat_id), 'text': texto,
+    }
+    if texto.startswith('/'):
+        mensagem['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(texto.split()[0])}]
+    return {'update_id': update_id, 'message': mensagem}
+
+
+def criar_update_callback(update_id: int, chat_id: int, dados: str) -> Dict[str, Any]:
+    """Atualização do Telegram com o toque num botão inline."""
+    mensagem = {
+        'message_id': next(_ids_mensagem), 'date': int(time.time()),
+        'chat': _chat(chat_id), 'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'Kraflo'},
+        'text': '...',
+    }
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': _usuario(chat_id), 'chat_instance': str(chat_id),
+            'message': mensagem, 'data': dados,
+        },
+    }
+
+
+# Métodos da Bot API que produzem uma mensagem visível para o utilizador.
+METODOS_DE_ENVIO = ('sendMessage', 'sendDocument', 'editMessageText')
+
+
+def resultado_bot_api(metodo: str, parametros: Dict[str, Any]) -> Any:
+    """Campo `result` plausível para a resposta de cada método da Bot API usado pelo bot."""
+    chat_id = int(parametros.get('chat_id', 0) or 0)
+    if metodo == 'getMe':
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': 'Kraflo', 'username': 'kraflo_bot',
+                'can_join_groups': False, 'can_read_all_group_messages': False,
+                'supports_inline_queries': False}
+    if metodo in METODOS_DE_ENVIO:
+        return {'message_id': next(_ids_mensagem), 'date': int(time.time()),
+                'chat': _chat(chat_id), 'text': str(parametros.get('text', ''))}
+    if metodo == 'getUpdates':
+        return []
+    return True
+
+
+class TelegramFalso:
+    """Implementa o subconjunto da Bot API usado pelo Kraflo."""
+
+    def __init__(self, porta: int):
+        self.servidor = ServidorHTTP('127.0.0.1', porta)
+        self.enviadas: List[Dict[str, Any]] = []
+        self.webhook: Dict[str, str] = {}
+        self._respostas: Dict[int, asyncio.Event] = {}
+
+    def aguardar_resposta(self, chat_id: int) -> asyncio.Event:
+        evento = self._respostas[chat_id] = asyncio.Event()
+        return evento
+
+    async def iniciar(self) -> None:
+        async def api(pedido: Pedido) -> Resposta:
+            return self._responder(pedido)
+        self.servidor.rota_prefixo('POST', '/bot', api)
+        await self.servidor.iniciar()
+
+    @staticmethod
+    def _parametros(pedido: Pedido) -> Dict[str, Any]:
+        tipo = pedido.cabecalhos.get('content-type', '')
+        if 'application/json' in tipo:
+            return json.loads(pedido.corpo or b'{}')
+        if 'multipart/form-data' in tipo:
+            chat = re.search(rb'name="chat_id"\r\n\r\n(-?\d+)', pedido.corpo)
+            return {'chat_id': chat.group(1).decode() if chat else '0', 'documento': len(pedido.corpo)}
+        return {k: v[0] for k, v in urllib.parse.parse_qs(pedido.corpo.decode()).items()}
+
+    def _responder(self, pedido: Pedido) -> Resposta:
+        metodo = pedido.caminho.rsplit('/', 1)[-1]
+        parametros = self._parametros(pedido)
+        if metodo == 'setWebhook':
+            self.webhook = parametros
+        elif metodo in METODOS_DE_ENVIO:
+            self.enviadas.append({'metodo': metodo, **parametros})
+            evento = self._respostas.pop(int(parametros.get('chat_id', 0) or 0), None)
+            if evento:
+                evento.set()
+        return Resposta.json({'ok': True, 'result': resultado_bot_api(metodo, parametros)})
+
+
+async def _enviar_webhook(url: str, segredo: str, dados: Dict[str, Any]) -> int:
+    """Envia uma atualização para o webhook do bot com um cliente HTTP mínimo."""
+    alvo = urllib.parse.urlsplit(url)
+    leitor, escritor = await asyncio.open_connection(alvo.hostname, alvo.port or 80)
+    corpo = json.dumps(dados).encode()
+    escritor.write(
+        f"POST {alvo.path} HTTP/1.1\r\nHost: {alvo.netloc}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(corpo)}\r\nX-Telegram-Bot-Api-Secret-Token: {segredo}\r\n"
+        f"Connection: close\r\n\r\n".encode() + corpo
+    )
+    await escritor.drain()
+    linha = await leitor.readline()
+    escritor.close()
+    return int(linha.split()[1])
+
+
+async def main() -> None:
+    argumentos = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentos.add_argument('--porta', type=int, default=8081)
+    argumentos.add_argument('--webhook', default='http://127.0.0.1:8080/telegram')
+    argumentos.add_argument('--segredo', default='segredo')
+    argumentos.add_argument('--chats', type=int, default=50)
+    argumentos.add_argument('--espera', type=float, default=10.0, help='segundos à espera do setWebhook do bot')
+    args = argumentos.parse_args()
+
+    telegram = TelegramFalso(args.porta)
+    await telegram.iniciar()
+    print(f"Bot API falsa em http://127.0.0.1:{args.porta}. A aguardar que o bot registe o webhook...")
+    limite = time.monotonic() + args.espera
+    while not telegram.webhook and time.monotonic() < limite:
+        await asyncio.sleep(0.1)
+
+    async def conversa(chat_id: int) -> float:
+        resposta = telegram.aguardar_resposta(chat_id)
+        inicio = time.perf_counter()
+        estado = await _enviar_webhook(args.webhook, args.segredo, criar_update_mensagem(chat_id, chat_id, '/start'))
+        if estado != 200:
+            raise RuntimeError(f"webhook respondeu {estado}")
+        await asyncio.wait_for(resposta.wait(), 30)
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    tempos = sorted(await asyncio.gather(*(conversa(1000 + i) for i in range(args.chats))))
+    total = time.perf_counter() - inicio
+    print(f"{args.chats} conversas em {total:.2f}s | p50={statistics.median(tempos) * 1000:.1f}ms "
+          f"| p95={tempos[int(len(tempos) * 0.95) - 1] * 1000:.1f}ms | máx={tempos[-1] * 1000:.1f}ms")
+    await telegram.servidor.parar()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
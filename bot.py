@@ -1,29 +1,136 @@
+import asyncio
+import os
+import sys
 from telegram.ext import Application
-from config import TELEGRAM_TOKEN, logging
+from config import (
+    TELEGRAM_TOKEN, TELEGRAM_API_URL, BOT_MODO, MAX_ATUALIZACOES_CONCORRENTES,
+    PERSISTENCIA_ATIVA, PERSISTENCIA_FICHEIRO, PERSISTENCIA_INTERVALO,
+    METRICAS_HOST, METRICAS_PORTA, METRICAS_LOG_INTERVALO,
+    ENVIO_TAXA_GLOBAL, ENVIO_TAXA_CHAT, ENVIO_RAJADA_CHAT, ENVIO_MAX_TENTATIVAS, logging
+)
+from database import encerrar_db
+from database.models import cache_perfis, journal, ciclo_descarga_journal, descarregar_journal
+from utils.fila_relatorios import fila_relatorios
+from utils.cache_relatorios import cache_relatorios
+from utils.limitador_envios import LimitadorEnvios
+from utils.metricas import instrumentar_handlers, criar_servidor_metricas, ciclo_log_metricas
+from utils.pdf_generator import limpar_pdfs_orfaos
+from utils.processamento import ProcessadorPorChat
+from utils.persistencia import PersistenciaSQLite
+from utils.webhook import executar_webhook
+from utils.distribuicao import executar_entrada, executar_trabalhador
 from handlers.start import get_start_handler
-from handlers.os_handler import get_criar_os_handler, get_fechar_os_handler 
-from handlers.report_handler import get_report_handler
+from handlers.os_handler import get_criar_os_handler, get_fechar_os_handler
+from handlers.report_handler import get_report_handler, get_relatorio_setor_handler
+from handlers.maquina_handler import get_maquina_handlers
+from handlers.exportar_handler import get_exportar_handler
+from handlers.assinatura_handler import get_assinatura_handlers, agendar_relatorios
+from handlers.ui import estatisticas_teclados
+from handlers.erros import tratar_erro
+
+# Tarefas de segundo plano (descarga do journal, resumo das métricas no log).
+_tarefas: list[asyncio.Task] = []
+_servidor_metricas = None
+
+async def ao_iniciar(application: Application) -> None:
+    """Arranca as tarefas de segundo plano e o servidor de métricas."""
+    global _servidor_metricas
+    # Não usa application.create_task: os ciclos nunca terminam e o stop() ficaria à espera deles.
+    loop = asyncio.get_running_loop()
+    _tarefas.append(loop.create_task(ciclo_descarga_journal(), name="descarga_journal"))
+    if METRICAS_LOG_INTERVALO:
+        _tarefas.append(loop.create_task(ciclo_log_metricas(METRICAS_LOG_INTERVALO), name="log_metricas"))
+    if METRICAS_PORTA:
+        _servidor_metricas = criar_servidor_metricas(METRICAS_HOST, METRICAS_PORTA)
+        await _servidor_metricas.iniciar()
+
+async def ao_encerrar(application: Application) -> None:
+    """Liberta os recursos partilhados quando o bot é desligado."""
+    logging.info(f"Estatísticas do cache de perfis: {cache_perfis.estatisticas()}")
+    logging.info(f"Estatísticas do cache de relatórios: {cache_relatorios.estatisticas()}")
+    logging.info(f"Estatísticas do cache de teclados: {estatisticas_teclados()}")
+    for tarefa in _tarefas:
+        tarefa.cancel()
+    if _servidor_metricas is not None:
+        await _servidor_metricas.parar()
+    # Última tentativa de enviar o journal; o que falhar fica no ficheiro para o próximo arranque.
+    await descarregar_journal()
+    logging.info(f"Journal no encerramento: {journal.metricas()}")
+    fila_relatorios.encerrar()
+    encerrar_db()
+
+def registar_handlers(application: Application) -> None:
+    """Adiciona os handlers (gestores de comandos/conversas) à aplicação."""
+    # Primeiro, para que os botões do histórico de máquinas e das assinaturas não sejam apanhados por uma conversa em curso.
+    application.add_handlers(get_maquina_handlers())
+    application.add_handlers(get_assinatura_handlers())
+    application.add_handler(get_start_handler())
+    application.add_handler(get_criar_os_handler())
+    application.add_handler(get_fechar_os_handler())
+    application.add_handler(get_report_handler()) # Adiciona o novo handler de relatório
+    application.add_handler(get_relatorio_setor_handler())
+    application.add_handler(get_exportar_handler())
+    # Falhas do banco de dados são comunicadas ao utilizador, em vez de parecerem resultados vazios.
+    application.add_error_handler(tratar_erro)
+    # Cada passo das conversas fica registado nas métricas (duração e erros).
+    instrumentar_handlers(application)
+
+def criar_aplicacao() -> Application:
+    """
+    Cria a aplicação do bot usando o token.
+    As atualizações de chats diferentes são processadas em paralelo;
+    as de um mesmo chat continuam a ser processadas por ordem.
+    """
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .concurrent_updates(ProcessadorPorChat(MAX_ATUALIZACOES_CONCORRENTES))
+        .post_init(ao_iniciar)
+        .post_shutdown(ao_encerrar)
+    )
+    # O estado das conversas sobrevive a reinícios do serviço.
+    if PERSISTENCIA_ATIVA:
+        builder = builder.persistence(PersistenciaSQLite(PERSISTENCIA_FICHEIRO, PERSISTENCIA_INTERVALO))
+    # Os envios para o Telegram passam por uma fila com limites e prioridades.
+    if ENVIO_TAXA_GLOBAL > 0:
+        builder = builder.rate_limiter(
+            LimitadorEnvios(ENVIO_TAXA_GLOBAL, ENVIO_TAXA_CHAT, ENVIO_RAJADA_CHAT, ENVIO_MAX_TENTATIVAS)
+        )
+    application = builder.build()
+    registar_handlers(application)
+    agendar_relatorios(application)
+    return application
 
 def main() -> None:
     """
     Ponto de entrada principal do bot.
-    Configura a aplicação e inicia o polling para receber mensagens.
+    Configura a aplicação e inicia o polling (ou o webhook) para receber mensagens.
     """
     logging.info("A iniciar a aplicação do bot Kraflo...")
 
-    # Cria a aplicação do bot usando o token
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-    
-    # Adiciona os handlers (gestores de comandos/conversas) à aplicação
-    application.add_handler(get_start_handler())
-    application.add_handler(get_criar_os_handler())
-    application.add_handler(get_fechar_os_handler())
-    application.add_handler(get_report_handler()) # Adiciona o novo handler de relatório
+    # Remove relatórios deixados para trás por uma execução anterior interrompida.
+    # Os trabalhadores partilham a pasta: só a entrada a limpa, antes de os lançar.
+    if BOT_MODO != "trabalhador":
+        limpar_pdfs_orfaos()
+
+    if BOT_MODO == "distribuido":
+        # Este processo só reparte as atualizações; os handlers correm em processos filhos (este mesmo script).
+        asyncio.run(executar_entrada([sys.executable, os.path.abspath(__file__)]))
+        return
+
+    application = criar_aplicacao()
+
+    logging.info(f"Bot iniciado em modo {BOT_MODO}. A aguardar mensagens...")
 
-    logging.info("Bot iniciado. A aguardar mensagens...")
-    
     # Inicia o bot. Ele ficará a escutar por novas mensagens até que o processo seja interrompido.
-    application.run_polling()
+    if BOT_MODO == "webhook":
+        asyncio.run(executar_webhook(application))
+    elif BOT_MODO == "trabalhador":
+        asyncio.run(executar_trabalhador(application))
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -19,18 +19,213 @@ if not TELEGRAM_TOKEN:
     logging.error("O token do Telegram (TELEGRAM_BOT_TOKEN) não foi encontrado nas variáveis de ambiente.")
     raise ValueError("Token do Telegram não configurado.")
 
+# URL base da API do Telegram. Só precisa de ser alterada para testes com um servidor falso local.
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# --- Modo de Execução ---
+# "polling" (padrão) consulta o Telegram continuamente; "webhook" abre um servidor HTTP
+# local que recebe as atualizações enviadas pelo Telegram; "distribuido" reparte as
+# atualizações por vários processos do bot (ver Modo Distribuído abaixo).
+BOT_MODO = os.getenv("BOT_MODO", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL pública (https) que o Telegram deve chamar
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORTA = int(os.getenv("WEBHOOK_PORTA", "8080"))
+WEBHOOK_CAMINHO = os.getenv("WEBHOOK_CAMINHO", "/telegram")
+WEBHOOK_SEGREDO = os.getenv("WEBHOOK_SEGREDO")
+
+# --- Modo Distribuído ---
+# Um processo de entrada recebe as atualizações do Telegram (por "polling" ou "webhook", conforme
+# DISTRIBUICAO_ENTRADA) e reparte-as por DISTRIBUICAO_TRABALHADORES processos do bot, por hashing
+# consistente do chat_id: as conversas de cada utilizador ficam sempre no mesmo processo, e por ordem.
+# O trabalhador i escuta em DISTRIBUICAO_HOST, na porta DISTRIBUICAO_PORTA_BASE + i.
+DISTRIBUICAO_ENTRADA = os.getenv("DISTRIBUICAO_ENTRADA", "polling")
+DISTRIBUICAO_TRABALHADORES = int(os.getenv("DISTRIBUICAO_TRABALHADORES", "2"))
+DISTRIBUICAO_HOST = os.getenv("DISTRIBUICAO_HOST", "127.0.0.1")
+DISTRIBUICAO_PORTA_BASE = int(os.getenv("DISTRIBUICAO_PORTA_BASE", "8100"))
+# A saúde dos trabalhadores é verificada a cada DISTRIBUICAO_SAUDE_INTERVALO segundos; um trabalhador
+# sai do anel (e os seus chats passam para os outros) após DISTRIBUICAO_SAUDE_FALHAS falhas seguidas.
+DISTRIBUICAO_SAUDE_INTERVALO = float(os.getenv("DISTRIBUICAO_SAUDE_INTERVALO", "5"))
+DISTRIBUICAO_SAUDE_FALHAS = int(os.getenv("DISTRIBUICAO_SAUDE_FALHAS", "3"))
+# Definidos pelo processo de entrada em cada trabalhador que arranca (não configurar à mão).
+TRABALHADOR_INDICE = int(os.getenv("TRABALHADOR_INDICE", "0"))
+TRABALHADOR_SEGREDO = os.getenv("TRABALHADOR_SEGREDO", "")
+
+if BOT_MODO not in ("polling", "webhook", "distribuido", "trabalhador"):
+    raise ValueError(f"BOT_MODO inválido: {BOT_MODO}. Use 'polling', 'webhook', 'distribuido' ou 'trabalhador'.")
+if BOT_MODO == "distribuido" and DISTRIBUICAO_ENTRADA not in ("polling", "webhook"):
+    raise ValueError(f"DISTRIBUICAO_ENTRADA inválida: {DISTRIBUICAO_ENTRADA}. Use 'polling' ou 'webhook'.")
+if (BOT_MODO == "webhook" or (BOT_MODO == "distribuido" and DISTRIBUICAO_ENTRADA == "webhook")) \
+        and (not WEBHOOK_URL or not WEBHOOK_SEGREDO):
+    logging.error("O modo webhook requer WEBHOOK_URL e WEBHOOK_SEGREDO.")
+    raise ValueError("Webhook não configurado.")
+
+# Número máximo de atualizações processadas em simultâneo.
+# As atualizações de um mesmo chat são sempre processadas por ordem, uma de cada vez.
+MAX_ATUALIZACOES_CONCORRENTES = int(os.getenv("MAX_ATUALIZACOES_CONCORRENTES", "64"))
+
+# --- Persistência das Conversas ---
+# Ficheiro SQLite onde o estado das conversas é guardado entre reinícios.
+# Deixe vazio para manter o estado apenas em memória.
+PERSISTENCIA_FICHEIRO = os.getenv("PERSISTENCIA_FICHEIRO", "kraflo_estado.sqlite3")
+PERSISTENCIA_ATIVA = bool(PERSISTENCIA_FICHEIRO)
+# Intervalo (em segundos) entre gravações do estado em lote.
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "5"))
+
+# --- Journal de Escritas ---
+# Ficheiro local onde a criação e o fecho de OS ficam guardados até serem enviados ao banco.
+JOURNAL_FICHEIRO = os.getenv("JOURNAL_FICHEIRO", "kraflo_journal.jsonl")
+# Intervalo (em segundos) entre tentativas de envio enquanto houver escritas pendentes.
+JOURNAL_INTERVALO = float(os.getenv("JOURNAL_INTERVALO", "5"))
+# Número máximo de OS enviadas numa única inserção em lote.
+JOURNAL_LOTE = int(os.getenv("JOURNAL_LOTE", "500"))
+
+# --- Armazenamento ---
+# "supabase" (padrão) usa o banco na nuvem; "sqlite" usa um ficheiro local com o mesmo
+# esquema, para redes isoladas da fábrica e testes de carga.
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase")
+DB_SQLITE_FICHEIRO = os.getenv("DB_SQLITE_FICHEIRO", "kraflo.sqlite3")
+
+if DB_BACKEND not in ("supabase", "sqlite"):
+    raise ValueError(f"DB_BACKEND inválido: {DB_BACKEND}. Use 'supabase' ou 'sqlite'.")
+
 # --- Configurações do Supabase ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if DB_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
     logging.error("As credenciais do Supabase (URL e KEY) não foram encontradas.")
     raise ValueError("Credenciais do Supabase não configuradas.")
 
+# Número máximo de threads usadas para executar as chamadas (bloqueantes) ao banco de dados
+# fora do event loop do bot. Limita também o número de pedidos simultâneos ao PostgREST.
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "8"))
+
+# Ligações HTTP ao Supabase: mantidas abertas (keep-alive) e reutilizadas entre pedidos.
+# DB_HTTP_TIMEOUT: tempo máximo (segundos) de cada pedido; DB_HTTP_KEEPALIVE: segundos que uma ligação inativa fica aberta.
+DB_HTTP_TIMEOUT = float(os.getenv("DB_HTTP_TIMEOUT", "15"))
+DB_HTTP_KEEPALIVE = float(os.getenv("DB_HTTP_KEEPALIVE", "60"))
+
+# Falhas passageiras do banco: as leituras são repetidas até DB_TENTATIVAS vezes, com uma espera
+# aleatória que cresce de DB_ESPERA_BASE até DB_ESPERA_MAX segundos.
+DB_TENTATIVAS = int(os.getenv("DB_TENTATIVAS", "3"))
+DB_ESPERA_BASE = float(os.getenv("DB_ESPERA_BASE", "0.2"))
+DB_ESPERA_MAX = float(os.getenv("DB_ESPERA_MAX", "2"))
+# Após DB_DISJUNTOR_FALHAS falhas seguidas, as chamadas ao banco falham de imediato durante
+# DB_DISJUNTOR_ESPERA segundos, em vez de esperarem pelo timeout de um banco em baixo.
+DB_DISJUNTOR_FALHAS = int(os.getenv("DB_DISJUNTOR_FALHAS", "5"))
+DB_DISJUNTOR_ESPERA = float(os.getenv("DB_DISJUNTOR_ESPERA", "30"))
+
+# Agrupamento de consultas: os perfis e as listas de OS abertas pedidos por vários
+# handlers dentro de DB_LOTE_JANELA segundos são lidos numa única consulta (até DB_LOTE_MAX chaves).
+DB_LOTE_JANELA = float(os.getenv("DB_LOTE_JANELA", "0.005"))
+DB_LOTE_MAX = int(os.getenv("DB_LOTE_MAX", "100"))
+
+# Número de OS lidas por página nas consultas paginadas (relatórios).
+OS_TAMANHO_PAGINA = int(os.getenv("OS_TAMANHO_PAGINA", "200"))
+
+# Cache de perfis de utilizador (tabela usuarios).
+# Os perfis quase nunca mudam, por isso evitamos uma consulta ao banco em cada mensagem.
+PERFIL_CACHE_MAX = int(os.getenv("PERFIL_CACHE_MAX", "1024"))
+PERFIL_CACHE_TTL = float(os.getenv("PERFIL_CACHE_TTL", "600"))
+# Tempo (em segundos) durante o qual um chat_id não registado é lembrado como tal.
+PERFIL_CACHE_TTL_NEGATIVO = float(os.getenv("PERFIL_CACHE_TTL_NEGATIVO", "60"))
+
+# Índice em memória das OS abertas de cada utilizador (usado no seletor do fecho de OS).
+# OS_INDICE_MAX: número de utilizadores indexados; OS_INDICE_TTL: segundos até a lista ser relida do banco.
+OS_INDICE_MAX = int(os.getenv("OS_INDICE_MAX", "1024"))
+OS_INDICE_TTL = float(os.getenv("OS_INDICE_TTL", "900"))
+# Número de OS mostradas por página no seletor do fecho de OS.
+OS_SELETOR_PAGINA = int(os.getenv("OS_SELETOR_PAGINA", "8"))
+# Número de OS mostradas por página no histórico de uma máquina (/maquina).
+MAQUINA_HISTORICO_PAGINA = int(os.getenv("MAQUINA_HISTORICO_PAGINA", "5"))
+# Páginas do calendário dos relatórios guardadas em memória (cada uma é um teclado já pronto).
+CALENDARIO_CACHE_MAX = int(os.getenv("CALENDARIO_CACHE_MAX", "512"))
+
 # --- Configurações Gerais da Aplicação ---
 # Define o diretório onde os relatórios em PDF serão salvos temporariamente.
 PDF_SAVE_PATH = "temp_pdfs/"
 
+# Modo de entrega dos relatórios: "memoria" envia o PDF diretamente a partir da memória,
+# "disco" grava-o primeiro em PDF_SAVE_PATH (útil para depuração).
+PDF_MODO_ENTREGA = os.getenv("PDF_MODO_ENTREGA", "memoria")
+
+# Os relatórios PDF são gerados num pool de processos, para não bloquear o bot.
+# PDF_MAX_WORKERS: número de processos de renderização em paralelo.
+# PDF_FILA_MAX: número máximo de relatórios à espera de um processo livre.
+# PDF_TIMEOUT: tempo máximo (em segundos) que um relatório pode demorar a ser gerado.
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "2"))
+PDF_FILA_MAX = int(os.getenv("PDF_FILA_MAX", "20"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "120"))
+
+# Fonte TrueType dos relatórios (Unicode: travessões, símbolos, letras fora do latin-1).
+# PDF_FONTE_NORMAL / PDF_FONTE_NEGRITO: ficheiros .ttf das faces normal e negrito.
+# PDF_FONTE_ITALICO: face itálica (vazio = usa a face normal).
+# Se algum ficheiro não existir, os relatórios usam a fonte Arial base do PDF (só latin-1).
+PDF_FONTE_NORMAL = os.getenv("PDF_FONTE_NORMAL", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+PDF_FONTE_NEGRITO = os.getenv("PDF_FONTE_NEGRITO", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+PDF_FONTE_ITALICO = os.getenv("PDF_FONTE_ITALICO", "")
+
+# Níveis de utilizador (campo "nivel" do registo, sem distinguir maiúsculas) que podem pedir
+# o relatório do setor inteiro com /relatorio_setor, separados por vírgulas.
+RELATORIO_SETOR_NIVEIS = {
+    nivel.strip().lower() for nivel in os.getenv("RELATORIO_SETOR_NIVEIS", "Supervisor,Gestor,Coordenador").split(",")
+    if nivel.strip()
+}
+
+# Os relatórios já gerados ficam num cache em memória (LRU), limitado a RELATORIO_CACHE_MB.
+# Um pedido repetido do mesmo relatório é enviado a partir do cache. 0 desativa.
+RELATORIO_CACHE_BYTES = int(float(os.getenv("RELATORIO_CACHE_MB", "64")) * 1024 * 1024)
+
+# --- Exportação ---
+# /exportar envia as OS em bruto de todos os técnicos (CSV comprimido ou XLSX) aos níveis em EXPORTACAO_NIVEIS.
+EXPORTACAO_NIVEIS = {
+    nivel.strip().lower() for nivel in os.getenv("EXPORTACAO_NIVEIS", "Supervisor,Gestor,Coordenador,Planeamento").split(",")
+    if nivel.strip()
+}
+# OS lidas por página durante a exportação e exportações em simultâneo.
+EXPORTACAO_TAMANHO_PAGINA = int(os.getenv("EXPORTACAO_TAMANHO_PAGINA", "1000"))
+EXPORTACAO_CONCORRENCIA = int(os.getenv("EXPORTACAO_CONCORRENCIA", "1"))
+# Tamanho máximo do ficheiro enviado (o Telegram aceita até 50 MB; mais com um servidor Bot API local).
+EXPORTACAO_MAX_BYTES = int(float(os.getenv("EXPORTACAO_MAX_MB", "50")) * 1024 * 1024)
+
+# --- Relatórios Agendados ---
+# Os relatórios assinados (/assinar) são gerados de madrugada, fora da hora de ponta, e entregues de manhã.
+# RELATORIOS_AGENDADOS_HORA: hora da pré-geração; RELATORIOS_AGENDADOS_ENTREGA: hora da entrega
+# (vazio = entrega logo após a geração). Ambas no FUSO_HORARIO (vazio = fuso do sistema).
+RELATORIOS_AGENDADOS_HORA = os.getenv("RELATORIOS_AGENDADOS_HORA", "02:00")
+RELATORIOS_AGENDADOS_ENTREGA = os.getenv("RELATORIOS_AGENDADOS_ENTREGA", "07:00")
+FUSO_HORARIO = os.getenv("FUSO_HORARIO", "")
+# Os trabalhos são espalhados aleatoriamente por esta janela (segundos), para não sobrecarregar o banco e o Telegram.
+RELATORIOS_AGENDADOS_JITTER = float(os.getenv("RELATORIOS_AGENDADOS_JITTER", "1800"))
+RELATORIOS_AGENDADOS_JITTER_ENTREGA = float(os.getenv("RELATORIOS_AGENDADOS_JITTER_ENTREGA", "300"))
+# Relatórios agendados gerados ao mesmo tempo (o resto do pool de PDF fica livre para os pedidos ao vivo).
+RELATORIOS_AGENDADOS_CONCORRENCIA = int(os.getenv("RELATORIOS_AGENDADOS_CONCORRENCIA", "1"))
+
+# --- Envios para o Telegram ---
+# Todos os pedidos à API passam por uma fila com limites (utils/limitador_envios.py).
+# ENVIO_TAXA_GLOBAL: pedidos por segundo no total (0 desativa a fila).
+# ENVIO_TAXA_CHAT / ENVIO_RAJADA_CHAT: mensagens por segundo em cada chat e quantas podem sair de seguida.
+# ENVIO_MAX_TENTATIVAS: repetições de um pedido recusado pelo Telegram com erro 429.
+ENVIO_TAXA_GLOBAL = float(os.getenv("ENVIO_TAXA_GLOBAL", "25"))
+ENVIO_TAXA_CHAT = float(os.getenv("ENVIO_TAXA_CHAT", "1"))
+ENVIO_RAJADA_CHAT = float(os.getenv("ENVIO_RAJADA_CHAT", "3"))
+ENVIO_MAX_TENTATIVAS = int(os.getenv("ENVIO_MAX_TENTATIVAS", "3"))
+
+# --- Pedidos Repetidos ---
+# Durante IDEMPOTENCIA_JANELA segundos, uma OS criada ou fechada com os mesmos dados pelo
+# mesmo chat (ex.: toque duplo numa rede fraca) não volta a ser gravada.
+IDEMPOTENCIA_JANELA = float(os.getenv("IDEMPOTENCIA_JANELA", "120"))
+IDEMPOTENCIA_MAX = int(os.getenv("IDEMPOTENCIA_MAX", "4096"))
+
+# --- Métricas ---
+# Servidor HTTP local com as métricas no formato Prometheus (GET /metricas). Porta 0 desativa.
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+METRICAS_PORTA = int(os.getenv("METRICAS_PORTA", "9464"))
+# Intervalo (em segundos) entre os resumos das métricas escritos no log. 0 desativa.
+METRICAS_LOG_INTERVALO = float(os.getenv("METRICAS_LOG_INTERVALO", "300"))
+# Operações (handlers, consultas) mais lentas do que isto (em segundos) são registadas no log.
+METRICAS_LENTO = float(os.getenv("METRICAS_LENTO", "1.0"))
+
 # Define textos de botões para serem usados em toda a aplicação.
 # Centralizar isto aqui facilita a manutenção.
 class UIBotao:
@@ -1,21 +1,95 @@
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import httpx
+from supabase import create_client, Client, ClientOptions
+from config import (
+    SUPABASE_URL, SUPABASE_KEY, DB_MAX_WORKERS, DB_BACKEND, DB_SQLITE_FICHEIRO, DB_HTTP_TIMEOUT, DB_HTTP_KEEPALIVE,
+    DB_TENTATIVAS, DB_ESPERA_BASE, DB_ESPERA_MAX, DB_DISJUNTOR_FALHAS, DB_DISJUNTOR_ESPERA, logging
+)
+from .repositorio import Repositorio
+from .resiliencia import Disjuntor, proteger_repositorio
+from utils.metricas import instrumentar_repositorio
 
 # Variável global para a instância do cliente Supabase.
 db_client: Client | None = None
+_cliente_http: httpx.Client | None = None
+
+# Repositório em uso (Supabase ou SQLite, conforme DB_BACKEND).
+repositorio: Repositorio | None = None
+
+# Disjuntor partilhado por todas as chamadas ao banco (ver resiliencia.py).
+disjuntor = Disjuntor(DB_DISJUNTOR_FALHAS, DB_DISJUNTOR_ESPERA)
+
+# Pool de threads onde correm as chamadas bloqueantes ao banco de dados.
+# É limitado para que um pico de pedidos não abra ligações sem controlo.
+_db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="kraflo-db")
+
+def _criar_cliente_http() -> httpx.Client:
+    """
+    Cliente HTTP partilhado pelo Supabase. As ligações ficam abertas (keep-alive) e são reutilizadas
+    entre pedidos, sem novo handshake TLS em cada consulta; o limite acompanha o número de threads
+    do pool do banco. Com HTTP/2, os pedidos simultâneos partilham a mesma ligação.
+    """
+    return httpx.Client(
+        http2=True,
+        follow_redirects=True,
+        timeout=httpx.Timeout(DB_HTTP_TIMEOUT, connect=min(DB_HTTP_TIMEOUT, 5.0)),
+        limits=httpx.Limits(
+            max_connections=DB_MAX_WORKERS,
+            max_keepalive_connections=DB_MAX_WORKERS,
+            keepalive_expiry=DB_HTTP_KEEPALIVE,
+        ),
+    )
 
 def get_db() -> Client:
     """
     Inicializa e/ou retorna a instância do cliente Supabase.
     Garante que a conexão seja estabelecida apenas uma vez (padrão Singleton).
     """
-    global db_client
+    global db_client, _cliente_http
     if db_client is None:
         try:
             logging.info("A inicializar a conexão com o Supabase...")
-            db_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            _cliente_http = _criar_cliente_http()
+            db_client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=_cliente_http))
             logging.info("Conexão com o Supabase estabelecida com sucesso.")
         except Exception as e:
             logging.error(f"Falha ao conectar com o Supabase: {e}")
             raise e
-    return db_client
\ No newline at end of file
+    return db_client
+
+def get_repositorio() -> Repositorio:
+    """
+    Retorna o repositório de dados configurado em DB_BACKEND (padrão Singleton).
+    """
+    global repositorio
+    if repositorio is None:
+        if DB_BACKEND == "sqlite":
+            from .repositorio_sqlite import RepositorioSQLite
+            logging.info(f"A usar o banco de dados local SQLite em {DB_SQLITE_FICHEIRO}.")
+            repositorio = RepositorioSQLite(DB_SQLITE_FICHEIRO)
+        else:
+            from .repositorio_supabase import RepositorioSupabase
+            repositorio = RepositorioSupabase(get_db())
+        # Cada consulta fica registada nas métricas (duração e erros).
+        instrumentar_repositorio(repositorio)
+        # Por fora das métricas: cada tentativa é medida, e os erros chegam a models.py como ErroBancoDados.
+        proteger_repositorio(repositorio, disjuntor, DB_TENTATIVAS, DB_ESPERA_BASE, DB_ESPERA_MAX)
+    return repositorio
+
+async def executar_em_thread(funcao: Callable[..., Any], *args: Any) -> Any:
+    """
+    Executa uma função bloqueante no pool de threads do banco de dados,
+    sem bloquear o event loop do bot enquanto espera pela resposta.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, funcao, *args)
+
+def encerrar_db() -> None:
+    """Liberta as threads do pool e as ligações. Deve ser chamada no encerramento do bot."""
+    _db_executor.shutdown(wait=False, cancel_futures=True)
+    if repositorio is not None:
+        repositorio.fechar()
+    if _cliente_http is not None:
+        _cliente_http.close()
@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from utils.metricas import registo
+
+# Marcador para distinguir "não está no cache" de um valor None guardado.
+AUSENTE = object()
+
+cache_acessos = registo.contador(
+    'kraflo_cache_total', 'Consultas aos caches em memória com nome, por cache e resultado (hit/miss).'
+)
+
+class CacheTTL:
+    """
+    Cache em memória limitado, com expiração por tempo (TTL) e remoção LRU.
+    Guarda também resultados negativos (None), para que utilizadores não
+    registados não provoquem uma consulta ao banco a cada mensagem.
+    Com `nome`, os hits e misses são também contados em /metricas.
+    """
+    def __init__(self, max_entradas: int, ttl: float, ttl_negativo: float | None = None, nome: str | None = None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.ttl_negativo = ttl if ttl_negativo is None else ttl_negativo
+        self.nome = nome
+        self._dados: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, chave: Hashable, padrao: Any = AUSENTE) -> Any:
+        """Retorna o valor guardado, ou `padrao` se não existir ou tiver expirado."""
+        entrada = self._dados.get(chave)
+        if entrada is None or entrada[0] < time.monotonic():
+            if entrada is not None:
+                del self._dados[chave]
+            self.misses += 1
+            self._contar('miss')
+            return padrao
+        self._dados.move_to_end(chave)
+        self.hits += 1
+        self._contar('hit')
+        return entrada[1]
+
+    def _contar(self, resultado: str) -> None:
+        if self.nome is not None:
+            cache_acessos.incrementar(cache=self.nome, resultado=resultado)
+
+    def guardar(self, chave: Hashable, valor: Any) -> None:
+        ttl = self.ttl if valor is not None else self.ttl_negativo
+        self._dados[chave] = (time.monotonic() + ttl, valor)
+        self._dados.move_to_end(chave)
+        while len(self._dados) > self.max_entradas:
+            self._dados.popitem(last=False)
+
+    def invalidar(self, chave: Hashable) -> None:
+        self._dados.pop(chave, None)
+
+    def limpar(self) -> None:
+        self._dados.clear()
+
+    def estatisticas(self) -> dict[str, int | float]:
+        """Contadores de uso, úteis para medir quantas consultas o cache poupa."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entradas': len(self._dados),
+            'taxa_acerto': (self.hits / total) if total else 0.0,
+        }
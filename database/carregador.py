@@ -0,0 +1,81 @@
+"""
+Agrupamento de consultas concorrentes (ao estilo DataLoader).
+
+Na troca de turno dezenas de técnicos usam o bot ao mesmo tempo e cada
+handler pede o seu próprio perfil ou a sua lista de OS abertas. Em vez de
+uma ida ao banco por pedido, as chaves pedidas dentro de uma janela curta
+são juntas numa única consulta `IN (...)` e cada handler recebe apenas o
+seu resultado.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from . import executar_em_thread
+from utils.metricas import lote_tamanho, lote_consultas, lote_poupadas
+
+
+class CarregadorLotes:
+    """
+    Junta os pedidos feitos em `janela` segundos numa só chamada a
+    `funcao_lote(chaves) -> {chave: valor}`, executada no pool do banco.
+    Chaves repetidas no mesmo lote partilham o mesmo resultado; as chaves
+    ausentes da resposta recebem `padrao()`. Se a chamada falhar (ou não
+    retornar um dicionário), todos os pedidos do lote recebem o erro.
+    """
+
+    def __init__(self, nome: str, funcao_lote: Callable[[list], Dict[Hashable, Any]],
+                 janela: float, max_lote: int, padrao: Callable[[], Any] = lambda: None):
+        self.nome = nome
+        self.funcao_lote = funcao_lote
+        self.janela = janela
+        self.max_lote = max_lote
+        self.padrao = padrao
+        self._pendentes: Dict[Hashable, asyncio.Future] = {}
+        self._temporizador: asyncio.TimerHandle | None = None
+        # O event loop só guarda uma referência fraca às tarefas: sem esta, um lote
+        # em curso poderia ser recolhido pelo GC e os seus pedidos nunca seriam respondidos.
+        self._tarefas: set[asyncio.Task] = set()
+
+    async def carregar(self, chave: Hashable) -> Any:
+        if self._pendentes:
+            # Junta-se a um lote já aberto: é uma ida ao banco a menos.
+            lote_poupadas.incrementar(carregador=self.nome)
+        futuro = self._pendentes.get(chave)
+        if futuro is None:
+            loop = asyncio.get_running_loop()
+            futuro = self._pendentes[chave] = loop.create_future()
+            if len(self._pendentes) >= self.max_lote:
+                self._despachar()
+            elif self._temporizador is None:
+                self._temporizador = loop.call_later(self.janela, self._despachar)
+        # shield: um handler cancelado não cancela o resultado partilhado pelos outros.
+        return await asyncio.shield(futuro)
+
+    def _despachar(self) -> None:
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendentes = self._pendentes, {}
+        if lote:
+            tarefa = asyncio.get_running_loop().create_task(self._executar(lote))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(self, lote: Dict[Hashable, asyncio.Future]) -> None:
+        lote_tamanho.observar(len(lote), carregador=self.nome)
+        lote_consultas.incrementar(carregador=self.nome)
+        try:
+            resultados = await executar_em_thread(self.funcao_lote, list(lote))
+            if not isinstance(resultados, dict):
+                raise TypeError(
+                    f"Carregador {self.nome}: funcao_lote retornou {type(resultados).__name__} em vez de um dicionário."
+                )
+        except Exception as e:
+            for futuro in lote.values():
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        for chave, futuro in lote.items():
+            if not futuro.done():
+                futuro.set_result(resultados[chave] if chave in resultados else self.padrao())
+
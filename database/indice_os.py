@@ -0,0 +1,86 @@
+"""
+Índice em memória das OS abertas de cada utilizador.
+
+O seletor de OS do fluxo de fecho é reaberto a cada página e a cada filtro;
+em vez de voltar a pedir ao banco a lista completa, a lista de cada chat é
+lida uma vez e depois mantida incrementalmente: as OS criadas entram quando
+o journal as insere no banco (é aí que recebem o id) e as fechadas saem no
+momento do fecho.
+
+É atualizado a partir do event loop e da thread que descarrega o journal,
+por isso todas as operações passam por um lock.
+"""
+import threading
+from typing import Any, Dict, Iterable, List
+
+from .cache import CacheTTL, AUSENTE
+
+# Campos de cada OS guardados no índice (os mesmos de listar_ordens_abertas).
+CAMPOS_INDICE = ('id', 'numero_maquina', 'data_abertura')
+
+
+class IndiceOSAbertas:
+    """
+    Listas de OS abertas por chat_id, limitadas a `max_chats` (LRU) e
+    relidas do banco ao fim de `ttl` segundos, para apanhar alterações feitas
+    fora do bot (ex.: diretamente no Supabase).
+    """
+
+    def __init__(self, max_chats: int, ttl: float):
+        self._listas = CacheTTL(max_chats, ttl, nome='os_abertas')
+        # Versão por chat: muda a cada alteração, para que uma leitura do banco
+        # iniciada antes de uma escrita não substitua o índice já atualizado.
+        self._versoes: Dict[int, int] = {}
+        # Versão dos chats ainda sem entrada em _versoes; sobe a cada limpar().
+        self._versao_inicial = 0
+        self._lock = threading.Lock()
+
+    def versao(self, chat_id: int) -> int:
+        with self._lock:
+            return self._versoes.get(chat_id, self._versao_inicial)
+
+    def obter(self, chat_id: int) -> List[Dict[str, Any]] | None:
+        """OS abertas do chat por ordem de abertura, ou None se o chat não estiver indexado."""
+        with self._lock:
+            ordens = self._listas.obter(chat_id)
+            return None if ordens is AUSENTE else [dict(os) for os in ordens.values()]
+
+    def carregar(self, chat_id: int, ordens: Iterable[Dict[str, Any]], versao: int) -> List[Dict[str, Any]]:
+        """
+        Indexa a lista lida do banco, exceto se o chat tiver mudado desde `versao`
+        (nesse caso será relida no próximo pedido). Retorna a lista ordenada.
+        """
+        linhas = sorted(
+            ({campo: os.get(campo) for campo in CAMPOS_INDICE} for os in ordens),
+            key=lambda os: (os['data_abertura'] or '', os['id']),
+        )
+        with self._lock:
+            if self._versoes.get(chat_id, self._versao_inicial) == versao:
+                self._listas.guardar(chat_id, {os['id']: dict(os) for os in linhas})
+        return linhas
+
+    def adicionar(self, chat_id: int, ordem: Dict[str, Any]) -> None:
+        with self._lock:
+            self._versoes[chat_id] = self._versoes.get(chat_id, self._versao_inicial) + 1
+            ordens = self._listas.obter(chat_id)
+            if ordens is not AUSENTE:
+                ordens[ordem['id']] = {campo: ordem.get(campo) for campo in CAMPOS_INDICE}
+
+    def remover(self, chat_id: int, os_id: int) -> None:
+        with self._lock:
+            self._versoes[chat_id] = self._versoes.get(chat_id, self._versao_inicial) + 1
+            ordens = self._listas.obter(chat_id)
+            if ordens is not AUSENTE:
+                ordens.pop(os_id, None)
+
+    def limpar(self) -> None:
+        """Esquece todas as listas; as leituras do banco já em curso também são descartadas."""
+        with self._lock:
+            self._listas.limpar()
+            self._versao_inicial += 1
+            for chat_id in self._versoes:
+                self._versoes[chat_id] += 1
+
+    def estatisticas(self) -> Dict[str, int | float]:
+        with self._lock:
+            return self._listas.estatisticas()
@@ -0,0 +1,139 @@
+"""
+Journal local de escritas (criação e fecho de OS).
+
+Cada escrita é primeiro acrescentada a um ficheiro local (uma linha JSON por
+registo) e só depois enviada ao Supabase por um processo em segundo plano.
+Assim, uma falha de rede no chão de fábrica não perde o texto que o técnico
+escreveu: o registo fica no journal e é reenviado até ser confirmado.
+
+Cada registo tem uma chave de idempotência (UUID), gravada na própria OS,
+para que um reenvio após uma falha parcial nunca duplique uma OS.
+
+Um registo que o banco recusa de forma permanente (ex.: viola uma restrição)
+sai do journal para um ficheiro de quarentena ao lado (<journal>.quarentena),
+com o motivo, para não bloquear as escritas seguintes.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from config import logging
+
+# Tipos de registo do journal.
+CRIAR = 'criar'
+FECHAR = 'fechar'
+CONFIRMADO = 'confirmado'
+
+# Número de registos confirmados a partir do qual o ficheiro é reescrito só com os pendentes.
+LIMITE_COMPACTACAO = 1000
+
+
+class JournalEscritas:
+    """Ficheiro de escritas pendentes, só de acréscimo, com confirmação por chave."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.caminho_quarentena = caminho + '.quarentena'
+        self._lock = threading.Lock()
+        self._pendentes: Dict[str, Dict[str, Any]] = {}
+        self._confirmados_no_ficheiro = 0
+        self._trabalho = asyncio.Event()
+        self._carregar()
+
+    def _carregar(self) -> None:
+        """Reconstrói a lista de pendentes a partir do ficheiro (após um reinício)."""
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, encoding='utf-8') as ficheiro:
+            for linha in ficheiro:
+                try:
+                    registo = json.loads(linha)
+                except ValueError:
+                    # Linha truncada por uma falha a meio da escrita: é ignorada.
+                    continue
+                if registo['tipo'] == CONFIRMADO:
+                    for chave in registo['chaves']:
+                        self._pendentes.pop(chave, None)
+                    self._confirmados_no_ficheiro += len(registo['chaves'])
+                else:
+                    self._pendentes[registo['chave']] = registo
+        if self._pendentes:
+            logging.info(f"Journal: {len(self._pendentes)} escrita(s) pendente(s) recuperada(s) de {self.caminho}.")
+
+    def _acrescentar(self, registo: Dict[str, Any], caminho: str | None = None) -> None:
+        with open(caminho or self.caminho, 'a', encoding='utf-8') as ficheiro:
+            ficheiro.write(json.dumps(registo, ensure_ascii=False) + '\n')
+            ficheiro.flush()
+            os.fsync(ficheiro.fileno())
+
+    def registar(self, tipo: str, **campos: Any) -> str:
+        """Grava uma escrita no disco e retorna a sua chave de idempotência."""
+        registo = {'tipo': tipo, 'chave': str(uuid.uuid4()), 'ts': time.time(), **campos}
+        with self._lock:
+            self._acrescentar(registo)
+            self._pendentes[registo['chave']] = registo
+        return registo['chave']
+
+    def sinalizar(self) -> None:
+        """Acorda o processo de descarga. Deve ser chamada a partir do event loop."""
+        self._trabalho.set()
+
+    async def aguardar_trabalho(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._trabalho.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._trabalho.clear()
+
+    def pendentes(self, tipo: str | None = None) -> List[Dict[str, Any]]:
+        """Registos ainda não confirmados, por ordem de chegada."""
+        with self._lock:
+            registos = list(self._pendentes.values())
+        return [r for r in registos if tipo is None or r['tipo'] == tipo]
+
+    def confirmar(self, chaves: List[str]) -> None:
+        """Marca registos como aplicados no banco de dados."""
+        if not chaves:
+            return
+        with self._lock:
+            self._acrescentar({'tipo': CONFIRMADO, 'chaves': chaves})
+            for chave in chaves:
+                self._pendentes.pop(chave, None)
+            self._confirmados_no_ficheiro += len(chaves)
+            if not self._pendentes or self._confirmados_no_ficheiro >= LIMITE_COMPACTACAO:
+                self._compactar()
+
+    def quarentena(self, registo: Dict[str, Any], motivo: str) -> None:
+        """
+        Move um registo recusado pelo banco para o ficheiro de quarentena e retira-o dos pendentes.
+        É gravado na quarentena antes de ser confirmado: uma falha entre os dois passos repete-o, não o perde.
+        """
+        with self._lock:
+            self._acrescentar({**registo, 'motivo': motivo, 'ts_quarentena': time.time()}, self.caminho_quarentena)
+        self.confirmar([registo['chave']])
+
+    def _compactar(self) -> None:
+        """Reescreve o ficheiro apenas com os registos pendentes (substituição atómica)."""
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as ficheiro:
+            for registo in self._pendentes.values():
+                ficheiro.write(json.dumps(registo, ensure_ascii=False) + '\n')
+            ficheiro.flush()
+            os.fsync(ficheiro.fileno())
+        os.replace(temporario, self.caminho)
+        self._confirmados_no_ficheiro = 0
+
+    def metricas(self) -> Dict[str, Any]:
+        """Tamanho e idade do backlog de escritas ainda não enviadas ao banco."""
+        with self._lock:
+            instantes = [r['ts'] for r in self._pendentes.values()]
+        return {
+            'pendentes': len(instantes),
+            'idade_mais_antiga_s': round(time.time() - min(instantes), 1) if instantes else 0.0,
+            'mais_antiga': datetime.fromtimestamp(min(instantes)).isoformat() if instantes else None,
+        }
@@ -1,34 +1,85 @@
-from . import get_db
-from config import logging
+from . import get_repositorio, executar_em_thread
+from .journal import JournalEscritas, CRIAR, FECHAR
+from .cache import CacheTTL, AUSENTE
+from .carregador import CarregadorLotes
+from .indice_os import IndiceOSAbertas
+from .repositorio import Cursor, calcular_estatisticas_maquina, intervalo_iso, paginar
+from .resiliencia import ErroBancoDados, erro_transitorio
+from utils.metricas import medir, registo as registo_metricas, journal_pendentes, journal_idade_segundos
+from utils.cache_relatorios import cache_relatorios
+from utils.exportacao import FORMATOS
+from config import (
+    logging, PERFIL_CACHE_MAX, PERFIL_CACHE_TTL, PERFIL_CACHE_TTL_NEGATIVO, OS_TAMANHO_PAGINA,
+    JOURNAL_FICHEIRO, JOURNAL_INTERVALO, JOURNAL_LOTE, DB_LOTE_JANELA, DB_LOTE_MAX,
+    OS_INDICE_MAX, OS_INDICE_TTL, EXPORTACAO_TAMANHO_PAGINA
+)
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, Tuple
+
+# Cache dos perfis de utilizador, indexado por chat_id.
+cache_perfis = CacheTTL(PERFIL_CACHE_MAX, PERFIL_CACHE_TTL, PERFIL_CACHE_TTL_NEGATIVO, nome='perfis')
+
+# Consultas agrupadas: pedidos simultâneos de vários chats seguem numa só consulta IN (...).
+carregador_usuarios = CarregadorLotes(
+    'usuarios', lambda chat_ids: get_repositorio().buscar_usuarios(chat_ids), DB_LOTE_JANELA, DB_LOTE_MAX
+)
+carregador_os_abertas = CarregadorLotes(
+    'os_abertas', lambda chat_ids: get_repositorio().listar_ordens_abertas_lote(chat_ids), DB_LOTE_JANELA, DB_LOTE_MAX,
+    padrao=list
+)
+# OS abertas por chat, mantidas em memória e atualizadas a cada criação e fecho.
+indice_os_abertas = IndiceOSAbertas(OS_INDICE_MAX, OS_INDICE_TTL)
+
+# Journal local onde a criação e o fecho de OS são gravados antes de irem para o banco.
+journal = JournalEscritas(JOURNAL_FICHEIRO)
+# Impede duas descargas em simultâneo (ex.: a do ciclo e a do encerramento), que reenviariam os mesmos registos.
+_lock_descarga = threading.Lock()
+journal_quarentena = registo_metricas.contador(
+    'kraflo_journal_quarentena_total', 'Escritas do journal recusadas pelo banco e movidas para a quarentena.'
+)
 
 # --- Funções de Gestão de Usuários ---
 
-def buscar_usuario_por_id(chat_id: int) -> Dict[str, Any] | None:
+@medir
+async def buscar_usuario_por_id(chat_id: int) -> Dict[str, Any] | None:
+    """
+    Busca o perfil do utilizador, primeiro no cache e só depois no banco.
+    Utilizadores não registados também ficam em cache (como None) por um período curto.
+    Lança ErroBancoDados se o banco falhar, para não confundir a falha com "não registado".
+    """
+    usuario = cache_perfis.obter(chat_id)
+    if usuario is not AUSENTE:
+        return usuario
     try:
-        db = get_db()
-        response = db.table('usuarios').select('*').eq('chat_id', chat_id).single().execute()
-        return response.data
+        # Só uma resposta vazia ("não registado") vai para o cache; uma exceção é uma falha.
+        usuario = await carregador_usuarios.carregar(chat_id)
+        cache_perfis.guardar(chat_id, usuario)
+        return usuario
+    except ErroBancoDados:
+        raise
     except Exception as e:
         logging.error(f"Erro ao buscar usuário por ID {chat_id}: {e}")
         return None
 
-def verificar_matricula_existente(cadastro_empresa: str) -> bool:
+@medir
+async def verificar_matricula_existente(cadastro_empresa: str) -> bool:
     try:
-        db = get_db()
-        response = db.table('usuarios').select('cadastro_empresa').eq('cadastro_empresa', cadastro_empresa).single().execute()
-        return response.data is not None
+        return await executar_em_thread(get_repositorio().existe_matricula, cadastro_empresa)
+    except ErroBancoDados:
+        raise
     except Exception:
         return False
 
-def registrar_usuario(chat_id: int, nome: str, funcao: str, nivel: str, setor: str, cadastro_empresa: str) -> bool:
+@medir
+async def registrar_usuario(chat_id: int, nome: str, funcao: str, nivel: str, setor: str, cadastro_empresa: str) -> bool:
     try:
-        db = get_db()
-        db.table('usuarios').insert({
+        await executar_em_thread(get_repositorio().inserir_usuario, {
             'chat_id': chat_id, 'nome': nome, 'funcao': funcao, 
             'nivel': nivel, 'setor': setor, 'cadastro_empresa': cadastro_empresa
-        }).execute()
+        })
+        # Remove o resultado negativo guardado antes do registo.
+        cache_perfis.invalidar(chat_id)
         logging.info(f"Usuário {nome} (chat_id: {chat_id}) registrado com sucesso.")
         return True
     except Exception as e:
@@ -37,74 +88,292 @@ def registrar_usuario(chat_id: int, nome: str, funcao: str, nivel: str, setor: s
 
 # --- Funções de Gestão de Ordens de Serviço ---
 
-def criar_ordem_servico(chat_id: int, dados_os: Dict[str, Any]) -> bool:
+@medir
+async def criar_ordem_servico(chat_id: int, dados_os: Dict[str, Any]) -> bool:
     """
-    Cria uma nova ordem de serviço na tabela 'ordens_servico'.
-    Agora espera um dicionário com os dados da OS.
+    Regista uma nova ordem de serviço.
+    A OS é gravada primeiro no journal local e confirmada de imediato ao utilizador;
+    a inserção na tabela 'ordens_servico' é feita em segundo plano por descarregar_journal().
     """
     try:
-        db = get_db()
         # Adiciona o chat_id e a data ao dicionário antes de inserir
         dados_os['chat_id'] = chat_id
         dados_os['data_abertura'] = datetime.now().isoformat()
-        
-        db.table('ordens_servico').insert(dados_os).execute()
-        logging.info(f"Nova OS criada para o chat_id {chat_id}.")
+
+        await executar_em_thread(lambda: journal.registar(CRIAR, dados=dados_os))
+        journal.sinalizar()
+        logging.info(f"Nova OS registada no journal para o chat_id {chat_id}.")
         return True
     except Exception as e:
         logging.error(f"Falha ao criar OS para o chat_id {chat_id}: {e}")
         return False
 
-def buscar_os_abertas_por_usuario(chat_id: int) -> List[Dict[str, Any]]:
+@medir
+async def buscar_os_abertas_por_usuario(chat_id: int) -> List[Dict[str, Any]]:
     """
-    Busca todas as OS abertas (sem data_fechamento) para um usuário específico.
+    Busca todas as OS abertas (sem data_fechamento) para um usuário específico, por ordem de abertura.
+    Depois da primeira leitura, a lista vem do índice em memória, mantido pela criação e pelo fecho.
+    As OS cujo fecho ainda está no journal, por enviar, já não são listadas.
+    Lança ErroBancoDados se o banco falhar (uma lista vazia quer dizer mesmo "nenhuma OS aberta").
     """
     try:
-        db = get_db()
-        response = db.table('ordens_servico').select('id, numero_maquina').eq('chat_id', chat_id).is_('data_fechamento', None).execute()
-        return response.data if response.data else []
+        abertas = indice_os_abertas.obter(chat_id)
+        if abertas is None:
+            versao = indice_os_abertas.versao(chat_id)
+            abertas = indice_os_abertas.carregar(chat_id, await carregador_os_abertas.carregar(chat_id), versao)
+        fecho_pendente = {r['os_id'] for r in journal.pendentes(FECHAR) if r['chat_id'] == chat_id}
+        return [os for os in abertas if os['id'] not in fecho_pendente]
+    except ErroBancoDados:
+        raise
     except Exception as e:
         logging.error(f"Erro ao buscar OS abertas para o chat_id {chat_id}: {e}")
         return []
 
-def fechar_ordem_servico(os_id: int, chat_id: int, dados_fechamento: Dict[str, Any]) -> bool:
+@medir
+async def fechar_ordem_servico(os_id: int, chat_id: int, dados_fechamento: Dict[str, Any],
+                               data_abertura: str | None = None) -> bool:
     """
-    Atualiza uma OS com as informações de fecho.
+    Regista o fecho de uma OS no journal; a atualização no banco é feita em segundo plano.
+    `data_abertura` (da listagem de OS abertas) permite invalidar só os relatórios do dia
+    em que a OS foi aberta; sem ela, são invalidados todos os relatórios do utilizador.
     """
     try:
-        db = get_db()
         dados_fechamento['data_fechamento'] = datetime.now().isoformat()
-        db.table('ordens_servico').update(dados_fechamento).eq('id', os_id).eq('chat_id', chat_id).execute()
-        logging.info(f"OS ID {os_id} fechada com sucesso pelo chat_id {chat_id}.")
+        await executar_em_thread(lambda: journal.registar(
+            FECHAR, os_id=os_id, chat_id=chat_id, data_abertura=data_abertura, dados=dados_fechamento
+        ))
+        journal.sinalizar()
+        indice_os_abertas.remover(chat_id, os_id)
+        logging.info(f"Fecho da OS ID {os_id} registado no journal pelo chat_id {chat_id}.")
         return True
     except Exception as e:
         logging.error(f"Falha ao fechar a OS ID {os_id}: {e}")
         return False
 
-def buscar_os_por_periodo(chat_id: int, data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
+def limpar_caches_locais() -> None:
+    """
+    Esquece os perfis, as OS abertas e os relatórios guardados em memória. No modo distribuído,
+    os chats que um trabalhador recebe quando o anel muda podem ter sido alterados por outro.
+    """
+    cache_perfis.limpar()
+    indice_os_abertas.limpar()
+    cache_relatorios.limpar()
+
+# --- Descarga do Journal ---
+
+def _falha_permanente(erro: BaseException) -> bool:
+    """Indica se repetir a escrita não adianta (ex.: restrição violada), ao contrário de uma falha de rede."""
+    if isinstance(erro, ErroBancoDados):
+        return not erro.transitorio
+    return not erro_transitorio(erro)
+
+def _mover_para_quarentena(registo: Dict[str, Any], erro: BaseException) -> None:
+    journal.quarentena(registo, str(erro))
+    journal_quarentena.incrementar(tipo=registo['tipo'])
+    chat_id = registo.get('chat_id') or registo['dados'].get('chat_id')
+    logging.error(
+        f"Journal: escrita '{registo['tipo']}' {registo['chave']} (chat_id {chat_id}) recusada pelo banco "
+        f"e movida para {journal.caminho_quarentena}: {erro}"
+    )
+
+def _aplicar_criacoes(repositorio, lote: List[Dict[str, Any]]) -> int:
+    """
+    Insere um lote de criações do journal. Se o banco recusar o lote de forma permanente,
+    divide-o ao meio até isolar a(s) OS recusada(s), que vão para a quarentena; as restantes
+    são inseridas. Uma falha transitória interrompe a descarga (os registos ficam pendentes).
+    """
+    linhas = [{**r['dados'], 'chave_idempotencia': r['chave']} for r in lote]
+    try:
+        inseridas = repositorio.inserir_ordens(linhas)
+    except Exception as e:
+        if not _falha_permanente(e):
+            raise
+        if len(lote) == 1:
+            _mover_para_quarentena(lote[0], e)
+            return 0
+        meio = len(lote) // 2
+        return _aplicar_criacoes(repositorio, lote[:meio]) + _aplicar_criacoes(repositorio, lote[meio:])
+    journal.confirmar([r['chave'] for r in lote])
+    # Só agora as OS têm id e podem ser escolhidas no fecho.
+    for ordem in inseridas:
+        indice_os_abertas.adicionar(ordem['chat_id'], ordem)
+    for linha in linhas:
+        cache_relatorios.invalidar(linha['chat_id'], linha['data_abertura'][:10])
+    return len(lote)
+
+def _aplicar_fecho(repositorio, registo: Dict[str, Any]) -> int:
+    try:
+        repositorio.atualizar_ordem(registo['os_id'], registo['chat_id'], registo['dados'])
+    except Exception as e:
+        if not _falha_permanente(e):
+            raise
+        _mover_para_quarentena(registo, e)
+        return 0
+    journal.confirmar([registo['chave']])
+    data_abertura = registo.get('data_abertura')
+    cache_relatorios.invalidar(registo['chat_id'], data_abertura[:10] if data_abertura else None)
+    return 1
+
+def _aplicar_escritas_pendentes() -> Tuple[int, BaseException | None]:
     """
-    Busca todas as ordens de serviço de um usuário dentro de um intervalo de datas.
+    Envia ao banco as escritas pendentes do journal e confirma as que forem aplicadas.
+    As criações vão em lotes de inserção; a chave de idempotência (UNIQUE) faz com
+    que uma OS já inserida numa tentativa anterior seja ignorada em vez de duplicada.
+    Os fechos são atualizações e podem ser repetidos sem efeitos adicionais; são
+    enviados mesmo que as criações falhem (referem OS que já estão no banco).
+    Os registos recusados de forma permanente vão para a quarentena.
+    Cada escrita aplicada invalida os relatórios em cache que a incluem; as OS inseridas
+    entram no índice de OS abertas.
+    Retorna o número de escritas aplicadas e a falha transitória que interrompeu a descarga (ou None).
     """
+    with _lock_descarga:
+        repositorio = get_repositorio()
+        aplicadas = 0
+        falha: BaseException | None = None
+
+        criacoes = journal.pendentes(CRIAR)
+        try:
+            for i in range(0, len(criacoes), JOURNAL_LOTE):
+                aplicadas += _aplicar_criacoes(repositorio, criacoes[i:i + JOURNAL_LOTE])
+        except Exception as e:
+            falha = e
+
+        try:
+            for registo in journal.pendentes(FECHAR):
+                aplicadas += _aplicar_fecho(repositorio, registo)
+        except Exception as e:
+            falha = falha or e
+
+        return aplicadas, falha
+
+@medir
+async def descarregar_journal() -> int:
+    """Tenta enviar o journal ao banco. Retorna o número de escritas aplicadas."""
     try:
-        db = get_db()
-        start_date_obj = datetime.strptime(data_inicio, '%Y-%m-%d')
-        end_date_obj = datetime.strptime(data_fim, '%Y-%m-%d')
-        
-        next_day_obj = end_date_obj + timedelta(days=1)
-        
-        start_date_iso = start_date_obj.isoformat()
-        next_day_iso = next_day_obj.isoformat()
+        aplicadas, falha = await executar_em_thread(_aplicar_escritas_pendentes)
+    except Exception as e:
+        logging.error(f"Journal: erro inesperado na descarga: {e}")
+        return 0
+    if aplicadas:
+        logging.info(f"Journal: {aplicadas} escrita(s) aplicada(s) no banco.")
+    if falha is not None:
+        logging.warning(f"Journal: falha ao enviar escritas ao banco, nova tentativa em breve ({falha}). Backlog: {journal.metricas()}")
+    return aplicadas
 
-        response = (
-            db.table('ordens_servico')
-            .select('*')
-            .eq('chat_id', chat_id)
-            .gte('data_abertura', start_date_iso)
-            .lt('data_abertura', next_day_iso)
-            .order('data_abertura', desc=False)
-            .execute()
-        )
-        return response.data if response.data else []
+async def ciclo_descarga_journal() -> None:
+    """
+    Tarefa de segundo plano: descarrega o journal assim que há novas escritas
+    e, enquanto houver pendentes (ex.: sem rede), tenta de novo a cada JOURNAL_INTERVALO segundos.
+    """
+    while True:
+        await descarregar_journal()
+        atualizar_metricas_journal()
+        await journal.aguardar_trabalho(JOURNAL_INTERVALO)
+
+def atualizar_metricas_journal() -> None:
+    """Publica em /metricas o tamanho e a idade do backlog, também no modo polling (sem GET /saude)."""
+    metricas = journal.metricas()
+    journal_pendentes.definir(metricas['pendentes'])
+    journal_idade_segundos.definir(metricas['idade_mais_antiga_s'])
+
+@medir
+async def existe_os_no_periodo(chat_id: int, data_inicio: str, data_fim: str) -> bool:
+    """Verifica, com uma consulta mínima, se o usuário tem alguma OS no intervalo. Lança ErroBancoDados se o banco falhar."""
+    try:
+        start_date_iso, next_day_iso = intervalo_iso(data_inicio, data_fim)
+        return await executar_em_thread(get_repositorio().existe_ordem_periodo, chat_id, start_date_iso, next_day_iso)
+    except ErroBancoDados:
+        raise
     except Exception as e:
-        logging.error(f"Erro ao buscar OS por período para o chat_id {chat_id}: {e}")
+        logging.error(f"Erro ao verificar OS por período para o chat_id {chat_id}: {e}")
+        return False
+
+@medir
+async def resumo_setor(setor: str, data_inicio: str, data_fim: str) -> List[Dict[str, Any]] | None:
+    """
+    Totais das OS do setor no intervalo, por técnico e tipo de manutenção, agregados no banco.
+    Retorna None em caso de erro, para distinguir de um setor sem OS ([]).
+    """
+    try:
+        start_date_iso, next_day_iso = intervalo_iso(data_inicio, data_fim)
+        return await executar_em_thread(get_repositorio().resumo_setor, setor, start_date_iso, next_day_iso)
+    except Exception as e:
+        logging.error(f"Erro ao agregar as OS do setor {setor}: {e}")
+        return None
+
+@medir
+async def historico_maquina(numero_maquina: str, antes: Cursor | None, limite: int) -> List[Dict[str, Any]] | None:
+    """Uma página do histórico de OS da máquina, da mais recente para a mais antiga. None em caso de erro."""
+    try:
+        return await executar_em_thread(get_repositorio().pagina_ordens_maquina, numero_maquina, antes, limite)
+    except Exception as e:
+        logging.error(f"Erro ao buscar o histórico da máquina {numero_maquina}: {e}")
+        return None
+
+@medir
+async def estatisticas_maquina(numero_maquina: str) -> Dict[str, Any] | None:
+    """MTTR, MTBF e totais por tipo de manutenção de todas as OS da máquina. None em caso de erro."""
+    try:
+        return await executar_em_thread(lambda: calcular_estatisticas_maquina(iterar_os_maquina(numero_maquina)))
+    except Exception as e:
+        logging.error(f"Erro ao calcular as estatísticas da máquina {numero_maquina}: {e}")
+        return None
+
+@medir
+async def exportar_ordens(data_inicio: str, data_fim: str, formato: str, destino: str) -> int | None:
+    """
+    Escreve em `destino` todas as OS abertas no intervalo (de todos os técnicos), no `formato`
+    de utils/exportacao.py. Retorna o número de OS exportadas, ou None em caso de erro.
+    """
+    try:
+        _, escrever = FORMATOS[formato]
+        return await executar_em_thread(lambda: escrever(iterar_os_exportacao(data_inicio, data_fim), destino))
+    except Exception as e:
+        logging.error(f"Erro ao exportar as OS de {data_inicio} a {data_fim} ({formato}): {e}")
+        return None
+
+# --- Assinaturas de Relatórios ---
+
+@medir
+async def listar_assinaturas(chat_id: int | None = None) -> List[Dict[str, Any]]:
+    """Assinaturas de relatórios periódicos: todas, ou apenas as de um utilizador. Lança ErroBancoDados se o banco falhar."""
+    try:
+        return await executar_em_thread(get_repositorio().listar_assinaturas, chat_id)
+    except ErroBancoDados:
+        raise
+    except Exception as e:
+        logging.error(f"Erro ao listar as assinaturas de relatórios: {e}")
         return []
+
+@medir
+async def guardar_assinatura(chat_id: int, frequencia: str, layout: str) -> bool:
+    try:
+        await executar_em_thread(get_repositorio().guardar_assinatura, chat_id, frequencia, layout)
+        logging.info(f"Assinatura de relatório {frequencia} guardada para o chat_id {chat_id}.")
+        return True
+    except Exception as e:
+        logging.error(f"Falha ao guardar a assinatura {frequencia} do chat_id {chat_id}: {e}")
+        return False
+
+@medir
+async def remover_assinatura(chat_id: int, frequencia: str) -> bool:
+    try:
+        await executar_em_thread(get_repositorio().remover_assinatura, chat_id, frequencia)
+        return True
+    except Exception as e:
+        logging.error(f"Falha ao remover a assinatura {frequencia} do chat_id {chat_id}: {e}")
+        return False
+
+def iterar_os_maquina(numero_maquina: str, tamanho_pagina: int = OS_TAMANHO_PAGINA) -> Iterator[Dict[str, Any]]:
+    """Percorre todas as OS da máquina, página a página, da mais recente para a mais antiga."""
+    repositorio = get_repositorio()
+    return paginar(lambda antes, limite: repositorio.pagina_ordens_maquina(numero_maquina, antes, limite), tamanho_pagina)
+
+def iterar_os_exportacao(data_inicio: str, data_fim: str, tamanho_pagina: int = EXPORTACAO_TAMANHO_PAGINA) -> Iterator[Dict[str, Any]]:
+    """Percorre as OS de todos os técnicos no intervalo, página a página, por ordem de abertura."""
+    repositorio = get_repositorio()
+    start_date_iso, next_day_iso = intervalo_iso(data_inicio, data_fim)
+    return paginar(
+        lambda apos, limite: repositorio.pagina_ordens_exportacao(start_date_iso, next_day_iso, apos, limite),
+        tamanho_pagina,
+    )
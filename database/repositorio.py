@@ -0,0 +1,276 @@
+"""
+Interface de acesso aos dados (utilizadores e ordens de serviço).
+
+database/models.py só fala com esta interface, nunca diretamente com o
+Supabase, para que o bot possa correr com outro armazenamento: o SQLite
+local (rede isolada da fábrica, testes de carga) ou o Supabase na nuvem.
+
+Todos os métodos são bloqueantes; models.py chama-os no pool de threads
+do banco de dados (executar_em_thread). As datas são strings ISO 8601.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Colunas de ordens_servico usadas nos relatórios (todas exceto chat_id).
+COLUNAS_RELATORIO = (
+    'id', 'numero_maquina', 'modelo_maquina', 'tipo_manutencao', 'problema_apresentado',
+    'data_abertura', 'data_fechamento', 'solucao_aplicada', 'substituir_peca',
+    'descricao_peca', 'tag_peca', 'servico_concluido', 'observacao',
+)
+
+# Colunas das OS inseridas devolvidas por inserir_ordens (para o índice de OS abertas).
+COLUNAS_INSERIDAS = ('id', 'chat_id', 'numero_maquina', 'data_abertura')
+
+# Colunas de ordens_servico lidas no relatório de setor; a consulta junta ainda o 'nome' do técnico.
+COLUNAS_SETOR = (
+    'id', 'chat_id', 'numero_maquina', 'tipo_manutencao', 'data_abertura', 'data_fechamento', 'servico_concluido',
+)
+
+# Colunas do histórico de uma máquina.
+COLUNAS_MAQUINA = (
+    'id', 'chat_id', 'modelo_maquina', 'tipo_manutencao', 'problema_apresentado', 'solucao_aplicada',
+    'data_abertura', 'data_fechamento', 'servico_concluido',
+)
+
+# Colunas de ordens_servico exportadas por /exportar; a consulta junta ainda o 'nome' e o 'setor' do técnico.
+COLUNAS_EXPORTACAO = ('id', 'chat_id') + COLUNAS_RELATORIO[1:]
+
+# Tipo de manutenção que corresponde a uma avaria (usado no MTBF).
+TIPO_AVARIA = 'Corretiva'
+
+# Métodos da interface que só leem dados e podem ser repetidos sem efeitos (ver database/resiliencia.py).
+OPERACOES_LEITURA = frozenset({
+    'buscar_usuario', 'buscar_usuarios', 'existe_matricula', 'listar_ordens_abertas', 'listar_ordens_abertas_lote',
+    'existe_ordem_periodo', 'pagina_ordens_periodo', 'pagina_ordens_setor', 'resumo_setor',
+    'pagina_ordens_maquina', 'pagina_ordens_exportacao', 'listar_assinaturas',
+})
+
+# Posição (data_abertura, id) da última OS lida, para a paginação por chave.
+Cursor = Tuple[str, int]
+
+
+def intervalo_iso(data_inicio: str, data_fim: str) -> Tuple[str, str]:
+    """Converte datas 'YYYY-MM-DD' no intervalo [início, dia seguinte ao fim) em ISO."""
+    inicio = datetime.strptime(data_inicio, '%Y-%m-%d')
+    fim = datetime.strptime(data_fim, '%Y-%m-%d') + timedelta(days=1)
+    return inicio.isoformat(), fim.isoformat()
+
+
+def cursor_da_linha(linha: Dict[str, Any]) -> Cursor:
+    return linha['data_abertura'], linha['id']
+
+
+def paginar(pagina: Callable[[Cursor | None, int], List[Dict[str, Any]]], tamanho_pagina: int,
+            cursor: Callable[[Dict[str, Any]], Cursor] = cursor_da_linha) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre uma consulta página a página. `pagina(cursor, limite)` retorna até `limite` linhas
+    a seguir ao cursor (None na primeira página), que é lido da última linha com `cursor`.
+    É paginação por chave em vez de OFFSET, por isso cada página custa o mesmo
+    independentemente da posição, e só uma página fica em memória.
+    """
+    apos: Cursor | None = None
+    while True:
+        linhas = pagina(apos, tamanho_pagina)
+        yield from linhas
+        if len(linhas) < tamanho_pagina:
+            return
+        apos = cursor(linhas[-1])
+
+
+def iterar_ordens_periodo(repositorio: 'Repositorio', chat_id: int, data_inicio: str, data_fim: str,
+                          tamanho_pagina: int) -> Iterator[Dict[str, Any]]:
+    """Percorre as OS de um utilizador entre as datas 'YYYY-MM-DD', por ordem de abertura."""
+    inicio, fim = intervalo_iso(data_inicio, data_fim)
+    return paginar(lambda apos, limite: repositorio.pagina_ordens_periodo(chat_id, inicio, fim, apos, limite),
+                   tamanho_pagina)
+
+
+def agrupar_por(registos: Iterable[Dict[str, Any]], campo: str) -> Dict[Any, list]:
+    """Agrupa uma lista de registos pelo valor de `campo` (usado nas consultas em lote)."""
+    grupos: Dict[Any, list] = {}
+    for registo in registos:
+        grupos.setdefault(registo[campo], []).append(registo)
+    return grupos
+
+
+def agregar_resumo_setor(ordens: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Agregação local, numa única passagem, equivalente à de resumo_setor no banco:
+    uma linha por (técnico, tipo de manutenção) com os totais e as horas de reparação.
+    """
+    grupos: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    for ordem in ordens:
+        chave = (ordem['chat_id'], ordem['nome'], ordem['tipo_manutencao'])
+        grupo = grupos.get(chave)
+        if grupo is None:
+            grupo = grupos[chave] = {
+                'chat_id': chave[0], 'nome': chave[1], 'tipo_manutencao': chave[2],
+                'total': 0, 'fechadas': 0, 'concluidas': 0, 'horas_reparacao': 0.0,
+            }
+        grupo['total'] += 1
+        if ordem.get('servico_concluido'):
+            grupo['concluidas'] += 1
+        if ordem.get('data_fechamento'):
+            grupo['fechadas'] += 1
+            duracao = datetime.fromisoformat(ordem['data_fechamento']) - datetime.fromisoformat(ordem['data_abertura'])
+            grupo['horas_reparacao'] += duracao.total_seconds() / 3600
+    return sorted(grupos.values(), key=lambda g: (g['nome'], g['tipo_manutencao']))
+
+
+def calcular_estatisticas_maquina(ordens: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Estatísticas de uma máquina numa única passagem pelas suas OS, da mais recente para a mais antiga
+    (a ordem de pagina_ordens_maquina), sem guardar a lista em memória:
+    - MTTR: tempo médio de reparação (abertura -> fecho) das OS fechadas, em horas;
+    - MTBF: tempo médio de funcionamento entre avarias (fecho de uma OS corretiva -> abertura
+      da corretiva seguinte), em horas;
+    - por tipo de manutenção: número de OS, fechadas e MTTR.
+    """
+    total = abertas = 0
+    horas_reparacao = 0.0
+    reparacoes = 0
+    horas_entre_avarias = 0.0
+    intervalos = 0
+    abertura_avaria_seguinte: datetime | None = None
+    por_tipo: Dict[str, Dict[str, Any]] = {}
+    primeira = ultima = None
+
+    for ordem in ordens:
+        total += 1
+        abertura = datetime.fromisoformat(ordem['data_abertura'])
+        ultima = ultima or abertura
+        primeira = abertura
+        tipo = por_tipo.setdefault(ordem['tipo_manutencao'], {'total': 0, 'fechadas': 0, 'horas_reparacao': 0.0})
+        tipo['total'] += 1
+
+        fecho = datetime.fromisoformat(ordem['data_fechamento']) if ordem.get('data_fechamento') else None
+        if fecho is None:
+            abertas += 1
+        else:
+            duracao = (fecho - abertura).total_seconds() / 3600
+            horas_reparacao += duracao
+            reparacoes += 1
+            tipo['fechadas'] += 1
+            tipo['horas_reparacao'] += duracao
+
+        if ordem['tipo_manutencao'] == TIPO_AVARIA:
+            if fecho is not None and abertura_avaria_seguinte is not None:
+                horas_entre_avarias += max(0.0, (abertura_avaria_seguinte - fecho).total_seconds() / 3600)
+                intervalos += 1
+            abertura_avaria_seguinte = abertura
+
+    for tipo in por_tipo.values():
+        tipo['mttr_horas'] = tipo['horas_reparacao'] / tipo['fechadas'] if tipo['fechadas'] else None
+    return {
+        'total': total,
+        'abertas': abertas,
+        'primeira_abertura': primeira.isoformat() if primeira else None,
+        'ultima_abertura': ultima.isoformat() if ultima else None,
+        'mttr_horas': horas_reparacao / reparacoes if reparacoes else None,
+        'mtbf_horas': horas_entre_avarias / intervalos if intervalos else None,
+        'por_tipo': dict(sorted(por_tipo.items(), key=lambda t: -t[1]['total'])),
+    }
+
+
+class Repositorio(ABC):
+    """Operações sobre as tabelas 'usuarios' e 'ordens_servico'."""
+
+    # --- Utilizadores ---
+
+    @abstractmethod
+    def buscar_usuario(self, chat_id: int) -> Dict[str, Any] | None:
+        """Perfil do utilizador, ou None se não estiver registado."""
+
+    @abstractmethod
+    def buscar_usuarios(self, chat_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Perfis de vários utilizadores numa só consulta, indexados por chat_id (só os registados)."""
+
+    @abstractmethod
+    def existe_matricula(self, cadastro_empresa: str) -> bool:
+        """Indica se a matrícula já pertence a algum utilizador."""
+
+    @abstractmethod
+    def inserir_usuario(self, usuario: Dict[str, Any]) -> None:
+        """Insere um utilizador. Falha se o chat_id ou a matrícula já existirem."""
+
+    # --- Ordens de Serviço ---
+
+    @abstractmethod
+    def inserir_ordens(self, ordens: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insere várias OS de uma só vez. As OS cuja 'chave_idempotencia' já
+        exista são ignoradas, por isso repetir o mesmo lote não cria duplicados.
+        Retorna as OS efetivamente inseridas, com 'id', 'chat_id', 'numero_maquina' e 'data_abertura'.
+        """
+
+    @abstractmethod
+    def atualizar_ordem(self, os_id: int, chat_id: int, dados: Dict[str, Any]) -> None:
+        """Atualiza uma OS do utilizador (não faz nada se ela não existir)."""
+
+    @abstractmethod
+    def listar_ordens_abertas(self, chat_id: int) -> List[Dict[str, Any]]:
+        """OS sem data_fechamento do utilizador, apenas com 'id', 'numero_maquina' e 'data_abertura'."""
+
+    @abstractmethod
+    def listar_ordens_abertas_lote(self, chat_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """OS abertas de vários utilizadores numa só consulta, com 'id', 'numero_maquina', 'data_abertura' e 'chat_id'."""
+
+    @abstractmethod
+    def existe_ordem_periodo(self, chat_id: int, inicio: str, fim: str) -> bool:
+        """Indica se o utilizador tem alguma OS aberta em [inicio, fim)."""
+
+    @abstractmethod
+    def pagina_ordens_periodo(self, chat_id: int, inicio: str, fim: str,
+                              apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        """
+        Até `limite` OS abertas em [inicio, fim), com as COLUNAS_RELATORIO, ordenadas
+        por (data_abertura, id) e estritamente a seguir ao cursor `apos`.
+        """
+
+    @abstractmethod
+    def pagina_ordens_setor(self, setor: str, inicio: str, fim: str,
+                            apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        """
+        Até `limite` OS abertas em [inicio, fim) por técnicos do `setor`, com as COLUNAS_SETOR
+        e o 'nome' do técnico, ordenadas por (data_abertura, id) e a seguir ao cursor `apos`.
+        """
+
+    @abstractmethod
+    def resumo_setor(self, setor: str, inicio: str, fim: str) -> List[Dict[str, Any]]:
+        """
+        Totais das OS abertas em [inicio, fim) pelos técnicos do `setor`, agregados no banco:
+        uma linha por (chat_id, nome, tipo_manutencao) com 'total', 'fechadas', 'concluidas'
+        e 'horas_reparacao' (soma das durações das OS fechadas, em horas).
+        """
+
+    @abstractmethod
+    def pagina_ordens_maquina(self, numero_maquina: str, antes: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        """
+        Até `limite` OS da máquina (de todos os técnicos), com as COLUNAS_MAQUINA, da mais
+        recente para a mais antiga por (data_abertura, id) e estritamente antes do cursor `antes`.
+        """
+
+    @abstractmethod
+    def pagina_ordens_exportacao(self, inicio: str, fim: str, apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        """
+        Até `limite` OS abertas em [inicio, fim) por todos os técnicos, com as COLUNAS_EXPORTACAO
+        e o 'nome' e 'setor' do técnico, ordenadas por (data_abertura, id) e a seguir ao cursor `apos`.
+        """
+
+    # --- Assinaturas de relatórios ---
+
+    @abstractmethod
+    def listar_assinaturas(self, chat_id: int | None = None) -> List[Dict[str, Any]]:
+        """Assinaturas de relatórios periódicos ('chat_id', 'frequencia', 'layout'); todas, ou só as de `chat_id`."""
+
+    @abstractmethod
+    def guardar_assinatura(self, chat_id: int, frequencia: str, layout: str) -> None:
+        """Cria a assinatura, ou atualiza o layout se o utilizador já tiver uma com esta frequência."""
+
+    @abstractmethod
+    def remover_assinatura(self, chat_id: int, frequencia: str) -> None:
+        """Remove a assinatura (não faz nada se ela não existir)."""
+
+    def fechar(self) -> None:
+        """Liberta as ligações ao armazenamento."""
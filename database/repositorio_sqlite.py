@@ -0,0 +1,285 @@
+"""
+Implementação do repositório sobre um ficheiro SQLite local.
+
+Reproduz o esquema e os índices do README (tabelas 'usuarios' e
+'ordens_servico'), para que o bot funcione sem acesso ao Supabase: numa
+rede isolada da fábrica ou em testes de carga.
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List
+
+from .repositorio import (
+    Repositorio, Cursor, COLUNAS_RELATORIO, COLUNAS_INSERIDAS, COLUNAS_SETOR, COLUNAS_MAQUINA,
+    COLUNAS_EXPORTACAO, agrupar_por
+)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER UNIQUE NOT NULL,
+    nome TEXT NOT NULL,
+    funcao TEXT NOT NULL,
+    nivel TEXT,
+    setor TEXT,
+    cadastro_empresa TEXT UNIQUE NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS ordens_servico (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL REFERENCES usuarios (chat_id) ON DELETE CASCADE,
+    numero_maquina TEXT NOT NULL,
+    modelo_maquina TEXT NOT NULL,
+    tipo_manutencao TEXT NOT NULL,
+    problema_apresentado TEXT NOT NULL,
+    data_abertura TEXT NOT NULL,
+    data_fechamento TEXT,
+    solucao_aplicada TEXT,
+    substituir_peca INTEGER,
+    descricao_peca TEXT,
+    tag_peca TEXT,
+    servico_concluido INTEGER,
+    observacao TEXT,
+    chave_idempotencia TEXT UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS assinaturas_relatorio (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL REFERENCES usuarios (chat_id) ON DELETE CASCADE,
+    frequencia TEXT NOT NULL,
+    layout TEXT NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    UNIQUE (chat_id, frequencia)
+);
+
+CREATE INDEX IF NOT EXISTS idx_os_data_abertura ON ordens_servico (data_abertura);
+CREATE INDEX IF NOT EXISTS idx_os_chat_id ON ordens_servico (chat_id);
+CREATE INDEX IF NOT EXISTS idx_os_chat_abertura_id ON ordens_servico (chat_id, data_abertura, id);
+CREATE INDEX IF NOT EXISTS idx_usuarios_setor ON usuarios (setor);
+CREATE INDEX IF NOT EXISTS idx_os_maquina_abertura_id ON ordens_servico (numero_maquina, data_abertura, id);
+CREATE INDEX IF NOT EXISTS idx_os_abertura_id ON ordens_servico (data_abertura, id);
+"""
+
+COLUNAS_USUARIO = ('chat_id', 'nome', 'funcao', 'nivel', 'setor', 'cadastro_empresa')
+COLUNAS_OS = (
+    'chat_id', 'numero_maquina', 'modelo_maquina', 'tipo_manutencao', 'problema_apresentado',
+    'data_abertura', 'data_fechamento', 'solucao_aplicada', 'substituir_peca', 'descricao_peca',
+    'tag_peca', 'servico_concluido', 'observacao', 'chave_idempotencia',
+)
+# O SQLite guarda BOOLEAN como 0/1; estas colunas voltam a ser bool na leitura.
+COLUNAS_BOOLEANAS = ('substituir_peca', 'servico_concluido')
+
+_SELECT_RELATORIO = ', '.join(COLUNAS_RELATORIO)
+_SELECT_MAQUINA = ', '.join(COLUNAS_MAQUINA)
+_SELECT_SETOR = ', '.join(f'o.{coluna}' for coluna in COLUNAS_SETOR) + ', u.nome'
+_SELECT_EXPORTACAO = ', '.join(f'o.{coluna}' for coluna in COLUNAS_EXPORTACAO) + ', u.nome, u.setor'
+
+
+def _validar_colunas(colunas: Iterable[str], permitidas: tuple) -> None:
+    # Os nomes de colunas entram no SQL, por isso só se aceitam os do esquema.
+    desconhecidas = set(colunas) - set(permitidas)
+    if desconhecidas:
+        raise ValueError(f"Colunas desconhecidas: {', '.join(sorted(desconhecidas))}")
+
+
+def _para_dict(linha: sqlite3.Row) -> Dict[str, Any]:
+    registo = dict(linha)
+    for coluna in COLUNAS_BOOLEANAS:
+        if registo.get(coluna) is not None:
+            registo[coluna] = bool(registo[coluna])
+    return registo
+
+
+class RepositorioSQLite(Repositorio):
+    """Uma ligação por thread do pool (o sqlite3 não partilha ligações entre threads)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._ligacoes: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._ligacao().executescript(ESQUEMA)
+
+    def _ligacao(self) -> sqlite3.Connection:
+        ligacao = getattr(self._local, 'ligacao', None)
+        if ligacao is None:
+            ligacao = sqlite3.connect(self.caminho, check_same_thread=False, isolation_level=None, timeout=30)
+            ligacao.row_factory = sqlite3.Row
+            ligacao.execute("PRAGMA journal_mode=WAL")
+            ligacao.execute("PRAGMA synchronous=NORMAL")
+            ligacao.execute("PRAGMA foreign_keys=ON")
+            self._local.ligacao = ligacao
+            with self._lock:
+                self._ligacoes.append(ligacao)
+        return ligacao
+
+    def _consultar(self, sql: str, parametros: tuple = ()) -> List[Dict[str, Any]]:
+        return [_para_dict(linha) for linha in self._ligacao().execute(sql, parametros).fetchall()]
+
+    # --- Utilizadores ---
+
+    def buscar_usuario(self, chat_id: int) -> Dict[str, Any] | None:
+        linhas = self._consultar("SELECT * FROM usuarios WHERE chat_id = ? LIMIT 1", (chat_id,))
+        return linhas[0] if linhas else None
+
+    def buscar_usuarios(self, chat_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        marcadores = ', '.join('?' * len(chat_ids))
+        linhas = self._consultar(f"SELECT * FROM usuarios WHERE chat_id IN ({marcadores})", tuple(chat_ids))
+        return {usuario['chat_id']: usuario for usuario in linhas}
+
+    def existe_matricula(self, cadastro_empresa: str) -> bool:
+        linha = self._ligacao().execute(
+            "SELECT 1 FROM usuarios WHERE cadastro_empresa = ? LIMIT 1", (cadastro_empresa,)
+        ).fetchone()
+        return linha is not None
+
+    def inserir_usuario(self, usuario: Dict[str, Any]) -> None:
+        _validar_colunas(usuario, COLUNAS_USUARIO)
+        colunas = list(usuario)
+        self._ligacao().execute(
+            f"INSERT INTO usuarios ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            tuple(usuario[c] for c in colunas),
+        )
+
+    # --- Ordens de Serviço ---
+
+    def inserir_ordens(self, ordens: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for ordem in ordens:
+            _validar_colunas(ordem, COLUNAS_OS)
+        sql = (
+            f"INSERT INTO ordens_servico ({', '.join(COLUNAS_OS)}) VALUES ({', '.join('?' * len(COLUNAS_OS))}) "
+            f"ON CONFLICT (chave_idempotencia) DO NOTHING RETURNING {', '.join(COLUNAS_INSERIDAS)}"
+        )
+        ligacao = self._ligacao()
+        ligacao.execute("BEGIN")
+        try:
+            # RETURNING não funciona com executemany; numa só transação, o custo por linha é pequeno.
+            inseridas = []
+            for ordem in ordens:
+                inseridas.extend(_para_dict(linha) for linha in ligacao.execute(sql, tuple(ordem.get(c) for c in COLUNAS_OS)))
+            ligacao.execute("COMMIT")
+            return inseridas
+        except Exception:
+            ligacao.execute("ROLLBACK")
+            raise
+
+    def atualizar_ordem(self, os_id: int, chat_id: int, dados: Dict[str, Any]) -> None:
+        _validar_colunas(dados, COLUNAS_OS)
+        atribuicoes = ', '.join(f"{coluna} = ?" for coluna in dados)
+        self._ligacao().execute(
+            f"UPDATE ordens_servico SET {atribuicoes} WHERE id = ? AND chat_id = ?",
+            (*dados.values(), os_id, chat_id),
+        )
+
+    def listar_ordens_abertas(self, chat_id: int) -> List[Dict[str, Any]]:
+        return self._consultar(
+            "SELECT id, numero_maquina, data_abertura FROM ordens_servico WHERE chat_id = ? AND data_fechamento IS NULL",
+            (chat_id,),
+        )
+
+    def listar_ordens_abertas_lote(self, chat_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        marcadores = ', '.join('?' * len(chat_ids))
+        linhas = self._consultar(
+            f"SELECT id, numero_maquina, data_abertura, chat_id FROM ordens_servico "
+            f"WHERE chat_id IN ({marcadores}) AND data_fechamento IS NULL",
+            tuple(chat_ids),
+        )
+        return agrupar_por(linhas, 'chat_id')
+
+    def existe_ordem_periodo(self, chat_id: int, inicio: str, fim: str) -> bool:
+        linha = self._ligacao().execute(
+            "SELECT 1 FROM ordens_servico WHERE chat_id = ? AND data_abertura >= ? AND data_abertura < ? LIMIT 1",
+            (chat_id, inicio, fim),
+        ).fetchone()
+        return linha is not None
+
+    def pagina_ordens_periodo(self, chat_id: int, inicio: str, fim: str,
+                              apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        if apos is None:
+            return self._consultar(
+                f"SELECT {_SELECT_RELATORIO} FROM ordens_servico "
+                "WHERE chat_id = ? AND data_abertura >= ? AND data_abertura < ? "
+                "ORDER BY data_abertura, id LIMIT ?",
+                (chat_id, inicio, fim, limite),
+            )
+        # Comparação de tuplos: usa o índice (chat_id, data_abertura, id) diretamente.
+        return self._consultar(
+            f"SELECT {_SELECT_RELATORIO} FROM ordens_servico "
+            "WHERE chat_id = ? AND data_abertura >= ? AND data_abertura < ? AND (data_abertura, id) > (?, ?) "
+            "ORDER BY data_abertura, id LIMIT ?",
+            (chat_id, inicio, fim, *apos, limite),
+        )
+
+    def pagina_ordens_setor(self, setor: str, inicio: str, fim: str,
+                            apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        sql = (
+            f"SELECT {_SELECT_SETOR} FROM ordens_servico o JOIN usuarios u ON u.chat_id = o.chat_id "
+            "WHERE u.setor = ? AND o.data_abertura >= ? AND o.data_abertura < ? "
+        )
+        parametros: tuple = (setor, inicio, fim)
+        if apos is not None:
+            sql += "AND (o.data_abertura, o.id) > (?, ?) "
+            parametros += tuple(apos)
+        return self._consultar(sql + "ORDER BY o.data_abertura, o.id LIMIT ?", parametros + (limite,))
+
+    def pagina_ordens_exportacao(self, inicio: str, fim: str, apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        # LEFT JOIN: uma OS cujo técnico já não existe continua a ser exportada, sem nome.
+        sql = (
+            f"SELECT {_SELECT_EXPORTACAO} FROM ordens_servico o LEFT JOIN usuarios u ON u.chat_id = o.chat_id "
+            "WHERE o.data_abertura >= ? AND o.data_abertura < ? "
+        )
+        # A data do cursor passa a ser o limite inferior: o SQLite só usa este limite para
+        # posicionar a leitura no índice, e com `inicio` cada página voltaria ao início do período.
+        parametros: tuple = (apos[0] if apos is not None else inicio, fim)
+        if apos is not None:
+            sql += "AND (o.data_abertura, o.id) > (?, ?) "
+            parametros += tuple(apos)
+        return self._consultar(sql + "ORDER BY o.data_abertura, o.id LIMIT ?", parametros + (limite,))
+
+    def resumo_setor(self, setor: str, inicio: str, fim: str) -> List[Dict[str, Any]]:
+        return self._consultar(
+            "SELECT o.chat_id, u.nome, o.tipo_manutencao, COUNT(*) AS total, "
+            "COUNT(o.data_fechamento) AS fechadas, "
+            "SUM(CASE WHEN o.servico_concluido THEN 1 ELSE 0 END) AS concluidas, "
+            "COALESCE(SUM((julianday(o.data_fechamento) - julianday(o.data_abertura)) * 24), 0) AS horas_reparacao "
+            "FROM ordens_servico o JOIN usuarios u ON u.chat_id = o.chat_id "
+            "WHERE u.setor = ? AND o.data_abertura >= ? AND o.data_abertura < ? "
+            "GROUP BY o.chat_id, u.nome, o.tipo_manutencao ORDER BY u.nome, o.tipo_manutencao",
+            (setor, inicio, fim),
+        )
+
+    def pagina_ordens_maquina(self, numero_maquina: str, antes: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        sql = f"SELECT {_SELECT_MAQUINA} FROM ordens_servico WHERE numero_maquina = ? "
+        parametros: tuple = (str(numero_maquina),)
+        if antes is not None:
+            sql += "AND (data_abertura, id) < (?, ?) "
+            parametros += tuple(antes)
+        return self._consultar(sql + "ORDER BY data_abertura DESC, id DESC LIMIT ?", parametros + (limite,))
+
+    # --- Assinaturas de relatórios ---
+
+    def listar_assinaturas(self, chat_id: int | None = None) -> List[Dict[str, Any]]:
+        if chat_id is None:
+            return self._consultar("SELECT chat_id, frequencia, layout FROM assinaturas_relatorio ORDER BY id")
+        return self._consultar(
+            "SELECT chat_id, frequencia, layout FROM assinaturas_relatorio WHERE chat_id = ? ORDER BY id", (chat_id,)
+        )
+
+    def guardar_assinatura(self, chat_id: int, frequencia: str, layout: str) -> None:
+        self._ligacao().execute(
+            "INSERT INTO assinaturas_relatorio (chat_id, frequencia, layout) VALUES (?, ?, ?) "
+            "ON CONFLICT (chat_id, frequencia) DO UPDATE SET layout = excluded.layout",
+            (chat_id, frequencia, layout),
+        )
+
+    def remover_assinatura(self, chat_id: int, frequencia: str) -> None:
+        self._ligacao().execute(
+            "DELETE FROM assinaturas_relatorio WHERE chat_id = ? AND frequencia = ?", (chat_id, frequencia)
+        )
+
+    def fechar(self) -> None:
+        with self._lock:
+            for ligacao in self._ligacoes:
+                ligacao.close()
+            self._ligacoes.clear()
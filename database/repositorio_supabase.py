@@ -0,0 +1,184 @@
+"""Implementação do repositório sobre o Supabase (PostgREST)."""
+from typing import Any, Dict, List
+
+from postgrest.exceptions import APIError
+from supabase import Client
+
+from config import logging, OS_TAMANHO_PAGINA
+from .repositorio import (
+    Repositorio, Cursor, COLUNAS_RELATORIO, COLUNAS_INSERIDAS, COLUNAS_SETOR, COLUNAS_MAQUINA,
+    COLUNAS_EXPORTACAO, agrupar_por, agregar_resumo_setor, paginar
+)
+
+_SELECT_RELATORIO = ', '.join(COLUNAS_RELATORIO)
+_SELECT_MAQUINA = ', '.join(COLUNAS_MAQUINA)
+# "usuarios!inner" junta o técnico de cada OS (pela chave estrangeira chat_id) e exclui as OS sem correspondência.
+_SELECT_SETOR = ', '.join(COLUNAS_SETOR) + ', usuarios!inner(nome)'
+# Sem "!inner": as OS de técnicos que já não existem também são exportadas.
+_SELECT_EXPORTACAO = ', '.join(COLUNAS_EXPORTACAO) + ', usuarios(nome, setor)'
+# Código do PostgREST para uma função RPC que não existe no banco.
+_RPC_INEXISTENTE = 'PGRST202'
+
+
+class RepositorioSupabase(Repositorio):
+
+    def __init__(self, cliente: Client):
+        self.cliente = cliente
+
+    def _ordens(self):
+        return self.cliente.table('ordens_servico')
+
+    # --- Utilizadores ---
+
+    def buscar_usuario(self, chat_id: int) -> Dict[str, Any] | None:
+        # limit(1) em vez de single(): uma resposta vazia significa "não registado",
+        # enquanto uma exceção significa falha.
+        response = self.cliente.table('usuarios').select('*').eq('chat_id', chat_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def buscar_usuarios(self, chat_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        response = self.cliente.table('usuarios').select('*').in_('chat_id', chat_ids).execute()
+        return {usuario['chat_id']: usuario for usuario in response.data or []}
+
+    def existe_matricula(self, cadastro_empresa: str) -> bool:
+        response = (
+            self.cliente.table('usuarios')
+            .select('cadastro_empresa')
+            .eq('cadastro_empresa', cadastro_empresa)
+            .limit(1)
+            .execute()
+        )
+        return bool(response.data)
+
+    def inserir_usuario(self, usuario: Dict[str, Any]) -> None:
+        self.cliente.table('usuarios').insert(usuario).execute()
+
+    # --- Ordens de Serviço ---
+
+    def inserir_ordens(self, ordens: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Com ignore_duplicates, a resposta só traz as linhas realmente inseridas.
+        response = self._ordens().upsert(ordens, on_conflict='chave_idempotencia', ignore_duplicates=True).execute()
+        return [{coluna: linha.get(coluna) for coluna in COLUNAS_INSERIDAS} for linha in response.data or []]
+
+    def atualizar_ordem(self, os_id: int, chat_id: int, dados: Dict[str, Any]) -> None:
+        self._ordens().update(dados).eq('id', os_id).eq('chat_id', chat_id).execute()
+
+    def listar_ordens_abertas(self, chat_id: int) -> List[Dict[str, Any]]:
+        response = (
+            self._ordens()
+            .select('id, numero_maquina, data_abertura')
+            .eq('chat_id', chat_id)
+            .is_('data_fechamento', None)
+            .execute()
+        )
+        return response.data or []
+
+    def listar_ordens_abertas_lote(self, chat_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        response = (
+            self._ordens()
+            .select('id, numero_maquina, data_abertura, chat_id')
+            .in_('chat_id', chat_ids)
+            .is_('data_fechamento', None)
+            .execute()
+        )
+        return agrupar_por(response.data or [], 'chat_id')
+
+    def existe_ordem_periodo(self, chat_id: int, inicio: str, fim: str) -> bool:
+        response = (
+            self._ordens()
+            .select('id')
+            .eq('chat_id', chat_id)
+            .gte('data_abertura', inicio)
+            .lt('data_abertura', fim)
+            .limit(1)
+            .execute()
+        )
+        return bool(response.data)
+
+    def pagina_ordens_periodo(self, chat_id: int, inicio: str, fim: str,
+                              apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        query = (
+            self._ordens()
+            .select(_SELECT_RELATORIO)
+            .eq('chat_id', chat_id)
+            .gte('data_abertura', inicio)
+            .lt('data_abertura', fim)
+        )
+        if apos is not None:
+            # Continua a seguir à última linha lida: (data_abertura, id) > (última data, último id)
+            data, ultimo_id = apos
+            query = query.or_(f'data_abertura.gt."{data}",and(data_abertura.eq."{data}",id.gt.{ultimo_id})')
+        response = query.order('data_abertura').order('id').limit(limite).execute()
+        return response.data or []
+
+    def pagina_ordens_setor(self, setor: str, inicio: str, fim: str,
+                            apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        query = (
+            self._ordens()
+            .select(_SELECT_SETOR)
+            .eq('usuarios.setor', setor)
+            .gte('data_abertura', inicio)
+            .lt('data_abertura', fim)
+        )
+        if apos is not None:
+            data, ultimo_id = apos
+            query = query.or_(f'data_abertura.gt."{data}",and(data_abertura.eq."{data}",id.gt.{ultimo_id})')
+        response = query.order('data_abertura').order('id').limit(limite).execute()
+        linhas = response.data or []
+        for linha in linhas:
+            linha['nome'] = linha.pop('usuarios')['nome']
+        return linhas
+
+    def pagina_ordens_exportacao(self, inicio: str, fim: str, apos: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        query = self._ordens().select(_SELECT_EXPORTACAO).gte('data_abertura', inicio).lt('data_abertura', fim)
+        if apos is not None:
+            data, ultimo_id = apos
+            query = query.or_(f'data_abertura.gt."{data}",and(data_abertura.eq."{data}",id.gt.{ultimo_id})')
+        response = query.order('data_abertura').order('id').limit(limite).execute()
+        linhas = response.data or []
+        for linha in linhas:
+            usuario = linha.pop('usuarios') or {}
+            linha['nome'] = usuario.get('nome')
+            linha['setor'] = usuario.get('setor')
+        return linhas
+
+    def pagina_ordens_maquina(self, numero_maquina: str, antes: Cursor | None, limite: int) -> List[Dict[str, Any]]:
+        query = self._ordens().select(_SELECT_MAQUINA).eq('numero_maquina', str(numero_maquina))
+        if antes is not None:
+            data, ultimo_id = antes
+            query = query.or_(f'data_abertura.lt."{data}",and(data_abertura.eq."{data}",id.lt.{ultimo_id})')
+        response = query.order('data_abertura', desc=True).order('id', desc=True).limit(limite).execute()
+        return response.data or []
+
+    def resumo_setor(self, setor: str, inicio: str, fim: str) -> List[Dict[str, Any]]:
+        try:
+            # Função resumo_setor do README: a agregação é feita no Postgres e só os totais viajam.
+            response = self.cliente.rpc('resumo_setor', {'p_setor': setor, 'p_inicio': inicio, 'p_fim': fim}).execute()
+            return response.data or []
+        except APIError as e:
+            if e.code != _RPC_INEXISTENTE:
+                raise
+            logging.warning("Função resumo_setor não instalada no banco; a agregar localmente (ver README).")
+        return agregar_resumo_setor(paginar(
+            lambda apos, limite: self.pagina_ordens_setor(setor, inicio, fim, apos, limite), OS_TAMANHO_PAGINA
+        ))
+
+    # --- Assinaturas de relatórios ---
+
+    def _assinaturas(self):
+        return self.cliente.table('assinaturas_relatorio')
+
+    def listar_assinaturas(self, chat_id: int | None = None) -> List[Dict[str, Any]]:
+        query = self._assinaturas().select('chat_id, frequencia, layout')
+        if chat_id is not None:
+            query = query.eq('chat_id', chat_id)
+        response = query.order('id').execute()
+        return response.data or []
+
+    def guardar_assinatura(self, chat_id: int, frequencia: str, layout: str) -> None:
+        self._assinaturas().upsert(
+            {'chat_id': chat_id, 'frequencia': frequencia, 'layout': layout}, on_conflict='chat_id,frequencia'
+        ).execute()
+
+    def remover_assinatura(self, chat_id: int, frequencia: str) -> None:
+        self._assinaturas().delete().eq('chat_id', chat_id).eq('frequencia', frequencia).execute()
@@ -0,0 +1,160 @@
+"""
+Proteção das chamadas ao banco de dados: erros explícitos, novas tentativas
+e disjuntor (circuit breaker).
+
+Sem esta camada, uma falha passageira do Supabase chegava aos handlers como
+um resultado vazio ("utilizador não registado", "nenhuma OS encontrada").
+Agora, todas as exceções do repositório saem como ErroBancoDados e:
+
+    - as leituras (idempotentes) que falham por um erro transitório (rede,
+      timeout, gateway 5xx, SQLite bloqueado) são repetidas até
+      DB_TENTATIVAS vezes, com espera exponencial aleatória ("full jitter");
+    - DB_DISJUNTOR_FALHAS erros transitórios seguidos abrem o disjuntor:
+      durante DB_DISJUNTOR_ESPERA segundos as chamadas falham de imediato
+      (BancoIndisponivel), sem ocupar threads à espera de timeouts; depois
+      deixa passar uma chamada de teste e volta a fechar se ela tiver sucesso.
+
+As escritas não são repetidas aqui: as OS passam pelo journal, que já as
+reenvia até serem aceites.
+"""
+import functools
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+import httpx
+from postgrest.exceptions import APIError
+
+from config import logging
+from utils.metricas import registo
+from .repositorio import Repositorio, OPERACOES_LEITURA
+
+FECHADO, ABERTO, MEIO_ABERTO = 'fechado', 'aberto', 'meio_aberto'
+_VALOR_ESTADO = {FECHADO: 0, MEIO_ABERTO: 1, ABERTO: 2}
+
+# Respostas do PostgREST que indicam uma falha passageira (gateway, ligação ao Postgres, timeout da consulta).
+CODIGOS_TRANSITORIOS = frozenset({'500', '502', '503', '504', 'PGRST000', 'PGRST001', 'PGRST002', '57014', '57P01'})
+
+db_tentativas = registo.contador('kraflo_db_tentativas_total', 'Leituras repetidas após um erro transitório do banco.')
+db_falha_rapida = registo.contador('kraflo_db_falha_rapida_total', 'Chamadas recusadas com o disjuntor aberto.')
+db_disjuntor = registo.medidor('kraflo_db_disjuntor', 'Estado do disjuntor do banco (0 fechado, 1 meio aberto, 2 aberto).')
+
+
+class ErroBancoDados(Exception):
+    """O banco de dados não respondeu ou recusou a operação (não é um resultado vazio)."""
+
+    def __init__(self, operacao: str, transitorio: bool, causa: BaseException | None = None):
+        super().__init__(f"{operacao}: {causa}" if causa else operacao)
+        self.operacao = operacao
+        self.transitorio = transitorio
+
+
+class BancoIndisponivel(ErroBancoDados):
+    """Lançada sem contactar o banco, enquanto o disjuntor está aberto."""
+
+
+def erro_transitorio(erro: BaseException) -> bool:
+    if isinstance(erro, httpx.TransportError):
+        return True
+    if isinstance(erro, APIError):
+        return str(erro.code) in CODIGOS_TRANSITORIOS
+    if isinstance(erro, sqlite3.OperationalError):
+        return 'locked' in str(erro) or 'busy' in str(erro)
+    return False
+
+
+class Disjuntor:
+    """Disjuntor partilhado pelas threads do pool do banco."""
+
+    def __init__(self, limite_falhas: int, espera: float):
+        self.limite_falhas = limite_falhas
+        self.espera = espera
+        self.estado = FECHADO
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_curso = False
+        self._lock = threading.Lock()
+        db_disjuntor.definir(_VALOR_ESTADO[FECHADO])
+
+    def _mudar(self, estado: str) -> None:
+        if estado != self.estado:
+            logging.warning(f"Disjuntor do banco de dados: {self.estado} -> {estado}.")
+            self.estado = estado
+            db_disjuntor.definir(_VALOR_ESTADO[estado])
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.estado == FECHADO:
+                return True
+            if self.estado == ABERTO and time.monotonic() < self._aberto_ate:
+                return False
+            # Fim da espera: só uma chamada de teste passa de cada vez.
+            if self._teste_em_curso:
+                return False
+            self._mudar(MEIO_ABERTO)
+            self._teste_em_curso = True
+            return True
+
+    def sucesso(self) -> None:
+        with self._lock:
+            self._falhas = 0
+            self._teste_em_curso = False
+            self._mudar(FECHADO)
+
+    def falha(self) -> None:
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_curso = False
+            if self.estado == MEIO_ABERTO or self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.espera
+                self._mudar(ABERTO)
+
+    def concluido(self) -> None:
+        """Uma chamada de teste que terminou com um erro não transitório não decide nada."""
+        with self._lock:
+            self._teste_em_curso = False
+
+
+def _proteger(operacao: str, metodo: Callable, disjuntor: Disjuntor, tentativas: int,
+              espera_base: float, espera_max: float) -> Callable:
+    max_tentativas = tentativas if operacao in OPERACOES_LEITURA else 1
+
+    @functools.wraps(metodo)
+    def protegido(*args: Any, **kwargs: Any) -> Any:
+        for tentativa in range(1, max_tentativas + 1):
+            if not disjuntor.permitir():
+                db_falha_rapida.incrementar(operacao=operacao)
+                raise BancoIndisponivel(operacao, transitorio=True)
+            try:
+                resultado = metodo(*args, **kwargs)
+            except ErroBancoDados:
+                # Vinda de uma chamada interna do próprio repositório, já protegida.
+                disjuntor.concluido()
+                raise
+            except Exception as e:
+                if not erro_transitorio(e):
+                    disjuntor.concluido()
+                    raise ErroBancoDados(operacao, transitorio=False, causa=e) from e
+                disjuntor.falha()
+                if tentativa == max_tentativas:
+                    raise ErroBancoDados(operacao, transitorio=True, causa=e) from e
+                db_tentativas.incrementar(operacao=operacao)
+                # Corre numa thread do pool do banco, por isso a espera bloqueante não afeta o event loop.
+                time.sleep(random.uniform(0, min(espera_max, espera_base * 2 ** (tentativa - 1))))
+            else:
+                disjuntor.sucesso()
+                return resultado
+
+    return protegido
+
+
+def proteger_repositorio(repositorio: Any, disjuntor: Disjuntor, tentativas: int,
+                         espera_base: float, espera_max: float) -> Any:
+    """Aplica erros explícitos, novas tentativas (só leituras) e o disjuntor a cada método da interface."""
+    for operacao in Repositorio.__abstractmethods__:
+        setattr(repositorio, operacao, _proteger(
+            operacao, getattr(repositorio, operacao), disjuntor, tentativas, espera_base, espera_max
+        ))
+    return repositorio
@@ -0,0 +1,234 @@
+# kraflo/handlers/assinatura_handler.py
+"""
+Relatórios periódicos por assinatura.
+
+Com /assinar, o utilizador pede o relatório do dia anterior (diário), da
+semana anterior (semanal, às segundas-feiras) ou do mês anterior (mensal,
+no dia 1). Os relatórios do dia são pré-gerados de madrugada, fora da hora
+de ponta, e ficam no cache de relatórios; de manhã são entregues a partir
+do cache. Tanto a geração como a entrega são espalhadas aleatoriamente por
+uma janela de tempo, para não sobrecarregar o banco nem a API do Telegram,
+e só RELATORIOS_AGENDADOS_CONCORRENCIA relatórios são gerados de cada vez.
+"""
+import asyncio
+import calendar
+import random
+from datetime import date, datetime, time, timedelta, tzinfo
+from zoneinfo import ZoneInfo
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, CallbackContext
+
+from config import (
+    logging, RELATORIOS_AGENDADOS_HORA, RELATORIOS_AGENDADOS_ENTREGA, FUSO_HORARIO,
+    RELATORIOS_AGENDADOS_JITTER, RELATORIOS_AGENDADOS_JITTER_ENTREGA, RELATORIOS_AGENDADOS_CONCORRENCIA
+)
+from database.models import (
+    buscar_usuario_por_id, existe_os_no_periodo, listar_assinaturas, guardar_assinatura, remover_assinatura
+)
+from utils.cache_relatorios import cache_relatorios, ChaveRelatorio
+from utils.distribuicao import chat_local
+from utils.fila_relatorios import fila_relatorios, FilaCheia, RenderizacaoExpirada
+from utils.pdf_generator import gerar_relatorio_periodo_pdf, LAYOUT_RESUMO, LAYOUT_DETALHADO
+from .report_handler import enviar_pdf_em_cache
+
+FREQUENCIAS = {'diario': 'Diário', 'semanal': 'Semanal', 'mensal': 'Mensal'}
+LAYOUTS = (LAYOUT_RESUMO, LAYOUT_DETALHADO)
+
+# Uma entrega que encontre a fila de relatórios cheia é repetida mais tarde, até este número de vezes.
+MAX_TENTATIVAS_ENTREGA = 3
+ESPERA_NOVA_TENTATIVA = 300
+
+_vagas: asyncio.Semaphore | None = None
+
+
+def fuso_horario() -> tzinfo:
+    return ZoneInfo(FUSO_HORARIO) if FUSO_HORARIO else datetime.now().astimezone().tzinfo
+
+
+def periodo_devido(frequencia: str, hoje: date) -> tuple[str, str] | None:
+    """Período ('YYYY-MM-DD', 'YYYY-MM-DD') a enviar hoje para a frequência, ou None se hoje não há envio."""
+    if frequencia == 'diario':
+        ontem = hoje - timedelta(days=1)
+        return ontem.isoformat(), ontem.isoformat()
+    if frequencia == 'semanal' and hoje.weekday() == 0:
+        return (hoje - timedelta(days=7)).isoformat(), (hoje - timedelta(days=1)).isoformat()
+    if frequencia == 'mensal' and hoje.day == 1:
+        ultimo = hoje - timedelta(days=1)
+        return ultimo.replace(day=1).isoformat(), ultimo.isoformat()
+    return None
+
+
+# <<< --- COMANDOS --- >>>
+
+def _teclado_frequencias() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(nome, callback_data=f"assinar:{frequencia}")] for frequencia, nome in FREQUENCIAS.items()]
+    )
+
+async def assinar(update: Update, context: CallbackContext):
+    """/assinar [diario|semanal|mensal] [resumo|detalhado]; sem argumentos, mostra as opções."""
+    chat_id = update.effective_chat.id
+    if not await buscar_usuario_por_id(chat_id):
+        await update.message.reply_text("Você precisa estar registrado para assinar relatórios. Use /start para se registrar.")
+        return
+    if not context.args:
+        await update.message.reply_text("Com que frequência deseja receber o relatório?", reply_markup=_teclado_frequencias())
+        return
+
+    frequencia = context.args[0].lower()
+    layout = context.args[1].lower() if len(context.args) > 1 else LAYOUT_RESUMO
+    if frequencia not in FREQUENCIAS or layout not in LAYOUTS:
+        await update.message.reply_text("❌ Use /assinar diario|semanal|mensal [resumo|detalhado].")
+        return
+    await update.message.reply_text(await _guardar(chat_id, frequencia, layout))
+
+async def assinar_botao(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+    frequencia = query.data.split(':', 1)[1]
+    if frequencia not in FREQUENCIAS:
+        return
+    await query.edit_message_text(await _guardar(update.effective_chat.id, frequencia, LAYOUT_RESUMO))
+
+async def _guardar(chat_id: int, frequencia: str, layout: str) -> str:
+    if not await guardar_assinatura(chat_id, frequencia, layout):
+        return "❌ Não foi possível guardar a assinatura. Tente novamente mais tarde."
+    return f"✅ Assinatura do relatório {FREQUENCIAS[frequencia].lower()} ({layout}) ativa. Use /assinaturas para a gerir."
+
+async def assinaturas(update: Update, context: CallbackContext):
+    """/assinaturas: lista as assinaturas do utilizador, com um botão para cancelar cada uma."""
+    lista = await listar_assinaturas(update.effective_chat.id)
+    if not lista:
+        await update.message.reply_text("Não tem relatórios assinados. Use /assinar para receber relatórios periódicos.")
+        return
+    linhas = [f"• {FREQUENCIAS.get(a['frequencia'], a['frequencia'])} ({a['layout']})" for a in lista]
+    teclado = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"❌ Cancelar {FREQUENCIAS.get(a['frequencia'], a['frequencia']).lower()}",
+                              callback_data=f"desassinar:{a['frequencia']}")]
+        for a in lista
+    ])
+    await update.message.reply_text("Os seus relatórios assinados:\n" + "\n".join(linhas), reply_markup=teclado)
+
+async def desassinar_botao(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+    frequencia = query.data.split(':', 1)[1]
+    if await remover_assinatura(update.effective_chat.id, frequencia):
+        await query.edit_message_text(f"Assinatura do relatório {FREQUENCIAS.get(frequencia, frequencia).lower()} cancelada.")
+    else:
+        await query.edit_message_text("❌ Não foi possível cancelar a assinatura. Tente novamente mais tarde.")
+
+
+# <<< --- TRABALHOS AGENDADOS --- >>>
+
+async def _assinaturas_devidas() -> list[tuple[dict, tuple[str, str]]]:
+    hoje = datetime.now(fuso_horario()).date()
+    devidas = []
+    for assinatura in await listar_assinaturas():
+        # No modo distribuído, cada assinatura é tratada só pelo trabalhador dono do chat.
+        if not chat_local(assinatura['chat_id']):
+            continue
+        periodo = periodo_devido(assinatura['frequencia'], hoje)
+        if periodo:
+            devidas.append((assinatura, periodo))
+    return devidas
+
+def _agendar_espalhado(context: CallbackContext, callback, devidas: list, janela: float, **extra) -> None:
+    for assinatura, periodo in devidas:
+        context.job_queue.run_once(
+            callback, when=random.uniform(0, janela),
+            data={'assinatura': assinatura, 'periodo': periodo, **extra},
+            name=f"{callback.__name__}:{assinatura['chat_id']}:{assinatura['frequencia']}",
+        )
+
+async def pre_gerar_relatorios(context: CallbackContext) -> None:
+    """Trabalho diário (de madrugada): agenda a geração dos relatórios devidos hoje."""
+    devidas = await _assinaturas_devidas()
+    logging.info(f"Relatórios agendados: {len(devidas)} a pré-gerar.")
+    _agendar_espalhado(context, gerar_assinatura, devidas, RELATORIOS_AGENDADOS_JITTER,
+                       entregar=not RELATORIOS_AGENDADOS_ENTREGA)
+
+async def entregar_relatorios(context: CallbackContext) -> None:
+    """Trabalho diário (de manhã): agenda a entrega dos relatórios devidos hoje."""
+    devidas = await _assinaturas_devidas()
+    logging.info(f"Relatórios agendados: {len(devidas)} a entregar.")
+    _agendar_espalhado(context, gerar_assinatura, devidas, RELATORIOS_AGENDADOS_JITTER_ENTREGA, entregar=True)
+
+async def _obter_pdf(chat_id: int, layout: str, data_inicio: str, data_fim: str) -> tuple[ChaveRelatorio, bytes, str | None] | None:
+    """O PDF do período, do cache ou gerado agora (e guardado no cache). None se não houver OS."""
+    global _vagas
+    chave: ChaveRelatorio = (chat_id, data_inicio, data_fim, layout, False)
+    entrada = cache_relatorios.obter(chave)
+    if entrada is not None:
+        return chave, entrada.pdf, entrada.file_id
+
+    if _vagas is None:
+        _vagas = asyncio.Semaphore(RELATORIOS_AGENDADOS_CONCORRENCIA)
+    async with _vagas:
+        geracao = cache_relatorios.geracao(chat_id)
+        usuario, existem_ordens = await asyncio.gather(
+            buscar_usuario_por_id(chat_id),
+            existe_os_no_periodo(chat_id, data_inicio, data_fim),
+        )
+        if not usuario or not existem_ordens:
+            return None
+        periodo_str = f"{datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')} a {datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')}"
+        # Gerado sempre em memória, para poder ficar no cache até à hora da entrega.
+        pdf = await fila_relatorios.renderizar(
+            gerar_relatorio_periodo_pdf, usuario, data_inicio, data_fim, periodo_str, True, layout, False
+        )
+    if not isinstance(pdf, bytes):
+        raise RuntimeError("falha na geração do PDF")
+    cache_relatorios.guardar(chave, pdf, geracao)
+    return chave, pdf, None
+
+async def gerar_assinatura(context: CallbackContext) -> None:
+    """Gera (ou obtém do cache) o relatório de uma assinatura e, se for a hora da entrega, envia-o."""
+    dados = context.job.data
+    assinatura = dados['assinatura']
+    chat_id, frequencia = assinatura['chat_id'], assinatura['frequencia']
+    data_inicio, data_fim = dados['periodo']
+    try:
+        resultado = await _obter_pdf(chat_id, assinatura['layout'], data_inicio, data_fim)
+    except (FilaCheia, RenderizacaoExpirada) as e:
+        tentativa = dados.get('tentativa', 0) + 1
+        if dados['entregar'] and tentativa <= MAX_TENTATIVAS_ENTREGA:
+            logging.warning(f"Relatório {frequencia} do chat_id {chat_id} adiado ({type(e).__name__}), tentativa {tentativa}.")
+            context.job_queue.run_once(gerar_assinatura, when=ESPERA_NOVA_TENTATIVA, data={**dados, 'tentativa': tentativa})
+        return
+    except Exception as e:
+        logging.error(f"Falha ao gerar o relatório {frequencia} do chat_id {chat_id}: {e}")
+        return
+
+    if not dados['entregar'] or resultado is None:
+        # Sem OS no período não se envia nada, para não incomodar com relatórios vazios.
+        return
+    chave, pdf, file_id = resultado
+    inicio = datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
+    fim = datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')
+    await context.bot.send_message(chat_id, f"📅 Relatório {FREQUENCIAS[frequencia].lower()}: {inicio}" + (f" a {fim}" if fim != inicio else ""))
+    await enviar_pdf_em_cache(context, chat_id, chave, pdf, file_id)
+
+
+def agendar_relatorios(application: Application) -> None:
+    """Regista na JobQueue a pré-geração de madrugada e a entrega de manhã."""
+    if application.job_queue is None:
+        logging.warning("JobQueue indisponível (instale python-telegram-bot[job-queue]): relatórios agendados desativados.")
+        return
+    fuso = fuso_horario()
+    hora = time.fromisoformat(RELATORIOS_AGENDADOS_HORA).replace(tzinfo=fuso)
+    application.job_queue.run_daily(pre_gerar_relatorios, hora, name='pre_gerar_relatorios')
+    if RELATORIOS_AGENDADOS_ENTREGA:
+        entrega = time.fromisoformat(RELATORIOS_AGENDADOS_ENTREGA).replace(tzinfo=fuso)
+        application.job_queue.run_daily(entregar_relatorios, entrega, name='entregar_relatorios')
+
+
+def get_assinatura_handlers() -> list:
+    # Os botões têm padrão próprio e são registados antes das conversas (ver bot.registar_handlers).
+    return [
+        CommandHandler("assinar", assinar),
+        CommandHandler("assinaturas", assinaturas),
+        CallbackQueryHandler(assinar_botao, pattern="^assinar:"),
+        CallbackQueryHandler(desassinar_botao, pattern="^desassinar:"),
+    ]
@@ -0,0 +1,34 @@
+# kraflo/handlers/erros.py
+"""
+Tratamento global dos erros levantados pelos handlers.
+
+Uma falha do banco de dados (ErroBancoDados) chega aqui em vez de ser
+confundida com um resultado vazio: o utilizador é avisado de que o sistema
+está indisponível e pode repetir o passo, porque a conversa fica no mesmo
+estado. Os restantes erros só ficam registados no log.
+"""
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from config import logging
+from database.resiliencia import ErroBancoDados, BancoIndisponivel
+
+MENSAGEM_INDISPONIVEL = "⚠️ O sistema está temporariamente indisponível. Tente novamente dentro de alguns instantes."
+
+
+async def tratar_erro(update: object, context: CallbackContext) -> None:
+    erro = context.error
+    if isinstance(erro, BancoIndisponivel):
+        # O disjuntor já registou a falha no log; não repete o aviso a cada pedido recusado.
+        logging.info(f"Pedido recusado com o banco indisponível: {erro}")
+    elif isinstance(erro, ErroBancoDados):
+        logging.error(f"Erro do banco de dados ao tratar uma atualização: {erro}")
+    else:
+        logging.error("Erro não tratado num handler.", exc_info=erro)
+        return
+
+    if isinstance(update, Update) and update.effective_chat:
+        try:
+            await context.bot.send_message(update.effective_chat.id, MENSAGEM_INDISPONIVEL)
+        except Exception as e:
+            logging.warning(f"Não foi possível avisar o chat_id {update.effective_chat.id} da indisponibilidade: {e}")
@@ -0,0 +1,115 @@
+# kraflo/handlers/exportar_handler.py
+"""
+Exportação das OS em bruto para a equipa de planeamento.
+
+/exportar [csv|xlsx] [AAAA|MM/AAAA] envia todas as OS abertas no ano (ou no
+mês) indicado, de todos os técnicos, como CSV comprimido (padrão) ou XLSX.
+As OS são lidas do banco página a página e escritas diretamente num ficheiro
+temporário, por isso um ano inteiro de OS não fica em memória.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import date
+
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+
+from config import logging, EXPORTACAO_NIVEIS, EXPORTACAO_CONCORRENCIA, EXPORTACAO_MAX_BYTES
+from database.models import buscar_usuario_por_id, exportar_ordens
+from utils.exportacao import FORMATOS
+from utils.voo_unico import voo_unico
+from .report_handler import periodo_do_mes
+
+FORMATO_PADRAO = 'csv'
+# Tempo máximo (em segundos) para carregar o ficheiro para o Telegram.
+TIMEOUT_ENVIO = 300
+
+# Cada exportação ocupa uma thread do banco até ao fim; limita quantas correm ao mesmo tempo.
+_vagas = asyncio.Semaphore(EXPORTACAO_CONCORRENCIA)
+
+
+def interpretar_argumentos(args: list[str]) -> tuple[str, str, str] | None:
+    """
+    Converte os argumentos de /exportar em (formato, data_inicio, data_fim), com as datas em 'YYYY-MM-DD'.
+    Sem período, exporta o ano atual. Retorna None se algum argumento for inválido.
+    """
+    formato = FORMATO_PADRAO
+    periodo = (date.today().replace(month=1, day=1).isoformat(), date.today().replace(month=12, day=31).isoformat())
+    for argumento in args:
+        argumento = argumento.strip().lower()
+        if argumento in FORMATOS:
+            formato = argumento
+        elif argumento.isdigit() and len(argumento) == 4:
+            periodo = (f"{argumento}-01-01", f"{argumento}-12-31")
+        else:
+            periodo = periodo_do_mes(argumento)
+            if periodo is None:
+                return None
+    return (formato, *periodo)
+
+
+async def exportar(update: Update, context: CallbackContext):
+    """/exportar [csv|xlsx] [AAAA|MM/AAAA]: reservado aos níveis em EXPORTACAO_NIVEIS."""
+    chat_id = update.effective_chat.id
+    usuario = await buscar_usuario_por_id(chat_id)
+    if not usuario:
+        await update.message.reply_text("Você precisa estar registrado para exportar dados. Use /start para se registrar.")
+        return
+    if (usuario.get('nivel') or '').strip().lower() not in EXPORTACAO_NIVEIS:
+        await update.message.reply_text("⛔ A exportação de dados está disponível apenas para supervisores e planeamento.")
+        return
+
+    pedido = interpretar_argumentos(context.args or [])
+    if pedido is None:
+        await update.message.reply_text(
+            "❌ Pedido inválido. Use /exportar [csv|xlsx] [AAAA|MM/AAAA], por exemplo: /exportar xlsx 2024"
+        )
+        return
+    formato, data_inicio, data_fim = pedido
+
+    chave = (chat_id, 'exportar', formato, data_inicio, data_fim)
+    if voo_unico.em_curso(chave):
+        await update.message.reply_text("⏳ Esta exportação já está em curso. O ficheiro será enviado assim que estiver pronto.")
+        return
+
+    await update.message.reply_text(f"A exportar as OS de {data_inicio} a {data_fim} ({formato.upper()}). Aguarde...")
+    context.application.create_task(
+        voo_unico.executar(chave, lambda: gerar_e_enviar_exportacao(context, chat_id, formato, data_inicio, data_fim)),
+        update=update
+    )
+
+
+async def gerar_e_enviar_exportacao(context: CallbackContext, chat_id: int, formato: str, data_inicio: str, data_fim: str):
+    """Escreve a exportação num ficheiro temporário, envia-o como documento e apaga-o."""
+    extensao, _ = FORMATOS[formato]
+    descritor, caminho = tempfile.mkstemp(prefix='kraflo_exportacao_', suffix=extensao)
+    os.close(descritor)
+    try:
+        async with _vagas:
+            total = await exportar_ordens(data_inicio, data_fim, formato, caminho)
+        if total is None:
+            await context.bot.send_message(chat_id, "Ocorreu um erro ao exportar as OS. Tente novamente mais tarde.")
+            return
+        if total == 0:
+            await context.bot.send_message(chat_id, "Nenhuma Ordem de Serviço foi encontrada para o período selecionado.")
+            return
+        tamanho = os.path.getsize(caminho)
+        if tamanho > EXPORTACAO_MAX_BYTES:
+            logging.warning(f"Exportação de {total} OS com {tamanho} bytes excede o limite de envio.")
+            await context.bot.send_message(
+                chat_id, "⚠️ O ficheiro é demasiado grande para ser enviado pelo Telegram. Escolha um período mais curto (por exemplo, um mês)."
+            )
+            return
+        with open(caminho, 'rb') as ficheiro:
+            await context.bot.send_document(
+                chat_id, document=ficheiro, filename=f"ordens_servico_{data_inicio}_{data_fim}{extensao}",
+                caption=f"{total} OS exportadas.", write_timeout=TIMEOUT_ENVIO
+            )
+        logging.info(f"Exportação de {total} OS ({formato}, {tamanho} bytes) enviada para o chat_id {chat_id}.")
+    finally:
+        os.remove(caminho)
+
+
+def get_exportar_handler() -> CommandHandler:
+    return CommandHandler("exportar", exportar)
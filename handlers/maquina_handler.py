@@ -0,0 +1,120 @@
+# kraflo/handlers/maquina_handler.py
+"""
+Histórico de uma máquina: /maquina <número> mostra as estatísticas de
+manutenção (MTTR, MTBF, totais por tipo) e as OS da máquina, das mais
+recentes para as mais antigas, com um botão para ver as anteriores.
+"""
+import asyncio
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, CallbackQueryHandler, CallbackContext
+
+from config import MAQUINA_HISTORICO_PAGINA
+from database.models import buscar_usuario_por_id, historico_maquina, estatisticas_maquina
+from utils.pdf_generator import formatar_data_curta
+
+# Botão "mais antigas": "maq:<número>:<data_abertura>:<id>" (cursor da última OS mostrada).
+PREFIXO_CALLBACK = 'maq:'
+
+
+def _horas(valor: float | None) -> str:
+    return f"{valor:.1f} h" if valor is not None else "-"
+
+
+def formatar_estatisticas(numero_maquina: str, estatisticas: dict) -> str:
+    linhas = [
+        f"🔧 Máquina {numero_maquina}",
+        f"OS registadas: {estatisticas['total']} (em aberto: {estatisticas['abertas']})",
+        f"Primeira OS: {formatar_data_curta(estatisticas['primeira_abertura'])}",
+        f"MTTR (tempo médio de reparação): {_horas(estatisticas['mttr_horas'])}",
+        f"MTBF (tempo médio entre avarias): {_horas(estatisticas['mtbf_horas'])}",
+        "",
+        "Por tipo de manutenção:",
+    ]
+    for tipo, valores in estatisticas['por_tipo'].items():
+        linhas.append(f"• {tipo}: {valores['total']} OS, {valores['fechadas']} fechadas, MTTR {_horas(valores['mttr_horas'])}")
+    return "\n".join(linhas)
+
+
+def _resumir(texto: str | None, limite: int = 80) -> str:
+    texto = (texto or '-').replace('\n', ' ')
+    return texto if len(texto) <= limite else texto[:limite - 3] + '...'
+
+
+def montar_pagina_historico(numero_maquina: str, ordens: list, limite: int) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Texto de uma página do histórico e, se houver mais OS, o botão para as anteriores."""
+    blocos = []
+    for ordem in ordens:
+        estado = "fechada" if ordem.get('data_fechamento') else "em aberto"
+        blocos.append(
+            f"#{ordem['id']} · {formatar_data_curta(ordem['data_abertura'])} · {ordem['tipo_manutencao']} · {estado}\n"
+            f"  Problema: {_resumir(ordem.get('problema_apresentado'))}\n"
+            f"  Solução: {_resumir(ordem.get('solucao_aplicada'))}"
+        )
+    texto = f"Histórico da máquina {numero_maquina}:\n\n" + "\n\n".join(blocos)
+
+    teclado = None
+    if len(ordens) == limite:
+        ultima = ordens[-1]
+        dados = f"{PREFIXO_CALLBACK}{numero_maquina}:{ultima['data_abertura']}:{ultima['id']}"
+        # O Telegram limita o callback_data a 64 bytes.
+        if len(dados.encode()) <= 64:
+            teclado = InlineKeyboardMarkup([[InlineKeyboardButton("⏪ OS mais antigas", callback_data=dados)]])
+    return texto, teclado
+
+
+async def maquina(update: Update, context: CallbackContext):
+    """/maquina <número>: estatísticas e primeira página do histórico da máquina."""
+    if not await buscar_usuario_por_id(update.effective_chat.id):
+        await update.message.reply_text("Você precisa estar registrado para consultar máquinas. Use /start para se registrar.")
+        return
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Indique o número da máquina, por exemplo: /maquina 1234")
+        return
+    numero_maquina = context.args[0]
+
+    # As estatísticas percorrem todas as OS da máquina; a primeira página é lida em paralelo.
+    estatisticas, ordens = await asyncio.gather(
+        estatisticas_maquina(numero_maquina),
+        historico_maquina(numero_maquina, None, MAQUINA_HISTORICO_PAGINA),
+    )
+    if estatisticas is None or ordens is None:
+        await update.message.reply_text("Ocorreu um erro ao consultar a máquina. Tente novamente mais tarde.")
+        return
+    if not ordens:
+        await update.message.reply_text(f"Não há Ordens de Serviço registadas para a máquina {numero_maquina}.")
+        return
+
+    await update.message.reply_text(formatar_estatisticas(numero_maquina, estatisticas))
+    texto, teclado = montar_pagina_historico(numero_maquina, ordens, MAQUINA_HISTORICO_PAGINA)
+    await update.message.reply_text(texto, reply_markup=teclado)
+
+
+async def mais_antigas(update: Update, context: CallbackContext):
+    """Botão "OS mais antigas": a página seguinte do histórico, a partir do cursor no botão."""
+    query = update.callback_query
+    await query.answer()
+    # A data ISO contém ':', por isso o número sai do início e o id do fim.
+    numero_maquina, resto = query.data[len(PREFIXO_CALLBACK):].split(':', 1)
+    data_abertura, os_id = resto.rsplit(':', 1)
+
+    ordens = await historico_maquina(numero_maquina, (data_abertura, int(os_id)), MAQUINA_HISTORICO_PAGINA)
+    if ordens is None:
+        await context.bot.send_message(update.effective_chat.id, "Ocorreu um erro ao consultar a máquina. Tente novamente mais tarde.")
+        return
+    # O botão sai da página anterior, para não ser tocado duas vezes.
+    await query.edit_message_reply_markup(reply_markup=None)
+    if not ordens:
+        await context.bot.send_message(update.effective_chat.id, "Não há OS mais antigas para esta máquina.")
+        return
+    texto, teclado = montar_pagina_historico(numero_maquina, ordens, MAQUINA_HISTORICO_PAGINA)
+    await context.bot.send_message(update.effective_chat.id, texto, reply_markup=teclado)
+
+
+def get_maquina_handlers() -> list:
+    # O CallbackQueryHandler tem padrão próprio e é registado antes das conversas,
+    # para que os botões do histórico funcionem mesmo a meio de outra conversa.
+    return [
+        CommandHandler("maquina", maquina),
+        CallbackQueryHandler(mais_antigas, pattern=f"^{PREFIXO_CALLBACK}"),
+    ]
@@ -8,9 +8,10 @@ from telegram.ext import (
     ConversationHandler, CommandHandler, MessageHandler, 
     CallbackQueryHandler, filters, CallbackContext
 )
-from config import logging, UIBotao
+from config import logging, UIBotao, PERSISTENCIA_ATIVA, OS_SELETOR_PAGINA
 from database.models import buscar_usuario_por_id, criar_ordem_servico, buscar_os_abertas_por_usuario, fechar_ordem_servico
-from .ui import get_main_keyboard
+from utils.voo_unico import voo_unico
+from .ui import get_main_keyboard, teclado_inline
 
 # --- Estados da Conversa ---
 # Adicionamos um estado genérico para confirmação no início dos fluxos
@@ -66,14 +67,14 @@ async def cancelar(update: Update, context: CallbackContext):
 async def criar_os_iniciar(update: Update, context: CallbackContext):
     """Ponto de entrada para criar OS. Pede confirmação."""
     context.user_data.clear()
-    usuario = buscar_usuario_por_id(update.effective_chat.id)
+    usuario = await buscar_usuario_por_id(update.effective_chat.id)
     if not usuario:
         await update.message.reply_text("Você precisa estar registrado para criar uma OS. Use /start para se registrar.")
         return ConversationHandler.END
         
     context.user_data['acao_pendente'] = 'criar_os'
-    keyboard = [[InlineKeyboardButton("Sim, criar OS", callback_data="sim")], [InlineKeyboardButton("Não", callback_data="nao")]]
-    await update.message.reply_text("Tem a certeza de que deseja criar uma nova Ordem de Serviço?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Sim, criar OS", "sim"), ("Não", "nao"))
+    await update.message.reply_text("Tem a certeza de que deseja criar uma nova Ordem de Serviço?", reply_markup=keyboard)
     return CONFIRMAR_ACAO
 
 async def receber_numero_maquina(update: Update, context: CallbackContext):
@@ -89,8 +90,8 @@ async def receber_numero_maquina(update: Update, context: CallbackContext):
 
 async def receber_modelo_maquina(update: Update, context: CallbackContext):
     context.user_data['modelo_maquina'] = update.message.text
-    keyboard = [[InlineKeyboardButton("Preventiva", callback_data="Preventiva")], [InlineKeyboardButton("Corretiva", callback_data="Corretiva")],[InlineKeyboardButton("Preditiva", callback_data="Preditiva")]]
-    await update.message.reply_text("Selecione o tipo de manutenção:", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Preventiva", "Preventiva"), ("Corretiva", "Corretiva"), ("Preditiva", "Preditiva"))
+    await update.message.reply_text("Selecione o tipo de manutenção:", reply_markup=keyboard)
     return TIPO_MANUTENCAO
 
 async def receber_tipo_manutencao(update: Update, context: CallbackContext):
@@ -112,9 +113,11 @@ async def receber_problema_apresentado(update: Update, context: CallbackContext)
         'problema_apresentado': context.user_data.get('problema_apresentado')
     }
 
-    sucesso = criar_ordem_servico(
-        chat_id=update.effective_chat.id,
-        dados_os=dados_para_criar_os
+    # Um reenvio dos mesmos dados (toque duplo, rede fraca) não cria uma segunda OS.
+    chat_id = update.effective_chat.id
+    chave = (chat_id, 'criar_os', tuple(sorted(dados_para_criar_os.items())))
+    sucesso = await voo_unico.executar(
+        chave, lambda: criar_ordem_servico(chat_id=chat_id, dados_os=dados_para_criar_os), idempotente=True
     )
 
     if sucesso:
@@ -130,35 +133,124 @@ async def fechar_os_iniciar(update: Update, context: CallbackContext):
     """Ponto de entrada para fechar OS. Pede confirmação."""
     context.user_data.clear()
     context.user_data['acao_pendente'] = 'fechar_os'
-    keyboard = [[InlineKeyboardButton("Sim, fechar OS", callback_data="sim")], [InlineKeyboardButton("Não", callback_data="nao")]]
-    await update.message.reply_text("Tem a certeza de que deseja fechar uma Ordem de Serviço?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Sim, fechar OS", "sim"), ("Não", "nao"))
+    await update.message.reply_text("Tem a certeza de que deseja fechar uma Ordem de Serviço?", reply_markup=keyboard)
     return CONFIRMAR_ACAO
 
+def montar_seletor_os(ordens: list, pagina: int, filtro: str | None) -> tuple[str, InlineKeyboardMarkup]:
+    """
+    Texto e teclado de uma página do seletor de OS abertas.
+    Botões: "os:<id>" escolhe a OS, "pag:<n>" muda de página, "filtrar"/"limpar_filtro" gerem o filtro por máquina.
+    """
+    total_paginas = max(1, -(-len(ordens) // OS_SELETOR_PAGINA))
+    pagina = min(max(pagina, 0), total_paginas - 1)
+    inicio = pagina * OS_SELETOR_PAGINA
+
+    keyboard = [
+        [InlineKeyboardButton(f"ID: {os['id']} - Máquina: {os['numero_maquina']}", callback_data=f"os:{os['id']}")]
+        for os in ordens[inicio:inicio + OS_SELETOR_PAGINA]
+    ]
+    if total_paginas > 1:
+        navegacao = []
+        if pagina > 0:
+            navegacao.append(InlineKeyboardButton("◀️ Anterior", callback_data=f"pag:{pagina - 1}"))
+        navegacao.append(InlineKeyboardButton(f"{pagina + 1}/{total_paginas}", callback_data="pagina_atual"))
+        if pagina < total_paginas - 1:
+            navegacao.append(InlineKeyboardButton("Seguinte ▶️", callback_data=f"pag:{pagina + 1}"))
+        keyboard.append(navegacao)
+    if filtro:
+        keyboard.append([InlineKeyboardButton("✖️ Limpar filtro", callback_data="limpar_filtro")])
+    else:
+        keyboard.append([InlineKeyboardButton("🔎 Filtrar por máquina", callback_data="filtrar")])
+    keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="cancelar")])
+
+    if filtro and not ordens:
+        texto = f"Nenhuma OS aberta para a máquina {filtro}. Escreva outro número ou limpe o filtro."
+    elif filtro:
+        texto = f"OS abertas da máquina {filtro} ({len(ordens)}). Selecione a que deseja fechar:"
+    else:
+        texto = f"Tem {len(ordens)} OS aberta(s). Selecione a que deseja fechar:"
+    return texto, InlineKeyboardMarkup(keyboard)
+
+async def ordens_do_seletor(chat_id: int, context: CallbackContext) -> list:
+    """OS abertas do utilizador (do índice em memória), com o filtro por máquina aplicado."""
+    ordens = await buscar_os_abertas_por_usuario(chat_id)
+    filtro = context.user_data.get('filtro_maquina')
+    if filtro:
+        ordens = [os for os in ordens if str(os['numero_maquina']).startswith(filtro)]
+    return ordens
+
 async def listar_os_para_fechar(update: Update, context: CallbackContext):
-    """Busca e lista as OS abertas para o utilizador selecionar."""
+    """Busca e lista as OS abertas para o utilizador selecionar, uma página de cada vez."""
     chat_id = update.effective_chat.id
-    ordens_abertas = buscar_os_abertas_por_usuario(chat_id)
+    context.user_data['pagina_os'] = 0
+    context.user_data.pop('filtro_maquina', None)
+    ordens_abertas = await ordens_do_seletor(chat_id, context)
     
     if not ordens_abertas:
         await context.bot.send_message(chat_id, "Você não tem nenhuma Ordem de Serviço aberta no momento.", reply_markup=get_main_keyboard())
         return ConversationHandler.END
 
-    keyboard = [[InlineKeyboardButton(f"ID: {os['id']} - Máquina: {os['numero_maquina']}", callback_data=str(os['id']))] for os in ordens_abertas]
-    await context.bot.send_message(chat_id, "Selecione a Ordem de Serviço que deseja fechar:", reply_markup=InlineKeyboardMarkup(keyboard))
+    texto, teclado = montar_seletor_os(ordens_abertas, 0, None)
+    await context.bot.send_message(chat_id, texto, reply_markup=teclado)
     return SELECIONAR_OS
 
-# (O resto das funções de fecho não precisam de alteração, mas estão aqui para completude)
 async def selecionar_os(update: Update, context: CallbackContext):
+    """Trata os botões do seletor: escolha da OS, mudança de página e filtro."""
     query = update.callback_query
     await query.answer()
-    context.user_data['os_id'] = int(query.data)
+    chat_id = update.effective_chat.id
+
+    if query.data == 'cancelar':
+        await query.edit_message_text("Operação cancelada.")
+        return await cancelar(update, context)
+    if query.data == 'pagina_atual':
+        return SELECIONAR_OS
+    if query.data == 'filtrar':
+        await query.edit_message_text("Escreva o número da máquina (ou o início do número):")
+        return SELECIONAR_OS
+    if query.data.startswith('pag:') or query.data == 'limpar_filtro':
+        if query.data == 'limpar_filtro':
+            context.user_data.pop('filtro_maquina', None)
+            context.user_data['pagina_os'] = 0
+        else:
+            context.user_data['pagina_os'] = int(query.data[4:])
+        ordens = await ordens_do_seletor(chat_id, context)
+        texto, teclado = montar_seletor_os(ordens, context.user_data['pagina_os'], context.user_data.get('filtro_maquina'))
+        await query.edit_message_text(texto, reply_markup=teclado)
+        return SELECIONAR_OS
+
+    # "os:<id>"; um id simples vem de teclados enviados antes da paginação (conversas persistidas).
+    os_id = int(query.data[3:] if query.data.startswith('os:') else query.data)
+    ordem = next((os for os in await buscar_os_abertas_por_usuario(chat_id) if os['id'] == os_id), None)
+    if ordem is None:
+        await query.edit_message_text("Esta OS já não está aberta.")
+        return await listar_os_para_fechar(update, context)
+
+    context.user_data['os_id'] = os_id
+    # A data de abertura segue para o fecho, para invalidar só os relatórios desse dia.
+    context.user_data['os_data_abertura'] = ordem.get('data_abertura')
     await query.edit_message_text("Ótimo. Por favor, descreva a solução que foi aplicada.")
     return SOLUCAO_APLICADA
 
+async def filtrar_por_maquina(update: Update, context: CallbackContext):
+    """Texto escrito no seletor: filtra as OS pelo número da máquina."""
+    filtro = update.message.text.strip()
+    if not filtro.isdigit():
+        await update.message.reply_text("❌ Entrada inválida. Por favor, insira apenas números para a máquina.")
+        return SELECIONAR_OS
+
+    context.user_data['filtro_maquina'] = filtro
+    context.user_data['pagina_os'] = 0
+    ordens = await ordens_do_seletor(update.effective_chat.id, context)
+    texto, teclado = montar_seletor_os(ordens, 0, filtro)
+    await update.message.reply_text(texto, reply_markup=teclado)
+    return SELECIONAR_OS
+
 async def receber_solucao(update: Update, context: CallbackContext):
     context.user_data['solucao_aplicada'] = update.message.text
-    keyboard = [[InlineKeyboardButton("Sim", callback_data="sim")], [InlineKeyboardButton("Não", callback_data="nao")]]
-    await update.message.reply_text("Houve substituição de peças?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Sim", "sim"), ("Não", "nao"))
+    await update.message.reply_text("Houve substituição de peças?", reply_markup=keyboard)
     return PERGUNTAR_PECA
 
 async def perguntar_peca(update: Update, context: CallbackContext):
@@ -172,8 +264,8 @@ async def perguntar_peca(update: Update, context: CallbackContext):
         context.user_data['substituir_peca'] = False
         context.user_data['descricao_peca'] = None
         context.user_data['tag_peca'] = None
-        keyboard = [[InlineKeyboardButton("Sim, concluído", callback_data="sim")], [InlineKeyboardButton("Não, pendente", callback_data="nao")]]
-        await query.edit_message_text("O serviço foi concluído com sucesso?", reply_markup=InlineKeyboardMarkup(keyboard))
+        keyboard = teclado_inline(("Sim, concluído", "sim"), ("Não, pendente", "nao"))
+        await query.edit_message_text("O serviço foi concluído com sucesso?", reply_markup=keyboard)
         return SERVICO_CONCLUIDO
 
 async def receber_descricao_peca(update: Update, context: CallbackContext):
@@ -183,16 +275,16 @@ async def receber_descricao_peca(update: Update, context: CallbackContext):
 
 async def receber_tag_peca(update: Update, context: CallbackContext):
     context.user_data['tag_peca'] = update.message.text
-    keyboard = [[InlineKeyboardButton("Sim, concluído", callback_data="sim")], [InlineKeyboardButton("Não, pendente", callback_data="nao")]]
-    await update.message.reply_text("O serviço foi concluído com sucesso?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Sim, concluído", "sim"), ("Não, pendente", "nao"))
+    await update.message.reply_text("O serviço foi concluído com sucesso?", reply_markup=keyboard)
     return SERVICO_CONCLUIDO
 
 async def receber_servico_concluido(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     context.user_data['servico_concluido'] = (query.data == "sim")
-    keyboard = [[InlineKeyboardButton("Sim, adicionar", callback_data="sim")], [InlineKeyboardButton("Não, finalizar", callback_data="nao")]]
-    await query.edit_message_text("Deseja adicionar alguma observação final?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Sim, adicionar", "sim"), ("Não, finalizar", "nao"))
+    await query.edit_message_text("Deseja adicionar alguma observação final?", reply_markup=keyboard)
     return PERGUNTAR_OBSERVACAO
 
 async def perguntar_observacao(update: Update, context: CallbackContext):
@@ -219,10 +311,14 @@ async def finalizar_fechamento_os(update: Update, context: CallbackContext):
         'servico_concluido': context.user_data['servico_concluido'],
         'observacao': context.user_data.get('observacao'),
     }
-    sucesso = fechar_ordem_servico(
-        os_id=context.user_data['os_id'],
-        chat_id=update.effective_chat.id,
-        dados_fechamento=dados_fechamento
+    os_id = context.user_data['os_id']
+    data_abertura = context.user_data.get('os_data_abertura')
+    chat_id = update.effective_chat.id
+    sucesso = await voo_unico.executar(
+        (chat_id, 'fechar_os', os_id),
+        lambda: fechar_ordem_servico(os_id=os_id, chat_id=chat_id, dados_fechamento=dados_fechamento,
+                                     data_abertura=data_abertura),
+        idempotente=True
     )
     if sucesso:
         await context.bot.send_message(update.effective_chat.id, "✅ Ordem de Serviço fechada com sucesso!", reply_markup=get_main_keyboard())
@@ -243,7 +339,8 @@ def get_criar_os_handler() -> ConversationHandler:
             TIPO_MANUTENCAO: [CallbackQueryHandler(receber_tipo_manutencao)],
             PROBLEMA_APRESENTADO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_problema_apresentado)],
         },
-        fallbacks=[CommandHandler("cancelar", cancelar)], per_message=False
+        fallbacks=[CommandHandler("cancelar", cancelar)], per_message=False,
+        name="criar_os", persistent=PERSISTENCIA_ATIVA
     )
 
 def get_fechar_os_handler() -> ConversationHandler:
@@ -251,7 +348,10 @@ def get_fechar_os_handler() -> ConversationHandler:
         entry_points=[CommandHandler("fechar_os", fechar_os_iniciar), MessageHandler(filters.Text([UIBotao.FECHAR_OS]), fechar_os_iniciar)],
         states={
             CONFIRMAR_ACAO: [CallbackQueryHandler(confirmar_acao)],
-            SELECIONAR_OS: [CallbackQueryHandler(selecionar_os)],
+            SELECIONAR_OS: [
+                CallbackQueryHandler(selecionar_os),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, filtrar_por_maquina),
+            ],
             SOLUCAO_APLICADA: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_solucao)],
             PERGUNTAR_PECA: [CallbackQueryHandler(perguntar_peca)],
             DESCRICAO_PECA: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_descricao_peca)],
@@ -260,5 +360,6 @@ def get_fechar_os_handler() -> ConversationHandler:
             PERGUNTAR_OBSERVACAO: [CallbackQueryHandler(perguntar_observacao)],
             OBSERVACOES: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_observacoes)],
         },
-        fallbacks=[CommandHandler("cancelar", cancelar)], per_message=False
+        fallbacks=[CommandHandler("cancelar", cancelar)], per_message=False,
+        name="fechar_os", persistent=PERSISTENCIA_ATIVA
     )
@@ -1,16 +1,24 @@
 import os
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import asyncio
+import calendar
+from datetime import datetime, date
+from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import (
     ConversationHandler, CommandHandler, MessageHandler, 
     CallbackQueryHandler, filters, CallbackContext
 )
-from telegram_bot_calendar import DetailedTelegramCalendar, LSTEP
+from telegram_bot_calendar import LSTEP
 
-from config import logging, UIBotao
-from database.models import buscar_usuario_por_id, buscar_os_por_periodo
-from utils.pdf_generator import gerar_relatorio_pdf
-from .ui import get_main_keyboard
+from config import logging, UIBotao, PDF_MODO_ENTREGA, PERSISTENCIA_ATIVA, RELATORIO_SETOR_NIVEIS
+from database.models import buscar_usuario_por_id, existe_os_no_periodo, resumo_setor
+from utils.pdf_generator import (
+    gerar_relatorio_periodo_pdf, gerar_relatorio_setor_pdf, nome_ficheiro_relatorio, LAYOUT_DETALHADO, LAYOUT_RESUMO
+)
+from utils.fila_relatorios import fila_relatorios, FilaCheia, RenderizacaoExpirada
+from utils.voo_unico import voo_unico
+from utils.cache_relatorios import cache_relatorios, ChaveRelatorio
+from .ui import get_main_keyboard, teclado_inline, construir_calendario, processar_calendario
 
 (
     ESCOLHER_OPCAO, 
@@ -18,18 +26,19 @@ from .ui import get_main_keyboard
     CONFIRMAR_DIA_UNICO,
     PROCESSAR_CALENDARIO_INICIO, 
     PROCESSAR_CALENDARIO_FIM,
-    CONFIRMAR_INTERVALO
-) = range(16, 22)
+    CONFIRMAR_INTERVALO,
+    ESCOLHER_LAYOUT
+) = range(16, 23)
 
 async def relatorio_iniciar(update: Update, context: CallbackContext):
     """Ponto de entrada para o fluxo de geração de relatórios."""
     context.user_data.clear()
-    keyboard = [
-        [InlineKeyboardButton("Relatório de um Dia Específico", callback_data="dia_unico")],
-        [InlineKeyboardButton("Relatório por Intervalo de Datas", callback_data="intervalo")],
-        [InlineKeyboardButton("Cancelar Operação", callback_data="cancelar_geral")],
-    ]
-    await update.message.reply_text("Como deseja gerar o relatório?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(
+        ("Relatório de um Dia Específico", "dia_unico"),
+        ("Relatório por Intervalo de Datas", "intervalo"),
+        ("Cancelar Operação", "cancelar_geral"),
+    )
+    await update.message.reply_text("Como deseja gerar o relatório?", reply_markup=keyboard)
     return ESCOLHER_OPCAO
 
 async def escolher_opcao(update: Update, context: CallbackContext):
@@ -42,11 +51,11 @@ async def escolher_opcao(update: Update, context: CallbackContext):
         return await cancelar(update, context)
 
     if query.data == "dia_unico":
-        calendar, step = DetailedTelegramCalendar().build()
+        calendar, step = construir_calendario()
         await query.edit_message_text(f"Selecione o dia para o relatório.\n{LSTEP[step]}", reply_markup=calendar)
         return PROCESSAR_CALENDARIO_DIA
     elif query.data == "intervalo":
-        calendar, step = DetailedTelegramCalendar().build()
+        calendar, step = construir_calendario()
         await query.edit_message_text(f"Selecione a DATA INICIAL do intervalo.\n{LSTEP[step]}", reply_markup=calendar)
         return PROCESSAR_CALENDARIO_INICIO
 
@@ -54,21 +63,21 @@ async def processar_calendario_dia(update: Update, context: CallbackContext):
     """Processa a seleção de data e pede confirmação."""
     query = update.callback_query
     await query.answer()
-    result, key, step = DetailedTelegramCalendar().process(query.data)
+    result, key, step = processar_calendario(query.data)
 
     if not result and key:
         await query.edit_message_text(f"Selecione o dia.\n{LSTEP[step]}", reply_markup=key)
         return PROCESSAR_CALENDARIO_DIA
     elif result:
         context.user_data['data_selecionada'] = result
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirmar e Gerar", callback_data="confirmar")],
-            [InlineKeyboardButton("✏️ Escolher Outra Data", callback_data="voltar")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancelar")],
-        ]
+        keyboard = teclado_inline(
+            ("✅ Confirmar e Gerar", "confirmar"),
+            ("✏️ Escolher Outra Data", "voltar"),
+            ("❌ Cancelar", "cancelar"),
+        )
         await query.edit_message_text(
             f"Você selecionou a data: {result.strftime('%d/%m/%Y')}.\n\nConfirma a geração do relatório?",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=keyboard
         )
         return CONFIRMAR_DIA_UNICO
 
@@ -78,13 +87,11 @@ async def confirmar_dia_unico(update: Update, context: CallbackContext):
     await query.answer()
     
     if query.data == 'confirmar':
-        data = context.user_data['data_selecionada']
-        data_str = data.strftime('%Y-%m-%d')
-        await query.edit_message_text(f"A gerar relatório para {data.strftime('%d/%m/%Y')}. Aguarde...")
-        await gerar_e_enviar_pdf(update, context, data_str, data_str)
-        return ConversationHandler.END
+        data_str = context.user_data['data_selecionada'].strftime('%Y-%m-%d')
+        context.user_data['periodo'] = (data_str, data_str)
+        return await perguntar_layout(update, context)
     elif query.data == 'voltar':
-        calendar, step = DetailedTelegramCalendar().build()
+        calendar, step = construir_calendario()
         await query.edit_message_text(f"Seleção anterior cancelada. Escolha o dia novamente.\n{LSTEP[step]}", reply_markup=calendar)
         return PROCESSAR_CALENDARIO_DIA
     else: # Cancelar
@@ -93,21 +100,21 @@ async def confirmar_dia_unico(update: Update, context: CallbackContext):
 async def processar_calendario_inicio(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
-    result, key, step = DetailedTelegramCalendar().process(query.data)
+    result, key, step = processar_calendario(query.data)
 
     if not result and key:
         await query.edit_message_text(f"Selecione a DATA INICIAL.\n{LSTEP[step]}", reply_markup=key)
         return PROCESSAR_CALENDARIO_INICIO
     elif result:
         context.user_data['data_inicio'] = result
-        calendar, step = DetailedTelegramCalendar(min_date=result).build()
+        calendar, step = construir_calendario(data_minima=result)
         await query.edit_message_text(f"Data inicial: {result.strftime('%d/%m/%Y')}.\nAgora, selecione a DATA FINAL.", reply_markup=calendar)
         return PROCESSAR_CALENDARIO_FIM
 
 async def processar_calendario_fim(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
-    result, key, step = DetailedTelegramCalendar(min_date=context.user_data['data_inicio']).process(query.data)
+    result, key, step = processar_calendario(query.data, data_minima=context.user_data['data_inicio'])
 
     if not result and key:
         await query.edit_message_text(f"Selecione a DATA FINAL.\n{LSTEP[step]}", reply_markup=key)
@@ -115,14 +122,14 @@ async def processar_calendario_fim(update: Update, context: CallbackContext):
     elif result:
         context.user_data['data_fim'] = result
         data_inicio = context.user_data['data_inicio']
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirmar e Gerar", callback_data="confirmar")],
-            [InlineKeyboardButton("✏️ Escolher Outro Período", callback_data="voltar")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancelar")],
-        ]
+        keyboard = teclado_inline(
+            ("✅ Confirmar e Gerar", "confirmar"),
+            ("✏️ Escolher Outro Período", "voltar"),
+            ("❌ Cancelar", "cancelar"),
+        )
         await query.edit_message_text(
             f"Você selecionou o período de {data_inicio.strftime('%d/%m/%Y')} a {result.strftime('%d/%m/%Y')}.\n\nConfirma a geração do relatório?",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=keyboard
         )
         return CONFIRMAR_INTERVALO
 
@@ -134,36 +141,213 @@ async def confirmar_intervalo(update: Update, context: CallbackContext):
     if query.data == 'confirmar':
         data_inicio = context.user_data['data_inicio'].strftime('%Y-%m-%d')
         data_fim = context.user_data['data_fim'].strftime('%Y-%m-%d')
-        await query.edit_message_text(f"A gerar relatório para o período selecionado. Aguarde...")
-        await gerar_e_enviar_pdf(update, context, data_inicio, data_fim)
-        return ConversationHandler.END
+        context.user_data['periodo'] = (data_inicio, data_fim)
+        return await perguntar_layout(update, context)
     elif query.data == 'voltar':
         # Volta para o primeiro passo, de escolher dia único ou intervalo
         return await relatorio_iniciar(query, context)
     else: # Cancelar
         return await cancelar(update, context)
 
+async def perguntar_layout(update: Update, context: CallbackContext):
+    """Pergunta em que formato o relatório deve ser gerado."""
+    keyboard = teclado_inline(
+        ("📋 Resumo (tabela)", "resumo"),
+        ("📋 Resumo + detalhes de cada OS", "resumo_anexos"),
+        ("📄 Detalhado (uma página por OS)", "detalhado"),
+        ("❌ Cancelar", "cancelar"),
+    )
+    await update.callback_query.edit_message_text("Escolha o formato do relatório:", reply_markup=keyboard)
+    return ESCOLHER_LAYOUT
+
+async def escolher_layout(update: Update, context: CallbackContext):
+    """Recebe o formato escolhido e inicia a geração do relatório."""
+    query = update.callback_query
+    await query.answer()
+
+    if query.data == 'cancelar':
+        return await cancelar(update, context)
+    if query.data not in ('resumo', 'resumo_anexos', 'detalhado'):
+        # Toque repetido no botão do passo anterior ("Confirmar e Gerar"): ignora.
+        return ESCOLHER_LAYOUT
+
+    layout = LAYOUT_DETALHADO if query.data == 'detalhado' else LAYOUT_RESUMO
+    com_anexos = query.data == 'resumo_anexos'
+    data_inicio, data_fim = context.user_data['periodo']
+
+    # O mesmo relatório pedido de novo enquanto ainda está a ser gerado não é gerado duas vezes.
+    chave = (update.effective_chat.id, 'relatorio', data_inicio, data_fim, layout, com_anexos)
+    if voo_unico.em_curso(chave):
+        await query.edit_message_text("⏳ Este relatório já está a ser gerado. Será enviado assim que estiver pronto.")
+        return ConversationHandler.END
+
+    await query.edit_message_text("A gerar o relatório para o período selecionado. Aguarde...")
+    # O relatório é gerado em segundo plano para não prender a conversa.
+    context.application.create_task(
+        voo_unico.executar(chave, lambda: gerar_e_enviar_pdf(update, context, data_inicio, data_fim, layout, com_anexos)),
+        update=update
+    )
+    return ConversationHandler.END
+
+
+async def enviar_pdf_em_cache(context: CallbackContext, chat_id: int, chave: ChaveRelatorio, pdf: bytes,
+                              file_id: str | None = None):
+    """
+    Envia um PDF do cache. Se o Telegram já o recebeu antes, reenvia-o pelo file_id,
+    sem voltar a carregar o ficheiro; caso contrário envia os bytes e guarda o file_id.
+    """
+    if file_id:
+        try:
+            await context.bot.send_document(chat_id, document=file_id)
+            return
+        except TelegramError as e:
+            logging.warning(f"Reenvio do relatório por file_id falhou, a enviar o ficheiro ({e}).")
+    mensagem = await context.bot.send_document(chat_id, document=pdf, filename=nome_ficheiro_relatorio(chat_id))
+    if mensagem.document:
+        cache_relatorios.definir_file_id(chave, mensagem.document.file_id)
+
 
-async def gerar_e_enviar_pdf(update: Update, context: CallbackContext, data_inicio: str, data_fim: str):
+async def gerar_e_enviar_pdf(update: Update, context: CallbackContext, data_inicio: str, data_fim: str,
+                             layout: str = LAYOUT_DETALHADO, com_anexos: bool = False):
     """Função auxiliar para buscar dados, gerar e enviar o PDF."""
     chat_id = update.effective_chat.id
-    usuario = buscar_usuario_por_id(chat_id)
-    ordens = buscar_os_por_periodo(chat_id, data_inicio, data_fim)
+    chave: ChaveRelatorio = (chat_id, data_inicio, data_fim, layout, com_anexos)
+    if cache_relatorios.ativo:
+        entrada = cache_relatorios.obter(chave)
+        if entrada is not None:
+            await enviar_pdf_em_cache(context, chat_id, chave, entrada.pdf, entrada.file_id)
+            await context.bot.send_message(chat_id, "Selecione uma nova opção:", reply_markup=get_main_keyboard())
+            return
+    # Lida antes das consultas: se uma OS do período chegar ao banco durante a geração, o PDF não fica em cache.
+    geracao = cache_relatorios.geracao(chat_id)
 
-    if not usuario or not ordens:
+    # As duas consultas são independentes, por isso correm em paralelo.
+    # As OS em si são lidas página a página pelo processo que gera o PDF;
+    # aqui só confirmamos que existe pelo menos uma.
+    usuario, existem_ordens = await asyncio.gather(
+        buscar_usuario_por_id(chat_id),
+        existe_os_no_periodo(chat_id, data_inicio, data_fim),
+    )
+
+    if not usuario or not existem_ordens:
         await context.bot.send_message(chat_id, "Nenhuma Ordem de Serviço foi encontrada para o período selecionado.")
     else:
         periodo_str = f"{datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')} a {datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')}"
-        filepath = gerar_relatorio_pdf(usuario, ordens, periodo_str)
-        if filepath and os.path.exists(filepath):
-            await context.bot.send_document(chat_id, document=open(filepath, 'rb'), filename=os.path.basename(filepath))
-            os.remove(filepath)
+        async def avisar_fila(posicao: int):
+            await context.bot.send_message(chat_id, f"⏳ O seu relatório está na fila (posição {posicao}). Será enviado assim que estiver pronto.")
+
+        try:
+            resultado = await fila_relatorios.renderizar(
+                gerar_relatorio_periodo_pdf, usuario, data_inicio, data_fim, periodo_str,
+                PDF_MODO_ENTREGA == 'memoria', layout, com_anexos,
+                ao_entrar_na_fila=avisar_fila
+            )
+        except FilaCheia:
+            await context.bot.send_message(chat_id, "⚠️ Há muitos relatórios a ser gerados neste momento. Por favor, tente novamente dentro de alguns minutos.", reply_markup=get_main_keyboard())
+            return
+        except RenderizacaoExpirada:
+            await context.bot.send_message(chat_id, "⚠️ O relatório demorou demasiado tempo a ser gerado. Tente um período mais curto.", reply_markup=get_main_keyboard())
+            return
+
+        if isinstance(resultado, bytes):
+            # Modo em memória: o PDF é enviado diretamente, sem ficheiro temporário, e fica em cache.
+            if cache_relatorios.ativo:
+                cache_relatorios.guardar(chave, resultado, geracao)
+            await enviar_pdf_em_cache(context, chat_id, chave, resultado)
+        elif resultado and os.path.exists(resultado):
+            try:
+                with open(resultado, 'rb') as ficheiro:
+                    await context.bot.send_document(chat_id, document=ficheiro, filename=os.path.basename(resultado))
+            finally:
+                os.remove(resultado)
         else:
             await context.bot.send_message(chat_id, "Ocorreu um erro ao gerar o seu relatório em PDF.")
     
     await context.bot.send_message(chat_id, "Selecione uma nova opção:", reply_markup=get_main_keyboard())
 
 
+# <<< --- RELATÓRIO DO SETOR (SUPERVISORES) --- >>>
+
+def periodo_do_mes(texto: str | None) -> tuple[str, str] | None:
+    """Converte 'MM/AAAA' (ou nada, para o mês atual) no primeiro e último dia do mês, em 'YYYY-MM-DD'."""
+    try:
+        mes = datetime.strptime(texto, '%m/%Y').date() if texto else date.today().replace(day=1)
+    except ValueError:
+        return None
+    ultimo_dia = calendar.monthrange(mes.year, mes.month)[1]
+    return mes.isoformat(), mes.replace(day=ultimo_dia).isoformat()
+
+async def relatorio_setor(update: Update, context: CallbackContext):
+    """
+    /relatorio_setor [MM/AAAA]: resumo de todas as OS do setor do utilizador no mês indicado
+    (por omissão, o mês atual). Reservado aos níveis em RELATORIO_SETOR_NIVEIS.
+    """
+    chat_id = update.effective_chat.id
+    usuario = await buscar_usuario_por_id(chat_id)
+    if not usuario:
+        await update.message.reply_text("Você precisa estar registrado para gerar relatórios. Use /start para se registrar.")
+        return
+    if (usuario.get('nivel') or '').strip().lower() not in RELATORIO_SETOR_NIVEIS:
+        await update.message.reply_text("⛔ O relatório do setor está disponível apenas para supervisores.")
+        return
+    setor = usuario.get('setor')
+    if not setor:
+        await update.message.reply_text("O seu registo não tem um setor definido.")
+        return
+
+    periodo = periodo_do_mes(context.args[0] if context.args else None)
+    if periodo is None:
+        await update.message.reply_text("❌ Mês inválido. Use /relatorio_setor MM/AAAA (por exemplo, /relatorio_setor 03/2025).")
+        return
+    data_inicio, data_fim = periodo
+
+    chave = (chat_id, 'relatorio_setor', setor, data_inicio, data_fim)
+    if voo_unico.em_curso(chave):
+        await update.message.reply_text("⏳ Este relatório já está a ser gerado. Será enviado assim que estiver pronto.")
+        return
+
+    await update.message.reply_text(f"A gerar o relatório do setor {setor}. Aguarde...")
+    context.application.create_task(
+        voo_unico.executar(chave, lambda: gerar_e_enviar_relatorio_setor(context, chat_id, setor, data_inicio, data_fim)),
+        update=update
+    )
+
+async def gerar_e_enviar_relatorio_setor(context: CallbackContext, chat_id: int, setor: str, data_inicio: str, data_fim: str):
+    """Agrega as OS do setor no banco, gera o PDF de resumo e envia-o."""
+    resumo = await resumo_setor(setor, data_inicio, data_fim)
+    if resumo is None:
+        await context.bot.send_message(chat_id, "Ocorreu um erro ao consultar as OS do setor. Tente novamente mais tarde.", reply_markup=get_main_keyboard())
+        return
+    if not resumo:
+        await context.bot.send_message(chat_id, "Nenhuma Ordem de Serviço do setor foi encontrada para o período selecionado.", reply_markup=get_main_keyboard())
+        return
+
+    periodo_str = f"{datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')} a {datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')}"
+    try:
+        resultado = await fila_relatorios.renderizar(
+            gerar_relatorio_setor_pdf, setor, resumo, periodo_str, PDF_MODO_ENTREGA == 'memoria'
+        )
+    except FilaCheia:
+        await context.bot.send_message(chat_id, "⚠️ Há muitos relatórios a ser gerados neste momento. Por favor, tente novamente dentro de alguns minutos.", reply_markup=get_main_keyboard())
+        return
+    except RenderizacaoExpirada:
+        await context.bot.send_message(chat_id, "⚠️ O relatório demorou demasiado tempo a ser gerado.", reply_markup=get_main_keyboard())
+        return
+
+    nome_ficheiro = f"relatorio_setor_{data_inicio[:7]}.pdf"
+    if isinstance(resultado, bytes):
+        await context.bot.send_document(chat_id, document=resultado, filename=nome_ficheiro)
+    elif resultado and os.path.exists(resultado):
+        try:
+            with open(resultado, 'rb') as ficheiro:
+                await context.bot.send_document(chat_id, document=ficheiro, filename=nome_ficheiro)
+        finally:
+            os.remove(resultado)
+    else:
+        await context.bot.send_message(chat_id, "Ocorreu um erro ao gerar o relatório do setor em PDF.")
+    await context.bot.send_message(chat_id, "Selecione uma nova opção:", reply_markup=get_main_keyboard())
+
+
 async def cancelar(update: Update, context: CallbackContext):
     """Cancela a operação atual."""
     query = update.callback_query
@@ -190,7 +374,13 @@ def get_report_handler() -> ConversationHandler:
             PROCESSAR_CALENDARIO_INICIO: [CallbackQueryHandler(processar_calendario_inicio)],
             PROCESSAR_CALENDARIO_FIM: [CallbackQueryHandler(processar_calendario_fim)],
             CONFIRMAR_INTERVALO: [CallbackQueryHandler(confirmar_intervalo)],
+            ESCOLHER_LAYOUT: [CallbackQueryHandler(escolher_layout)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
-        per_message=False
+        per_message=False,
+        name="relatorio", persistent=PERSISTENCIA_ATIVA
     )
+
+
+def get_relatorio_setor_handler() -> CommandHandler:
+    return CommandHandler("relatorio_setor", relatorio_setor)
@@ -1,11 +1,11 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     ConversationHandler, CommandHandler, MessageHandler, 
     CallbackQueryHandler, filters, CallbackContext
 )
-from config import logging
+from config import logging, PERSISTENCIA_ATIVA
 from database.models import buscar_usuario_por_id, registrar_usuario, verificar_matricula_existente
-from .ui import get_main_keyboard
+from .ui import get_main_keyboard, teclado_inline
 
 # Definimos os "estados" da nossa conversa de registo.
 # São como passos num formulário.
@@ -16,7 +16,7 @@ async def start(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
     logging.info(f"Comando /start recebido do chat_id: {chat_id}")
     
-    usuario = buscar_usuario_por_id(chat_id)
+    usuario = await buscar_usuario_por_id(chat_id)
     
     if usuario:
         await update.message.reply_text(
@@ -34,12 +34,8 @@ async def start(update: Update, context: CallbackContext):
 async def receber_nome(update: Update, context: CallbackContext):
     """Recebe o nome e pergunta a função."""
     context.user_data['nome'] = update.message.text
-    keyboard = [
-        [InlineKeyboardButton("Mecânico", callback_data="Mecânico")],
-        [InlineKeyboardButton("Eletricista", callback_data="Eletricista")],
-        [InlineKeyboardButton("Outro", callback_data="Outro")]
-    ]
-    await update.message.reply_text("Ótimo! Agora, qual é a sua função?", reply_markup=InlineKeyboardMarkup(keyboard))
+    keyboard = teclado_inline(("Mecânico", "Mecânico"), ("Eletricista", "Eletricista"), ("Outro", "Outro"))
+    await update.message.reply_text("Ótimo! Agora, qual é a sua função?", reply_markup=keyboard)
     return FUNCAO
 
 async def receber_funcao(update: Update, context: CallbackContext):
@@ -66,13 +62,13 @@ async def receber_cadastro_empresa(update: Update, context: CallbackContext):
     """Recebe a matrícula, valida, e finaliza o registo."""
     matricula = update.message.text
     
-    if verificar_matricula_existente(matricula):
+    if await verificar_matricula_existente(matricula):
         await update.message.reply_text(
             "⚠️ Este número de matrícula já está em uso. Por favor, insira uma matrícula válida ou contacte o suporte."
         )
         return CADASTRO_EMPRESA # Permanece no mesmo estado, a pedir a matrícula novamente.
 
-    sucesso = registrar_usuario(
+    sucesso = await registrar_usuario(
         chat_id=update.effective_chat.id,
         nome=context.user_data['nome'],
         funcao=context.user_data['funcao'],
@@ -111,5 +107,6 @@ def get_start_handler() -> ConversationHandler:
             CADASTRO_EMPRESA: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_cadastro_empresa)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
-        per_message=False # Garante que a conversa seja por utilizador, não por mensagem
+        per_message=False, # Garante que a conversa seja por utilizador, não por mensagem
+        name="registo", persistent=PERSISTENCIA_ATIVA
     )
@@ -1,14 +1,87 @@
-from telegram import ReplyKeyboardMarkup, KeyboardButton
-from config import UIBotao
+"""
+Teclados partilhados pelos handlers.
+
+Os teclados fixos são construídos uma única vez (os objetos do
+python-telegram-bot são imutáveis, por isso a mesma instância pode ser
+enviada em todas as respostas). As páginas do calendário dos relatórios
+ficam num cache limitado, indexado por (passo, ano, mês, data mínima):
+cada toque no calendário deixa de reconstruir o teclado do zero.
+"""
+import functools
+from datetime import date
+from typing import Dict, Tuple
+
+from telegram import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram_bot_calendar import DetailedTelegramCalendar
+from telegram_bot_calendar.base import CB_CALENDAR, YEAR, DAY, SELECT, GOTO, NOTHING
+from telegram_bot_calendar.detailed import STEPS
+
+from config import UIBotao, CALENDARIO_CACHE_MAX
+
+# resize_keyboard=True faz o teclado se ajustar ao tamanho da tela.
+TECLADO_PRINCIPAL = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton(UIBotao.CRIAR_OS)],
+        [KeyboardButton(UIBotao.FECHAR_OS), KeyboardButton(UIBotao.GERAR_RELATORIO)],
+    ],
+    resize_keyboard=True,
+)
+
 
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """
-    Cria e retorna o teclado principal com os botões de comando.
+    Retorna o teclado principal com os botões de comando.
     """
-    keyboard = [
-        [KeyboardButton(UIBotao.CRIAR_OS)],
-        [KeyboardButton(UIBotao.FECHAR_OS), KeyboardButton(UIBotao.GERAR_RELATORIO)],
-    ]
-    
-    # resize_keyboard=True faz o teclado se ajustar ao tamanho da tela.
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
\ No newline at end of file
+    return TECLADO_PRINCIPAL
+
+
+@functools.lru_cache(maxsize=None)
+def teclado_inline(*botoes: Tuple[str, str]) -> InlineKeyboardMarkup:
+    """
+    Teclado com um botão (texto, callback_data) por linha, ex.: as perguntas Sim/Não.
+    Os textos são fixos no código, por isso o número de teclados diferentes é pequeno.
+    """
+    return InlineKeyboardMarkup([[InlineKeyboardButton(texto, callback_data=dados)] for texto, dados in botoes])
+
+
+@functools.lru_cache(maxsize=CALENDARIO_CACHE_MAX)
+def _pagina_calendario(passo: str, ano: int, mes: int, data_minima: date | None) -> str:
+    # Um "ir para" (GOTO) leva o calendário ao passo e ao mês pedidos, sem depender do dia.
+    _, teclado, _ = DetailedTelegramCalendar(min_date=data_minima).process(
+        f"{CB_CALENDAR}_0_{GOTO}_{passo}_{ano}_{mes}_1"
+    )
+    return teclado
+
+
+def _chave_pagina(passo: str, ano: int, mes: int, data_minima: date | None) -> Tuple[str, int, int, date | None]:
+    # As páginas de anos e de meses só dependem do ano: o mês fica fixo para partilharem a entrada.
+    return passo, ano, mes if passo == DAY else 1, data_minima
+
+
+def construir_calendario(data_minima: date | None = None) -> Tuple[str, str]:
+    """Primeira página do calendário (escolha do ano), como DetailedTelegramCalendar().build()."""
+    hoje = date.today()
+    return _pagina_calendario(*_chave_pagina(YEAR, hoje.year, hoje.month, data_minima)), YEAR
+
+
+def processar_calendario(dados: str, data_minima: date | None = None) -> Tuple[date | None, str | None, str | None]:
+    """
+    Trata um toque no calendário, como DetailedTelegramCalendar().process(dados):
+    retorna (data escolhida, None, passo) quando um dia é escolhido, ou
+    (None, teclado, passo) com a página seguinte; (None, None, None) para botões vazios.
+    """
+    partes = dados.split("_")
+    acao = partes[2]
+    if acao == NOTHING:
+        return None, None, None
+    passo, ano, mes, dia = partes[3], int(partes[4]), int(partes[5]), int(partes[6])
+    if acao == SELECT:
+        if passo not in STEPS:
+            return date(ano, mes, dia), None, passo
+        passo = STEPS[passo]
+    return None, _pagina_calendario(*_chave_pagina(passo, ano, mes, data_minima)), passo
+
+
+def estatisticas_teclados() -> Dict[str, int]:
+    info = _pagina_calendario.cache_info()
+    return {'calendario_entradas': info.currsize, 'calendario_hits': info.hits, 'calendario_misses': info.misses}
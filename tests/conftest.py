@@ -0,0 +1,28 @@
+"""
+Configuração partilhada pelos testes.
+
+Os testes correm offline: as variáveis de ambiente obrigatórias recebem
+valores fictícios e os ficheiros locais (banco SQLite, journal, estado das
+conversas) vão para uma pasta temporária, antes de o config.py ser importado.
+"""
+import os
+import shutil
+import tempfile
+
+PASTA_TESTES = tempfile.mkdtemp(prefix='kraflo_testes_')
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TESTE")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "teste")
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'DB_SQLITE_FICHEIRO': os.path.join(PASTA_TESTES, 'kraflo.sqlite3'),
+    'JOURNAL_FICHEIRO': os.path.join(PASTA_TESTES, 'journal.jsonl'),
+    'PERSISTENCIA_FICHEIRO': os.path.join(PASTA_TESTES, 'estado.sqlite3'),
+    'METRICAS_PORTA': '0',
+    'METRICAS_LOG_INTERVALO': '0',
+})
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(PASTA_TESTES, ignore_errors=True)
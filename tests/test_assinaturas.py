@@ -0,0 +1,83 @@
+"""Relatórios periódicos por assinatura (handlers/assinatura_handler.py)."""
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import assinatura_handler
+from handlers.assinatura_handler import (
+    periodo_devido, gerar_assinatura, MAX_TENTATIVAS_ENTREGA, ESPERA_NOVA_TENTATIVA
+)
+from utils.fila_relatorios import FilaCheia, RenderizacaoExpirada
+
+ASSINATURA = {'chat_id': 990101, 'frequencia': 'semanal', 'layout': 'resumo'}
+PERIODO = ('2024-02-26', '2024-03-03')
+
+
+@pytest.mark.parametrize('frequencia, hoje, periodo', [
+    ('diario', date(2024, 3, 5), ('2024-03-04', '2024-03-04')),
+    ('diario', date(2024, 1, 1), ('2023-12-31', '2023-12-31')),
+    ('diario', date(2024, 3, 1), ('2024-02-29', '2024-02-29')),
+    # Segunda-feira: a semana anterior, de segunda a domingo, mesmo a atravessar o mês e o ano.
+    ('semanal', date(2024, 3, 4), ('2024-02-26', '2024-03-03')),
+    ('semanal', date(2024, 1, 1), ('2023-12-25', '2023-12-31')),
+    ('semanal', date(2024, 3, 5), None),
+    ('semanal', date(2024, 3, 3), None),
+    # Dia 1: o mês anterior inteiro, com fevereiro bissexto e a passagem de ano.
+    ('mensal', date(2024, 3, 1), ('2024-02-01', '2024-02-29')),
+    ('mensal', date(2023, 3, 1), ('2023-02-01', '2023-02-28')),
+    ('mensal', date(2024, 1, 1), ('2023-12-01', '2023-12-31')),
+    ('mensal', date(2024, 5, 1), ('2024-04-01', '2024-04-30')),
+    ('mensal', date(2024, 3, 2), None),
+    ('anual', date(2024, 1, 1), None),
+])
+def test_periodo_devido(frequencia, hoje, periodo):
+    assert periodo_devido(frequencia, hoje) == periodo
+
+
+class FilaDeTrabalhosFalsa:
+    def __init__(self):
+        self.agendados = []
+
+    def run_once(self, callback, when, data=None, name=None):
+        self.agendados.append((callback, when, data))
+
+
+def _contexto(dados: dict, fila: FilaDeTrabalhosFalsa):
+    return SimpleNamespace(job=SimpleNamespace(data=dados), job_queue=fila, bot=None)
+
+
+@pytest.mark.parametrize('erro', [FilaCheia, RenderizacaoExpirada])
+def test_entrega_com_a_fila_cheia_e_repetida_ate_ao_limite(monkeypatch, erro):
+    chamadas = []
+
+    async def obter_pdf(*args):
+        chamadas.append(args)
+        raise erro()
+
+    monkeypatch.setattr(assinatura_handler, '_obter_pdf', obter_pdf)
+    fila = FilaDeTrabalhosFalsa()
+    dados = {'assinatura': ASSINATURA, 'periodo': PERIODO, 'entregar': True}
+
+    # Cada tentativa falhada agenda a seguinte; corre-se a que foi agendada até não haver mais.
+    while dados is not None:
+        antes = len(fila.agendados)
+        asyncio.run(gerar_assinatura(_contexto(dados, fila)))
+        dados = fila.agendados[antes][2] if len(fila.agendados) > antes else None
+
+    assert len(chamadas) == MAX_TENTATIVAS_ENTREGA + 1
+    assert [d['tentativa'] for _, _, d in fila.agendados] == list(range(1, MAX_TENTATIVAS_ENTREGA + 1))
+    assert all(callback is gerar_assinatura and espera == ESPERA_NOVA_TENTATIVA for callback, espera, _ in fila.agendados)
+    assert all(d['assinatura'] == ASSINATURA and d['periodo'] == PERIODO for _, _, d in fila.agendados)
+
+
+def test_pre_geracao_com_a_fila_cheia_nao_e_repetida(monkeypatch):
+    async def obter_pdf(*args):
+        raise FilaCheia()
+
+    monkeypatch.setattr(assinatura_handler, '_obter_pdf', obter_pdf)
+    fila = FilaDeTrabalhosFalsa()
+    # De madrugada só se pré-gera: a entrega da manhã volta a tentar a partir do cache ou de novo.
+    asyncio.run(gerar_assinatura(_contexto({'assinatura': ASSINATURA, 'periodo': PERIODO, 'entregar': False}, fila)))
+    assert fila.agendados == []
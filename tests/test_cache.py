@@ -0,0 +1,91 @@
+"""Cache em memória com TTL e remoção LRU (database/cache.py) e o cache de perfis."""
+import asyncio
+
+import pytest
+
+import database
+from database import cache, models
+from database.cache import CacheTTL, AUSENTE, cache_acessos
+from database.repositorio_sqlite import RepositorioSQLite
+
+CHAT_ID = 940001
+
+
+class Relogio:
+    """Substitui time.monotonic no módulo do cache, para avançar o tempo sem esperar."""
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cache.time, 'monotonic', relogio)
+    return relogio
+
+
+def test_entrada_expira_ao_fim_do_ttl(relogio):
+    perfis = CacheTTL(max_entradas=10, ttl=60)
+    perfis.guardar(1, {'nome': 'Ana'})
+    relogio.agora += 60
+    assert perfis.obter(1) == {'nome': 'Ana'}
+    relogio.agora += 0.001
+    assert perfis.obter(1) is AUSENTE
+    assert perfis.estatisticas()['entradas'] == 0
+
+
+def test_resultado_negativo_usa_o_ttl_proprio(relogio):
+    perfis = CacheTTL(max_entradas=10, ttl=600, ttl_negativo=30)
+    perfis.guardar(1, None)
+    perfis.guardar(2, {'nome': 'Bruno'})
+    relogio.agora += 29
+    # None em cache ("não registado") distingue-se de uma chave ausente.
+    assert perfis.obter(1) is None
+    relogio.agora += 2
+    assert perfis.obter(1) is AUSENTE
+    assert perfis.obter(2) == {'nome': 'Bruno'}
+
+
+def test_remove_a_entrada_usada_ha_mais_tempo(relogio):
+    perfis = CacheTTL(max_entradas=2, ttl=60)
+    perfis.guardar(1, 'a')
+    perfis.guardar(2, 'b')
+    assert perfis.obter(1) == 'a'
+    perfis.guardar(3, 'c')
+    assert perfis.obter(2) is AUSENTE
+    assert (perfis.obter(1), perfis.obter(3)) == ('a', 'c')
+
+
+def test_hits_e_misses_sao_exportados_nas_metricas(relogio):
+    antes = cache_acessos.resumo()
+    perfis = CacheTTL(max_entradas=10, ttl=60, nome='teste')
+    perfis.guardar(1, 'a')
+    perfis.obter(1)
+    perfis.obter(1)
+    perfis.obter(2)
+    resumo = cache_acessos.resumo()
+    assert resumo['teste,hit'] - antes.get('teste,hit', 0) == 2
+    assert resumo['teste,miss'] - antes.get('teste,miss', 0) == 1
+    assert perfis.estatisticas() == {'hits': 2, 'misses': 1, 'entradas': 1, 'taxa_acerto': 2 / 3}
+
+
+def test_registo_substitui_o_resultado_negativo_em_cache(tmp_path, monkeypatch):
+    repositorio = RepositorioSQLite(str(tmp_path / 'banco.sqlite3'))
+    monkeypatch.setattr(database, 'repositorio', repositorio)
+    models.cache_perfis.invalidar(CHAT_ID)
+
+    async def cenario():
+        assert await models.buscar_usuario_por_id(CHAT_ID) is None
+        assert models.cache_perfis.obter(CHAT_ID) is None
+        assert await models.registrar_usuario(CHAT_ID, 'Ana', 'Técnico', 'I', 'Prensas', 'M1')
+        return await models.buscar_usuario_por_id(CHAT_ID)
+
+    try:
+        assert asyncio.run(cenario())['nome'] == 'Ana'
+    finally:
+        models.cache_perfis.invalidar(CHAT_ID)
+        repositorio.fechar()
@@ -0,0 +1,106 @@
+"""Cache dos relatórios PDF (utils/cache_relatorios.py) e o reenvio pelo file_id."""
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import TelegramError
+
+from handlers.report_handler import enviar_pdf_em_cache
+from utils.cache_relatorios import CacheRelatorios
+
+CHAT_ID = 970001
+MARCO = (CHAT_ID, '2024-03-01', '2024-03-31', 'detalhado', False)
+
+
+def _chave(chat_id: int, inicio: str, fim: str) -> tuple:
+    return (chat_id, inicio, fim, 'detalhado', False)
+
+
+def test_limite_em_bytes_remove_os_relatorios_usados_ha_mais_tempo():
+    cache = CacheRelatorios(max_bytes=10)
+    a, b, c, d = (_chave(CHAT_ID, f'2024-0{m}-01', f'2024-0{m}-28') for m in range(1, 5))
+    for chave in (a, b, c):
+        cache.guardar(chave, b'1234', cache.geracao(CHAT_ID))
+    # Três PDFs de 4 bytes não cabem em 10: sai o primeiro.
+    assert cache.obter(a) is None and cache.estatisticas()['bytes'] == 8
+    assert cache.obter(b) is not None
+    cache.guardar(d, b'1234', cache.geracao(CHAT_ID))
+    assert cache.obter(c) is None
+    assert cache.obter(b).pdf == b'1234' and cache.obter(d).pdf == b'1234'
+
+    # Um PDF maior do que o limite não é guardado nem expulsa os outros.
+    cache.guardar(a, b'x' * 11, cache.geracao(CHAT_ID))
+    assert cache.obter(a) is None and cache.estatisticas() == {'entradas': 2, 'bytes': 8, 'max_bytes': 10}
+
+
+def test_relatorio_gerado_antes_de_uma_escrita_nao_fica_em_cache():
+    cache = CacheRelatorios(max_bytes=1000)
+    geracao = cache.geracao(CHAT_ID)
+    # Uma OS do chat chega ao banco enquanto o relatório está a ser gerado.
+    cache.invalidar(CHAT_ID, '2024-03-10')
+    cache.guardar(MARCO, b'%PDF desatualizado', geracao)
+    assert cache.obter(MARCO) is None
+
+    cache.guardar(MARCO, b'%PDF atual', cache.geracao(CHAT_ID))
+    assert cache.obter(MARCO).pdf == b'%PDF atual'
+    # A invalidação de outro chat não afeta a geração deste.
+    geracao = cache.geracao(CHAT_ID)
+    cache.invalidar(CHAT_ID + 1, '2024-03-10')
+    cache.guardar(_chave(CHAT_ID, '2024-04-01', '2024-04-30'), b'%PDF abril', geracao)
+    assert cache.obter(_chave(CHAT_ID, '2024-04-01', '2024-04-30')) is not None
+
+
+def test_invalidar_um_dia_so_remove_os_periodos_que_o_incluem():
+    cache = CacheRelatorios(max_bytes=1000)
+    chaves = {
+        'marco': MARCO,
+        'dia': _chave(CHAT_ID, '2024-03-10', '2024-03-10'),
+        'antes': _chave(CHAT_ID, '2024-03-01', '2024-03-09'),
+        'depois': _chave(CHAT_ID, '2024-03-11', '2024-03-31'),
+        'outro_chat': _chave(CHAT_ID + 1, '2024-03-01', '2024-03-31'),
+    }
+    for chave in chaves.values():
+        cache.guardar(chave, b'%PDF', cache.geracao(chave[0]))
+
+    cache.invalidar(CHAT_ID, '2024-03-10')
+    assert {nome for nome, chave in chaves.items() if cache.obter(chave)} == {'antes', 'depois', 'outro_chat'}
+    # Sem dia (data de abertura desconhecida), saem todos os relatórios do chat.
+    cache.invalidar(CHAT_ID)
+    assert {nome for nome, chave in chaves.items() if cache.obter(chave)} == {'outro_chat'}
+
+
+class BotFalso:
+    """Regista os envios; devolve um file_id novo por cada ficheiro carregado."""
+
+    def __init__(self, file_id_invalido: bool = False):
+        self.enviados = []
+        self.file_id_invalido = file_id_invalido
+
+    async def send_document(self, chat_id, document, filename=None):
+        self.enviados.append(document)
+        if isinstance(document, str):
+            if self.file_id_invalido:
+                raise TelegramError('wrong file identifier')
+            return SimpleNamespace(document=SimpleNamespace(file_id=document))
+        return SimpleNamespace(document=SimpleNamespace(file_id=f'file-{len(self.enviados)}'))
+
+
+def test_segundo_envio_reutiliza_o_file_id(monkeypatch):
+    cache = CacheRelatorios(max_bytes=1000)
+    monkeypatch.setattr('handlers.report_handler.cache_relatorios', cache)
+    cache.guardar(MARCO, b'%PDF', cache.geracao(CHAT_ID))
+    contexto = SimpleNamespace(bot=BotFalso())
+
+    async def enviar():
+        entrada = cache.obter(MARCO)
+        await enviar_pdf_em_cache(contexto, CHAT_ID, MARCO, entrada.pdf, entrada.file_id)
+
+    asyncio.run(enviar())
+    assert cache.obter(MARCO).file_id == 'file-1'
+    asyncio.run(enviar())
+    assert contexto.bot.enviados == [b'%PDF', 'file-1']
+
+    # Um file_id recusado pelo Telegram volta a enviar o ficheiro e guarda o novo.
+    contexto.bot = BotFalso(file_id_invalido=True)
+    asyncio.run(enviar())
+    assert contexto.bot.enviados == ['file-1', b'%PDF']
+    assert cache.obter(MARCO).file_id == 'file-2'
@@ -0,0 +1,47 @@
+"""Agrupamento de consultas concorrentes em lotes (database/carregador.py)."""
+import asyncio
+import gc
+
+from database.carregador import CarregadorLotes
+
+
+def test_pedidos_da_mesma_janela_partilham_uma_chamada():
+    chamadas = []
+
+    def funcao_lote(chaves):
+        chamadas.append(sorted(chaves))
+        return {chave: chave * 10 for chave in chaves if chave != 3}
+
+    carregador = CarregadorLotes('teste', funcao_lote, janela=0.01, max_lote=100, padrao=list)
+
+    async def cenario():
+        return await asyncio.gather(*(carregador.carregar(chave) for chave in (1, 2, 2, 3)))
+
+    assert asyncio.run(cenario()) == [10, 20, 20, []]
+    assert chamadas == [[1, 2, 3]]
+    assert not carregador._tarefas
+
+
+def test_lote_em_curso_nao_e_recolhido_pelo_gc():
+    carregador = CarregadorLotes('teste', lambda chaves: {c: c for c in chaves}, janela=0, max_lote=1)
+
+    async def cenario():
+        futuro = asyncio.ensure_future(carregador.carregar(7))
+        await asyncio.sleep(0)
+        # O despacho já criou a tarefa do lote; só o carregador a referencia.
+        assert len(carregador._tarefas) == 1
+        gc.collect()
+        return await asyncio.wait_for(futuro, 5)
+
+    assert asyncio.run(cenario()) == 7
+    assert not carregador._tarefas
+
+
+def test_resultado_que_nao_e_dicionario_falha_todos_os_pedidos():
+    carregador = CarregadorLotes('teste', lambda chaves: [None] * len(chaves), janela=0.01, max_lote=100)
+
+    async def cenario():
+        return await asyncio.gather(carregador.carregar(1), carregador.carregar(2), return_exceptions=True)
+
+    erros = asyncio.run(cenario())
+    assert all(isinstance(erro, TypeError) and 'list' in str(erro) for erro in erros)
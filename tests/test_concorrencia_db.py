@@ -0,0 +1,60 @@
+"""
+Uma consulta lenta ao banco não pode bloquear as conversas dos outros chats:
+as consultas correm no pool de threads do banco, fora do event loop.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import database
+from database.models import cache_perfis
+from handlers.start import start, NOME
+
+
+class RepositorioLento:
+    """Repositório falso: a consulta do chat `chat_lento` fica presa até `libertar` ser sinalizado."""
+
+    def __init__(self, chat_lento: int):
+        self.chat_lento = chat_lento
+        self.bloqueada = threading.Event()
+        self.libertar = threading.Event()
+
+    def buscar_usuarios(self, chat_ids):
+        if self.chat_lento in chat_ids:
+            self.bloqueada.set()
+            assert self.libertar.wait(10), "a consulta lenta nunca foi libertada"
+        return {}
+
+
+def _update(chat_id: int, respostas: list):
+    async def reply_text(texto, **kwargs):
+        respostas.append((chat_id, texto))
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), message=SimpleNamespace(reply_text=reply_text))
+
+
+def test_consulta_lenta_nao_bloqueia_outro_chat(monkeypatch):
+    chat_lento, chat_rapido = 910001, 910002
+    repositorio = RepositorioLento(chat_lento)
+    monkeypatch.setattr(database, 'repositorio', repositorio)
+    for chat_id in (chat_lento, chat_rapido):
+        cache_perfis.invalidar(chat_id)
+    respostas = []
+
+    async def cenario():
+        lento = asyncio.create_task(start(_update(chat_lento, respostas), SimpleNamespace()))
+        # Espera que a consulta do primeiro chat esteja presa no banco (sem bloquear o loop).
+        assert await asyncio.to_thread(repositorio.bloqueada.wait, 5)
+
+        estado = await asyncio.wait_for(start(_update(chat_rapido, respostas), SimpleNamespace()), 5)
+        assert estado == NOME
+        assert [chat for chat, _ in respostas] == [chat_rapido]
+        assert not lento.done()
+
+        repositorio.libertar.set()
+        assert await asyncio.wait_for(lento, 5) == NOME
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        repositorio.libertar.set()
+    assert [chat for chat, _ in respostas] == [chat_rapido, chat_lento]
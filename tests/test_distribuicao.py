@@ -0,0 +1,218 @@
+"""
+Distribuição das atualizações pela entrada (utils/distribuicao.py): cada chat
+vai sempre para o mesmo trabalhador, pela ordem de chegada, e quando um
+trabalhador sai do anel só os chats dele mudam de dono. Quem recebe chats
+numa mudança do anel esvazia os caches em memória antes de os atender.
+"""
+import asyncio
+import json
+from typing import Dict, List, Tuple
+
+from benchmarks.telegram_falso import criar_update_mensagem
+from database.models import cache_perfis, indice_os_abertas, limpar_caches_locais
+from utils.cache_relatorios import cache_relatorios
+from utils.distribuicao import (
+    Entrada, CAMINHO_ATUALIZACOES, CAMINHO_ANEL, CABECALHO_SEGREDO_TRABALHADOR, chave_atualizacao
+)
+from utils.servidor_http import ServidorHTTP, Pedido, Resposta
+
+SEGREDO = 'segredo-dos-testes'
+CHATS = list(range(930001, 930013))
+
+
+class TrabalhadorFalso:
+    """Servidor local que regista as atualizações recebidas; `saudavel = False` simula um trabalhador em baixo."""
+
+    def __init__(self):
+        self.recebidas: List[Tuple[int, int]] = []
+        # Avisos de mudança do anel e lotes, pela ordem em que chegaram: ('anel', set()) ou ('lote', chats).
+        self.eventos: List[Tuple[str, set]] = []
+        self.saudavel = True
+        self.servidor = ServidorHTTP('127.0.0.1', 0)
+        self.servidor.rota('POST', CAMINHO_ATUALIZACOES, self._receber)
+        self.servidor.rota('POST', CAMINHO_ANEL, self._mudanca_anel)
+        self.servidor.rota('GET', '/saude', self._saude)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.servidor.porta_efetiva}"
+
+    async def _receber(self, pedido: Pedido) -> Resposta:
+        if pedido.cabecalhos.get(CABECALHO_SEGREDO_TRABALHADOR) != SEGREDO:
+            return Resposta(403)
+        if not self.saudavel:
+            return Resposta(503)
+        lote = [(chave_atualizacao(dados), dados['update_id']) for dados in json.loads(pedido.corpo)]
+        self.recebidas.extend(lote)
+        self.eventos.append(('lote', {chat_id for chat_id, _ in lote}))
+        return Resposta(200)
+
+    async def _mudanca_anel(self, pedido: Pedido) -> Resposta:
+        if pedido.cabecalhos.get(CABECALHO_SEGREDO_TRABALHADOR) != SEGREDO or not self.saudavel:
+            return Resposta(503)
+        self.eventos.append(('anel', set()))
+        return Resposta(200)
+
+    def avisado_antes_de(self, chats: set, desde: int = 0) -> bool:
+        """Houve um aviso de mudança do anel antes do primeiro lote (a partir de `desde`) com algum de `chats`."""
+        for tipo, lote in self.eventos[desde:]:
+            if tipo == 'anel':
+                return True
+            if lote & chats:
+                return False
+        return True
+
+    async def _saude(self, pedido: Pedido) -> Resposta:
+        return Resposta(200 if self.saudavel else 503)
+
+
+async def _fonte(primeiro_id: int, rondas: int):
+    """Mensagens de todos os CHATS, intercaladas, com update_id crescente."""
+    update_id = primeiro_id
+    for ronda in range(rondas):
+        for chat_id in CHATS:
+            yield criar_update_mensagem(update_id, chat_id, f"mensagem {ronda}")
+            update_id += 1
+
+
+async def _aguardar(condicao, timeout: float = 10.0) -> None:
+    limite = asyncio.get_running_loop().time() + timeout
+    while not condicao():
+        assert asyncio.get_running_loop().time() < limite, "condição não cumprida a tempo"
+        await asyncio.sleep(0.02)
+
+
+def _donos(trabalhadores: List[TrabalhadorFalso], desde: Dict[int, int]) -> Dict[int, set]:
+    """Trabalhadores que receberam cada chat, contando só as atualizações a partir de `desde[índice]`."""
+    donos: Dict[int, set] = {}
+    for indice, trabalhador in enumerate(trabalhadores):
+        for chat_id, _ in trabalhador.recebidas[desde.get(indice, 0):]:
+            donos.setdefault(chat_id, set()).add(indice)
+    return donos
+
+
+def _por_ordem(trabalhadores: List[TrabalhadorFalso]) -> bool:
+    """Em cada trabalhador, as atualizações de cada chat chegaram por ordem crescente de update_id."""
+    for trabalhador in trabalhadores:
+        ultimo: Dict[int, int] = {}
+        for chat_id, update_id in trabalhador.recebidas:
+            if update_id <= ultimo.get(chat_id, -1):
+                return False
+            ultimo[chat_id] = update_id
+    return True
+
+
+def test_chats_mantem_o_dono_e_passam_para_os_outros_quando_ele_sai():
+    async def cenario():
+        trabalhadores = [TrabalhadorFalso() for _ in range(3)]
+        for trabalhador in trabalhadores:
+            await trabalhador.servidor.iniciar()
+        entrada = Entrada([t.url for t in trabalhadores], SEGREDO, lancador=None, intervalo_saude=0.1, limite_falhas=2)
+        await entrada.iniciar()
+        try:
+            assert await entrada.aguardar_prontos(5)
+
+            await entrada.consumir(_fonte(1, rondas=5))
+            await _aguardar(lambda: sum(len(t.recebidas) for t in trabalhadores) == 5 * len(CHATS))
+            donos = _donos(trabalhadores, {})
+            assert all(len(indices) == 1 for indices in donos.values()) and sorted(donos) == CHATS
+            assert _por_ordem(trabalhadores)
+
+            # O dono do primeiro chat deixa de responder. As atualizações chegam enquanto ainda está
+            # no anel: ficam na fila dele e, quando sai, passam para os novos donos pela mesma ordem.
+            retirado = next(iter(donos[CHATS[0]]))
+            trabalhadores[retirado].saudavel = False
+            antes = {indice: len(t.recebidas) for indice, t in enumerate(trabalhadores)}
+
+            await entrada.consumir(_fonte(1000, rondas=3))
+            await _aguardar(lambda: not entrada.estado()['trabalhadores'][f"trabalhador-{retirado}"]['no_anel'])
+            await _aguardar(lambda: entrada.pendentes() == 0 and sum(
+                len(t.recebidas) - antes[i] for i, t in enumerate(trabalhadores)) == 3 * len(CHATS))
+            novos_donos = _donos(trabalhadores, antes)
+            assert all(len(indices) == 1 for indices in novos_donos.values()) and sorted(novos_donos) == CHATS
+            for chat_id in CHATS:
+                if donos[chat_id] == {retirado}:
+                    assert retirado not in novos_donos[chat_id]
+                else:
+                    # Os chats dos trabalhadores que continuam no anel não mudam de dono.
+                    assert novos_donos[chat_id] == donos[chat_id]
+            assert len(trabalhadores[retirado].recebidas) == antes[retirado]
+            assert _por_ordem(trabalhadores)
+        finally:
+            await entrada.parar(timeout=1)
+            for trabalhador in trabalhadores:
+                await trabalhador.servidor.parar()
+
+    asyncio.run(cenario())
+
+
+def test_trabalhador_que_volta_ao_anel_recupera_os_chats_depois_de_esvaziar_os_caches():
+    async def cenario():
+        trabalhadores = [TrabalhadorFalso() for _ in range(3)]
+        for trabalhador in trabalhadores:
+            await trabalhador.servidor.iniciar()
+        entrada = Entrada([t.url for t in trabalhadores], SEGREDO, lancador=None, intervalo_saude=0.1, limite_falhas=2)
+        no_anel = lambda indice: entrada.estado()['trabalhadores'][f"trabalhador-{indice}"]['no_anel']
+        entregues = lambda: sum(len(t.recebidas) for t in trabalhadores)
+        await entrada.iniciar()
+        try:
+            assert await entrada.aguardar_prontos(5)
+            # No primeiro arranque não há estado antigo: nenhum aviso.
+            await entrada.consumir(_fonte(1, rondas=2))
+            await _aguardar(lambda: entregues() == 2 * len(CHATS))
+            donos = _donos(trabalhadores, {})
+            assert all(tipo == 'lote' for t in trabalhadores for tipo, _ in t.eventos)
+
+            retirado = next(iter(donos[CHATS[0]]))
+            chats_retirado = {chat_id for chat_id, indices in donos.items() if indices == {retirado}}
+            trabalhadores[retirado].saudavel = False
+            await _aguardar(lambda: not no_anel(retirado))
+            marcas = [len(t.eventos) for t in trabalhadores]
+            await entrada.consumir(_fonte(1000, rondas=2))
+            await _aguardar(lambda: entrada.pendentes() == 0 and entregues() == 4 * len(CHATS))
+            # Quem ficou com os chats do retirado esvaziou os caches antes de os atender.
+            for indice, trabalhador in enumerate(trabalhadores):
+                if indice != retirado:
+                    assert trabalhador.avisado_antes_de(chats_retirado, marcas[indice])
+
+            # Volta sem ter reiniciado: só é readmitido depois de esvaziar os caches.
+            marca_retirado = len(trabalhadores[retirado].eventos)
+            trabalhadores[retirado].saudavel = True
+            await _aguardar(lambda: no_anel(retirado))
+            assert ('anel', set()) in trabalhadores[retirado].eventos[marca_retirado:]
+            antes = {indice: len(t.recebidas) for indice, t in enumerate(trabalhadores)}
+            await entrada.consumir(_fonte(2000, rondas=2))
+            await _aguardar(lambda: entrada.pendentes() == 0 and entregues() == 6 * len(CHATS))
+            # O anel volta a ser o inicial, por isso cada chat volta ao dono original.
+            assert _donos(trabalhadores, antes) == donos
+            assert _por_ordem(trabalhadores)
+        finally:
+            await entrada.parar(timeout=1)
+            for trabalhador in trabalhadores:
+                await trabalhador.servidor.parar()
+
+    asyncio.run(cenario())
+
+
+def test_limpar_caches_locais_descarta_tambem_as_leituras_em_curso():
+    chat_id = 930100
+    cache_perfis.guardar(chat_id, {'nome': 'Ana'})
+    indice_os_abertas.carregar(chat_id, [{'id': 1, 'numero_maquina': 'M-1', 'data_abertura': '2024-03-01'}],
+                               indice_os_abertas.versao(chat_id))
+    chave = (chat_id, '2024-03-01', '2024-03-31', 'detalhado', False)
+    cache_relatorios.guardar(chave, b'%PDF antigo', cache_relatorios.geracao(chat_id))
+    # Leituras começadas antes da mudança do anel (e de um chat ainda sem versão própria).
+    versao, geracao = indice_os_abertas.versao(chat_id), cache_relatorios.geracao(chat_id)
+    versao_novo, geracao_novo = indice_os_abertas.versao(chat_id + 1), cache_relatorios.geracao(chat_id + 1)
+
+    limpar_caches_locais()
+
+    assert cache_perfis.obter(chat_id, None) is None
+    assert indice_os_abertas.obter(chat_id) is None
+    assert cache_relatorios.obter(chave) is None
+    indice_os_abertas.carregar(chat_id, [], versao)
+    indice_os_abertas.carregar(chat_id + 1, [], versao_novo)
+    cache_relatorios.guardar(chave, b'%PDF desatualizado', geracao)
+    cache_relatorios.guardar((chat_id + 1,) + chave[1:], b'%PDF desatualizado', geracao_novo)
+    assert indice_os_abertas.obter(chat_id) is None and indice_os_abertas.obter(chat_id + 1) is None
+    assert cache_relatorios.obter(chave) is None and cache_relatorios.obter((chat_id + 1,) + chave[1:]) is None
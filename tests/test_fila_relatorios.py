@@ -0,0 +1,49 @@
+"""Fila de renderização: um relatório que excede o tempo máximo não pode prender o pool."""
+import asyncio
+import time
+
+import pytest
+
+from utils.fila_relatorios import FilaRenderizacao, RenderizacaoExpirada
+
+
+def test_relatorio_expirado_recicla_o_pool():
+    fila = FilaRenderizacao(max_workers=1, max_fila=5, timeout=1.5)
+
+    async def cenario():
+        # Aquece o pool (o arranque do processo não conta para o tempo limite do teste seguinte).
+        assert await fila.renderizar(sum, [1, 2]) == 3
+        processo_antigo = next(iter(fila._executor._processes.values()))
+
+        with pytest.raises(RenderizacaoExpirada):
+            await fila.renderizar(time.sleep, 60)
+
+        # Com um único processo, o próximo relatório só é gerado se o processo preso tiver sido substituído.
+        assert await asyncio.wait_for(fila.renderizar(sum, [3, 4]), 30) == 7
+        processo_antigo.join(5)
+        assert not processo_antigo.is_alive()
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        fila.encerrar()
+
+
+def test_trabalho_interrompido_pela_reciclagem_e_repetido():
+    fila = FilaRenderizacao(max_workers=2, max_fila=5, timeout=3)
+
+    async def cenario():
+        await asyncio.gather(fila.renderizar(sum, [0]), fila.renderizar(sum, [0]))
+        preso = asyncio.create_task(fila.renderizar(time.sleep, 60))
+        await asyncio.sleep(1.5)
+        # Este trabalho está a meio quando o outro expira (t=3s): perde o processo e é gerado de novo no pool novo.
+        inicio = time.perf_counter()
+        assert await asyncio.wait_for(fila.renderizar(time.sleep, 2), 30) is None
+        assert time.perf_counter() - inicio > 3
+        with pytest.raises(RenderizacaoExpirada):
+            await preso
+
+    try:
+        asyncio.run(cenario())
+    finally:
+        fila.encerrar()
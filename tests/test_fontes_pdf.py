@@ -0,0 +1,55 @@
+"""Fonte TrueType dos relatórios (utils/fontes_pdf.py) e o regresso à Arial sem ela."""
+import io
+import re
+import zlib
+
+from fontTools import ttLib
+
+from utils import fontes_pdf
+from utils.pdf_generator import PDF
+
+TEXTO = 'Δp ≥ 5 µm — ✓ 80 ℃'
+
+
+def _fontes_embutidas(pdf_bytes: bytes) -> list:
+    """As fontes TrueType embutidas no PDF (objetos /FontFile2), lidas com o fontTools."""
+    fontes = []
+    for numero in re.findall(rb'/FontFile2 (\d+) 0 R', pdf_bytes):
+        objeto = re.search(rb'\n' + numero + rb' 0 obj\n<<(.*?)>>\nstream\n', pdf_bytes, re.S)
+        tamanho = int(re.search(rb'/Length (\d+)', objeto.group(1)).group(1))
+        dados = pdf_bytes[objeto.end():objeto.end() + tamanho]
+        if b'/FlateDecode' in objeto.group(1):
+            dados = zlib.decompress(dados)
+        fontes.append(ttLib.TTFont(io.BytesIO(dados)))
+    return fontes
+
+
+def _gerar(texto: str) -> tuple:
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_font(pdf.familia, '', 12)
+    pdf.cell(text=texto)
+    return pdf, bytes(pdf.output())
+
+
+def test_texto_fora_do_latin1_fica_no_subconjunto_de_cada_pdf():
+    pdf, primeiro = _gerar(TEXTO)
+    assert pdf.familia == fontes_pdf.FAMILIA
+    cmaps = [fonte.getBestCmap() for fonte in _fontes_embutidas(primeiro)]
+    assert any(set(map(ord, TEXTO.replace(' ', ''))) <= cmap.keys() for cmap in cmaps)
+
+    # As cópias partilham as métricas, mas cada PDF embute só os glifos que usou.
+    _, segundo = _gerar('OK')
+    cmaps = [fonte.getBestCmap() for fonte in _fontes_embutidas(segundo)]
+    assert any({ord('O'), ord('K')} <= cmap.keys() for cmap in cmaps)
+    assert not any(ord('≥') in cmap or ord('Δ') in cmap for cmap in cmaps)
+
+
+def test_sem_o_ficheiro_da_fonte_os_relatorios_usam_a_arial(tmp_path, monkeypatch):
+    monkeypatch.setattr(fontes_pdf, 'PDF_FONTE_NORMAL', str(tmp_path / 'DejaVuSans.ttf'))
+    pdf, pdf_bytes = _gerar(TEXTO)
+    assert pdf.familia == fontes_pdf.FAMILIA_PADRAO
+    assert _fontes_embutidas(pdf_bytes) == []
+    assert b'/BaseFont /Helvetica' in pdf_bytes
+    # A Arial só cobre o latin-1: µ fica, as letras e a pontuação em falta viram '?' e os símbolos são omitidos.
+    assert pdf.normalize_text(TEXTO) == '?p  5 µm ?  80 '
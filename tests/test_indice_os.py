@@ -0,0 +1,140 @@
+"""Índice das OS abertas (database/indice_os.py) e o seletor de OS do fluxo de fecho."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from config import OS_SELETOR_PAGINA
+from database import models
+from database.indice_os import IndiceOSAbertas
+from database.journal import JournalEscritas
+from database.repositorio_sqlite import RepositorioSQLite
+from handlers import os_handler
+from handlers.os_handler import montar_seletor_os, ordens_do_seletor
+
+CHAT_ID = 980001
+
+
+def _ordem(os_id: int, numero_maquina: str, dia: int = 1) -> dict:
+    return {'id': os_id, 'numero_maquina': numero_maquina, 'data_abertura': f'2024-03-{dia:02d}T08:00:00'}
+
+
+def test_leitura_iniciada_antes_de_uma_alteracao_e_descartada():
+    indice = IndiceOSAbertas(max_chats=10, ttl=60)
+    versao = indice.versao(CHAT_ID)
+    # Uma OS chega ao banco enquanto a lista ainda está a ser lida: a leitura já não a inclui.
+    indice.adicionar(CHAT_ID, _ordem(3, 'M-3'))
+    lida = indice.carregar(CHAT_ID, [_ordem(2, 'M-2', 2), _ordem(1, 'M-1')], versao)
+    assert [os['id'] for os in lida] == [1, 2]
+    assert indice.obter(CHAT_ID) is None
+
+    versao = indice.versao(CHAT_ID)
+    indice.carregar(CHAT_ID, [_ordem(1, 'M-1'), _ordem(2, 'M-2', 2)], versao)
+    indice.adicionar(CHAT_ID, _ordem(3, 'M-3', 3))
+    indice.remover(CHAT_ID, 1)
+    assert [os['id'] for os in indice.obter(CHAT_ID)] == [2, 3]
+
+    versao = indice.versao(CHAT_ID)
+    indice.remover(CHAT_ID, 2)
+    indice.carregar(CHAT_ID, [_ordem(2, 'M-2', 2), _ordem(3, 'M-3', 3)], versao)
+    assert [os['id'] for os in indice.obter(CHAT_ID)] == [3]
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    """Banco SQLite e journal próprios do teste, com um técnico e duas OS abertas."""
+    repositorio = RepositorioSQLite(str(tmp_path / 'banco.sqlite3'))
+    repositorio.inserir_usuario({
+        'chat_id': CHAT_ID, 'nome': 'Ana', 'funcao': 'Técnico', 'nivel': 'I', 'setor': 'Prensas', 'cadastro_empresa': 'M1',
+    })
+    repositorio.inserir_ordens([
+        {'chat_id': CHAT_ID, 'numero_maquina': f'M-{i}', 'modelo_maquina': 'Prensa', 'tipo_manutencao': 'Corretiva',
+         'problema_apresentado': 'Ruído', 'data_abertura': f'2024-03-0{i}T08:00:00', 'chave_idempotencia': f'k{i}'}
+        for i in (1, 2)
+    ])
+    monkeypatch.setattr(database, 'repositorio', repositorio)
+    monkeypatch.setattr(models, 'journal', JournalEscritas(str(tmp_path / 'journal.jsonl')))
+    models.indice_os_abertas.limpar()
+    yield repositorio
+    models.indice_os_abertas.limpar()
+    repositorio.fechar()
+
+
+def test_indice_acompanha_a_criacao_e_esconde_os_fechos_pendentes(ambiente):
+    async def maquinas():
+        return [os['numero_maquina'] for os in await models.buscar_os_abertas_por_usuario(CHAT_ID)]
+
+    async def cenario():
+        assert await maquinas() == ['M-1', 'M-2']
+        versao = models.indice_os_abertas.versao(CHAT_ID)
+
+        # A OS criada só entra no índice quando o journal a insere no banco (e ela recebe o id).
+        assert await models.criar_ordem_servico(CHAT_ID, {
+            'numero_maquina': 'M-3', 'modelo_maquina': 'Prensa', 'tipo_manutencao': 'Corretiva', 'problema_apresentado': 'Fuga',
+        })
+        assert await maquinas() == ['M-1', 'M-2']
+        await models.descarregar_journal()
+        assert await maquinas() == ['M-1', 'M-2', 'M-3']
+        assert models.indice_os_abertas.versao(CHAT_ID) == versao + 1
+
+        # O fecho sai logo do seletor, mesmo antes de chegar ao banco...
+        primeira = (await models.buscar_os_abertas_por_usuario(CHAT_ID))[0]
+        assert await models.fechar_ordem_servico(primeira['id'], CHAT_ID, {'servico_concluido': True},
+                                                 primeira['data_abertura'])
+        assert await maquinas() == ['M-2', 'M-3']
+        # ...e continua escondido se a lista for relida do banco, onde a OS ainda está aberta.
+        models.indice_os_abertas.limpar()
+        assert [os['numero_maquina'] for os in ambiente.listar_ordens_abertas(CHAT_ID)] == ['M-1', 'M-2', 'M-3']
+        assert await maquinas() == ['M-2', 'M-3']
+
+        await models.descarregar_journal()
+        models.indice_os_abertas.limpar()
+        assert await maquinas() == ['M-2', 'M-3']
+
+    asyncio.run(cenario())
+
+
+def _botoes(teclado) -> list:
+    return [botao.callback_data for linha in teclado.inline_keyboard for botao in linha]
+
+
+def test_seletor_pagina_as_os_abertas():
+    ordens = [_ordem(i, f'M-{i}') for i in range(1, 2 * OS_SELETOR_PAGINA + 2)]
+
+    texto, teclado = montar_seletor_os(ordens, 0, None)
+    assert texto.startswith(f"Tem {len(ordens)} OS")
+    assert _botoes(teclado) == [f'os:{i}' for i in range(1, OS_SELETOR_PAGINA + 1)] + [
+        'pagina_atual', 'pag:1', 'filtrar', 'cancelar']
+
+    _, teclado = montar_seletor_os(ordens, 1, None)
+    assert _botoes(teclado)[OS_SELETOR_PAGINA:] == ['pag:0', 'pagina_atual', 'pag:2', 'filtrar', 'cancelar']
+
+    # Uma página fora do intervalo (ex.: depois de fechar OS) mostra a última.
+    _, teclado = montar_seletor_os(ordens, 99, None)
+    assert _botoes(teclado) == ['os:' + str(len(ordens)), 'pag:1', 'pagina_atual', 'filtrar', 'cancelar']
+    assert teclado.inline_keyboard[1][1].text == '3/3'
+
+    # Uma só página: sem navegação.
+    _, teclado = montar_seletor_os(ordens[:2], 0, None)
+    assert _botoes(teclado) == ['os:1', 'os:2', 'filtrar', 'cancelar']
+
+
+def test_filtro_por_prefixo_da_maquina(monkeypatch):
+    ordens = [_ordem(1, 'PR-10'), _ordem(2, 'PR-11'), _ordem(3, 'TO-10'), _ordem(4, 'PR-2')]
+
+    async def buscar(chat_id):
+        return ordens
+
+    monkeypatch.setattr(os_handler, 'buscar_os_abertas_por_usuario', buscar)
+    contexto = SimpleNamespace(user_data={'filtro_maquina': 'PR-1'})
+    filtradas = asyncio.run(ordens_do_seletor(CHAT_ID, contexto))
+    assert [os['id'] for os in filtradas] == [1, 2]
+
+    texto, teclado = montar_seletor_os(filtradas, 0, 'PR-1')
+    assert texto.startswith("OS abertas da máquina PR-1 (2)")
+    assert _botoes(teclado) == ['os:1', 'os:2', 'limpar_filtro', 'cancelar']
+
+    contexto.user_data['filtro_maquina'] = 'XX'
+    texto, _ = montar_seletor_os(asyncio.run(ordens_do_seletor(CHAT_ID, contexto)), 0, 'XX')
+    assert texto.startswith("Nenhuma OS aberta para a máquina XX")
@@ -0,0 +1,136 @@
+"""
+Descarga do journal de escritas para o banco: reenvios sem duplicar OS,
+quarentena dos registos recusados e fechos independentes das criações.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import database
+from database import models
+from database.journal import JournalEscritas, CRIAR, FECHAR
+from database.repositorio import iterar_ordens_periodo
+from database.repositorio_sqlite import RepositorioSQLite
+from utils.metricas import journal_pendentes, journal_idade_segundos
+
+CHAT_ID = 920001
+
+
+def _ordem(numero_maquina: str, chat_id: int = CHAT_ID) -> dict:
+    return {
+        'chat_id': chat_id, 'numero_maquina': numero_maquina, 'modelo_maquina': 'Prensa',
+        'tipo_manutencao': 'Corretiva', 'problema_apresentado': 'Ruído', 'data_abertura': '2024-03-01T08:00:00',
+    }
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    """Journal e banco SQLite próprios do teste, com um técnico registado."""
+    repositorio = RepositorioSQLite(str(tmp_path / 'banco.sqlite3'))
+    repositorio.inserir_usuario({
+        'chat_id': CHAT_ID, 'nome': 'Ana', 'funcao': 'Técnico', 'nivel': 'I', 'setor': 'Prensas', 'cadastro_empresa': 'M1',
+    })
+    journal = JournalEscritas(str(tmp_path / 'journal.jsonl'))
+    monkeypatch.setattr(database, 'repositorio', repositorio)
+    monkeypatch.setattr(models, 'journal', journal)
+    yield repositorio, journal
+    repositorio.fechar()
+
+
+def _maquinas(repositorio) -> list:
+    return sorted(o['numero_maquina'] for o in iterar_ordens_periodo(repositorio, CHAT_ID, '2024-01-01', '2024-12-31', 100))
+
+
+def test_reenvio_de_registo_ja_aplicado_nao_duplica_a_os(ambiente):
+    repositorio, journal = ambiente
+    journal.registar(CRIAR, dados=_ordem('M-1'))
+    registo = journal.pendentes()[0]
+    assert asyncio.run(models.descarregar_journal()) == 1
+
+    # Simula uma falha entre a inserção e a confirmação: o mesmo registo volta a estar pendente.
+    with open(journal.caminho, 'a', encoding='utf-8') as ficheiro:
+        ficheiro.write(json.dumps(registo) + '\n')
+    journal = JournalEscritas(journal.caminho)
+    models.journal = journal
+    assert len(journal.pendentes()) == 1
+
+    asyncio.run(models.descarregar_journal())
+    assert _maquinas(repositorio) == ['M-1']
+    assert journal.pendentes() == []
+
+
+def test_registo_recusado_vai_para_quarentena_e_o_resto_do_lote_e_inserido(ambiente):
+    repositorio, journal = ambiente
+    antes = models.journal_quarentena.resumo().get(CRIAR, 0)
+    journal.registar(CRIAR, dados=_ordem('M-1'))
+    # Técnico inexistente: viola a chave estrangeira, por isso o banco recusa sempre esta OS.
+    chave_recusada = journal.registar(CRIAR, dados=_ordem('M-2', chat_id=999999))
+    journal.registar(CRIAR, dados=_ordem('M-3'))
+
+    assert asyncio.run(models.descarregar_journal()) == 2
+    assert _maquinas(repositorio) == ['M-1', 'M-3']
+    assert journal.pendentes() == []
+    with open(journal.caminho_quarentena, encoding='utf-8') as ficheiro:
+        quarentena = [json.loads(linha) for linha in ficheiro]
+    assert [r['chave'] for r in quarentena] == [chave_recusada]
+    assert 'FOREIGN KEY' in quarentena[0]['motivo']
+    assert models.journal_quarentena.resumo().get(CRIAR, 0) == antes + 1
+
+
+class RepositorioSemInsercoes:
+    """Delega no repositório real, mas as inserções falham como numa queda de rede."""
+
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+
+    def inserir_ordens(self, ordens):
+        raise httpx.ConnectError("rede indisponível")
+
+    def __getattr__(self, nome):
+        return getattr(self.repositorio, nome)
+
+
+def test_fechos_sao_aplicados_mesmo_com_as_criacoes_a_falhar(ambiente, monkeypatch):
+    repositorio, journal = ambiente
+    os_id = repositorio.inserir_ordens([_ordem('M-1')])[0]['id']
+    monkeypatch.setattr(database, 'repositorio', RepositorioSemInsercoes(repositorio))
+    journal.registar(CRIAR, dados=_ordem('M-2'))
+    journal.registar(FECHAR, os_id=os_id, chat_id=CHAT_ID, data_abertura='2024-03-01T08:00:00',
+                     dados={'data_fechamento': '2024-03-01T10:00:00', 'servico_concluido': True})
+
+    assert asyncio.run(models.descarregar_journal()) == 1
+    assert repositorio.listar_ordens_abertas(CHAT_ID) == []
+    # A criação falhou de forma transitória: fica pendente, não vai para a quarentena.
+    assert [r['tipo'] for r in journal.pendentes()] == [CRIAR]
+
+
+def test_ciclo_de_descarga_publica_o_backlog_nas_metricas(ambiente, monkeypatch):
+    repositorio, journal = ambiente
+    monkeypatch.setattr(database, 'repositorio', RepositorioSemInsercoes(repositorio))
+    chave = journal.registar(CRIAR, dados=_ordem('M-1'))
+    journal._pendentes[chave]['ts'] -= 120
+
+    async def cenario():
+        ciclo = asyncio.create_task(models.ciclo_descarga_journal())
+        try:
+            await _aguardar(lambda: journal_pendentes.resumo().get('total') == 1)
+            assert journal_idade_segundos.resumo()['total'] >= 120
+            # A rede volta: a escrita chega ao banco e as métricas voltam a zero.
+            monkeypatch.setattr(database, 'repositorio', repositorio)
+            journal.sinalizar()
+            await _aguardar(lambda: journal_pendentes.resumo().get('total') == 0)
+            assert journal_idade_segundos.resumo()['total'] == 0
+        finally:
+            ciclo.cancel()
+
+    asyncio.run(cenario())
+    assert _maquinas(repositorio) == ['M-1']
+
+
+async def _aguardar(condicao, timeout: float = 5.0) -> None:
+    limite = asyncio.get_running_loop().time() + timeout
+    while not condicao():
+        assert asyncio.get_running_loop().time() < limite, "condição não cumprida a tempo"
+        await asyncio.sleep(0.01)
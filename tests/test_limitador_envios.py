@@ -0,0 +1,45 @@
+"""Repetição dos envios ao Telegram após um 429 (utils/limitador_envios.py)."""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+
+from utils.limitador_envios import LimitadorEnvios, _segundos_retry_after
+
+
+# Sem PTB_TIMEDELTA, o PTB avisa que retry_after vai passar a timedelta.
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+@pytest.mark.parametrize('ptb_timedelta', ['false', 'true'])
+def test_espera_do_retry_after_em_segundos(monkeypatch, ptb_timedelta):
+    # Com PTB_TIMEDELTA=true o PTB devolve retry_after como timedelta; senão, como int ou float.
+    monkeypatch.setenv('PTB_TIMEDELTA', ptb_timedelta)
+    espera = _segundos_retry_after(RetryAfter(3))
+    assert (espera, type(espera)) == (3.0, float)
+    assert _segundos_retry_after(RetryAfter(timedelta(milliseconds=250))) == 0.25
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+def test_pedido_e_repetido_depois_da_espera_pedida_pelo_telegram():
+    limitador = LimitadorEnvios(taxa_global=100, taxa_chat=100, rajada_chat=10, max_tentativas=2)
+    tentativas = []
+
+    async def enviar():
+        tentativas.append(time.monotonic())
+        if len(tentativas) == 1:
+            raise RetryAfter(timedelta(milliseconds=300))
+        return True
+
+    async def cenario():
+        await limitador.initialize()
+        try:
+            return await asyncio.wait_for(
+                limitador.process_request(enviar, (), {}, 'sendMessage', {'chat_id': 1, 'text': 'olá'}, None), 5
+            )
+        finally:
+            await limitador.shutdown()
+
+    assert asyncio.run(cenario()) is True
+    assert len(tentativas) == 2
+    assert tentativas[1] - tentativas[0] >= 0.3
@@ -0,0 +1,28 @@
+"""Geração de relatórios no processo de renderização."""
+import subprocess
+import sys
+
+import database
+from database.repositorio_sqlite import RepositorioSQLite
+from utils.pdf_generator import gerar_relatorio_periodo_pdf, LAYOUT_RESUMO
+
+
+def test_importar_gerador_nao_carrega_models():
+    # Cada processo do pool importa o gerador: não deve abrir o journal nem criar os caches do bot.
+    codigo = "import sys, utils.pdf_generator; sys.exit('database.models' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', codigo]).returncode == 0
+
+
+def test_relatorio_periodo_le_as_os_do_repositorio(tmp_path, monkeypatch):
+    repositorio = RepositorioSQLite(str(tmp_path / 'kraflo.sqlite3'))
+    monkeypatch.setattr(database, 'repositorio', repositorio)
+    usuario = {'chat_id': 42, 'nome': 'Ana', 'funcao': 'Mecânico', 'nivel': 'Pleno', 'setor': 'A', 'cadastro_empresa': 'M42'}
+    repositorio.inserir_usuario(usuario)
+    repositorio.inserir_ordens([
+        {'chat_id': 42, 'numero_maquina': str(i), 'modelo_maquina': 'Tear', 'tipo_manutencao': 'Corretiva',
+         'problema_apresentado': 'Ruído — rolamento', 'data_abertura': f'2024-03-{i:02d}T08:00:00', 'chave_idempotencia': f'k{i}'}
+        for i in range(1, 11)
+    ])
+    pdf = gerar_relatorio_periodo_pdf(usuario, '2024-03-01', '2024-03-31', 'março', True, LAYOUT_RESUMO)
+    repositorio.fechar()
+    assert pdf.startswith(b'%PDF')
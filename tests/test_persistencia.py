@@ -0,0 +1,60 @@
+"""Estado das conversas gravado em SQLite e recuperado após um reinício (utils/persistencia.py)."""
+import asyncio
+
+from utils.persistencia import PersistenciaSQLite
+
+CONVERSA = 'fechar_os'
+
+
+def test_estado_sobrevive_ao_reinicio(tmp_path):
+    caminho = str(tmp_path / 'estado.sqlite3')
+
+    async def antes_do_reinicio():
+        persistencia = PersistenciaSQLite(caminho)
+        user_data = {'pagina_os': 2, 'filtro_maquina': 'PR-1'}
+        await persistencia.update_user_data(990001, user_data)
+        await persistencia.update_user_data(990002, {'temporario': True})
+        await persistencia.update_chat_data(990001, {'idioma': 'pt'})
+        await persistencia.update_bot_data({'versao': 3})
+        await persistencia.update_conversation(CONVERSA, (990001, 990001), 'CONFIRMAR_ACAO')
+        await persistencia.update_conversation(CONVERSA, (990002, 990002), 'ESCOLHER_OS')
+        # Deixa gravar este lote em segundo plano; o resto só é gravado pelo flush do encerramento.
+        await persistencia._descarga
+        user_data['pagina_os'] = 99  # alterado pelo handler depois de entregue: não conta
+        await persistencia.drop_user_data(990002)
+        await persistencia.update_conversation(CONVERSA, (990002, 990002), None)
+        await persistencia.update_conversation('registo', (990003, 990003), 1)
+        await persistencia.flush()
+
+    async def depois_do_reinicio():
+        persistencia = PersistenciaSQLite(caminho)
+        try:
+            return (
+                await persistencia.get_user_data(),
+                await persistencia.get_chat_data(),
+                await persistencia.get_bot_data(),
+                await persistencia.get_conversations(CONVERSA),
+                await persistencia.get_conversations('registo'),
+            )
+        finally:
+            await persistencia.flush()
+
+    asyncio.run(antes_do_reinicio())
+    user_data, chat_data, bot_data, conversas, registo = asyncio.run(depois_do_reinicio())
+    assert user_data == {990001: {'pagina_os': 2, 'filtro_maquina': 'PR-1'}}
+    assert chat_data == {990001: {'idioma': 'pt'}}
+    assert bot_data == {'versao': 3}
+    assert conversas == {(990001, 990001): 'CONFIRMAR_ACAO'}
+    assert registo == {(990003, 990003): 1}
+
+
+def test_ficheiro_novo_comeca_vazio(tmp_path):
+    async def cenario():
+        persistencia = PersistenciaSQLite(str(tmp_path / 'estado.sqlite3'))
+        try:
+            return (await persistencia.get_user_data(), await persistencia.get_bot_data(),
+                    await persistencia.get_callback_data(), await persistencia.get_conversations(CONVERSA))
+        finally:
+            await persistencia.flush()
+
+    assert asyncio.run(cenario()) == ({}, {}, None, {})
@@ -0,0 +1,368 @@
+"""
+Conformidade das implementações do repositório: o SQLite local e o Supabase
+têm de devolver os mesmos resultados para as mesmas operações.
+
+O Supabase corre contra um PostgREST falso (httpx.MockTransport) com as
+tabelas em memória. O falso só interpreta o subconjunto da API que
+database/repositorio_supabase.py usa; a função RPC resumo_setor não existe
+nele, por isso o Supabase agrega localmente, como num banco sem a função.
+"""
+import json
+import re
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from supabase import create_client, ClientOptions
+
+from database.repositorio import intervalo_iso, iterar_ordens_periodo, paginar
+from database.repositorio_sqlite import RepositorioSQLite
+from database.repositorio_supabase import RepositorioSupabase
+
+
+# --- PostgREST falso ---
+
+COLUNAS = {
+    'usuarios': ('id', 'chat_id', 'nome', 'funcao', 'nivel', 'setor', 'cadastro_empresa', 'created_at'),
+    'ordens_servico': (
+        'id', 'chat_id', 'numero_maquina', 'modelo_maquina', 'tipo_manutencao', 'problema_apresentado',
+        'data_abertura', 'data_fechamento', 'solucao_aplicada', 'substituir_peca', 'descricao_peca',
+        'tag_peca', 'servico_concluido', 'observacao', 'chave_idempotencia',
+    ),
+    'assinaturas_relatorio': ('id', 'chat_id', 'frequencia', 'layout', 'created_at'),
+}
+UNICAS = {
+    'usuarios': (('chat_id',), ('cadastro_empresa',)),
+    'ordens_servico': (('chave_idempotencia',),),
+    'assinaturas_relatorio': (('chat_id', 'frequencia'),),
+}
+
+
+def _dividir(texto: str) -> List[str]:
+    """Divide por vírgulas fora de parênteses e de aspas."""
+    partes, atual, nivel, aspas = [], '', 0, False
+    for c in texto:
+        if c == '"':
+            aspas = not aspas
+        elif not aspas and c == '(':
+            nivel += 1
+        elif not aspas and c == ')':
+            nivel -= 1
+        elif not aspas and nivel == 0 and c == ',':
+            partes.append(atual.strip())
+            atual = ''
+            continue
+        atual += c
+    return partes + [atual.strip()] if atual.strip() else partes
+
+
+def _converter(referencia: Any, texto: str) -> Any:
+    """Interpreta o valor do filtro com o tipo da coluna (o Postgres compara valores tipados)."""
+    texto = texto.strip('"')
+    if isinstance(referencia, bool):
+        return texto == 'true'
+    if isinstance(referencia, int):
+        return int(texto)
+    return texto
+
+
+def _cumpre(valor: Any, operador: str, texto: str) -> bool:
+    if operador == 'is':
+        return valor is None if texto == 'null' else valor is (texto == 'true')
+    if valor is None:
+        return False
+    if operador == 'in':
+        return valor in [_converter(valor, v) for v in _dividir(texto[1:-1])]
+    alvo = _converter(valor, texto)
+    return {
+        'eq': valor == alvo, 'neq': valor != alvo, 'gt': valor > alvo,
+        'gte': valor >= alvo, 'lt': valor < alvo, 'lte': valor <= alvo,
+    }[operador]
+
+
+def _condicao(linha: Dict[str, Any], expressao: str) -> bool:
+    """Uma condição de um filtro or=(...): 'coluna.op.valor', 'and(...)' ou 'or(...)'."""
+    for juncao, combinar in (('and(', all), ('or(', any)):
+        if expressao.startswith(juncao):
+            return combinar(_condicao(linha, parte) for parte in _dividir(expressao[len(juncao):-1]))
+    coluna, operador, texto = expressao.split('.', 2)
+    return _cumpre(linha.get(coluna), operador, texto)
+
+
+class PostgRESTFalso:
+    """Handler de httpx.MockTransport que responde como o PostgREST do Supabase, sobre listas em memória."""
+
+    def __init__(self):
+        self.tabelas: Dict[str, List[Dict[str, Any]]] = {nome: [] for nome in COLUNAS}
+        self._ids = {nome: 0 for nome in COLUNAS}
+
+    def __call__(self, pedido: httpx.Request) -> httpx.Response:
+        caminho = pedido.url.path.removeprefix('/rest/v1/')
+        if caminho.startswith('rpc/'):
+            return self._erro(404, 'PGRST202', f"Could not find the function public.{caminho[4:]}")
+        parametros = pedido.url.params.multi_items()
+        if pedido.method == 'GET':
+            return self._json(self._selecionar(caminho, parametros))
+        if pedido.method == 'POST':
+            return self._inserir(caminho, json.loads(pedido.content), dict(parametros), pedido.headers.get('prefer', ''))
+        linhas = self._filtrar(caminho, parametros)
+        if pedido.method == 'PATCH':
+            for linha in linhas:
+                linha.update(json.loads(pedido.content))
+            return self._json(linhas)
+        if pedido.method == 'DELETE':
+            self.tabelas[caminho] = [l for l in self.tabelas[caminho] if not any(l is r for r in linhas)]
+            return self._json(linhas)
+        return self._erro(405, 'PGRST000', 'método não suportado')
+
+    @staticmethod
+    def _json(dados: Any, estado: int = 200) -> httpx.Response:
+        return httpx.Response(estado, json=dados)
+
+    def _erro(self, estado: int, codigo: str, mensagem: str) -> httpx.Response:
+        return self._json({'code': codigo, 'message': mensagem, 'details': None, 'hint': None}, estado)
+
+    def _inserir(self, tabela: str, corpo: Any, parametros: Dict[str, str], prefer: str) -> httpx.Response:
+        ignorar_duplicados = 'resolution=ignore-duplicates' in prefer
+        juntar_duplicados = 'resolution=merge-duplicates' in prefer
+        inseridas = []
+        for novo in corpo if isinstance(corpo, list) else [corpo]:
+            if tabela != 'usuarios' and not any(u['chat_id'] == novo['chat_id'] for u in self.tabelas['usuarios']):
+                return self._erro(409, '23503', f'insert or update on table "{tabela}" violates foreign key constraint')
+            existente = self._conflito(tabela, novo)
+            if existente is not None:
+                if ignorar_duplicados:
+                    continue
+                if juntar_duplicados:
+                    existente.update(novo)
+                    inseridas.append(existente)
+                    continue
+                return self._erro(409, '23505', 'duplicate key value violates unique constraint')
+            self._ids[tabela] += 1
+            linha = {coluna: None for coluna in COLUNAS[tabela]}
+            linha.update(novo, id=self._ids[tabela])
+            self.tabelas[tabela].append(linha)
+            inseridas.append(linha)
+        return self._json([dict(l) for l in inseridas], 201)
+
+    def _conflito(self, tabela: str, novo: Dict[str, Any]) -> Dict[str, Any] | None:
+        for colunas in UNICAS[tabela]:
+            if any(novo.get(c) is None for c in colunas):
+                continue
+            for linha in self.tabelas[tabela]:
+                if all(linha[c] == novo[c] for c in colunas):
+                    return linha
+        return None
+
+    def _filtrar(self, tabela: str, parametros) -> List[Dict[str, Any]]:
+        linhas = self.tabelas[tabela]
+        for chave, valor in parametros:
+            if chave in ('select', 'order', 'limit', 'on_conflict', 'columns') or '.' in chave:
+                continue
+            if chave == 'or':
+                linhas = [l for l in linhas if _condicao(l, f'or{valor}')]
+            else:
+                operador, texto = valor.split('.', 1)
+                linhas = [l for l in linhas if _cumpre(l.get(chave), operador, texto)]
+        return linhas
+
+    def _selecionar(self, tabela: str, parametros) -> List[Dict[str, Any]]:
+        linhas = self._filtrar(tabela, parametros)
+        opcoes = dict(parametros)
+        filtros_embutidos = [(chave.split('.', 1), valor) for chave, valor in parametros if '.' in chave]
+        resultado = []
+        for linha in linhas:
+            saida = self._projetar(linha, _dividir(opcoes.get('select', '*')), filtros_embutidos)
+            if saida is not None:
+                resultado.append((linha, saida))
+        for campo in reversed(_dividir(opcoes.get('order', ''))):
+            coluna, _, sentido = campo.partition('.')
+            resultado.sort(key=lambda par: par[0][coluna], reverse=sentido == 'desc')
+        if 'limit' in opcoes:
+            resultado = resultado[:int(opcoes['limit'])]
+        return [saida for _, saida in resultado]
+
+    def _projetar(self, linha: Dict[str, Any], colunas: List[str], filtros_embutidos) -> Dict[str, Any] | None:
+        """Colunas pedidas em select, com os técnicos embutidos (ligados por chat_id); None se um !inner falhar."""
+        saida = {}
+        for coluna in colunas:
+            embutido = re.fullmatch(r'(\w+)(!inner)?\((.*)\)', coluna)
+            if embutido is None:
+                saida.update(linha if coluna == '*' else {coluna: linha[coluna]})
+                continue
+            relacao, interno, subcolunas = embutido.groups()
+            ligada = next((u for u in self.tabelas[relacao] if u['chat_id'] == linha['chat_id']), None)
+            if ligada is not None and not all(
+                _cumpre(ligada.get(c), *valor.split('.', 1)) for (r, c), valor in filtros_embutidos if r == relacao
+            ):
+                ligada = None
+            if ligada is None and interno:
+                return None
+            saida[relacao] = None if ligada is None else {c: ligada[c] for c in _dividir(subcolunas)}
+        return saida
+
+
+# --- Repositórios em teste ---
+
+@pytest.fixture(params=['sqlite', 'supabase'])
+def repositorio(request, tmp_path):
+    if request.param == 'sqlite':
+        repositorio = RepositorioSQLite(str(tmp_path / 'banco.sqlite3'))
+        yield repositorio
+        repositorio.fechar()
+        return
+    cliente_http = httpx.Client(transport=httpx.MockTransport(PostgRESTFalso()))
+    yield RepositorioSupabase(
+        create_client('http://postgrest.falso', 'chave', options=ClientOptions(httpx_client=cliente_http))
+    )
+    cliente_http.close()
+
+
+ANA, BRUNO, CARLA = 1001, 1002, 1003
+
+
+def _registar_tecnicos(repositorio) -> None:
+    for chat_id, nome, setor in ((ANA, 'Ana', 'Prensas'), (BRUNO, 'Bruno', 'Prensas'), (CARLA, 'Carla', 'Soldadura')):
+        repositorio.inserir_usuario({
+            'chat_id': chat_id, 'nome': nome, 'funcao': 'Técnico', 'nivel': 'I', 'setor': setor,
+            'cadastro_empresa': f'M{chat_id}',
+        })
+
+
+def _ordem(chat_id: int, maquina: str, abertura: str, chave: str, **extra) -> Dict[str, Any]:
+    return {
+        'chat_id': chat_id, 'numero_maquina': maquina, 'modelo_maquina': 'Prensa', 'tipo_manutencao': 'Corretiva',
+        'problema_apresentado': 'Ruído', 'data_abertura': abertura, 'data_fechamento': None,
+        'servico_concluido': None, 'chave_idempotencia': chave, **extra,
+    }
+
+
+def test_inserir_ordens_ignora_chaves_de_idempotencia_repetidas(repositorio):
+    _registar_tecnicos(repositorio)
+    lote = [_ordem(ANA, 'M-1', '2024-03-01T08:00:00', 'k1'), _ordem(ANA, 'M-2', '2024-03-02T08:00:00', 'k2')]
+
+    inseridas = repositorio.inserir_ordens(lote)
+    assert [(o['chat_id'], o['numero_maquina'], o['data_abertura']) for o in inseridas] == [
+        (ANA, 'M-1', '2024-03-01T08:00:00'), (ANA, 'M-2', '2024-03-02T08:00:00'),
+    ]
+    assert all(isinstance(o['id'], int) for o in inseridas)
+
+    # Reenvio do mesmo lote com uma OS nova: só a nova é inserida e devolvida.
+    reenviadas = repositorio.inserir_ordens(lote + [_ordem(ANA, 'M-3', '2024-03-03T08:00:00', 'k3')])
+    assert [o['numero_maquina'] for o in reenviadas] == ['M-3']
+    assert repositorio.inserir_ordens(lote) == []
+
+    ordens = iterar_ordens_periodo(repositorio, ANA, '2024-03-01', '2024-03-31', 10)
+    assert [o['numero_maquina'] for o in ordens] == ['M-1', 'M-2', 'M-3']
+
+
+def test_paginacao_por_chave_respeita_a_ordem_e_os_limites(repositorio):
+    _registar_tecnicos(repositorio)
+    repositorio.inserir_ordens([
+        _ordem(ANA, 'antes', '2024-02-29T23:59:59', 'k0'),
+        _ordem(ANA, 'inicio', '2024-03-01T00:00:00', 'k1'),
+        _ordem(ANA, 'empate-a', '2024-03-10T08:00:00', 'k2'),
+        _ordem(ANA, 'meio', '2024-03-05T08:00:00', 'k3'),
+        _ordem(ANA, 'empate-b', '2024-03-10T08:00:00', 'k4'),
+        _ordem(BRUNO, 'outro-chat', '2024-03-06T08:00:00', 'k5'),
+        _ordem(ANA, 'ultimo', '2024-03-31T23:59:59', 'k6'),
+        _ordem(ANA, 'fim', '2024-04-01T00:00:00', 'k7'),
+    ])
+    inicio, fim = intervalo_iso('2024-03-01', '2024-03-31')
+
+    paginas, apos = [], None
+    while True:
+        pagina = repositorio.pagina_ordens_periodo(ANA, inicio, fim, apos, 2)
+        paginas.append([o['numero_maquina'] for o in pagina])
+        if len(pagina) < 2:
+            break
+        apos = (pagina[-1]['data_abertura'], pagina[-1]['id'])
+    # [inicio, fim): inclui a OS aberta no primeiro instante e exclui a do instante `fim`;
+    # as OS com a mesma data seguem a ordem do id e nenhuma se repete ou perde entre páginas.
+    assert paginas == [['inicio', 'meio'], ['empate-a', 'empate-b'], ['ultimo']]
+
+    # Histórico da máquina: do mais recente para o mais antigo, estritamente antes do cursor.
+    repositorio.inserir_ordens([
+        _ordem(BRUNO, 'P-9', '2024-05-01T08:00:00', 'p1'),
+        _ordem(ANA, 'P-9', '2024-05-02T08:00:00', 'p2'),
+        _ordem(CARLA, 'P-9', '2024-05-02T08:00:00', 'p3'),
+    ])
+    historico = repositorio.pagina_ordens_maquina('P-9', None, 2)
+    assert [o['chat_id'] for o in historico] == [CARLA, ANA]
+    restante = repositorio.pagina_ordens_maquina('P-9', (historico[-1]['data_abertura'], historico[-1]['id']), 2)
+    assert [o['chat_id'] for o in restante] == [BRUNO]
+
+
+def test_paginar_para_na_pagina_incompleta_ou_vazia():
+    linhas = [{'data_abertura': f'2024-03-0{i}', 'id': i} for i in range(1, 5)]
+    pedidos = []
+
+    def pagina(apos, limite):
+        pedidos.append(apos)
+        restantes = [l for l in linhas if apos is None or (l['data_abertura'], l['id']) > apos]
+        return restantes[:limite]
+
+    # Total múltiplo do tamanho da página: só a página vazia confirma o fim.
+    assert [l['id'] for l in paginar(pagina, 2)] == [1, 2, 3, 4]
+    assert pedidos == [None, ('2024-03-02', 2), ('2024-03-04', 4)]
+    pedidos.clear()
+    assert [l['id'] for l in paginar(pagina, 3)] == [1, 2, 3, 4]
+    assert pedidos == [None, ('2024-03-03', 3)]
+
+
+def test_listagem_de_os_abertas(repositorio):
+    _registar_tecnicos(repositorio)
+    repositorio.inserir_ordens([
+        _ordem(ANA, 'M-1', '2024-03-01T08:00:00', 'k1'),
+        _ordem(ANA, 'M-2', '2024-03-02T08:00:00', 'k2', data_fechamento='2024-03-02T10:00:00', servico_concluido=True),
+        _ordem(BRUNO, 'M-3', '2024-03-03T08:00:00', 'k3'),
+    ])
+
+    abertas = repositorio.listar_ordens_abertas(ANA)
+    assert [(set(o), o['numero_maquina']) for o in abertas] == [({'id', 'numero_maquina', 'data_abertura'}, 'M-1')]
+    assert repositorio.listar_ordens_abertas(CARLA) == []
+
+    por_chat = repositorio.listar_ordens_abertas_lote([ANA, BRUNO, CARLA])
+    assert sorted(por_chat) == [ANA, BRUNO]
+    assert [o['numero_maquina'] for o in por_chat[ANA]] == ['M-1']
+    assert [(o['numero_maquina'], o['chat_id']) for o in por_chat[BRUNO]] == [('M-3', BRUNO)]
+
+
+def test_atualizar_ordem_so_altera_as_os_do_proprio_chat(repositorio):
+    _registar_tecnicos(repositorio)
+    os_id = repositorio.inserir_ordens([_ordem(ANA, 'M-1', '2024-03-01T08:00:00', 'k1')])[0]['id']
+    fecho = {'data_fechamento': '2024-03-01T10:00:00', 'solucao_aplicada': 'Ajuste', 'servico_concluido': True}
+
+    repositorio.atualizar_ordem(os_id, BRUNO, fecho)
+    assert [o['id'] for o in repositorio.listar_ordens_abertas(ANA)] == [os_id]
+
+    repositorio.atualizar_ordem(os_id, ANA, fecho)
+    assert repositorio.listar_ordens_abertas(ANA) == []
+    ordem = next(iterar_ordens_periodo(repositorio, ANA, '2024-03-01', '2024-03-01', 10))
+    assert (ordem['solucao_aplicada'], ordem['servico_concluido']) == ('Ajuste', True)
+
+
+def test_resumo_setor_agrega_por_tecnico_e_tipo(repositorio):
+    _registar_tecnicos(repositorio)
+    repositorio.inserir_ordens([
+        _ordem(ANA, 'M-1', '2024-03-01T08:00:00', 'k1', data_fechamento='2024-03-01T10:30:00', servico_concluido=True),
+        _ordem(ANA, 'M-2', '2024-03-02T08:00:00', 'k2', data_fechamento='2024-03-02T09:00:00', servico_concluido=False),
+        _ordem(ANA, 'M-3', '2024-03-03T08:00:00', 'k3'),
+        _ordem(ANA, 'M-4', '2024-03-04T08:00:00', 'k4', tipo_manutencao='Preventiva'),
+        _ordem(BRUNO, 'M-5', '2024-03-05T08:00:00', 'k5', data_fechamento='2024-03-05T12:00:00', servico_concluido=True),
+        # Fora do setor e fora do período: não entram no resumo.
+        _ordem(CARLA, 'M-6', '2024-03-06T08:00:00', 'k6'),
+        _ordem(BRUNO, 'M-7', '2024-04-01T08:00:00', 'k7'),
+    ])
+    inicio, fim = intervalo_iso('2024-03-01', '2024-03-31')
+
+    resumo = repositorio.resumo_setor('Prensas', inicio, fim)
+    assert [
+        (r['chat_id'], r['nome'], r['tipo_manutencao'], r['total'], r['fechadas'], r['concluidas']) for r in resumo
+    ] == [
+        (ANA, 'Ana', 'Corretiva', 3, 2, 1),
+        (ANA, 'Ana', 'Preventiva', 1, 0, 0),
+        (BRUNO, 'Bruno', 'Corretiva', 1, 1, 1),
+    ]
+    assert [r['horas_reparacao'] for r in resumo] == pytest.approx([3.5, 0, 4])
+    assert repositorio.resumo_setor('Inexistente', inicio, fim) == []
@@ -0,0 +1,170 @@
+"""Erros explícitos, novas tentativas e disjuntor do banco (database/resiliencia.py, handlers/erros.py)."""
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from telegram import Update
+
+from benchmarks.telegram_falso import criar_update_mensagem
+from database import resiliencia
+from database.repositorio_sqlite import RepositorioSQLite
+from database.resiliencia import (
+    Disjuntor, ErroBancoDados, BancoIndisponivel, erro_transitorio, proteger_repositorio,
+    FECHADO, ABERTO, MEIO_ABERTO,
+)
+from handlers.erros import tratar_erro, MENSAGEM_INDISPONIVEL
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(resiliencia.time, 'monotonic', relogio)
+    return relogio
+
+
+class Falhas:
+    """Método falso: lança as exceções da lista, pela ordem, e depois devolve `resultado`."""
+
+    def __init__(self, *erros: BaseException, resultado=None):
+        self.erros = list(erros)
+        self.resultado = resultado
+        self.chamadas = 0
+
+    def __call__(self, *args, **kwargs):
+        self.chamadas += 1
+        if self.erros:
+            raise self.erros.pop(0)
+        return self.resultado
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    repositorio = RepositorioSQLite(str(tmp_path / 'banco.sqlite3'))
+    yield repositorio
+    repositorio.fechar()
+
+
+def _proteger(repositorio, disjuntor: Disjuntor, **metodos):
+    for nome, metodo in metodos.items():
+        setattr(repositorio, nome, metodo)
+    return proteger_repositorio(repositorio, disjuntor, tentativas=3, espera_base=0, espera_max=0)
+
+
+def _erro_api(codigo: str) -> APIError:
+    return APIError({'code': codigo, 'message': 'erro', 'details': None, 'hint': None})
+
+
+@pytest.mark.parametrize('erro, transitorio', [
+    (httpx.ConnectError('sem rede'), True),
+    (httpx.ReadTimeout('timeout'), True),
+    (_erro_api('503'), True),
+    (_erro_api('PGRST000'), True),
+    (_erro_api('57014'), True),
+    (_erro_api('23505'), False),
+    (_erro_api('PGRST116'), False),
+    (_erro_api('42501'), False),
+    (sqlite3.OperationalError('database is locked'), True),
+    (sqlite3.OperationalError('no such table: usuarios'), False),
+    (ValueError('dados inválidos'), False),
+])
+def test_classificacao_dos_erros(erro, transitorio):
+    assert erro_transitorio(erro) is transitorio
+
+
+def test_disjuntor_abre_deixa_passar_um_teste_e_volta_a_fechar(relogio):
+    disjuntor = Disjuntor(limite_falhas=2, espera=30)
+    disjuntor.falha()
+    assert disjuntor.estado == FECHADO and disjuntor.permitir()
+    disjuntor.falha()
+    assert disjuntor.estado == ABERTO and not disjuntor.permitir()
+
+    relogio.agora += 30
+    # Fim da espera: passa uma única chamada de teste.
+    assert disjuntor.permitir() and disjuntor.estado == MEIO_ABERTO
+    assert not disjuntor.permitir()
+    # O teste falha: volta a abrir por mais uma espera completa.
+    disjuntor.falha()
+    assert disjuntor.estado == ABERTO
+    relogio.agora += 29
+    assert not disjuntor.permitir()
+
+    relogio.agora += 1
+    assert disjuntor.permitir() and disjuntor.estado == MEIO_ABERTO
+    disjuntor.sucesso()
+    assert disjuntor.estado == FECHADO and disjuntor.permitir()
+    assert resiliencia.db_disjuntor.resumo()['total'] == 0
+
+
+def test_leitura_transitoria_e_repetida_e_as_escritas_nunca(repositorio, relogio):
+    leitura = Falhas(httpx.ConnectError('sem rede'), _erro_api('503'), resultado=[{'chat_id': 1}])
+    escrita = Falhas(httpx.ConnectError('sem rede'), resultado=[{'id': 1}])
+    protegido = _proteger(repositorio, Disjuntor(limite_falhas=10, espera=30),
+                          buscar_usuarios=leitura, inserir_ordens=escrita)
+
+    assert protegido.buscar_usuarios([1]) == [{'chat_id': 1}]
+    assert leitura.chamadas == 3
+
+    with pytest.raises(ErroBancoDados) as erro:
+        protegido.inserir_ordens([{}])
+    assert escrita.chamadas == 1
+    assert (erro.value.operacao, erro.value.transitorio) == ('inserir_ordens', True)
+
+
+def test_erro_permanente_nao_e_repetido_nem_abre_o_disjuntor(repositorio, relogio):
+    leitura = Falhas(*[_erro_api('42501')] * 5)
+    disjuntor = Disjuntor(limite_falhas=1, espera=30)
+    protegido = _proteger(repositorio, disjuntor, buscar_usuarios=leitura)
+
+    with pytest.raises(ErroBancoDados) as erro:
+        protegido.buscar_usuarios([1])
+    assert leitura.chamadas == 1 and not erro.value.transitorio
+    assert disjuntor.estado == FECHADO
+
+
+def test_disjuntor_aberto_recusa_sem_contactar_o_banco(repositorio, relogio):
+    leitura = Falhas(*[httpx.ConnectError('sem rede')] * 3, resultado=[])
+    protegido = _proteger(repositorio, Disjuntor(limite_falhas=2, espera=30), buscar_usuarios=leitura)
+
+    with pytest.raises(BancoIndisponivel):
+        protegido.buscar_usuarios([1])
+    # Duas falhas abriram o disjuntor: a terceira tentativa já não chegou ao banco.
+    assert leitura.chamadas == 2
+    with pytest.raises(BancoIndisponivel):
+        protegido.buscar_usuarios([1])
+    assert leitura.chamadas == 2
+
+
+class BotFalso:
+    def __init__(self):
+        self.enviadas = []
+
+    async def send_message(self, chat_id, texto):
+        self.enviadas.append((chat_id, texto))
+
+
+class ContextoFalso:
+    def __init__(self, erro: BaseException):
+        self.error = erro
+        self.bot = BotFalso()
+
+
+@pytest.mark.parametrize('erro, avisado', [
+    (ErroBancoDados('buscar_usuarios', transitorio=True, causa=httpx.ConnectError('sem rede')), True),
+    (BancoIndisponivel('buscar_usuarios', transitorio=True), True),
+    (ValueError('erro de programação'), False),
+])
+def test_erros_do_banco_sao_comunicados_ao_utilizador(erro, avisado):
+    update = Update.de_json(criar_update_mensagem(1, 950001, 'olá'), None)
+    contexto = ContextoFalso(erro)
+    asyncio.run(tratar_erro(update, contexto))
+    assert contexto.bot.enviadas == ([(950001, MENSAGEM_INDISPONIVEL)] if avisado else [])
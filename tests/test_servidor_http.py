@@ -0,0 +1,108 @@
+"""Servidor HTTP do modo webhook, testado com um cliente local e a Bot API falsa."""
+import asyncio
+import json
+import os
+import signal
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+from benchmarks.telegram_falso import TelegramFalso, criar_update_mensagem
+from config import WEBHOOK_CAMINHO
+from utils import webhook
+from utils.servidor_http import ServidorHTTP, Resposta, TAMANHO_MAXIMO_LINHA
+
+SEGREDO = 'segredo-teste'
+
+
+async def _pedido(porta: int, dados: bytes, fim: bool = True) -> int:
+    """
+    Envia bytes em bruto e retorna o estado da resposta. Com fim=False o cliente não
+    fecha o seu lado: a resposta só chega inteira se o servidor fechar a ligação.
+    """
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    escritor.write(dados)
+    await escritor.drain()
+    if fim:
+        escritor.write_eof()
+    resposta = await asyncio.wait_for(leitor.read(), 5)
+    escritor.close()
+    return int(resposta.split(b' ', 2)[1])
+
+
+def _post(caminho: str, corpo: bytes, segredo: str) -> bytes:
+    return (
+        f"POST {caminho} HTTP/1.1\r\nHost: teste\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(corpo)}\r\nX-Telegram-Bot-Api-Secret-Token: {segredo}\r\nConnection: close\r\n\r\n"
+    ).encode() + corpo
+
+
+def test_servir_webhook(monkeypatch):
+    monkeypatch.setattr(webhook, 'WEBHOOK_SEGREDO', SEGREDO)
+    recebidas = []
+    resultados = {}
+
+    async def cenario():
+        telegram = TelegramFalso(0)
+        await telegram.iniciar()
+        url = f"http://127.0.0.1:{telegram.servidor.porta_efetiva}"
+        application = ApplicationBuilder().token('123456:TESTE').base_url(f"{url}/bot").build()
+
+        async def registar(update, context):
+            recebidas.append(update.effective_chat.id)
+        application.add_handler(TypeHandler(Update, registar))
+        servidor = webhook.criar_servidor_webhook(application, '127.0.0.1', 0)
+
+        async def pedidos():
+            try:
+                porta = servidor.porta_efetiva
+                update = json.dumps(criar_update_mensagem(1, 777, '/start')).encode()
+                resultados['valido'] = await _pedido(porta, _post(WEBHOOK_CAMINHO, update, SEGREDO))
+                resultados['segredo'] = await _pedido(porta, _post(WEBHOOK_CAMINHO, update, 'errado'))
+                resultados['json'] = await _pedido(porta, _post(WEBHOOK_CAMINHO, b'{nao e json', SEGREDO))
+                resultados['saude'] = await _pedido(porta, b"GET /saude HTTP/1.1\r\nConnection: close\r\n\r\n")
+                resultados['rota'] = await _pedido(porta, b"GET /nada HTTP/1.1\r\nConnection: close\r\n\r\n")
+                for _ in range(50):
+                    if recebidas:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        await webhook.servir(application, servidor, pedidos)
+        await telegram.servidor.parar()
+
+    asyncio.run(cenario())
+    assert resultados == {'valido': 200, 'segredo': 403, 'json': 400, 'saude': 200, 'rota': 404}
+    assert recebidas == [777]
+
+
+def test_pedidos_mal_formados_recebem_400_e_a_ligacao_fecha():
+    async def cenario():
+        servidor = ServidorHTTP('127.0.0.1', 0)
+
+        async def ok(pedido):
+            return Resposta(200, pedido.corpo)
+        servidor.rota('POST', '/eco', ok)
+        await servidor.iniciar()
+        porta = servidor.porta_efetiva
+        try:
+            estados = {
+                'linha_longa': await _pedido(porta, b"GET /" + b"a" * (TAMANHO_MAXIMO_LINHA + 10) + b" HTTP/1.1\r\n\r\n", fim=False),
+                'cabecalho_longo': await _pedido(porta, b"GET / HTTP/1.1\r\nX: " + b"a" * (TAMANHO_MAXIMO_LINHA + 10) + b"\r\n\r\n", fim=False),
+                'linha_invalida': await _pedido(porta, b"LIXO\r\n\r\n", fim=False),
+                'cabecalho_invalido': await _pedido(porta, b"GET / HTTP/1.1\r\nsem dois pontos\r\n\r\n", fim=False),
+                'tamanho_invalido': await _pedido(porta, b"POST /eco HTTP/1.1\r\nContent-Length: x\r\n\r\n", fim=False),
+                'corpo_grande': await _pedido(porta, b"POST /eco HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n", fim=False),
+                'cabecalhos_truncados': await _pedido(porta, b"GET / HTTP/1.1\r\nHost: x"),
+                'corpo_truncado': await _pedido(porta, b"POST /eco HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc"),
+                'valido': await _pedido(porta, b"POST /eco HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\nabc"),
+            }
+        finally:
+            await servidor.parar()
+        return estados
+
+    estados = asyncio.run(cenario())
+    assert estados.pop('corpo_grande') == 413
+    assert estados.pop('valido') == 200
+    assert set(estados.values()) == {400}, estados
@@ -0,0 +1,110 @@
+"""Pedidos repetidos partilham uma execução (utils/voo_unico.py)."""
+import asyncio
+
+from database import cache
+from utils.voo_unico import VooUnico, pedidos_repetidos
+
+CHAVE = (960001, 'relatorio', '2024-03')
+
+
+class Operacao:
+    """Operação assíncrona que só termina quando o teste a liberta."""
+
+    def __init__(self, resultado=True, erro: BaseException | None = None):
+        self.resultado = resultado
+        self.erro = erro
+        self.execucoes = 0
+        self.liberar = asyncio.Event()
+
+    async def __call__(self):
+        self.execucoes += 1
+        await self.liberar.wait()
+        if self.erro is not None:
+            raise self.erro
+        return self.resultado
+
+
+def test_pedidos_simultaneos_partilham_uma_execucao():
+    antes = pedidos_repetidos.resumo().get('relatorio,em_curso', 0)
+
+    async def cenario():
+        voo = VooUnico(janela=60, max_entradas=10)
+        operacao = Operacao(resultado='pdf')
+        pedidos = [asyncio.create_task(voo.executar(CHAVE, operacao)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert voo.em_curso(CHAVE)
+        operacao.liberar.set()
+        resultados = await asyncio.gather(*pedidos)
+        assert not voo.em_curso(CHAVE)
+        return operacao.execucoes, resultados
+
+    assert asyncio.run(cenario()) == (1, ['pdf'] * 3)
+    assert pedidos_repetidos.resumo()['relatorio,em_curso'] - antes == 2
+
+
+def test_resultado_idempotente_e_reutilizado_durante_a_janela(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: agora[0])
+
+    async def cenario():
+        voo = VooUnico(janela=60, max_entradas=10)
+        operacao = Operacao(resultado={'os_id': 7})
+        operacao.liberar.set()
+        primeiro = await voo.executar(CHAVE, operacao, idempotente=True)
+        agora[0] += 59
+        segundo = await voo.executar(CHAVE, operacao, idempotente=True)
+        assert operacao.execucoes == 1 and segundo == primeiro
+        # Fora da janela volta a executar; sem idempotente=True nunca reutiliza.
+        agora[0] += 2
+        await voo.executar(CHAVE, operacao, idempotente=True)
+        await voo.executar(CHAVE, operacao)
+        return operacao.execucoes
+
+    assert asyncio.run(cenario()) == 3
+
+
+def test_resultado_falso_nao_fica_na_janela():
+    async def cenario():
+        voo = VooUnico(janela=60, max_entradas=10)
+        operacao = Operacao(resultado=False)
+        operacao.liberar.set()
+        await voo.executar(CHAVE, operacao, idempotente=True)
+        await voo.executar(CHAVE, operacao, idempotente=True)
+        return operacao.execucoes
+
+    assert asyncio.run(cenario()) == 2
+
+
+def test_cancelar_um_pedido_nao_cancela_a_execucao_partilhada():
+    async def cenario():
+        voo = VooUnico(janela=60, max_entradas=10)
+        operacao = Operacao(resultado='pdf')
+        cancelado = asyncio.create_task(voo.executar(CHAVE, operacao))
+        restante = asyncio.create_task(voo.executar(CHAVE, operacao))
+        await asyncio.sleep(0)
+        cancelado.cancel()
+        await asyncio.sleep(0)
+        assert cancelado.cancelled() and voo.em_curso(CHAVE)
+        operacao.liberar.set()
+        return operacao.execucoes, await restante
+
+    assert asyncio.run(cenario()) == (1, 'pdf')
+
+
+def test_excecao_chega_a_todos_e_nao_bloqueia_a_chave():
+    async def cenario():
+        voo = VooUnico(janela=60, max_entradas=10)
+        falha = Operacao(erro=RuntimeError('banco em baixo'))
+        pedidos = [asyncio.create_task(voo.executar(CHAVE, falha, idempotente=True)) for _ in range(2)]
+        await asyncio.sleep(0)
+        falha.liberar.set()
+        erros = await asyncio.gather(*pedidos, return_exceptions=True)
+        assert all(isinstance(erro, RuntimeError) for erro in erros) and falha.execucoes == 1
+        assert not voo.em_curso(CHAVE)
+
+        # O pedido seguinte executa de novo, em vez de receber a exceção guardada.
+        sucesso = Operacao(resultado='pdf')
+        sucesso.liberar.set()
+        return await voo.executar(CHAVE, sucesso, idempotente=True), sucesso.execucoes
+
+    assert asyncio.run(cenario()) == ('pdf', 1)
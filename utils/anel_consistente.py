@@ -0,0 +1,64 @@
+"""
+Anel de hashing consistente, usado para repartir os chats pelos processos
+trabalhadores no modo distribuído.
+
+Cada nó ocupa várias posições (réplicas virtuais) no anel; uma chave pertence
+ao primeiro nó que aparece depois do seu hash. Quando um nó sai, só as chaves
+que eram dele mudam de dono (e espalham-se pelos restantes); quando volta,
+recupera exatamente as mesmas chaves.
+"""
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+# Posições de cada nó no anel: mais réplicas repartem os chats de forma mais uniforme.
+REPLICAS = 160
+
+
+def _hash(valor: str) -> int:
+    # Estável entre processos e reinícios, ao contrário de hash() (aleatorizado por PYTHONHASHSEED).
+    return int.from_bytes(hashlib.blake2b(valor.encode(), digest_size=8).digest(), 'big')
+
+
+class AnelConsistente:
+    """Atribui chaves (chat_id) a nós (trabalhadores)."""
+
+    def __init__(self, nos: Iterable[str] = (), replicas: int = REPLICAS):
+        self.replicas = replicas
+        self._posicoes: List[int] = []
+        self._donos: Dict[int, str] = {}
+        for no in nos:
+            self.adicionar(no)
+
+    @property
+    def nos(self) -> List[str]:
+        return sorted(set(self._donos.values()))
+
+    def __contains__(self, no: str) -> bool:
+        return _hash(f"{no}#0") in self._donos
+
+    def __len__(self) -> int:
+        return len(self._posicoes) // self.replicas
+
+    def adicionar(self, no: str) -> None:
+        if no in self:
+            return
+        for i in range(self.replicas):
+            posicao = _hash(f"{no}#{i}")
+            bisect.insort(self._posicoes, posicao)
+            self._donos[posicao] = no
+
+    def remover(self, no: str) -> None:
+        if no not in self:
+            return
+        for i in range(self.replicas):
+            posicao = _hash(f"{no}#{i}")
+            del self._posicoes[bisect.bisect_left(self._posicoes, posicao)]
+            del self._donos[posicao]
+
+    def no_para(self, chave: int | str) -> str | None:
+        """Nó responsável pela chave, ou None se o anel estiver vazio."""
+        if not self._posicoes:
+            return None
+        indice = bisect.bisect(self._posicoes, _hash(str(chave))) % len(self._posicoes)
+        return self._donos[self._posicoes[indice]]
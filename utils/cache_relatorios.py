@@ -0,0 +1,128 @@
+"""
+Cache dos relatórios PDF já gerados.
+
+Gerar um relatório custa uma ida ao pool de processos, várias consultas
+paginadas e o envio do ficheiro. Um técnico que pede o mesmo relatório duas
+vezes (ou o reenvia ao chefe de turno) recebe a cópia guardada, sem nova
+renderização.
+
+As entradas são indexadas por (chat_id, data_inicio, data_fim, layout,
+com_anexos) e o cache é limitado em bytes, com remoção LRU. Além do PDF,
+guarda-se o file_id devolvido pelo Telegram no primeiro envio, para que os
+envios seguintes nem sequer voltem a carregar o ficheiro.
+
+A invalidação é exata: quando uma OS de um utilizador chega ao banco (criação
+ou fecho), só os relatórios desse utilizador cujo período inclui o dia de
+abertura da OS são removidos.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Tuple
+
+from config import RELATORIO_CACHE_BYTES
+from .metricas import registo
+
+# (chat_id, data_inicio 'YYYY-MM-DD', data_fim 'YYYY-MM-DD', layout, com_anexos)
+ChaveRelatorio = Tuple[int, str, str, str, bool]
+
+cache_relatorios_total = registo.contador(
+    'kraflo_cache_relatorios_total', 'Pedidos de relatório ao cache, por resultado (hit/miss).'
+)
+
+
+class EntradaRelatorio:
+    __slots__ = ('pdf', 'file_id')
+
+    def __init__(self, pdf: bytes):
+        self.pdf = pdf
+        self.file_id: str | None = None
+
+
+class CacheRelatorios:
+    """
+    Cache LRU limitado a `max_bytes` de PDFs.
+    É partilhado entre o event loop e o pool do banco (a descarga do journal
+    invalida entradas a partir de uma thread), por isso todas as operações
+    passam por um lock.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._dados: OrderedDict[ChaveRelatorio, EntradaRelatorio] = OrderedDict()
+        self._bytes = 0
+        # Geração por chat: muda a cada invalidação, para que um relatório que
+        # começou a ser gerado antes de uma escrita não seja guardado depois dela.
+        self._geracoes: Dict[int, int] = {}
+        # Geração dos chats ainda sem entrada em _geracoes; sobe a cada limpar().
+        self._geracao_inicial = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_bytes > 0
+
+    def geracao(self, chat_id: int) -> int:
+        with self._lock:
+            return self._geracoes.get(chat_id, self._geracao_inicial)
+
+    def obter(self, chave: ChaveRelatorio) -> EntradaRelatorio | None:
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is not None:
+                self._dados.move_to_end(chave)
+        cache_relatorios_total.incrementar(resultado='hit' if entrada else 'miss')
+        return entrada
+
+    def guardar(self, chave: ChaveRelatorio, pdf: bytes, geracao: int) -> None:
+        """Guarda o PDF, exceto se o chat tiver sido invalidado desde `geracao` ou o PDF não couber."""
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            if self._geracoes.get(chave[0], self._geracao_inicial) != geracao:
+                return
+            self._remover(chave)
+            self._dados[chave] = EntradaRelatorio(pdf)
+            self._bytes += len(pdf)
+            while self._bytes > self.max_bytes:
+                self._remover(next(iter(self._dados)))
+
+    def definir_file_id(self, chave: ChaveRelatorio, file_id: str) -> None:
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is not None:
+                entrada.file_id = file_id
+
+    def invalidar(self, chat_id: int, dia: str | None = None) -> None:
+        """
+        Remove os relatórios do chat cujo período inclui `dia` ('YYYY-MM-DD').
+        Sem `dia` (data de abertura desconhecida), remove todos os relatórios do chat.
+        """
+        with self._lock:
+            self._geracoes[chat_id] = self._geracoes.get(chat_id, self._geracao_inicial) + 1
+            afetadas = [
+                chave for chave in self._dados
+                if chave[0] == chat_id and (dia is None or chave[1] <= dia <= chave[2])
+            ]
+            for chave in afetadas:
+                self._remover(chave)
+
+    def limpar(self) -> None:
+        """Remove todos os relatórios; os que estão a ser gerados já não serão guardados."""
+        with self._lock:
+            self._dados.clear()
+            self._bytes = 0
+            self._geracao_inicial += 1
+            for chat_id in self._geracoes:
+                self._geracoes[chat_id] += 1
+
+    def _remover(self, chave: Hashable) -> None:
+        entrada = self._dados.pop(chave, None)
+        if entrada is not None:
+            self._bytes -= len(entrada.pdf)
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entradas': len(self._dados), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+cache_relatorios = CacheRelatorios(RELATORIO_CACHE_BYTES)
@@ -0,0 +1,532 @@
+"""
+Modo distribuído: um processo de entrada e vários processos trabalhadores.
+
+O processo de entrada recebe as atualizações do Telegram (polling ou webhook)
+e não executa handlers: lê apenas o chat_id de cada atualização e envia-a,
+por HTTP local, ao trabalhador dono desse chat num anel de hashing
+consistente. Cada trabalhador é um processo normal do bot (handlers, caches,
+pool de PDF, JobQueue) que recebe as atualizações em vez de as ir buscar ao
+Telegram e responde diretamente à Bot API.
+
+Quando o anel muda, os trabalhadores que recebem chats (os que ficam, quando
+um sai, e o que volta) esvaziam os caches em memória antes do próximo lote:
+outro trabalhador pode ter alterado esses chats entretanto.
+
+Como um chat pertence sempre ao mesmo trabalhador, o estado das conversas
+(ConversationHandler) fica local e as atualizações de cada chat chegam por
+ordem: a entrada tem uma fila e um único envio em curso por trabalhador, e o
+trabalhador processa-as com o ProcessadorPorChat.
+
+A entrada verifica a saúde dos trabalhadores (GET /saude) e volta a lançar os
+processos que terminem. Um trabalhador que falhe DISTRIBUICAO_SAUDE_FALHAS
+vezes seguidas sai do anel: as atualizações pendentes e os seus chats passam
+para os restantes (perdendo uma conversa a meio, que o utilizador recomeça);
+quando volta a responder, recupera exatamente os mesmos chats, incluindo o
+estado das conversas gravado no seu ficheiro de persistência.
+"""
+import asyncio
+import functools
+import hmac
+import json
+import os
+import secrets
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    logging, BOT_MODO, TELEGRAM_TOKEN, TELEGRAM_API_URL, DISTRIBUICAO_ENTRADA, DISTRIBUICAO_TRABALHADORES,
+    DISTRIBUICAO_HOST, DISTRIBUICAO_PORTA_BASE, DISTRIBUICAO_SAUDE_INTERVALO, DISTRIBUICAO_SAUDE_FALHAS,
+    TRABALHADOR_INDICE, TRABALHADOR_SEGREDO, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORTA, WEBHOOK_CAMINHO,
+    WEBHOOK_SEGREDO, PERSISTENCIA_FICHEIRO, JOURNAL_FICHEIRO, METRICAS_HOST, METRICAS_PORTA, ENVIO_TAXA_GLOBAL
+)
+from database.models import descarregar_journal, limpar_caches_locais
+from .anel_consistente import AnelConsistente
+from .metricas import registo, criar_servidor_metricas
+from .processamento import chave_chat
+from .servidor_http import ServidorHTTP, Pedido, Resposta
+from .webhook import CABECALHO_SEGREDO, rota_saude, servir, sinal_de_paragem
+
+# Rota dos trabalhadores que recebe uma lista de atualizações (JSON), já pela ordem em que chegaram.
+CAMINHO_ATUALIZACOES = '/atualizacoes'
+# Rota dos trabalhadores que esvazia os caches em memória (os seus chats mudaram de dono).
+CAMINHO_ANEL = '/anel'
+CABECALHO_SEGREDO_TRABALHADOR = 'x-kraflo-segredo'
+# Número máximo de atualizações enviadas a um trabalhador num só pedido.
+LOTE_MAX = 100
+# Tempo de espera do long polling ao Telegram (segundos).
+TEMPO_POLLING = 30
+# Tempo dado aos trabalhadores para terminarem depois do SIGTERM, antes do SIGKILL.
+TEMPO_ENCERRAMENTO = 30
+
+atualizacoes_distribuidas = registo.contador(
+    'kraflo_distribuicao_atualizacoes_total', 'Atualizações entregues a cada trabalhador.')
+trabalhadores_no_anel = registo.medidor(
+    'kraflo_distribuicao_trabalhadores', 'Trabalhadores saudáveis no anel de distribuição.')
+reinicios_trabalhadores = registo.contador(
+    'kraflo_distribuicao_reinicios_total', 'Processos trabalhadores lançados de novo após terminarem.')
+
+
+def nome_trabalhador(indice: int) -> str:
+    return f"trabalhador-{indice}"
+
+
+@functools.lru_cache(maxsize=1)
+def _anel_completo() -> AnelConsistente:
+    return AnelConsistente(nome_trabalhador(i) for i in range(DISTRIBUICAO_TRABALHADORES))
+
+
+def chat_local(chat_id: int) -> bool:
+    """
+    Indica se o chat pertence a este processo (com todos os trabalhadores no anel).
+    Fora do modo distribuído, todos os chats são locais. Usado pelos trabalhos agendados,
+    que correm em todos os trabalhadores mas não devem ser repetidos.
+    """
+    if BOT_MODO != 'trabalhador':
+        return True
+    return _anel_completo().no_para(chat_id) == nome_trabalhador(TRABALHADOR_INDICE)
+
+
+def chave_atualizacao(dados: Dict[str, Any]) -> int | None:
+    """Chave de distribuição de uma atualização: a mesma que ordena o processamento no trabalhador."""
+    return chave_chat(Update.de_json(dados, None))
+
+
+def _ficheiro_trabalhador(caminho: str, indice: int) -> str:
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}.{indice}{extensao}"
+
+
+def ambiente_trabalhador(indice: int, total: int, segredo: str) -> Dict[str, str]:
+    """Variáveis de ambiente que distinguem o trabalhador `indice` dos restantes."""
+    ambiente = {
+        'BOT_MODO': 'trabalhador',
+        'TRABALHADOR_INDICE': str(indice),
+        'TRABALHADOR_SEGREDO': segredo,
+        # Cada processo tem os seus próprios ficheiros locais.
+        'JOURNAL_FICHEIRO': _ficheiro_trabalhador(JOURNAL_FICHEIRO, indice),
+        'PERSISTENCIA_FICHEIRO': _ficheiro_trabalhador(PERSISTENCIA_FICHEIRO, indice) if PERSISTENCIA_FICHEIRO else '',
+        # O limite do Telegram é do bot, não do processo: é repartido pelos trabalhadores.
+        'ENVIO_TAXA_GLOBAL': str(ENVIO_TAXA_GLOBAL / total),
+    }
+    if METRICAS_PORTA:
+        # A porta METRICAS_PORTA fica para a entrada; os trabalhadores usam as seguintes.
+        ambiente['METRICAS_PORTA'] = str(METRICAS_PORTA + 1 + indice)
+    return ambiente
+
+
+async def lancar_trabalhador(comando: List[str], segredo: str, indice: int) -> asyncio.subprocess.Process:
+    """Lança o processo do trabalhador; a saída (logs) vai para a mesma consola/journald da entrada."""
+    ambiente = {**os.environ, **ambiente_trabalhador(indice, DISTRIBUICAO_TRABALHADORES, segredo)}
+    processo = await asyncio.create_subprocess_exec(*comando, env=ambiente)
+    logging.info(f"{nome_trabalhador(indice)} lançado (pid {processo.pid}).")
+    return processo
+
+
+# <<< --- TRABALHADOR --- >>>
+
+def criar_servidor_trabalhador(application: Application, host: str, porta: int, segredo: str) -> ServidorHTTP:
+    """Servidor local do trabalhador: recebe as atualizações da entrada e responde ao /saude."""
+    servidor = ServidorHTTP(host, porta)
+
+    def autorizado(pedido: Pedido) -> bool:
+        return hmac.compare_digest(pedido.cabecalhos.get(CABECALHO_SEGREDO_TRABALHADOR, '').encode(), segredo.encode())
+
+    async def receber_atualizacoes(pedido: Pedido) -> Resposta:
+        if not autorizado(pedido):
+            return Resposta(403)
+        if not application.running:
+            # A encerrar: a entrada volta a enviar o lote mais tarde ou a outro trabalhador.
+            return Resposta(503)
+        try:
+            atualizacoes = [Update.de_json(dados, application.bot) for dados in json.loads(pedido.corpo)]
+        except (ValueError, TypeError, KeyError) as e:
+            logging.error(f"Lote de atualizações inválido recebido da entrada: {e}")
+            return Resposta(400)
+        for update in atualizacoes:
+            await application.update_queue.put(update)
+        return Resposta(200)
+
+    async def mudanca_anel(pedido: Pedido) -> Resposta:
+        if not autorizado(pedido):
+            return Resposta(403)
+        # As escritas pendentes vão primeiro para o banco, para que o novo dono dos chats as veja.
+        await descarregar_journal()
+        limpar_caches_locais()
+        logging.info(f"{nome_trabalhador(TRABALHADOR_INDICE)}: o anel mudou; caches em memória esvaziados.")
+        return Resposta(200)
+
+    servidor.rota('POST', CAMINHO_ATUALIZACOES, receber_atualizacoes)
+    servidor.rota('POST', CAMINHO_ANEL, mudanca_anel)
+    servidor.rota('GET', '/saude', rota_saude(application))
+    return servidor
+
+
+async def executar_trabalhador(application: Application) -> None:
+    """Ciclo de vida de um trabalhador: serve as atualizações enviadas pela entrada até receber SIGTERM."""
+    porta = DISTRIBUICAO_PORTA_BASE + TRABALHADOR_INDICE
+    servidor = criar_servidor_trabalhador(application, DISTRIBUICAO_HOST, porta, TRABALHADOR_SEGREDO)
+
+    async def pronto() -> None:
+        logging.info(f"{nome_trabalhador(TRABALHADOR_INDICE)} pronto em {DISTRIBUICAO_HOST}:{porta}.")
+
+    await servir(application, servidor, pronto)
+
+
+# <<< --- ENTRADA --- >>>
+
+@dataclass
+class Trabalhador:
+    nome: str
+    url: str
+    fila: asyncio.Queue = field(default_factory=asyncio.Queue)
+    # Lote retirado da fila e ainda não aceite pelo trabalhador.
+    lote: List[Dict[str, Any]] = field(default_factory=list)
+    a_enviar: bool = False
+    falhas: int = 0
+    processo: asyncio.subprocess.Process | None = None
+    arranques: int = 0
+    # Já esteve no anel (ao voltar, o estado em memória pode estar desatualizado).
+    admitido: bool = False
+    # O anel mudou desde o último lote: o trabalhador tem de esvaziar os caches antes do próximo.
+    limpar_estado: bool = False
+
+
+Lancador = Callable[[int], Awaitable[asyncio.subprocess.Process]]
+
+
+class Entrada:
+    """
+    Reparte as atualizações pelos trabalhadores. Com `lancador`, a entrada lança e
+    supervisiona os processos; sem ele, os trabalhadores são geridos por outro meio
+    (por exemplo, noutras máquinas, ou no mesmo processo num teste).
+    """
+
+    def __init__(self, urls: List[str], segredo: str, lancador: Lancador | None = None,
+                 intervalo_saude: float = DISTRIBUICAO_SAUDE_INTERVALO, limite_falhas: int = DISTRIBUICAO_SAUDE_FALHAS):
+        self.trabalhadores = [Trabalhador(nome_trabalhador(i), url.rstrip('/')) for i, url in enumerate(urls)]
+        self._por_nome = {t.nome: t for t in self.trabalhadores}
+        self.segredo = segredo
+        self.lancador = lancador
+        self.intervalo_saude = intervalo_saude
+        self.limite_falhas = limite_falhas
+        # Começa vazio: cada trabalhador entra no anel quando responder ao primeiro /saude.
+        self.anel = AnelConsistente()
+        # Atualizações recebidas enquanto nenhum trabalhador está disponível.
+        self._sem_dono: List[Dict[str, Any]] = []
+        self._cliente: httpx.AsyncClient | None = None
+        self._tarefas: List[asyncio.Task] = []
+
+    async def iniciar(self) -> None:
+        self._cliente = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=2.0))
+        if self.lancador is not None:
+            for indice, trabalhador in enumerate(self.trabalhadores):
+                trabalhador.processo = await self.lancador(indice)
+                trabalhador.arranques = 1
+        loop = asyncio.get_running_loop()
+        self._tarefas = [loop.create_task(self._ciclo_envio(t), name=f"envio_{t.nome}") for t in self.trabalhadores]
+        self._tarefas.append(loop.create_task(self._ciclo_saude(), name="saude_trabalhadores"))
+
+    async def aguardar_prontos(self, timeout: float = 30.0) -> bool:
+        """Espera que todos os trabalhadores estejam no anel. Retorna False se o tempo acabar antes."""
+        limite = asyncio.get_running_loop().time() + timeout
+        while len(self.anel) < len(self.trabalhadores):
+            if asyncio.get_running_loop().time() > limite:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def parar(self, timeout: float = 10.0) -> None:
+        """Entrega o que estiver pendente (até `timeout` segundos) e termina os trabalhadores."""
+        limite = asyncio.get_running_loop().time() + timeout
+        while self.pendentes() and asyncio.get_running_loop().time() < limite:
+            await asyncio.sleep(0.05)
+        if self.pendentes():
+            logging.warning(f"Entrada encerrada com {self.pendentes()} atualizações por entregar.")
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        await asyncio.gather(*(self._terminar(t) for t in self.trabalhadores))
+        if self._cliente is not None:
+            await self._cliente.aclose()
+
+    def pendentes(self) -> int:
+        return len(self._sem_dono) + sum(t.fila.qsize() + len(t.lote) for t in self.trabalhadores)
+
+    def distribuir(self, dados: Dict[str, Any]) -> None:
+        """Coloca a atualização na fila do trabalhador dono do chat."""
+        chave = chave_atualizacao(dados)
+        nome = self.anel.no_para(chave if chave is not None else dados.get('update_id', 0))
+        if nome is None:
+            self._sem_dono.append(dados)
+            return
+        self._por_nome[nome].fila.put_nowait(dados)
+
+    async def consumir(self, fonte: AsyncIterator[Dict[str, Any]]) -> None:
+        """Distribui todas as atualizações de uma fonte (polling, ou uma fonte falsa nos testes)."""
+        async for dados in fonte:
+            self.distribuir(dados)
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            'estado': 'ok' if len(self.anel) else 'sem_trabalhadores',
+            'sem_dono': len(self._sem_dono),
+            'trabalhadores': {
+                t.nome: {
+                    'no_anel': t.nome in self.anel, 'falhas': t.falhas, 'fila': t.fila.qsize() + len(t.lote),
+                    'pid': t.processo.pid if t.processo else None, 'arranques': t.arranques,
+                }
+                for t in self.trabalhadores
+            },
+        }
+
+    # --- Envio ---
+
+    async def _ciclo_envio(self, t: Trabalhador) -> None:
+        """Um único envio em curso por trabalhador, para que as atualizações cheguem pela ordem da fila."""
+        while True:
+            if not t.lote:
+                if t.nome not in self.anel and not t.fila.empty():
+                    # Atualizações postas na fila antes de o trabalhador sair do anel.
+                    self._redistribuir(t)
+                # Lido antes de tocar em t.lote: _redistribuir substitui a lista enquanto esta espera dura.
+                dados = await t.fila.get()
+                t.lote.append(dados)
+                while len(t.lote) < LOTE_MAX and not t.fila.empty():
+                    t.lote.append(t.fila.get_nowait())
+            t.a_enviar = True
+            try:
+                aceite = await self._avisar_mudanca_anel(t) and await self._publicar(t, t.lote)
+            finally:
+                t.a_enviar = False
+            if aceite:
+                atualizacoes_distribuidas.incrementar(len(t.lote), trabalhador=t.nome)
+                t.lote = []
+                continue
+            self._registar_falha(t)
+            if t.nome not in self.anel:
+                # Retirado do anel (agora, ou pela verificação de saúde durante o envio).
+                self._redistribuir(t)
+            else:
+                await asyncio.sleep(min(1.0, self.intervalo_saude))
+
+    async def _publicar(self, t: Trabalhador, lote: List[Dict[str, Any]]) -> bool:
+        try:
+            resposta = await self._cliente.post(
+                t.url + CAMINHO_ATUALIZACOES, content=json.dumps(lote).encode(),
+                headers={'Content-Type': 'application/json', CABECALHO_SEGREDO_TRABALHADOR: self.segredo},
+            )
+        except httpx.HTTPError as e:
+            logging.warning(f"Falha ao enviar {len(lote)} atualizações a {t.nome}: {e!r}")
+            return False
+        if resposta.status_code == 400:
+            # Não adianta repetir um lote que o trabalhador não consegue ler.
+            logging.error(f"{t.nome} rejeitou um lote de {len(lote)} atualizações como inválido; descartado.")
+            return True
+        if resposta.status_code != 200:
+            logging.warning(f"{t.nome} respondeu {resposta.status_code} a um lote de {len(lote)} atualizações.")
+            return False
+        return True
+
+    async def _avisar_mudanca_anel(self, t: Trabalhador) -> bool:
+        """Pede ao trabalhador que esvazie os caches, se o anel mudou desde o último pedido. False se falhar."""
+        if not t.limpar_estado:
+            return True
+        try:
+            resposta = await self._cliente.post(t.url + CAMINHO_ANEL, headers={CABECALHO_SEGREDO_TRABALHADOR: self.segredo})
+        except httpx.HTTPError as e:
+            logging.warning(f"Falha ao avisar {t.nome} da mudança do anel: {e!r}")
+            return False
+        if resposta.status_code != 200:
+            logging.warning(f"{t.nome} respondeu {resposta.status_code} ao aviso de mudança do anel.")
+            return False
+        t.limpar_estado = False
+        return True
+
+    # --- Saúde e rebalanceamento ---
+
+    def _registar_falha(self, t: Trabalhador) -> None:
+        t.falhas += 1
+        if t.falhas >= self.limite_falhas and t.nome in self.anel:
+            self._retirar(t)
+
+    def _retirar(self, t: Trabalhador) -> None:
+        self.anel.remover(t.nome)
+        trabalhadores_no_anel.definir(len(self.anel))
+        logging.warning(f"{t.nome} retirado do anel após {t.falhas} falhas; os seus chats passam para {self.anel.nos or 'nenhum trabalhador'}.")
+        for outro in self.trabalhadores:
+            if outro.nome in self.anel:
+                outro.limpar_estado = True
+        if not t.a_enviar:
+            self._redistribuir(t)
+
+    def _redistribuir(self, t: Trabalhador) -> None:
+        """Entrega as atualizações pendentes de um trabalhador retirado aos novos donos, pela mesma ordem."""
+        pendentes = t.lote
+        t.lote = []
+        while not t.fila.empty():
+            pendentes.append(t.fila.get_nowait())
+        if pendentes:
+            logging.info(f"{len(pendentes)} atualizações pendentes de {t.nome} redistribuídas.")
+        for dados in pendentes:
+            self.distribuir(dados)
+
+    def _admitir(self, t: Trabalhador) -> None:
+        t.falhas = 0
+        if t.nome in self.anel:
+            return
+        self.anel.adicionar(t.nome)
+        t.admitido = True
+        trabalhadores_no_anel.definir(len(self.anel))
+        logging.info(f"{t.nome} admitido no anel ({len(self.anel)}/{len(self.trabalhadores)} trabalhadores).")
+        sem_dono, self._sem_dono = self._sem_dono, []
+        for dados in sem_dono:
+            self.distribuir(dados)
+
+    async def _verificar(self, indice: int, t: Trabalhador) -> None:
+        if t.processo is not None and t.processo.returncode is not None:
+            logging.error(f"{t.nome} terminou com o código {t.processo.returncode}; a lançar de novo.")
+            t.falhas = self.limite_falhas
+            if t.nome in self.anel:
+                self._retirar(t)
+            t.processo = await self.lancador(indice)
+            t.arranques += 1
+            reinicios_trabalhadores.incrementar(trabalhador=t.nome)
+            return
+        try:
+            resposta = await self._cliente.get(t.url + '/saude', timeout=max(1.0, self.intervalo_saude))
+            saudavel = resposta.status_code == 200
+        except httpx.HTTPError:
+            saudavel = False
+        if saudavel and t.nome not in self.anel and t.admitido:
+            # Volta ao anel sem ter reiniciado: os seus chats foram atendidos por outros entretanto.
+            t.limpar_estado = True
+        if saudavel and await self._avisar_mudanca_anel(t):
+            self._admitir(t)
+        else:
+            self._registar_falha(t)
+
+    async def _ciclo_saude(self) -> None:
+        while True:
+            await asyncio.gather(*(self._verificar(i, t) for i, t in enumerate(self.trabalhadores)))
+            # Enquanto falta algum trabalhador no anel, verifica com mais frequência para o readmitir depressa.
+            completo = len(self.anel) == len(self.trabalhadores)
+            await asyncio.sleep(self.intervalo_saude if completo else min(0.5, self.intervalo_saude))
+
+    async def _terminar(self, t: Trabalhador) -> None:
+        processo = t.processo
+        if processo is None or processo.returncode is not None:
+            return
+        processo.terminate()
+        try:
+            await asyncio.wait_for(processo.wait(), TEMPO_ENCERRAMENTO)
+        except asyncio.TimeoutError:
+            logging.error(f"{t.nome} não terminou em {TEMPO_ENCERRAMENTO}s; a forçar o fim.")
+            processo.kill()
+            await processo.wait()
+
+
+# <<< --- FONTES DE ATUALIZAÇÕES DA ENTRADA --- >>>
+
+async def fonte_polling(url_bot: str) -> AsyncIterator[Dict[str, Any]]:
+    """Atualizações pedidas ao Telegram por long polling (getUpdates), em JSON, sem as converter em objetos."""
+    offset: int | None = None
+    async with httpx.AsyncClient(timeout=TEMPO_POLLING + 10) as cliente:
+        await cliente.post(f"{url_bot}/deleteWebhook")
+        try:
+            while True:
+                try:
+                    resposta = await cliente.post(f"{url_bot}/getUpdates", json={
+                        'offset': offset, 'timeout': TEMPO_POLLING, 'allowed_updates': Update.ALL_TYPES,
+                    })
+                    atualizacoes = resposta.json()['result']
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    logging.warning(f"Falha no getUpdates: {e!r}")
+                    await asyncio.sleep(1)
+                    continue
+                for dados in atualizacoes:
+                    offset = dados['update_id'] + 1
+                    yield dados
+        finally:
+            if offset is not None:
+                # Confirma as atualizações já distribuídas, para o Telegram não as repetir no próximo arranque.
+                try:
+                    await cliente.post(f"{url_bot}/getUpdates", json={'offset': offset, 'timeout': 0})
+                except httpx.HTTPError:
+                    pass
+
+
+def criar_servidor_entrada(entrada: Entrada, host: str = WEBHOOK_HOST, porta: int = WEBHOOK_PORTA,
+                           webhook: bool = False) -> ServidorHTTP:
+    """GET /saude com o estado dos trabalhadores e, com `webhook`, a rota que recebe o Telegram."""
+    servidor = ServidorHTTP(host, porta)
+
+    async def receber_update(pedido: Pedido) -> Resposta:
+        segredo = pedido.cabecalhos.get(CABECALHO_SEGREDO, '')
+        if not hmac.compare_digest(segredo.encode(), WEBHOOK_SEGREDO.encode()):
+            logging.warning("Pedido ao webhook rejeitado: token secreto inválido.")
+            return Resposta(403)
+        try:
+            entrada.distribuir(json.loads(pedido.corpo))
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.error(f"Atualização inválida recebida no webhook: {e}")
+            return Resposta(400)
+        return Resposta(200)
+
+    async def saude(pedido: Pedido) -> Resposta:
+        estado = entrada.estado()
+        return Resposta.json(estado, 200 if estado['estado'] == 'ok' else 503)
+
+    if webhook:
+        servidor.rota('POST', WEBHOOK_CAMINHO, receber_update)
+    servidor.rota('GET', '/saude', saude)
+    return servidor
+
+
+async def executar_entrada(comando: List[str]) -> None:
+    """
+    Ciclo de vida do processo de entrada: lança DISTRIBUICAO_TRABALHADORES trabalhadores
+    (cada um com `comando`), recebe as atualizações e distribui-as até receber SIGINT/SIGTERM.
+    """
+    parar = sinal_de_paragem()
+    # Gerado a cada arranque: só os trabalhadores lançados por esta entrada o conhecem.
+    segredo = secrets.token_hex(16)
+    urls = [f"http://{DISTRIBUICAO_HOST}:{DISTRIBUICAO_PORTA_BASE + i}" for i in range(DISTRIBUICAO_TRABALHADORES)]
+    entrada = Entrada(urls, segredo, functools.partial(lancar_trabalhador, comando, segredo))
+    webhook = DISTRIBUICAO_ENTRADA == 'webhook'
+    servidor = criar_servidor_entrada(entrada, webhook=webhook)
+    servidor_metricas = criar_servidor_metricas(METRICAS_HOST, METRICAS_PORTA) if METRICAS_PORTA else None
+    url_bot = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}"
+
+    await entrada.iniciar()
+    await servidor.iniciar()
+    if servidor_metricas is not None:
+        await servidor_metricas.iniciar()
+    if not await entrada.aguardar_prontos():
+        logging.warning("Nem todos os trabalhadores ficaram prontos a tempo; a continuar com os disponíveis.")
+    recepcao = None
+    if webhook:
+        async with httpx.AsyncClient() as cliente:
+            await cliente.post(f"{url_bot}/setWebhook", json={
+                'url': WEBHOOK_URL.rstrip('/') + WEBHOOK_CAMINHO, 'secret_token': WEBHOOK_SEGREDO,
+                'allowed_updates': Update.ALL_TYPES,
+            })
+        logging.info("Webhook registado na entrada. A aguardar atualizações...")
+    else:
+        recepcao = asyncio.get_running_loop().create_task(entrada.consumir(fonte_polling(url_bot)), name="polling")
+    logging.info(f"Entrada distribuída ({DISTRIBUICAO_ENTRADA}) com {DISTRIBUICAO_TRABALHADORES} trabalhadores.")
+
+    try:
+        await parar.wait()
+    finally:
+        logging.info("A encerrar a entrada distribuída...")
+        if recepcao is not None:
+            recepcao.cancel()
+            await asyncio.gather(recepcao, return_exceptions=True)
+        await servidor.parar()
+        await entrada.parar()
+        if servidor_metricas is not None:
+            await servidor_metricas.parar()
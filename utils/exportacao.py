@@ -0,0 +1,154 @@
+"""
+Exportação das OS em bruto (/exportar) para CSV comprimido ou XLSX.
+
+As OS chegam de um iterador paginado e são escritas diretamente no ficheiro
+de destino, linha a linha: a memória usada não depende do número de OS
+exportadas (só uma página do banco e um pequeno buffer de escrita).
+
+    - CSV: separado por ';' (o que o Excel espera com definições regionais
+      portuguesas), UTF-8 com BOM e comprimido com gzip (.csv.gz);
+    - XLSX: o ficheiro é um ZIP com XML; a folha é escrita em streaming,
+      com texto inline (sem tabela de strings partilhadas, que obrigaria a
+      guardar todos os textos em memória). Acima do limite de linhas do
+      Excel, as OS continuam numa nova folha.
+"""
+import csv
+import gzip
+import re
+import zipfile
+from typing import Any, Callable, Dict, Iterable, List
+from xml.sax.saxutils import escape
+
+# Ordem das colunas no ficheiro exportado.
+CAMPOS_EXPORTACAO = (
+    'id', 'chat_id', 'nome', 'setor', 'numero_maquina', 'modelo_maquina', 'tipo_manutencao',
+    'problema_apresentado', 'data_abertura', 'data_fechamento', 'solucao_aplicada', 'substituir_peca',
+    'descricao_peca', 'tag_peca', 'servico_concluido', 'observacao',
+)
+
+# Linhas por folha no XLSX (limite do Excel, incluindo o cabeçalho).
+MAX_LINHAS_FOLHA = 1048576
+# Linhas acumuladas antes de cada escrita no ficheiro.
+LINHAS_POR_ESCRITA = 1000
+
+# Caracteres de controlo que o XML 1.0 não aceita (aparecem em textos colados de outros sistemas).
+_CONTROLO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _valor(valor: Any) -> Any:
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    return valor
+
+
+def escrever_csv(linhas: Iterable[Dict[str, Any]], destino: str) -> int:
+    """Escreve as OS em `destino` como CSV comprimido com gzip. Retorna o número de OS escritas."""
+    total = 0
+    with gzip.open(destino, 'wt', encoding='utf-8-sig', newline='', compresslevel=6) as ficheiro:
+        escritor = csv.writer(ficheiro, delimiter=';')
+        escritor.writerow(CAMPOS_EXPORTACAO)
+        for linha in linhas:
+            escritor.writerow([_valor(linha.get(campo)) for campo in CAMPOS_EXPORTACAO])
+            total += 1
+    return total
+
+
+def _celula(valor: Any) -> str:
+    valor = _valor(valor)
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_CONTROLO_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+_CABECALHO_FOLHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_LINHA_CABECALHO = '<row>' + ''.join(_celula(campo) for campo in CAMPOS_EXPORTACAO) + '</row>'
+_FIM_FOLHA = '</sheetData></worksheet>'
+
+
+def _escrever_ficheiros_fixos(zip_: zipfile.ZipFile, folhas: int) -> None:
+    """Partes do pacote XLSX que só dependem do número de folhas."""
+    tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for n in range(1, folhas + 1)
+    )
+    zip_.writestr('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'{tipos}</Types>'
+    ))
+    zip_.writestr('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ))
+    folhas_xml = ''.join(f'<sheet name="OS {n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, folhas + 1))
+    zip_.writestr('xl/workbook.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets>{folhas_xml}</sheets></workbook>'
+    ))
+    relacoes = ''.join(
+        f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, folhas + 1)
+    )
+    zip_.writestr('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relacoes}</Relationships>'
+    ))
+
+
+def escrever_xlsx(linhas: Iterable[Dict[str, Any]], destino: str) -> int:
+    """Escreve as OS em `destino` como livro XLSX. Retorna o número de OS escritas."""
+    total = 0
+    folhas = 0
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zip_:
+        folha = None
+        linhas_folha = 0
+        buffer: List[str] = []
+        for linha in linhas:
+            if folha is None or linhas_folha == MAX_LINHAS_FOLHA:
+                if folha is not None:
+                    folha.write((''.join(buffer) + _FIM_FOLHA).encode())
+                    folha.close()
+                    buffer.clear()
+                folhas += 1
+                # force_zip64: o tamanho da folha não é conhecido de antemão e pode passar de 2 GiB.
+                folha = zip_.open(f'xl/worksheets/sheet{folhas}.xml', 'w', force_zip64=True)
+                folha.write((_CABECALHO_FOLHA + _LINHA_CABECALHO).encode())
+                linhas_folha = 1
+            buffer.append('<row>' + ''.join(_celula(linha.get(campo)) for campo in CAMPOS_EXPORTACAO) + '</row>')
+            linhas_folha += 1
+            total += 1
+            if len(buffer) >= LINHAS_POR_ESCRITA:
+                folha.write(''.join(buffer).encode())
+                buffer.clear()
+        if folha is None:
+            # Sem OS: uma folha só com o cabeçalho.
+            folhas = 1
+            zip_.writestr('xl/worksheets/sheet1.xml', _CABECALHO_FOLHA + _LINHA_CABECALHO + _FIM_FOLHA)
+        else:
+            folha.write((''.join(buffer) + _FIM_FOLHA).encode())
+            folha.close()
+        _escrever_ficheiros_fixos(zip_, folhas)
+    return total
+
+
+# Formato -> (extensão do ficheiro, função de escrita)
+FORMATOS: Dict[str, tuple[str, Callable[[Iterable[Dict[str, Any]], str], int]]] = {
+    'csv': ('.csv.gz', escrever_csv),
+    'xlsx': ('.xlsx', escrever_xlsx),
+}
@@ -0,0 +1,179 @@
+"""
+Fila de geração de relatórios PDF.
+
+A renderização com o fpdf2 é trabalho de CPU puro, por isso corre num pool
+de processos separado do event loop do bot. A fila é limitada: se houver
+demasiados relatórios à espera, novos pedidos são recusados de imediato.
+
+Um relatório que excede o tempo máximo ocupa o seu processo até terminar;
+por isso, quando expira, o pool é reciclado (os processos são terminados e
+substituídos). Os outros relatórios que estavam a ser gerados no pool antigo
+são repetidos uma vez no novo.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from config import PDF_MAX_WORKERS, PDF_FILA_MAX, PDF_TIMEOUT, logging
+from .metricas import relatorio_segundos, relatorio_fila_segundos, relatorio_erros
+from .fontes_pdf import preparar_fontes
+
+
+class FilaCheia(Exception):
+    """Lançada quando a fila de relatórios atingiu o limite configurado."""
+
+
+class RenderizacaoExpirada(Exception):
+    """Lançada quando um relatório excede o tempo máximo de geração."""
+
+
+class RenderizacaoInterrompida(RenderizacaoExpirada):
+    """Lançada quando o processo que gerava o relatório terminou antes do fim, mesmo depois de uma nova tentativa."""
+
+
+class _Vaga:
+    """Vaga do pool ocupada por um trabalho; libertada uma única vez (no fim do trabalho ou ao reciclar o pool)."""
+
+    def __init__(self, semaforo: asyncio.Semaphore):
+        self._semaforo = semaforo
+        self._ocupada = True
+
+    def libertar(self) -> None:
+        if self._ocupada:
+            self._ocupada = False
+            self._semaforo.release()
+
+
+class FilaRenderizacao:
+    """Envia trabalhos de renderização para um pool de processos com fila limitada."""
+
+    def __init__(self, max_workers: int, max_fila: int, timeout: float):
+        self.max_workers = max_workers
+        self.max_fila = max_fila
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._vagas = asyncio.Semaphore(max_workers)
+        # Vagas dos trabalhos a correr no pool atual.
+        self._ocupadas: set[_Vaga] = set()
+        self._em_espera = 0
+
+    @property
+    def em_espera(self) -> int:
+        return self._em_espera
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        # Os processos só são criados quando o primeiro relatório é pedido.
+        # Usamos "spawn" para que cada processo abra a sua própria ligação ao banco,
+        # em vez de herdar (via fork) o cliente HTTP e as threads do processo principal.
+        # Cada processo carrega a fonte dos relatórios ao arrancar, não no primeiro pedido.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=preparar_fontes,
+            )
+        return self._executor
+
+    async def renderizar(
+        self,
+        funcao: Callable[..., Any],
+        *args: Any,
+        ao_entrar_na_fila: Callable[[int], Awaitable[Any]] | None = None,
+    ) -> Any:
+        """
+        Executa `funcao(*args)` num processo do pool e devolve o seu resultado.
+        Se todos os processos estiverem ocupados, `ao_entrar_na_fila` é chamada
+        com a posição do pedido na fila (1 = o próximo a ser atendido).
+        """
+        if self._em_espera >= self.max_fila:
+            relatorio_erros.incrementar(motivo='fila_cheia')
+            raise FilaCheia()
+
+        entrada = time.perf_counter()
+        self._em_espera += 1
+        try:
+            if self._vagas.locked() and ao_entrar_na_fila:
+                await ao_entrar_na_fila(self._em_espera)
+            await self._vagas.acquire()
+        finally:
+            self._em_espera -= 1
+
+        relatorio_fila_segundos.observar(time.perf_counter() - entrada)
+
+        for tentativa in range(2):
+            if tentativa:
+                await self._vagas.acquire()
+            try:
+                return await self._executar(funcao, args)
+            except BrokenExecutor as e:
+                relatorio_erros.incrementar(motivo='processo_terminado')
+                if tentativa:
+                    raise RenderizacaoInterrompida() from e
+                logging.warning(f"O processo que gerava o relatório terminou ({type(e).__name__}); o relatório é gerado de novo.")
+
+    async def _executar(self, funcao: Callable[..., Any], args: tuple) -> Any:
+        """Executa o trabalho no pool atual; a vaga já foi obtida e é sempre libertada."""
+        vaga = _Vaga(self._vagas)
+        loop = asyncio.get_running_loop()
+        try:
+            executor = self._obter_executor()
+            futuro = loop.run_in_executor(executor, funcao, *args)
+        except BrokenExecutor:
+            vaga.libertar()
+            self._reciclar(self._executor)
+            raise
+        except Exception:
+            vaga.libertar()
+            raise
+        # A vaga só é libertada quando o processo termina de facto (ou é terminado ao
+        # reciclar o pool), para nunca haver mais trabalhos do que processos.
+        self._ocupadas.add(vaga)
+        inicio = time.perf_counter()
+        def terminado(concluido: asyncio.Future):
+            if not concluido.cancelled():
+                concluido.exception()  # marca o erro como lido se ninguém esperar pelo resultado (pedido expirado)
+            self._ocupadas.discard(vaga)
+            vaga.libertar()
+            relatorio_segundos.observar(time.perf_counter() - inicio, funcao=funcao.__name__)
+        futuro.add_done_callback(terminado)
+        try:
+            return await asyncio.wait_for(asyncio.shield(futuro), self.timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"A geração do relatório excedeu o limite de {self.timeout}s; o pool de processos é reciclado.")
+            relatorio_erros.incrementar(motivo='tempo_esgotado')
+            self._reciclar(executor)
+            raise RenderizacaoExpirada()
+        except BrokenExecutor:
+            self._reciclar(executor)
+            raise
+
+    def _reciclar(self, executor: ProcessPoolExecutor | None) -> None:
+        """
+        Termina os processos de `executor` (se ainda for o pool atual) e liberta as
+        vagas dos seus trabalhos; o próximo relatório cria um pool novo. Os trabalhos
+        que corriam nele falham com BrokenProcessPool e são repetidos em renderizar().
+        """
+        if executor is None or executor is not self._executor:
+            return
+        self._executor = None
+        # O ProcessPoolExecutor não tem uma API pública para terminar os processos a meio de um trabalho.
+        processos = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False)
+        for processo in processos:
+            processo.terminate()
+        ocupadas, self._ocupadas = self._ocupadas, set()
+        for vaga in ocupadas:
+            vaga.libertar()
+        logging.warning(f"Pool de relatórios reciclado: {len(processos)} processo(s) terminado(s).")
+
+    def encerrar(self) -> None:
+        """Termina o pool de processos. Deve ser chamada no encerramento do bot."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instância partilhada por todos os handlers.
+fila_relatorios = FilaRenderizacao(PDF_MAX_WORKERS, PDF_FILA_MAX, PDF_TIMEOUT)
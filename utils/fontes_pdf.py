@@ -0,0 +1,158 @@
+"""
+Fonte TrueType (Unicode) dos relatórios PDF.
+
+As fontes base do PDF (Arial/Helvetica) só cobrem o latin-1: um único
+carácter fora dele numa OS (um travessão colado do telemóvel, "≥", um emoji)
+fazia falhar o relatório inteiro. Os relatórios usam agora uma fonte
+TrueType, embutida no PDF só com os glifos usados (o fpdf2 faz o subconjunto
+ao gravar).
+
+Registar a fonte com add_font() em cada relatório custava ~40 ms (o fpdf2 lê
+a fonte inteira) e o subconjunto na gravação outros ~60 ms, mais do que
+todo o resto de um relatório pequeno. Por isso, uma vez por processo:
+    - a fonte é reduzida aos blocos de FAIXAS_UNICODE (latim, grego,
+      pontuação, símbolos técnicos), o que torna o subconjunto de cada
+      relatório várias vezes mais rápido;
+    - a fonte reduzida é lida pelo fpdf2 uma única vez e cada relatório
+      recebe uma cópia leve, com as métricas partilhadas e o seu próprio
+      subconjunto de glifos.
+A cópia usa objetos internos do fpdf2 (o add_font público só aceita caminhos
+de ficheiros), por isso a versão está limitada em requirements.txt e
+tests/test_fontes_pdf.py desenha texto fora do latin-1 com a fonte copiada.
+Se os ficheiros da fonte não existirem, os relatórios voltam à Arial.
+"""
+import functools
+import io
+import unicodedata
+from typing import Dict
+
+from fontTools import subset, ttLib
+from fpdf import FPDF
+from fpdf.fonts import TTFFont, SubsetMap
+
+from config import logging, PDF_FONTE_NORMAL, PDF_FONTE_NEGRITO, PDF_FONTE_ITALICO
+
+# Família com que a fonte TrueType é registada em cada PDF.
+FAMILIA = 'kraflo'
+# Fonte base do PDF, usada quando a fonte TrueType não está disponível.
+FAMILIA_PADRAO = 'Arial'
+# Substitui as letras e os números que a fonte não tem (os símbolos e emojis em falta são omitidos).
+SUBSTITUTO = '?'
+
+# Blocos Unicode mantidos na fonte reduzida.
+FAIXAS_UNICODE = (
+    (0x0020, 0x007E),  # ASCII
+    (0x00A0, 0x024F),  # Latin-1, Latin Extended-A/B
+    (0x0370, 0x03FF),  # Grego (µ, Ω, Δ nas medições)
+    (0x1E00, 0x1EFF),  # Latin Extended Additional
+    (0x2000, 0x206F),  # Pontuação geral (travessões, aspas curvas, reticências)
+    (0x20A0, 0x20CF),  # Moedas
+    (0x2100, 0x214F),  # Símbolos de letras (℃, №)
+    (0x2190, 0x21FF),  # Setas
+    (0x2200, 0x22FF),  # Operadores matemáticos (≤, ≥, ±, ≈)
+    (0x2500, 0x25FF),  # Linhas e formas geométricas
+    (0x2600, 0x27BF),  # Símbolos diversos e dingbats (⚠, ✓, ✗)
+)
+# Tabelas que o fpdf2 não usa (não faz kerning nem substituições OpenType).
+TABELAS_DESCARTADAS = ('GPOS', 'GSUB', 'GDEF', 'kern', 'FFTM', 'hdmx', 'MATH')
+
+# O fontTools regista cada passo do subconjunto em INFO (também o de cada relatório).
+logging.getLogger('fontTools').setLevel(logging.WARNING)
+
+
+def _ficheiros() -> Dict[str, str]:
+    ficheiros = {'': PDF_FONTE_NORMAL, 'B': PDF_FONTE_NEGRITO}
+    if PDF_FONTE_ITALICO:
+        ficheiros['I'] = PDF_FONTE_ITALICO
+    return ficheiros
+
+
+def _reduzir(caminho: str) -> bytes:
+    """
+    A fonte só com os glifos de FAIXAS_UNICODE, em TTF. Os nomes dos glifos são
+    mantidos: sem eles o fontTools reconstrói-os a cada relatório, no subconjunto.
+    """
+    fonte = ttLib.TTFont(caminho, recalcTimestamp=False)
+    opcoes = subset.Options(notdef_outline=True, recommended_glyphs=True, layout_features=[], name_IDs=['*'],
+                            glyph_names=True)
+    opcoes.drop_tables += list(TABELAS_DESCARTADAS)
+    reducao = subset.Subsetter(opcoes)
+    reducao.populate(unicodes=[codigo for inicio, fim in FAIXAS_UNICODE for codigo in range(inicio, fim + 1)])
+    reducao.subset(fonte)
+    saida = io.BytesIO()
+    fonte.save(saida)
+    return saida.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _carregar(caminho: str, estilo: str) -> tuple[bytes, TTFFont] | None:
+    """Fonte reduzida e o modelo lido pelo fpdf2 (métricas, cmap), uma vez por processo."""
+    if not caminho:
+        return None
+    try:
+        dados = _reduzir(caminho)
+        modelo = TTFFont(FPDF(), io.BytesIO(dados), f"{FAMILIA}{estilo}", estilo)
+    except Exception as e:
+        logging.warning(f"Fonte {caminho} indisponível ({e}); os relatórios usam a fonte {FAMILIA_PADRAO}.")
+        return None
+    logging.info(f"Fonte {caminho} ({estilo or 'normal'}) carregada: {len(dados)} bytes, {len(modelo.cmap)} caracteres.")
+    return dados, modelo
+
+
+def _copia(dados: bytes, modelo: TTFFont, pdf: FPDF) -> TTFFont:
+    """Cópia do modelo para um PDF: partilha as métricas, mas tem o seu próprio subconjunto de glifos."""
+    fonte = TTFFont.__new__(TTFFont)
+    for atributo in TTFFont.__slots__:
+        if hasattr(modelo, atributo):
+            setattr(fonte, atributo, getattr(modelo, atributo))
+    fonte.i = len(pdf.fonts) + 1
+    # O subconjunto feito na gravação altera a fonte, por isso cada PDF abre a sua
+    # (lazy=True: só lê o índice das tabelas, não os glifos).
+    fonte.ttfont = ttLib.TTFont(io.BytesIO(dados), recalcTimestamp=False, lazy=True)
+    fonte._hbfont = None
+    fonte.biggest_size_pt = 0
+    fonte.missing_glyphs = []
+    fonte.subset = SubsetMap(fonte)
+    return fonte
+
+
+def registar_fontes(pdf: FPDF) -> str:
+    """
+    Regista a fonte TrueType no PDF e retorna a família a usar em set_font
+    ("Arial" se não houver fonte). Sem PDF_FONTE_ITALICO não há face itálica: ver estilo_italico.
+    """
+    fontes = {estilo: _carregar(caminho, estilo) for estilo, caminho in _ficheiros().items()}
+    if not all(fontes.values()):
+        return FAMILIA_PADRAO
+    for estilo, (dados, modelo) in fontes.items():
+        pdf.fonts[f"{FAMILIA}{estilo}"] = _copia(dados, modelo, pdf)
+    return FAMILIA
+
+
+def estilo_italico(pdf: FPDF, familia: str) -> str:
+    """'I' se a família tiver face itálica no PDF; senão '' (texto normal, em vez de embutir a face normal duas vezes)."""
+    return 'I' if familia == FAMILIA_PADRAO or f"{familia}I" in pdf.fonts else ''
+
+
+def preparar_fontes() -> None:
+    """Inicializador dos processos do pool de PDF: carrega as fontes antes do primeiro relatório."""
+    for estilo, caminho in _ficheiros().items():
+        _carregar(caminho, estilo)
+
+
+def texto_imprimivel(texto: str, suportado) -> str:
+    """
+    Adapta o texto aos caracteres que a fonte consegue desenhar (`suportado(c)`):
+    compõe os acentos separados (NFC), omite símbolos, emojis e caracteres de
+    formatação em falta e troca as restantes letras em falta por SUBSTITUTO.
+    """
+    texto = unicodedata.normalize('NFC', texto)
+    if all(suportado(c) for c in texto):
+        return texto
+    partes = []
+    for c in texto:
+        if suportado(c):
+            partes.append(c)
+        elif unicodedata.category(c)[0] not in ('S', 'M', 'C'):
+            partes.append(SUBSTITUTO)
+    return ''.join(partes)
@@ -0,0 +1,228 @@
+"""
+Fila central dos envios para o Telegram.
+
+Todos os pedidos do bot à API (send_message, send_document, edições,
+respostas a botões) passam por aqui, através do rate limiter do
+python-telegram-bot, antes de saírem:
+
+    - um balde de tokens global limita o total de pedidos por segundo;
+    - um balde por chat limita as mensagens enviadas a cada conversa;
+    - quando o balde global está vazio, os pedidos esperam numa fila com
+      prioridades: as respostas interativas passam à frente dos envios em
+      massa (documentos PDF), para que um lote de relatórios não atrase
+      a resposta a um técnico que está à espera;
+    - um erro 429 (RetryAfter) pausa o chat (ou todos os envios, se o pedido
+      não for para um chat) pelo tempo indicado e o pedido é repetido, com
+      espera crescente, até ENVIO_MAX_TENTATIVAS vezes.
+
+A profundidade da fila e o tempo de espera são expostos em /metricas.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, List, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import logging
+from .metricas import registo
+
+PRIORIDADE_INTERATIVA = 0
+PRIORIDADE_MASSA = 1
+NOMES_PRIORIDADE = {PRIORIDADE_INTERATIVA: 'interativa', PRIORIDADE_MASSA: 'massa'}
+
+# Envios pesados que podem esperar pelas respostas interativas.
+ENDPOINTS_MASSA = frozenset({'sendDocument', 'sendMediaGroup'})
+# Pedidos que publicam uma mensagem nova num chat (contam para o limite por chat).
+# As edições e as respostas a botões só contam para o limite global.
+ENDPOINTS_CHAT = frozenset({
+    'sendMessage', 'sendDocument', 'sendMediaGroup', 'sendPhoto', 'sendAudio', 'sendVideo',
+    'sendVoice', 'sendAnimation', 'sendSticker', 'sendLocation', 'sendContact', 'sendPoll',
+    'copyMessage', 'forwardMessage',
+})
+
+# Baldes por chat guardados antes de se removerem os que estão cheios (chats inativos).
+MAX_BALDES_CHAT = 10000
+
+envios_fila = registo.medidor('kraflo_envios_fila', 'Pedidos ao Telegram à espera na fila, por prioridade.')
+envios_espera_segundos = registo.histograma(
+    'kraflo_envios_espera_segundos', 'Tempo de espera de um pedido ao Telegram antes de ser enviado, por prioridade.'
+)
+envios_limitados = registo.contador(
+    'kraflo_envios_limitados_total', 'Respostas 429 (RetryAfter) do Telegram, por endpoint e resultado (repetido/desistido).'
+)
+
+
+def _segundos_retry_after(erro: RetryAfter) -> float:
+    """Espera pedida pelo Telegram, em segundos. O PTB devolve int ou timedelta (com PTB_TIMEDELTA)."""
+    espera = erro.retry_after
+    return espera.total_seconds() if isinstance(espera, timedelta) else float(espera)
+
+
+class BaldeTokens:
+    """Balde de tokens: `taxa` tokens por segundo, até `capacidade` acumulados."""
+
+    __slots__ = ('taxa', 'capacidade', 'tokens', 'atualizado', 'pausa_ate')
+
+    def __init__(self, taxa: float, capacidade: float):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic()
+        self.pausa_ate = 0.0
+
+    def _repor(self, agora: float) -> None:
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def espera(self) -> float:
+        """Segundos até haver um token disponível (0 se já houver)."""
+        agora = time.monotonic()
+        self._repor(agora)
+        if agora < self.pausa_ate:
+            return self.pausa_ate - agora
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.taxa
+
+    def consumir(self) -> None:
+        self.tokens -= 1
+
+    def pausar(self, segundos: float) -> None:
+        self.pausa_ate = max(self.pausa_ate, time.monotonic() + segundos)
+        self.tokens = 0
+
+    def cheio(self) -> bool:
+        agora = time.monotonic()
+        self._repor(agora)
+        return self.tokens >= self.capacidade and agora >= self.pausa_ate
+
+
+class LimitadorEnvios(BaseRateLimiter[Dict[str, Any]]):
+    """
+    Rate limiter do bot. `taxa_global` pedidos por segundo no total e
+    `taxa_chat` mensagens por segundo em cada chat (com rajadas até
+    `rajada_chat`). Os argumentos `rate_limit_args={'prioridade': 'massa'}`
+    de um pedido forçam a prioridade de envio em massa.
+    """
+
+    def __init__(self, taxa_global: float, taxa_chat: float, rajada_chat: float, max_tentativas: int):
+        self.max_tentativas = max_tentativas
+        self._taxa_chat = taxa_chat
+        self._rajada_chat = max(1.0, rajada_chat)
+        self._global = BaldeTokens(taxa_global, max(1.0, taxa_global))
+        self._chats: Dict[int | str, BaldeTokens] = {}
+        # Heap de (prioridade, ordem de chegada, futuro) à espera do balde global.
+        self._fila: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequencia = itertools.count()
+        self._em_espera = {prioridade: 0 for prioridade in NOMES_PRIORIDADE}
+        self._novo_pedido: asyncio.Event | None = None
+        self._despachante: asyncio.Task | None = None
+
+    async def initialize(self) -> None:
+        self._novo_pedido = asyncio.Event()
+        # Criada no loop (não com application.create_task) para que o stop() não fique à espera dela.
+        self._despachante = asyncio.get_running_loop().create_task(self._despachar())
+
+    async def shutdown(self) -> None:
+        if self._despachante is not None:
+            self._despachante.cancel()
+            try:
+                await self._despachante
+            except asyncio.CancelledError:
+                pass
+            self._despachante = None
+        for _, _, futuro in self._fila:
+            futuro.cancel()
+        self._fila.clear()
+
+    @staticmethod
+    def _prioridade(endpoint: str, rate_limit_args: Dict[str, Any] | None) -> int:
+        if rate_limit_args and 'prioridade' in rate_limit_args:
+            return PRIORIDADE_MASSA if rate_limit_args['prioridade'] == 'massa' else PRIORIDADE_INTERATIVA
+        return PRIORIDADE_MASSA if endpoint in ENDPOINTS_MASSA else PRIORIDADE_INTERATIVA
+
+    def _balde_chat(self, chat_id: int | str) -> BaldeTokens:
+        balde = self._chats.get(chat_id)
+        if balde is None:
+            if len(self._chats) >= MAX_BALDES_CHAT:
+                # Um balde cheio é igual a um novo: os chats inativos podem ser esquecidos.
+                self._chats = {chave: b for chave, b in self._chats.items() if not b.cheio()}
+            balde = self._chats[chat_id] = BaldeTokens(self._taxa_chat, self._rajada_chat)
+        return balde
+
+    async def _aguardar_chat(self, chat_id: int | str) -> None:
+        balde = self._balde_chat(chat_id)
+        while (espera := balde.espera()) > 0:
+            await asyncio.sleep(espera)
+        balde.consumir()
+
+    def _atualizar_medidor(self, prioridade: int, delta: int) -> None:
+        self._em_espera[prioridade] += delta
+        envios_fila.definir(self._em_espera[prioridade], prioridade=NOMES_PRIORIDADE[prioridade])
+
+    async def _aguardar_global(self, prioridade: int) -> None:
+        # Caminho rápido: ninguém à espera e há token disponível.
+        if not self._fila and self._global.espera() == 0:
+            self._global.consumir()
+            return
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._fila, (prioridade, next(self._sequencia), futuro))
+        self._atualizar_medidor(prioridade, 1)
+        self._novo_pedido.set()
+        try:
+            await futuro
+        finally:
+            self._atualizar_medidor(prioridade, -1)
+
+    async def _despachar(self) -> None:
+        """Liberta os pedidos da fila, por prioridade, à medida que o balde global tem tokens."""
+        while True:
+            if not self._fila:
+                self._novo_pedido.clear()
+                await self._novo_pedido.wait()
+                continue
+            espera = self._global.espera()
+            if espera > 0:
+                await asyncio.sleep(espera)
+                continue
+            _, _, futuro = heapq.heappop(self._fila)
+            # Um pedido cancelado enquanto esperava não gasta o token.
+            if not futuro.done():
+                self._global.consumir()
+                futuro.set_result(None)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | Dict[str, Any] | List[Dict[str, Any]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Dict[str, Any] | None,
+    ) -> bool | Dict[str, Any] | List[Dict[str, Any]]:
+        prioridade = self._prioridade(endpoint, rate_limit_args)
+        chat_id = data.get('chat_id') if endpoint in ENDPOINTS_CHAT else None
+        tentativa = 0
+        while True:
+            inicio = time.monotonic()
+            if chat_id is not None:
+                await self._aguardar_chat(chat_id)
+            await self._aguardar_global(prioridade)
+            envios_espera_segundos.observar(time.monotonic() - inicio, prioridade=NOMES_PRIORIDADE[prioridade])
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as erro:
+                tentativa += 1
+                if tentativa > self.max_tentativas:
+                    envios_limitados.incrementar(endpoint=endpoint, resultado='desistido')
+                    logging.error(f"Limite do Telegram excedido em {endpoint} (chat {chat_id}); desistindo após {self.max_tentativas} tentativas.")
+                    raise
+                envios_limitados.incrementar(endpoint=endpoint, resultado='repetido')
+                # O tempo pedido pelo Telegram, mais uma margem que cresce a cada tentativa.
+                espera = _segundos_retry_after(erro) + random.uniform(0, 0.5 * tentativa)
+                logging.warning(f"Limite do Telegram excedido em {endpoint} (chat {chat_id}); nova tentativa em {espera:.1f}s.")
+                # Os outros pedidos do mesmo chat (ou todos, se não houver chat) também esperam.
+                (self._balde_chat(chat_id) if chat_id is not None else self._global).pausar(espera)
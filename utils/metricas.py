@@ -0,0 +1,283 @@
+"""
+Métricas de latência e de erros, no formato de texto do Prometheus.
+
+Histogramas e contadores simples, sem dependências externas, seguros para
+serem atualizados tanto a partir do event loop como das threads do banco.
+São expostos em GET /metricas (servidor HTTP local, ver criar_servidor_metricas)
+e resumidos periodicamente nos logs numa linha JSON.
+
+Instrumentação:
+    - cada callback dos ConversationHandler (instrumentar_handlers);
+    - cada função de database/models.py (decorador medir);
+    - cada consulta ao repositório de dados (instrumentar_repositorio);
+    - a geração de relatórios PDF (utils/fila_relatorios.py);
+    - o tamanho das consultas agrupadas (database/carregador.py);
+    - a fila de envios para o Telegram (utils/limitador_envios.py);
+    - o backlog do journal de escritas (database/models.py, ciclo_descarga_journal).
+"""
+import asyncio
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import METRICAS_LENTO, logging
+
+# Limites (em segundos) dos intervalos dos histogramas.
+LIMITES_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: str = '') -> str:
+    def escapar(valor: str) -> str:
+        return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    partes = [f'{nome}="{escapar(valor)}"' for nome, valor in rotulos]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores: Dict[Rotulos, float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, **rotulos: str) -> None:
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            for rotulos, valor in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_formatar_rotulos(rotulos)} {valor:g}")
+        return linhas
+
+    def resumo(self) -> Dict[str, float]:
+        with self._lock:
+            return {','.join(v for _, v in rotulos) or 'total': valor for rotulos, valor in self._valores.items()}
+
+
+class Medidor:
+    """Valor instantâneo (gauge), ex.: o tamanho de uma fila."""
+
+    def __init__(self, nome: str, ajuda: str):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores: Dict[Rotulos, float] = {}
+        self._lock = threading.Lock()
+
+    def definir(self, valor: float, **rotulos: str) -> None:
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = valor
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} gauge"]
+        with self._lock:
+            for rotulos, valor in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_formatar_rotulos(rotulos)} {valor:g}")
+        return linhas
+
+    def resumo(self) -> Dict[str, float]:
+        with self._lock:
+            return {','.join(v for _, v in rotulos) or 'total': valor for rotulos, valor in self._valores.items()}
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, limites: Tuple[float, ...] = LIMITES_PADRAO, em_segundos: bool = True):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = limites
+        self.em_segundos = em_segundos
+        # Por conjunto de rótulos: [contagens por intervalo (+Inf no fim), soma, total]
+        self._series: Dict[Rotulos, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos: str) -> None:
+        chave = tuple(sorted(rotulos.items()))
+        indice = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = sorted((rotulos, (list(c), s, n)) for rotulos, (c, s, n) in self._series.items())
+        for rotulos, (contagens, soma, total) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites, contagens):
+                acumulado += contagem
+                le = f'le="{limite:g}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, le)} {acumulado}")
+            le = 'le="+Inf"'
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos, le)} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {soma:.6f}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {total}")
+        return linhas
+
+    def resumo(self) -> Dict[str, Dict[str, float]]:
+        """Total de observações e média (em ms, se forem durações) por série."""
+        with self._lock:
+            if self.em_segundos:
+                return {
+                    ','.join(v for _, v in rotulos) or 'total': {'n': n, 'media_ms': round(s / n * 1000, 1)}
+                    for rotulos, (_, s, n) in self._series.items() if n
+                }
+            return {
+                ','.join(v for _, v in rotulos) or 'total': {'n': n, 'media': round(s / n, 1)}
+                for rotulos, (_, s, n) in self._series.items() if n
+            }
+
+
+class Registo:
+    """Conjunto de todas as métricas do processo."""
+
+    def __init__(self):
+        self._metricas: Dict[str, Contador | Medidor | Histograma] = {}
+
+    def contador(self, nome: str, ajuda: str) -> Contador:
+        return self._metricas.setdefault(nome, Contador(nome, ajuda))
+
+    def medidor(self, nome: str, ajuda: str) -> Medidor:
+        return self._metricas.setdefault(nome, Medidor(nome, ajuda))
+
+    def histograma(self, nome: str, ajuda: str, limites: Tuple[float, ...] = LIMITES_PADRAO,
+                   em_segundos: bool = True) -> Histograma:
+        return self._metricas.setdefault(nome, Histograma(nome, ajuda, limites, em_segundos))
+
+    def exportar_prometheus(self) -> str:
+        linhas: List[str] = []
+        for metrica in self._metricas.values():
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+    def resumo(self) -> Dict[str, Any]:
+        return {nome: metrica.resumo() for nome, metrica in self._metricas.items()}
+
+
+registo = Registo()
+
+handler_segundos = registo.histograma('kraflo_handler_segundos', 'Duração de cada callback dos handlers.')
+handler_erros = registo.contador('kraflo_handler_erros_total', 'Exceções lançadas pelos callbacks dos handlers.')
+db_funcao_segundos = registo.histograma('kraflo_db_funcao_segundos', 'Duração das funções de database/models.py (inclui cache e espera no pool).')
+db_consulta_segundos = registo.histograma('kraflo_db_consulta_segundos', 'Duração de cada consulta ao banco de dados.')
+db_erros = registo.contador('kraflo_db_erros_total', 'Consultas ao banco de dados que falharam.')
+relatorio_segundos = registo.histograma('kraflo_relatorio_segundos', 'Tempo de geração de um relatório PDF (sem a espera na fila).')
+relatorio_fila_segundos = registo.histograma('kraflo_relatorio_fila_segundos', 'Tempo de espera na fila de relatórios.')
+relatorio_erros = registo.contador('kraflo_relatorio_erros_total', 'Relatórios não gerados, por motivo.')
+lote_tamanho = registo.histograma('kraflo_lote_tamanho', 'Chaves distintas por consulta agrupada.', (1, 2, 5, 10, 20, 50, 100, 200), em_segundos=False)
+lote_consultas = registo.contador('kraflo_lote_consultas_total', 'Consultas agrupadas enviadas ao banco.')
+lote_poupadas = registo.contador('kraflo_lote_consultas_poupadas_total', 'Pedidos servidos por uma consulta agrupada já aberta.')
+journal_pendentes = registo.medidor('kraflo_journal_pendentes', 'Escritas no journal ainda não enviadas ao banco.')
+journal_idade_segundos = registo.medidor('kraflo_journal_idade_segundos', 'Idade da escrita pendente mais antiga do journal (0 sem pendentes).')
+
+
+def _registar_lento(tipo: str, nome: str, duracao: float) -> None:
+    if duracao >= METRICAS_LENTO:
+        logging.warning(json.dumps({'evento': 'operacao_lenta', 'tipo': tipo, 'nome': nome, 'ms': round(duracao * 1000, 1)}))
+
+
+def medir(funcao: Callable) -> Callable:
+    """Decorador para as funções assíncronas de database/models.py."""
+    @functools.wraps(funcao)
+    async def medida(*args: Any, **kwargs: Any) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return await funcao(*args, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            db_funcao_segundos.observar(duracao, funcao=funcao.__name__)
+            _registar_lento('db_funcao', funcao.__name__, duracao)
+    return medida
+
+
+def _medir_consulta(operacao: str, metodo: Callable) -> Callable:
+    @functools.wraps(metodo)
+    def medido(*args: Any, **kwargs: Any) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        except Exception:
+            db_erros.incrementar(operacao=operacao)
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            db_consulta_segundos.observar(duracao, operacao=operacao)
+            _registar_lento('db_consulta', operacao, duracao)
+    return medido
+
+
+def instrumentar_repositorio(repositorio: Any) -> Any:
+    """Mede cada método público da interface Repositorio nesta instância."""
+    from database.repositorio import Repositorio
+    for operacao in Repositorio.__abstractmethods__:
+        setattr(repositorio, operacao, _medir_consulta(operacao, getattr(repositorio, operacao)))
+    return repositorio
+
+
+def _medir_callback(nome: str, callback: Callable) -> Callable:
+    @functools.wraps(callback)
+    async def medido(update: Any, context: Any) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            handler_erros.incrementar(handler=nome)
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            handler_segundos.observar(duracao, handler=nome)
+            _registar_lento('handler', nome, duracao)
+    return medido
+
+
+def instrumentar_handlers(application: Any) -> None:
+    """
+    Substitui o callback de cada handler registado (incluindo os estados dos
+    ConversationHandler) por uma versão medida, rotulada "conversa:função".
+    """
+    from telegram.ext import ConversationHandler
+
+    def instrumentar(handler: Any, conversa: str) -> None:
+        if isinstance(handler, ConversationHandler):
+            nome = handler.name or conversa
+            for interno in handler.entry_points + handler.fallbacks + [h for hs in handler.states.values() for h in hs]:
+                instrumentar(interno, nome)
+        elif getattr(handler, 'callback', None) is not None and asyncio.iscoroutinefunction(handler.callback):
+            handler.callback = _medir_callback(f"{conversa}:{handler.callback.__name__}", handler.callback)
+
+    for grupo in application.handlers.values():
+        for handler in grupo:
+            instrumentar(handler, 'geral')
+
+
+def criar_servidor_metricas(host: str, porta: int):
+    """Servidor HTTP local com GET /metricas (formato Prometheus)."""
+    from .servidor_http import ServidorHTTP, Pedido, Resposta
+
+    servidor = ServidorHTTP(host, porta)
+
+    async def metricas(pedido: Pedido) -> Resposta:
+        return Resposta(200, registo.exportar_prometheus().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+
+    servidor.rota('GET', '/metricas', metricas)
+    return servidor
+
+
+async def ciclo_log_metricas(intervalo: float) -> None:
+    """Escreve periodicamente um resumo de todas as métricas numa linha JSON."""
+    while True:
+        await asyncio.sleep(intervalo)
+        logging.info(json.dumps({'evento': 'metricas', **registo.resumo()}, ensure_ascii=False))
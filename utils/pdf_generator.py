@@ -1,20 +1,63 @@
+import functools
 import os
 from datetime import datetime
 from fpdf import FPDF
-from config import logging, PDF_SAVE_PATH
-from typing import List, Dict, Any
+from config import logging, PDF_SAVE_PATH, OS_TAMANHO_PAGINA
+from typing import Iterable, Dict, Any
+from .fontes_pdf import registar_fontes, estilo_italico, texto_imprimivel
+
+TITULO_RELATORIO = 'Relatório de Atividades - Kraflo'
+
+@functools.lru_cache(maxsize=None)
+def _modelo_pagina(familia: str) -> Dict[str, float]:
+    """
+    Posições do cabeçalho e do rodapé (A4, margens de 10mm), calculadas uma vez
+    por processo e família: iguais às de cell(0, 10, ..., align='C'), mas
+    desenhadas com text(), sem o custo de cell() em todas as páginas.
+    """
+    pdf = PDF('P', 'mm', 'A4')
+    largura_util = pdf.w - pdf.l_margin - pdf.r_margin
+    pdf.set_font(familia, 'B', 14)
+    titulo_x = pdf.l_margin + (largura_util - pdf.get_string_width(TITULO_RELATORIO)) / 2
+    titulo_y = pdf.t_margin + 5 + 0.3 * pdf.font_size
+    pdf.set_font(familia, pdf.italico, 8)
+    return {
+        'titulo_x': titulo_x,
+        'titulo_y': titulo_y,
+        'fim_cabecalho_y': pdf.t_margin + 10 + 5,
+        'centro_x': pdf.l_margin + largura_util / 2,
+        'rodape_y': pdf.h - 15 + 5 + 0.3 * pdf.font_size,
+    }
 
 class PDF(FPDF):
-    """Classe personalizada para ter cabeçalho e rodapé no PDF."""
+    """Classe personalizada para ter cabeçalho e rodapé no PDF, com a fonte Unicode dos relatórios."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.familia = registar_fontes(self)
+        self.italico = estilo_italico(self, self.familia)
+
+    def normalize_text(self, text: str) -> str:
+        # Um carácter que a fonte não tem (emoji, ou qualquer um fora do latin-1 com a
+        # Arial) é omitido ou trocado em vez de fazer falhar o relatório inteiro.
+        if not text.isascii():
+            if self.is_ttf_font:
+                cmap = self.current_font.cmap
+                text = texto_imprimivel(text, lambda c: c.isascii() or ord(c) in cmap)
+            else:
+                text = texto_imprimivel(text, lambda c: ord(c) < 256)
+        return super().normalize_text(text)
+
     def header(self):
-        self.set_font('Arial', 'B', 14)
-        self.cell(0, 10, 'Relatório de Atividades - Kraflo', 0, 1, 'C')
-        self.ln(5)
+        modelo = _modelo_pagina(self.familia)
+        self.set_font(self.familia, 'B', 14)
+        self.text(modelo['titulo_x'], modelo['titulo_y'], TITULO_RELATORIO)
+        self.set_xy(self.l_margin, modelo['fim_cabecalho_y'])
 
     def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+        modelo = _modelo_pagina(self.familia)
+        self.set_font(self.familia, self.italico, 8)
+        rodape = f'Página {self.page_no()}'
+        self.text(modelo['centro_x'] - self.get_string_width(rodape) / 2, modelo['rodape_y'], rodape)
 
 def formatar_data(data_str: str | None) -> str:
     """Formata uma data ISO para o formato DD/MM/YYYY às HH:MM."""
@@ -26,82 +69,209 @@ def formatar_data(data_str: str | None) -> str:
     except (ValueError, TypeError):
         return str(data_str)
 
-def gerar_relatorio_pdf(usuario: Dict[str, Any], ordens: List[Dict[str, Any]], periodo: str) -> str | None:
+def nome_ficheiro_relatorio(chat_id: int) -> str:
+    """Gera o nome do ficheiro do relatório, único por utilizador e instante."""
+    return f"relatorio_kraflo_{chat_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+
+def limpar_pdfs_orfaos() -> int:
+    """
+    Remove relatórios que ficaram em PDF_SAVE_PATH de execuções anteriores
+    (por exemplo, após uma falha a meio do envio). Retorna o número de ficheiros removidos.
+    """
+    if not os.path.isdir(PDF_SAVE_PATH):
+        return 0
+    removidos = 0
+    for nome in os.listdir(PDF_SAVE_PATH):
+        if not nome.endswith('.pdf'):
+            continue
+        try:
+            os.remove(os.path.join(PDF_SAVE_PATH, nome))
+            removidos += 1
+        except OSError as e:
+            logging.warning(f"Não foi possível remover o ficheiro órfão {nome}: {e}")
+    if removidos:
+        logging.info(f"{removidos} relatório(s) órfão(s) removido(s) de {PDF_SAVE_PATH}.")
+    return removidos
+
+# --- Layouts disponíveis ---
+# LAYOUT_DETALHADO: uma página por OS, com o bloco do profissional repetido (formato original).
+# LAYOUT_RESUMO: cabeçalho do profissional uma única vez e uma tabela com uma linha por OS.
+LAYOUT_DETALHADO = 'detalhado'
+LAYOUT_RESUMO = 'resumo'
+
+# Colunas da tabela do layout resumo: (título, largura em mm). Soma = largura útil de um A4 (190mm).
+COLUNAS_TABELA = (
+    ('ID', 14), ('Máquina', 22), ('Modelo', 36), ('Tipo', 24),
+    ('Abertura', 34), ('Fecho', 34), ('Concluído', 26),
+)
+
+def formatar_data_curta(data_str: str | None) -> str:
+    """Formata uma data ISO para DD/MM/YYYY HH:MM, para caber numa célula da tabela."""
+    if not data_str:
+        return "-"
+    try:
+        return datetime.fromisoformat(data_str).strftime('%d/%m/%Y %H:%M')
+    except (ValueError, TypeError):
+        return str(data_str)
+
+def _ajustar_texto(pdf: FPDF, texto: str, largura: float) -> str:
+    """Corta o texto para caber na largura da célula, terminando com '...'."""
+    largura -= 2  # margem interna da célula
+    if pdf.get_string_width(texto) <= largura:
+        return texto
+    while texto and pdf.get_string_width(texto + '...') > largura:
+        texto = texto[:-1]
+    return texto + '...'
+
+def _escrever_detalhes_profissional(pdf: FPDF, usuario: Dict[str, Any], periodo: str) -> None:
+    pdf.set_font(pdf.familia, 'B', 12)
+    pdf.cell(0, 8, '1. Detalhes do Profissional', ln=True, border='B')
+    pdf.ln(4)
+    pdf.set_font(pdf.familia, '', 10)
+    pdf.cell(0, 6, f"Nome: {usuario.get('nome', 'N/A')}", ln=True)
+    pdf.cell(0, 6, f"Função: {usuario.get('funcao', 'N/A')}", ln=True)
+    pdf.cell(0, 6, f"Período do Relatório: {periodo}", ln=True)
+    pdf.ln(8)
+
+def _escrever_detalhes_os(pdf: FPDF, ordem: Dict[str, Any], titulo: str = "2. Detalhes da OS") -> None:
+    # --- Detalhes da Ordem de Serviço ---
+    pdf.set_font(pdf.familia, 'B', 12)
+    pdf.cell(0, 8, f"{titulo} ID: {ordem.get('id')}", ln=True, border='B')
+    pdf.ln(4)
+
+    # Formato Label -> Valor
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Máquina", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.cell(0, 7, f"  {ordem.get('numero_maquina', 'N/A')} - {ordem.get('modelo_maquina', 'N/A')}", ln=True)
+
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Tipo de Manutenção", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.cell(0, 7, f"  {ordem.get('tipo_manutencao', 'N/A')}", ln=True)
+
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Problema Apresentado", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.multi_cell(0, 7, f"  {ordem.get('problema_apresentado', 'Não preenchido')}")
+    pdf.ln(1) # CORREÇÃO: Força o cursor para a próxima linha
+
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Solução Aplicada", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.multi_cell(0, 7, f"  {ordem.get('solucao_aplicada', 'Não preenchido')}")
+    pdf.ln(1) # CORREÇÃO: Força o cursor para a próxima linha
+
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Datas", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.cell(0, 7, f"  Abertura: {formatar_data(ordem.get('data_abertura'))}", ln=True)
+    pdf.cell(0, 7, f"  Fecho: {formatar_data(ordem.get('data_fechamento'))}", ln=True)
+
+    if ordem.get('substituir_peca'):
+        pdf.set_font(pdf.familia, 'B', 11)
+        pdf.cell(0, 7, "Peças Utilizadas", ln=True)
+        pdf.set_font(pdf.familia, '', 11)
+        pdf.cell(0, 7, f"  Descrição: {ordem.get('descricao_peca', 'N/A')}", ln=True)
+        pdf.cell(0, 7, f"  TAG/Código: {ordem.get('tag_peca', 'N/A')}", ln=True)
+
+    pdf.set_font(pdf.familia, 'B', 11)
+    pdf.cell(0, 7, "Serviço Concluído", ln=True)
+    pdf.set_font(pdf.familia, '', 11)
+    pdf.cell(0, 7, f"  {'Sim' if ordem.get('servico_concluido') else 'Não'}", ln=True)
+
+    if ordem.get('observacao'):
+        pdf.set_font(pdf.familia, 'B', 11)
+        pdf.cell(0, 7, "Observações", ln=True)
+        pdf.set_font(pdf.familia, '', 11)
+        pdf.multi_cell(0, 7, f"  {ordem.get('observacao')}")
+
+def _escrever_cabecalho_tabela(pdf: FPDF) -> None:
+    pdf.set_font(pdf.familia, 'B', 9)
+    pdf.set_fill_color(230, 230, 230)
+    for titulo, largura in COLUNAS_TABELA:
+        pdf.cell(largura, 7, titulo, border=1, align='C', fill=True)
+    pdf.ln()
+    pdf.set_font(pdf.familia, '', 9)
+
+def _escrever_tabela_os(pdf: FPDF, ordens: Iterable[Dict[str, Any]]) -> int:
+    """Escreve a tabela de OS, repetindo o cabeçalho em cada página. Retorna o número de linhas."""
+    pdf.set_font(pdf.familia, 'B', 12)
+    pdf.cell(0, 8, '2. Ordens de Serviço', ln=True, border='B')
+    pdf.ln(4)
+    _escrever_cabecalho_tabela(pdf)
+
+    total = concluidas = 0
+    altura_linha = 6
+    for ordem in ordens:
+        if pdf.will_page_break(altura_linha):
+            pdf.add_page()
+            _escrever_cabecalho_tabela(pdf)
+        valores = (
+            str(ordem.get('id', '')),
+            str(ordem.get('numero_maquina', 'N/A')),
+            str(ordem.get('modelo_maquina', 'N/A')),
+            str(ordem.get('tipo_manutencao', 'N/A')),
+            formatar_data_curta(ordem.get('data_abertura')),
+            formatar_data_curta(ordem.get('data_fechamento')),
+            'Sim' if ordem.get('servico_concluido') else 'Não',
+        )
+        for (_, largura), valor in zip(COLUNAS_TABELA, valores):
+            pdf.cell(largura, altura_linha, _ajustar_texto(pdf, valor, largura), border=1)
+        pdf.ln()
+        total += 1
+        if ordem.get('servico_concluido'):
+            concluidas += 1
+
+    pdf.ln(4)
+    pdf.set_font(pdf.familia, 'B', 10)
+    pdf.cell(0, 6, f"Total de OS: {total}   |   Concluídas: {concluidas}   |   Pendentes: {total - concluidas}", ln=True)
+    return total
+
+def gerar_relatorio_pdf(
+    usuario: Dict[str, Any],
+    ordens: Iterable[Dict[str, Any]],
+    periodo: str,
+    em_memoria: bool = False,
+    layout: str = LAYOUT_DETALHADO,
+    anexos: Iterable[Dict[str, Any]] | None = None,
+) -> str | bytes | None:
+    """
+    Gera o relatório de atividades.
+    `ordens` pode ser qualquer iterável (lista ou gerador): é percorrido uma única vez.
+    No layout resumo, `anexos` (opcional) são as OS a detalhar em páginas de anexo
+    após a tabela; é um iterável à parte para que `ordens` possa ser um gerador.
+    Com em_memoria=True retorna o conteúdo do PDF em bytes, sem tocar no disco;
+    caso contrário grava o ficheiro em PDF_SAVE_PATH e retorna o seu caminho.
+    """
     try:
         pdf = PDF('P', 'mm', 'A4')
         pdf.set_auto_page_break(auto=True, margin=15)
-        
-        # --- Para cada Ordem de Serviço, criamos uma nova página ---
-        for i, ordem in enumerate(ordens):
+
+        if layout == LAYOUT_RESUMO:
             pdf.add_page()
-            
-            # --- Cabeçalho da Página com Detalhes do Profissional ---
-            pdf.set_font('Arial', 'B', 12)
-            pdf.cell(0, 8, '1. Detalhes do Profissional', ln=True, border='B')
-            pdf.ln(4)
-            pdf.set_font('Arial', '', 10)
-            pdf.cell(0, 6, f"Nome: {usuario.get('nome', 'N/A')}", ln=True)
-            pdf.cell(0, 6, f"Função: {usuario.get('funcao', 'N/A')}", ln=True)
-            pdf.cell(0, 6, f"Período do Relatório: {periodo}", ln=True)
-            pdf.ln(8)
-            
-            # --- Detalhes da Ordem de Serviço ---
-            pdf.set_font('Arial', 'B', 12)
-            pdf.cell(0, 8, f"2. Detalhes da OS ID: {ordem.get('id')}", ln=True, border='B')
-            pdf.ln(4)
-            
-            # Formato Label -> Valor
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Máquina", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.cell(0, 7, f"  {ordem.get('numero_maquina', 'N/A')} - {ordem.get('modelo_maquina', 'N/A')}", ln=True)
-
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Tipo de Manutenção", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.cell(0, 7, f"  {ordem.get('tipo_manutencao', 'N/A')}", ln=True)
-
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Problema Apresentado", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.multi_cell(0, 7, f"  {ordem.get('problema_apresentado', 'Não preenchido')}")
-            pdf.ln(1) # CORREÇÃO: Força o cursor para a próxima linha
-
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Solução Aplicada", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.multi_cell(0, 7, f"  {ordem.get('solucao_aplicada', 'Não preenchido')}")
-            pdf.ln(1) # CORREÇÃO: Força o cursor para a próxima linha
-            
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Datas", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.cell(0, 7, f"  Abertura: {formatar_data(ordem.get('data_abertura'))}", ln=True)
-            pdf.cell(0, 7, f"  Fecho: {formatar_data(ordem.get('data_fechamento'))}", ln=True)
-            
-            if ordem.get('substituir_peca'):
-                pdf.set_font('Arial', 'B', 11)
-                pdf.cell(0, 7, "Peças Utilizadas", ln=True)
-                pdf.set_font('Arial', '', 11)
-                pdf.cell(0, 7, f"  Descrição: {ordem.get('descricao_peca', 'N/A')}", ln=True)
-                pdf.cell(0, 7, f"  TAG/Código: {ordem.get('tag_peca', 'N/A')}", ln=True)
-
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 7, "Serviço Concluído", ln=True)
-            pdf.set_font('Arial', '', 11)
-            pdf.cell(0, 7, f"  {'Sim' if ordem.get('servico_concluido') else 'Não'}", ln=True)
-
-            if ordem.get('observacao'):
-                pdf.set_font('Arial', 'B', 11)
-                pdf.cell(0, 7, "Observações", ln=True)
-                pdf.set_font('Arial', '', 11)
-                pdf.multi_cell(0, 7, f"  {ordem.get('observacao')}")
+            _escrever_detalhes_profissional(pdf, usuario, periodo)
+            _escrever_tabela_os(pdf, ordens)
+            for ordem in anexos or ():
+                pdf.add_page()
+                _escrever_detalhes_os(pdf, ordem, titulo="Anexo - Detalhes da OS")
+        else:
+            # --- Para cada Ordem de Serviço, criamos uma nova página ---
+            for ordem in ordens:
+                pdf.add_page()
+                _escrever_detalhes_profissional(pdf, usuario, periodo)
+                _escrever_detalhes_os(pdf, ordem)
+
+        if em_memoria:
+            conteudo = bytes(pdf.output())
+            logging.info(f"Relatório PDF gerado em memória ({len(conteudo)} bytes).")
+            return conteudo
 
         # --- Salvar o ficheiro ---
         if not os.path.exists(PDF_SAVE_PATH):
             os.makedirs(PDF_SAVE_PATH)
             
-        filename = f"relatorio_kraflo_{usuario['chat_id']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+        filename = nome_ficheiro_relatorio(usuario['chat_id'])
         filepath = os.path.join(PDF_SAVE_PATH, filename)
         
         pdf.output(filepath)
@@ -111,3 +281,128 @@ def gerar_relatorio_pdf(usuario: Dict[str, Any], ordens: List[Dict[str, Any]], p
     except Exception as e:
         logging.error(f"Falha ao gerar o ficheiro PDF: {e}")
         return None
+
+def gerar_relatorio_periodo_pdf(
+    usuario: Dict[str, Any],
+    data_inicio: str,
+    data_fim: str,
+    periodo: str,
+    em_memoria: bool = False,
+    layout: str = LAYOUT_DETALHADO,
+    com_anexos: bool = False,
+) -> str | bytes | None:
+    """
+    Gera o relatório lendo as OS do banco página a página enquanto o PDF é escrito,
+    em vez de receber a lista completa. Pensada para correr no pool de processos:
+    o uso de memória não cresce com o número de OS lidas do banco.
+    Os anexos do layout resumo são lidos numa segunda passagem pelo período.
+    """
+    # Importação local: o processo de renderização só precisa do repositório, não do
+    # journal, dos caches e do pool de threads do bot (database/models.py).
+    from database import get_repositorio
+    from database.repositorio import iterar_ordens_periodo
+    repositorio = get_repositorio()
+    ordens = iterar_ordens_periodo(repositorio, usuario['chat_id'], data_inicio, data_fim, OS_TAMANHO_PAGINA)
+    anexos = iterar_ordens_periodo(repositorio, usuario['chat_id'], data_inicio, data_fim, OS_TAMANHO_PAGINA) if com_anexos else None
+    return gerar_relatorio_pdf(usuario, ordens, periodo, em_memoria, layout, anexos)
+
+# --- Relatório de setor ---
+
+def _horas_medias(horas: float, fechadas: int) -> str:
+    return f"{horas / fechadas:.1f}" if fechadas else "-"
+
+def _escrever_tabela_resumo(pdf: FPDF, titulo: str, colunas: tuple, linhas: Iterable[tuple]) -> None:
+    """Tabela simples de totais; a primeira coluna é texto e as restantes números."""
+    pdf.set_font(pdf.familia, 'B', 12)
+    pdf.cell(0, 8, titulo, ln=True, border='B')
+    pdf.ln(4)
+
+    def cabecalho():
+        pdf.set_font(pdf.familia, 'B', 9)
+        pdf.set_fill_color(230, 230, 230)
+        for nome, largura in colunas:
+            pdf.cell(largura, 7, nome, border=1, align='C', fill=True)
+        pdf.ln()
+        pdf.set_font(pdf.familia, '', 9)
+
+    cabecalho()
+    for linha in linhas:
+        if pdf.will_page_break(6):
+            pdf.add_page()
+            cabecalho()
+        for i, ((_, largura), valor) in enumerate(zip(colunas, linha)):
+            pdf.cell(largura, 6, _ajustar_texto(pdf, str(valor), largura), border=1, align='L' if i == 0 else 'R')
+        pdf.ln()
+    pdf.ln(6)
+
+COLUNAS_RESUMO_SETOR = (
+    ('', 70), ('OS', 22), ('Fechadas', 24), ('Concluídas', 24), ('Em aberto', 24), ('Horas/OS', 26),
+)
+
+def gerar_relatorio_setor_pdf(
+    setor: str,
+    resumo: Iterable[Dict[str, Any]],
+    periodo: str,
+    em_memoria: bool = False,
+) -> str | bytes | None:
+    """
+    Gera o relatório de um setor a partir dos totais já agregados no banco
+    (uma linha por técnico e tipo de manutenção, ver models.resumo_setor):
+    totais do setor, uma tabela por técnico e outra por tipo de manutenção.
+    O tamanho do PDF depende do número de técnicos, não do número de OS.
+    """
+    try:
+        por_tecnico: Dict[Any, list] = {}
+        por_tipo: Dict[str, list] = {}
+        totais = [0, 0, 0, 0.0]
+        for linha in resumo:
+            valores = (linha['total'], linha['fechadas'], linha['concluidas'], linha['horas_reparacao'] or 0.0)
+            for grupo, chave in ((por_tecnico, (linha['nome'], linha['chat_id'])), (por_tipo, linha['tipo_manutencao'])):
+                acumulado = grupo.setdefault(chave, [0, 0, 0, 0.0])
+                for i, valor in enumerate(valores):
+                    acumulado[i] += valor
+            for i, valor in enumerate(valores):
+                totais[i] += valor
+
+        def linhas_tabela(grupos: Dict[Any, list], rotulo) -> list:
+            return [
+                (rotulo(chave), total, fechadas, concluidas, total - fechadas, _horas_medias(horas, fechadas))
+                for chave, (total, fechadas, concluidas, horas) in sorted(grupos.items(), key=lambda g: -g[1][0])
+            ]
+
+        pdf = PDF('P', 'mm', 'A4')
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+
+        pdf.set_font(pdf.familia, 'B', 12)
+        pdf.cell(0, 8, '1. Resumo do Setor', ln=True, border='B')
+        pdf.ln(4)
+        pdf.set_font(pdf.familia, '', 10)
+        total, fechadas, concluidas, horas = totais
+        pdf.cell(0, 6, f"Setor: {setor}", ln=True)
+        pdf.cell(0, 6, f"Período do Relatório: {periodo}", ln=True)
+        pdf.cell(0, 6, f"Técnicos com OS no período: {len(por_tecnico)}", ln=True)
+        pdf.cell(0, 6, f"Total de OS: {total}   |   Fechadas: {fechadas}   |   Concluídas: {concluidas}   |   Em aberto: {total - fechadas}", ln=True)
+        pdf.cell(0, 6, f"Tempo médio de reparação: {_horas_medias(horas, fechadas)} h", ln=True)
+        pdf.ln(8)
+
+        colunas_tecnico = (('Técnico', COLUNAS_RESUMO_SETOR[0][1]),) + COLUNAS_RESUMO_SETOR[1:]
+        colunas_tipo = (('Tipo de manutenção', COLUNAS_RESUMO_SETOR[0][1]),) + COLUNAS_RESUMO_SETOR[1:]
+        _escrever_tabela_resumo(pdf, '2. Por Técnico', colunas_tecnico, linhas_tabela(por_tecnico, lambda chave: chave[0]))
+        _escrever_tabela_resumo(pdf, '3. Por Tipo de Manutenção', colunas_tipo, linhas_tabela(por_tipo, str))
+
+        if em_memoria:
+            conteudo = bytes(pdf.output())
+            logging.info(f"Relatório do setor {setor} gerado em memória ({len(conteudo)} bytes).")
+            return conteudo
+
+        if not os.path.exists(PDF_SAVE_PATH):
+            os.makedirs(PDF_SAVE_PATH)
+        filepath = os.path.join(PDF_SAVE_PATH, f"relatorio_setor_kraflo_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.pdf")
+        pdf.output(filepath)
+        logging.info(f"Relatório do setor {setor} gerado em: {filepath}")
+        return filepath
+
+    except Exception as e:
+        logging.error(f"Falha ao gerar o relatório do setor {setor}: {e}")
+        return None
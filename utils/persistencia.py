@@ -0,0 +1,194 @@
+"""
+Persistência do estado das conversas em SQLite.
+
+Guarda o estado dos ConversationHandler e o context.user_data/chat_data/bot_data
+num ficheiro SQLite local (modo WAL), para que um reinício do serviço não
+interrompa quem estava a meio de um fluxo (por exemplo, a fechar uma OS).
+
+As escritas são diferidas: o python-telegram-bot entrega as alterações em
+lote a cada `update_interval` segundos, e este módulo grava esse lote numa
+única transação, numa thread à parte. Nenhuma atualização espera pelo disco.
+"""
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+from copy import deepcopy
+from typing import Any, Dict, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import logging
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS geral (chave TEXT PRIMARY KEY, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversas (
+    nome TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    estado BLOB NOT NULL,
+    PRIMARY KEY (nome, chave)
+);
+"""
+
+# Marcador de "apagar" nas alterações pendentes.
+_REMOVER = None
+
+
+class PersistenciaSQLite(BasePersistence):
+    """Implementação de BasePersistence sobre SQLite com escrita diferida em lote."""
+
+    def __init__(self, caminho: str, update_interval: float = 5, store_data: PersistenceInput | None = None):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.caminho = caminho
+        self._ligacao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._ligacao.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, synchronous=NORMAL continua a garantir a integridade do ficheiro e evita
+        # um fsync por transação; no pior caso perde-se o último lote após uma falha de energia.
+        self._ligacao.execute("PRAGMA synchronous=NORMAL")
+        self._ligacao.executescript(ESQUEMA)
+        self._lock_escrita = threading.Lock()
+
+        # Alterações ainda não gravadas. Um valor None significa "remover".
+        self._user_data: Dict[int, Any] = {}
+        self._chat_data: Dict[int, Any] = {}
+        self._geral: Dict[str, Any] = {}
+        self._conversas: Dict[Tuple[str, str], Any] = {}
+        self._descarga: asyncio.Task | None = None
+
+    # --- Leitura (apenas no arranque) ---
+
+    def _ler_tabela(self, tabela: str) -> Dict[int, Any]:
+        linhas = self._ligacao.execute(f"SELECT id, dados FROM {tabela}").fetchall()
+        return {id_: pickle.loads(dados) for id_, dados in linhas}
+
+    def _ler_geral(self, chave: str) -> Any:
+        linha = self._ligacao.execute("SELECT dados FROM geral WHERE chave = ?", (chave,)).fetchone()
+        return pickle.loads(linha[0]) if linha else None
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return self._ler_tabela('user_data')
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return self._ler_tabela('chat_data')
+
+    async def get_bot_data(self) -> Any:
+        return self._ler_geral('bot_data') or {}
+
+    async def get_callback_data(self) -> Any:
+        return self._ler_geral('callback_data')
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        linhas = self._ligacao.execute("SELECT chave, estado FROM conversas WHERE nome = ?", (name,)).fetchall()
+        return {tuple(json.loads(chave)): pickle.loads(estado) for chave, estado in linhas}
+
+    # --- Escrita diferida ---
+
+    def _agendar_descarga(self) -> None:
+        """Agrupa todas as alterações recebidas no mesmo ciclo numa única transação."""
+        # O python-telegram-bot entrega todas as alterações de um ciclo seguidas, sem
+        # pausas, por isso a tarefa só corre depois de o lote inteiro ter chegado.
+        if self._descarga is None or self._descarga.done():
+            self._descarga = asyncio.get_running_loop().create_task(self._descarregar())
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        self._conversas[(name, json.dumps(list(key)))] = new_state
+        self._agendar_descarga()
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        # Cópia: o dicionário original continua a ser alterado pelos handlers.
+        self._user_data[user_id] = deepcopy(data)
+        self._agendar_descarga()
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        self._chat_data[chat_id] = deepcopy(data)
+        self._agendar_descarga()
+
+    async def update_bot_data(self, data: Any) -> None:
+        self._geral['bot_data'] = deepcopy(data)
+        self._agendar_descarga()
+
+    async def update_callback_data(self, data: Any) -> None:
+        self._geral['callback_data'] = deepcopy(data)
+        self._agendar_descarga()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_data[user_id] = _REMOVER
+        self._agendar_descarga()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._chat_data[chat_id] = _REMOVER
+        self._agendar_descarga()
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    def _retirar_pendentes(self) -> Tuple[dict, dict, dict, dict]:
+        pendentes = (self._user_data, self._chat_data, self._geral, self._conversas)
+        self._user_data, self._chat_data, self._geral, self._conversas = {}, {}, {}, {}
+        return pendentes
+
+    def _gravar(self, user_data: dict, chat_data: dict, geral: dict, conversas: dict) -> None:
+        """Grava um lote de alterações numa única transação."""
+        with self._lock_escrita:
+            cursor = self._ligacao.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for tabela, alteracoes in (('user_data', user_data), ('chat_data', chat_data)):
+                    remover = [(id_,) for id_, dados in alteracoes.items() if dados is _REMOVER]
+                    gravar = [(id_, pickle.dumps(dados)) for id_, dados in alteracoes.items() if dados is not _REMOVER]
+                    cursor.executemany(f"DELETE FROM {tabela} WHERE id = ?", remover)
+                    cursor.executemany(f"INSERT OR REPLACE INTO {tabela} (id, dados) VALUES (?, ?)", gravar)
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO geral (chave, dados) VALUES (?, ?)",
+                    [(chave, pickle.dumps(dados)) for chave, dados in geral.items()],
+                )
+                # Uma conversa terminada (estado None) é removida.
+                cursor.executemany(
+                    "DELETE FROM conversas WHERE nome = ? AND chave = ?",
+                    [chave for chave, estado in conversas.items() if estado is None],
+                )
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO conversas (nome, chave, estado) VALUES (?, ?, ?)",
+                    [(*chave, pickle.dumps(estado)) for chave, estado in conversas.items() if estado is not None],
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    async def _descarregar(self) -> None:
+        # Repete enquanto chegarem alterações durante a gravação do lote anterior.
+        while True:
+            pendentes = self._retirar_pendentes()
+            if not any(pendentes):
+                return
+            try:
+                await asyncio.to_thread(self._gravar, *pendentes)
+            except Exception as e:
+                logging.error(f"Falha ao gravar o estado das conversas: {e}")
+                self._repor_pendentes(*pendentes)
+                return
+
+    def _repor_pendentes(self, user_data: dict, chat_data: dict, geral: dict, conversas: dict) -> None:
+        """Devolve um lote que falhou à fila, sem sobrepor alterações mais recentes."""
+        for pendente, falhado in zip((self._user_data, self._chat_data, self._geral, self._conversas),
+                                     (user_data, chat_data, geral, conversas)):
+            for chave, valor in falhado.items():
+                pendente.setdefault(chave, valor)
+
+    async def flush(self) -> None:
+        """Chamado no encerramento do bot: grava tudo o que ainda estiver pendente."""
+        if self._descarga is not None:
+            await self._descarga
+        self._gravar(*self._retirar_pendentes())
+        self._ligacao.close()
+        logging.info(f"Estado das conversas gravado em {self.caminho}.")
@@ -0,0 +1,58 @@
+"""
+Processamento concorrente de atualizações do Telegram.
+
+Por omissão o python-telegram-bot processa uma atualização de cada vez, pelo
+que um relatório demorado atrasa todos os outros utilizadores. Este
+processador permite várias atualizações em simultâneo, mas mantém as de um
+mesmo chat em série e pela ordem de chegada, como os ConversationHandler exigem.
+"""
+import asyncio
+from typing import Awaitable, Dict
+
+from telegram.ext import BaseUpdateProcessor
+
+
+def chave_chat(update: object) -> int | None:
+    """Chave que define a ordem de processamento: o chat da atualização ou, sem chat, o utilizador."""
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, 'effective_user', None)
+    return user.id if user is not None else None
+
+
+class ProcessadorPorChat(BaseUpdateProcessor):
+    """Processa atualizações em paralelo entre chats e em série dentro de cada chat."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._pendentes: Dict[int, int] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        chave = chave_chat(update)
+        if chave is None:
+            await super().process_update(update, coroutine)
+            return
+
+        # O lock do chat é obtido antes da vaga global, para que as atualizações em espera
+        # de um chat muito ativo não ocupem vagas que outros chats poderiam usar.
+        lock = self._locks.setdefault(chave, asyncio.Lock())
+        self._pendentes[chave] = self._pendentes.get(chave, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._pendentes[chave] -= 1
+            if not self._pendentes[chave]:
+                del self._pendentes[chave]
+                del self._locks[chave]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
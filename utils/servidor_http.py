@@ -0,0 +1,193 @@
+"""
+Servidor HTTP/1.1 mínimo sobre asyncio.
+
+Serve apenas os poucos endpoints internos do bot (webhook do Telegram,
+verificação de saúde, métricas) sem acrescentar um framework web às
+dependências. Não se destina a ser exposto diretamente à internet: em
+produção deve ficar atrás de um proxy reverso com TLS (nginx, Caddy, ...).
+"""
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Tuple
+
+from config import logging
+
+# Tamanho máximo aceite para o corpo de um pedido (as atualizações do Telegram são pequenas).
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+# Tempo máximo de espera por um pedido numa ligação inativa.
+TEMPO_LIMITE_LEITURA = 30.0
+# Tamanho máximo da linha do pedido e de cada cabeçalho (limite do StreamReader).
+TAMANHO_MAXIMO_LINHA = 16 * 1024
+
+MOTIVOS = {
+    200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+@dataclass
+class Pedido:
+    metodo: str
+    caminho: str
+    cabecalhos: Dict[str, str]
+    corpo: bytes = b''
+
+
+@dataclass
+class Resposta:
+    estado: int = 200
+    corpo: bytes = b''
+    tipo: str = 'text/plain; charset=utf-8'
+    cabecalhos: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def json(cls, dados: object, estado: int = 200) -> 'Resposta':
+        return cls(estado, json.dumps(dados).encode(), 'application/json')
+
+
+Rota = Callable[[Pedido], Awaitable[Resposta]]
+
+
+class PedidoInvalido(Exception):
+    """Pedido mal formado, truncado ou demasiado grande: é respondido com `estado` e a ligação é fechada."""
+
+    def __init__(self, motivo: str, estado: int = 400):
+        super().__init__(motivo)
+        self.estado = estado
+
+
+class ServidorHTTP:
+    """Servidor com rotas registadas por (método, caminho)."""
+
+    def __init__(self, host: str, porta: int):
+        self.host = host
+        self.porta = porta
+        self._rotas: Dict[Tuple[str, str], Rota] = {}
+        self._prefixos: list[Tuple[str, str, Rota]] = []
+        self._servidor: asyncio.AbstractServer | None = None
+
+    def rota(self, metodo: str, caminho: str, funcao: Rota) -> None:
+        self._rotas[(metodo.upper(), caminho)] = funcao
+
+    def rota_prefixo(self, metodo: str, prefixo: str, funcao: Rota) -> None:
+        """Regista uma rota para todos os caminhos que começam por `prefixo`."""
+        self._prefixos.append((metodo.upper(), prefixo, funcao))
+
+    def _encontrar_rota(self, metodo: str, caminho: str) -> Rota | None:
+        funcao = self._rotas.get((metodo, caminho))
+        if funcao is None:
+            funcao = next((f for m, p, f in self._prefixos if m == metodo and caminho.startswith(p)), None)
+        return funcao
+
+    async def iniciar(self) -> None:
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta, limit=TAMANHO_MAXIMO_LINHA)
+        enderecos = ', '.join(str(s.getsockname()) for s in self._servidor.sockets)
+        logging.info(f"Servidor HTTP a escutar em {enderecos}.")
+
+    async def parar(self) -> None:
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+
+    @property
+    def porta_efetiva(self) -> int:
+        """Porta em uso (útil quando o servidor é iniciado com a porta 0)."""
+        return self._servidor.sockets[0].getsockname()[1] if self._servidor else self.porta
+
+    @staticmethod
+    async def _ler_linha(leitor: asyncio.StreamReader) -> bytes:
+        """Uma linha do pedido; b'' se a ligação fechar antes de ela começar."""
+        try:
+            return await asyncio.wait_for(leitor.readuntil(b'\n'), TEMPO_LIMITE_LEITURA)
+        except asyncio.LimitOverrunError:
+            raise PedidoInvalido('linha demasiado longa')
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise PedidoInvalido('pedido incompleto')
+            return b''
+
+    async def _ler_pedido(self, leitor: asyncio.StreamReader) -> Pedido | None:
+        linha = await self._ler_linha(leitor)
+        if not linha:
+            return None
+        partes = linha.decode('latin-1').split()
+        if len(partes) != 3 or not partes[2].startswith('HTTP/'):
+            raise PedidoInvalido('linha de pedido invalida')
+        metodo, caminho, _ = partes
+        cabecalhos: Dict[str, str] = {}
+        while True:
+            linha = await self._ler_linha(leitor)
+            if not linha:
+                raise PedidoInvalido('pedido incompleto')
+            if linha in (b'\r\n', b'\n'):
+                break
+            nome, separador, valor = linha.decode('latin-1').partition(':')
+            if not separador:
+                raise PedidoInvalido('cabecalho invalido')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        try:
+            tamanho = int(cabecalhos.get('content-length', '0'))
+        except ValueError:
+            raise PedidoInvalido('content-length invalido')
+        if tamanho < 0:
+            raise PedidoInvalido('content-length invalido')
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise PedidoInvalido('corpo demasiado grande', 413)
+        try:
+            corpo = await asyncio.wait_for(leitor.readexactly(tamanho), TEMPO_LIMITE_LEITURA) if tamanho else b''
+        except asyncio.IncompleteReadError:
+            raise PedidoInvalido('corpo incompleto')
+        return Pedido(metodo.upper(), caminho.split('?', 1)[0], cabecalhos, corpo)
+
+    async def _atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    pedido = await self._ler_pedido(leitor)
+                except (asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+                    # Ligação inativa, fechada pelo cliente ou servidor a encerrar.
+                    return
+                except PedidoInvalido as e:
+                    # O resto da ligação não pode ser lido com segurança: responde e fecha.
+                    logging.warning(f"Pedido HTTP inválido de {escritor.get_extra_info('peername')}: {e}")
+                    try:
+                        await self._escrever(escritor, Resposta(e.estado, str(e).encode()), fechar=True)
+                    except ConnectionError:
+                        pass
+                    return
+                if pedido is None:
+                    return
+
+                funcao = self._encontrar_rota(pedido.metodo, pedido.caminho)
+                if funcao is None:
+                    existe = any(caminho == pedido.caminho for _, caminho in self._rotas)
+                    resposta = Resposta(405 if existe else 404)
+                else:
+                    try:
+                        resposta = await funcao(pedido)
+                    except Exception as e:
+                        logging.error(f"Erro ao processar {pedido.metodo} {pedido.caminho}: {e}")
+                        resposta = Resposta(500)
+
+                fechar = pedido.cabecalhos.get('connection', '').lower() == 'close'
+                await self._escrever(escritor, resposta, fechar)
+                if fechar:
+                    return
+        finally:
+            escritor.close()
+
+    @staticmethod
+    async def _escrever(escritor: asyncio.StreamWriter, resposta: Resposta, fechar: bool) -> None:
+        cabecalhos = {
+            'Content-Type': resposta.tipo,
+            'Content-Length': str(len(resposta.corpo)),
+            'Connection': 'close' if fechar else 'keep-alive',
+            **resposta.cabecalhos,
+        }
+        linhas = [f"HTTP/1.1 {resposta.estado} {MOTIVOS.get(resposta.estado, '')}"]
+        linhas += [f"{nome}: {valor}" for nome, valor in cabecalhos.items()]
+        escritor.write(('\r\n'.join(linhas) + '\r\n\r\n').encode('latin-1') + resposta.corpo)
+        await escritor.drain()
@@ -0,0 +1,64 @@
+"""
+Proteção contra pedidos repetidos (toques duplos, reenvios em redes fracas).
+
+Em "single-flight", pedidos idênticos feitos em simultâneo partilham uma
+única execução: o segundo toque espera pelo resultado do primeiro em vez de
+repetir o trabalho. Opcionalmente, o resultado de uma operação concluída com
+sucesso fica guardado durante uma janela de idempotência, e um pedido
+idêntico nesse período recebe o mesmo resultado sem voltar a executar.
+
+A chave identifica o pedido: (chat_id, ação, parâmetros).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from config import IDEMPOTENCIA_JANELA, IDEMPOTENCIA_MAX
+from database.cache import CacheTTL, AUSENTE
+from .metricas import registo
+
+pedidos_repetidos = registo.contador(
+    'kraflo_pedidos_repetidos_total', 'Pedidos repetidos servidos sem nova execução, por ação e motivo.'
+)
+
+
+class VooUnico:
+    """Execuções em curso e resultados recentes, indexados pela chave do pedido."""
+
+    def __init__(self, janela: float, max_entradas: int):
+        self._em_curso: Dict[Hashable, asyncio.Task] = {}
+        self._concluidos = CacheTTL(max_entradas, janela)
+
+    def em_curso(self, chave: Hashable) -> bool:
+        return chave in self._em_curso
+
+    async def executar(self, chave: Hashable, operacao: Callable[[], Awaitable[Any]], idempotente: bool = False) -> Any:
+        """
+        Executa `operacao()` uma única vez por chave.
+        Com `idempotente=True`, um resultado verdadeiro é reutilizado durante a janela configurada.
+        """
+        acao = str(chave[1]) if isinstance(chave, tuple) and len(chave) > 1 else 'desconhecida'
+        if idempotente:
+            resultado = self._concluidos.obter(chave)
+            if resultado is not AUSENTE:
+                pedidos_repetidos.incrementar(acao=acao, motivo='janela')
+                return resultado
+
+        tarefa = self._em_curso.get(chave)
+        if tarefa is not None:
+            pedidos_repetidos.incrementar(acao=acao, motivo='em_curso')
+        else:
+            tarefa = asyncio.get_running_loop().create_task(operacao())
+            self._em_curso[chave] = tarefa
+
+            def terminada(t: asyncio.Task) -> None:
+                self._em_curso.pop(chave, None)
+                if idempotente and not t.cancelled() and t.exception() is None and t.result():
+                    self._concluidos.guardar(chave, t.result())
+            tarefa.add_done_callback(terminada)
+
+        # shield: se quem pediu for cancelado, a execução partilhada continua para os restantes.
+        return await asyncio.shield(tarefa)
+
+
+# Instância partilhada pelos handlers.
+voo_unico = VooUnico(IDEMPOTENCIA_JANELA, IDEMPOTENCIA_MAX)
@@ -0,0 +1,107 @@
+"""
+Modo webhook: o Telegram envia as atualizações para um servidor HTTP local.
+
+Rotas:
+    POST WEBHOOK_CAMINHO  recebe as atualizações (verifica o token secreto)
+    GET  /saude           estado do bot, para o systemd/proxy/monitorização
+
+O ciclo de vida (servir) e a rota /saude são partilhados com os processos
+trabalhadores do modo distribuído (utils/distribuicao.py).
+"""
+import asyncio
+import hmac
+import json
+import signal
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORTA, WEBHOOK_CAMINHO, WEBHOOK_SEGREDO, logging
+from database.models import journal
+from .servidor_http import ServidorHTTP, Pedido, Resposta
+
+# Cabeçalho com que o Telegram envia o secret_token definido no setWebhook.
+CABECALHO_SEGREDO = 'x-telegram-bot-api-secret-token'
+
+
+def criar_servidor_webhook(application: Application, host: str = WEBHOOK_HOST, porta: int = WEBHOOK_PORTA) -> ServidorHTTP:
+    """Cria o servidor HTTP que entrega as atualizações recebidas à fila da aplicação."""
+    servidor = ServidorHTTP(host, porta)
+
+    async def receber_update(pedido: Pedido) -> Resposta:
+        segredo = pedido.cabecalhos.get(CABECALHO_SEGREDO, '')
+        if not hmac.compare_digest(segredo.encode(), WEBHOOK_SEGREDO.encode()):
+            logging.warning("Pedido ao webhook rejeitado: token secreto inválido.")
+            return Resposta(403)
+        try:
+            update = Update.de_json(json.loads(pedido.corpo), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logging.error(f"Atualização inválida recebida no webhook: {e}")
+            return Resposta(400)
+        await application.update_queue.put(update)
+        return Resposta(200)
+
+    servidor.rota('POST', WEBHOOK_CAMINHO, receber_update)
+    servidor.rota('GET', '/saude', rota_saude(application))
+    return servidor
+
+
+def rota_saude(application: Application):
+    """Rota GET /saude: estado da aplicação, para o systemd/proxy/monitorização."""
+    async def saude(pedido: Pedido) -> Resposta:
+        processador = application.update_processor
+        estado = {
+            'estado': 'ok' if application.running else 'parado',
+            'fila': application.update_queue.qsize(),
+            'em_processamento': processador.current_concurrent_updates,
+            'journal': journal.metricas(),
+        }
+        return Resposta.json(estado, 200 if application.running else 503)
+    return saude
+
+
+def sinal_de_paragem() -> asyncio.Event:
+    """Evento que fica ativo quando o processo recebe SIGINT ou SIGTERM."""
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sinal, parar.set)
+    return parar
+
+
+async def servir(application: Application, servidor: ServidorHTTP, ao_arrancar=None) -> None:
+    """
+    Ciclo de vida completo do bot atrás de um servidor HTTP, equivalente ao run_polling():
+    inicializa a aplicação, inicia o servidor, chama `ao_arrancar` e serve até receber SIGINT/SIGTERM.
+    """
+    parar = sinal_de_paragem()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await servidor.iniciar()
+        if ao_arrancar is not None:
+            await ao_arrancar()
+        try:
+            await parar.wait()
+        finally:
+            logging.info("A encerrar o servidor de atualizações...")
+            await servidor.parar()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+async def executar_webhook(application: Application) -> None:
+    """Modo webhook: serve as atualizações e regista o webhook no Telegram."""
+    async def registar_webhook() -> None:
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_CAMINHO,
+            secret_token=WEBHOOK_SEGREDO,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logging.info("Webhook registado. A aguardar atualizações...")
+
+    await servir(application, criar_servidor_webhook(application), registar_webhook)